@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures write throughput and the page cache growth of the output
+file in the usual mode, in large file mode (the written beginning of
+the file is flushed and dropped from the page cache) and with direct
+I/O. Blocks are written by the writer thread as while downloading.
+
+The page cache growth is taken from 'Cached' in /proc/meminfo, so it
+is only reported on Linux and includes activity of other programs.
+
+Usage: python benchmarks/large_file.py [SIZE_MB] [DIRECTORY]
+
+"""
+
+import os
+import sys
+import time
+import builtins
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pymget.outfile import OutputFile
+from pymget.writer import Writer
+
+builtins.__dict__.setdefault('_', lambda text: text)
+
+BLOCK_SIZE = 4 * 2**20
+WRITE_BEHIND = 64 * 2**20
+
+
+class NullConsole:
+
+    def ask(self, message, default):
+        return default
+
+    def warning(self, message):
+        print('warning: {}'.format(message))
+
+
+def cached_bytes():
+
+    """
+    Returns the size of the page cache or None if it's unknown.
+
+    """
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('Cached:'):
+                    return int(line.split()[1]) * 2**10
+    except OSError:
+        pass
+    return None
+
+
+def run(size, directory, large_file, direct_io):
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        outfile = OutputFile(NullConsole(), os.path.join(tmp, 'bench'), large_file, direct_io)
+        outfile.create_path('bench')
+        data = os.urandom(BLOCK_SIZE)
+        cached = cached_bytes()
+        start = time.perf_counter()
+        with outfile:
+            writer = Writer(outfile, WRITE_BEHIND)
+            writer.start()
+            for offset in range(0, size, BLOCK_SIZE):
+                writer.put(offset, data)
+                for part_offset, length in writer.take_written():
+                    outfile.release(part_offset, length)
+            writer.close()
+            for part_offset, length in writer.take_written():
+                outfile.release(part_offset, length)
+            os.fsync(outfile.file.fileno()) # compare modes with data on disk
+        elapsed = time.perf_counter() - start
+        growth = cached_bytes() - cached if cached is not None else None
+    return size / elapsed / 2**20, growth
+
+
+def main():
+    size = (int(sys.argv[1]) if len(sys.argv) > 1 else 1024) * 2**20
+    directory = sys.argv[2] if len(sys.argv) > 2 else None
+    print('file size: {} MB'.format(size // 2**20))
+    for name, large_file, direct_io in (('page cache', False, False), ('large file', True, False), ('direct I/O', True, True)):
+        speed, growth = run(size, directory, large_file, direct_io)
+        growth = '{:>8.1f} MB cached'.format(growth / 2**20) if growth is not None else ''
+        print('{:<12} {:>10.1f} MB/s {}'.format(name, speed, growth))
+
+
+if __name__ == '__main__':
+    main()
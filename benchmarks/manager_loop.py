@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures the overhead of the manager loop per processed message.
+
+The manager receives a stream of progress and data messages like
+the one produced by download threads and saves the context either
+after every message (behaviour before the checkpoint policy) or
+according to the checkpoint interval.
+
+Usage: python benchmarks/manager_loop.py [MESSAGES]
+
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pymget.manager import Manager
+from pymget.outfile import Context
+from pymget.task_info import TaskProgress, TaskData
+
+BLOCK_SIZE = 4 * 2**20
+FRAGMENT_SIZE = 32 * 2**10
+MIRRORS = 8
+
+
+class NullMirror:
+
+    def __init__(self):
+        self.task_progress = 0
+
+    def done(self):
+        self.task_progress = 0
+
+
+class NullOutputFile:
+
+    def seek(self, offset):
+        pass
+
+    def write(self, data):
+        pass
+
+    def release(self, offset, length):
+        pass
+
+
+def messages(count):
+
+    """
+    Generates progress messages of mirrors with a data message
+    at the end of each block.
+
+    """
+    data = b'\x00' * BLOCK_SIZE
+    fragments = BLOCK_SIZE // FRAGMENT_SIZE
+    offset = 0
+    produced = 0
+    while produced < count:
+        for n in range(MIRRORS):
+            name = 'mirror{}'.format(n)
+            for fragment in range(1, fragments + 1):
+                yield TaskProgress(name, 206, fragment * FRAGMENT_SIZE)
+            yield TaskData(name, 206, offset + n * BLOCK_SIZE, data)
+            produced += fragments + 1
+        offset += MIRRORS * BLOCK_SIZE
+
+
+def create_manager(path):
+    manager = Manager()
+    manager.console = type('NullConsole', (), {'progress': lambda self, complete: None})()
+    manager.outfile = NullOutputFile()
+    manager.context = Context(path)
+    manager.block_size = BLOCK_SIZE
+    for n in range(MIRRORS):
+        manager.mirrors['mirror{}'.format(n)] = NullMirror()
+    return manager
+
+
+def run(count, legacy, interval=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = create_manager(os.path.join(tmp, 'bench'))
+        manager.checkpoint_interval = interval
+        start = time.perf_counter()
+        processed = 0
+        for task_info in messages(count):
+            if isinstance(task_info, TaskData):
+                # the task had been given before the data came
+                manager.parts_in_progress.append(task_info.offset)
+                manager.offset = max(manager.offset, task_info.offset + BLOCK_SIZE)
+            task_info.process(manager)
+            if legacy: # save the context after every message
+                needle_parts = manager.parts_in_progress.copy()
+                needle_parts.extend(manager.failed_parts)
+                manager.context.update(manager.offset, manager.written_bytes, needle_parts)
+            else:
+                manager.checkpoint()
+            processed += 1
+        manager.checkpoint(True)
+        elapsed = time.perf_counter() - start
+    return elapsed / processed * 10**6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print('messages: {}'.format(count))
+    print('{:<32} {:>10.2f} us/message'.format('context update per message', run(count, True)))
+    print('{:<32} {:>10.2f} us/message'.format('checkpoint on every change', run(count, False, 0)))
+    print('{:<32} {:>10.2f} us/message'.format('checkpoint every 1s', run(count, False, 1)))
+
+
+if __name__ == '__main__':
+    main()
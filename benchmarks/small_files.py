@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures how many small files per second are downloaded in batch
+mode with the small file fast path (one request to one mirror,
+no context) and without it (the header is requested from each
+mirror, the file is allocated and split into blocks).
+
+Files are served from memory by a local HTTP server supporting
+ranges and keep-alive connections, two mirrors are given for each
+file.
+
+Usage: python benchmarks/small_files.py [FILES] [SIZE_KB]
+
+"""
+
+import os
+import re
+import sys
+import time
+import builtins
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pymget.batch import Batch
+from pymget.command_line import CommandLine
+
+builtins.__dict__.setdefault('_', lambda text: text)
+
+BLOCK_SIZE = 16 * 2**10 # small blocks split files into several parts as in real downloads of larger files
+
+
+class NullConsole:
+
+    def message(self, text='', end='\n'):
+        pass
+
+    def error(self, text, end='\n'):
+        print('error: {}'.format(text))
+
+    def warning(self, text, end='\n'):
+        print('warning: {}'.format(text))
+
+    def ask(self, text, default):
+        return default
+
+    def redirect(self, out):
+        pass
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1' # keep connections alive
+    data = b''
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.data)))
+        self.end_headers()
+
+    def do_GET(self):
+        matches = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if not matches:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(self.data)))
+            self.end_headers()
+            self.wfile.write(self.data)
+            return
+        start, end = int(matches.group(1)), min(int(matches.group(2)), len(self.data) - 1)
+        self.send_response(206)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, len(self.data)))
+        self.end_headers()
+        self.wfile.write(self.data[start:end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(files, mirrors, small_file):
+    with tempfile.TemporaryDirectory() as tmp:
+        argv = ['pymget', '-o', tmp + os.sep, '-b', str(BLOCK_SIZE), '--small-file={}'.format(small_file)]
+        command_line = CommandLine(NullConsole(), argv)
+        command_line.parse()
+        command_line.jobs = []
+        for number in range(files):
+            links = ['http://127.0.0.1:{}/file{}'.format(port, number) for port in mirrors]
+            command_line.jobs.append(('', list(map(command_line.create_url, links))))
+        batch = Batch()
+        batch.prepare(NullConsole(), command_line)
+        start = time.perf_counter()
+        batch.download()
+        return files / (time.perf_counter() - start)
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    size = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) * 2**10
+    Handler.data = os.urandom(size)
+    servers = [serve(), serve()]
+    mirrors = [server.server_address[1] for server in servers]
+    print('{} files of {} KB, 2 mirrors'.format(files, size // 2**10))
+    for name, small_file in (('split', 0), ('fast path', 4 * 2**20)):
+        print('{:<10} {:>10.1f} files/s'.format(name, run(files, mirrors, small_file)))
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,4 +5,4 @@
 files from multiple mirrors"""
 
 __version__ = "1.42"
-__all__ = ['command_line', 'console', 'data_queue', 'manager', 'mirrors', 'networking', 'pymget', 'outfile', 'task_info', 'utils']
+__all__ = ['api', 'batch', 'cache', 'checksum', 'command_line', 'console', 'daemon', 'data_queue', 'manager', 'metalink', 'mirrors', 'networking', 'pymget', 'outfile', 'recursive', 'seed', 'stats', 'task_info', 'tuner', 'utils', 'workers', 'writer']
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Programmatic interface to download files from Python code.
+
+    import pymget.api
+
+    handle = pymget.api.download(['http://one.com/file', 'http://two.com/file'], '/tmp/',
+                                 on_progress=lambda written, size: ...,
+                                 block_size=2**20, checksum='sha256:...')
+    path = handle.result() # raises FatalError, FileError or CancelError
+
+Nothing is printed and nothing is read from stdin, so several
+files could be downloaded concurrently in one process.
+
+"""
+
+import time
+import queue
+import threading
+
+from . import messages
+from .console import IConsole
+from .command_line import CommandLine
+from .manager import Manager
+from .outfile import OutputFile
+
+class CallbackConsole(IConsole):
+
+    """
+    A console of an embedded download. Messages and progress
+    are passed to callbacks, questions are answered by the
+    callback or the default answer is used.
+
+    """
+    def __init__(self, on_progress=None, on_message=None, answer=None):
+
+        """
+        :on_progress: a callable receiving (written bytes, size of the file)
+        :on_message: a callable receiving (level, text), level is 'message', 'warning' or 'error'
+        :answer: a callable receiving (question, default answer) and returning bool
+
+        """
+        self.on_progress = on_progress
+        self.on_message = on_message
+        self.answer = answer
+        self.total = 0 # the size of the file when it becomes known
+
+    def create_progressbar(self, total, old_progress):
+        self.total = total
+        self.progress(old_progress)
+
+    def progress(self, complete):
+        if self.on_progress is not None:
+            self.on_progress(complete, self.total)
+
+    def message(self, text='', end='\n'):
+        self.notify('message', text)
+
+    def warning(self, text, end='\n'):
+        self.notify('warning', text)
+
+    def error(self, text, end='\n'):
+        self.notify('error', text)
+
+    def notify(self, level, text):
+
+        """
+        Passes the text to the callback, empty lines
+        used to separate output in the console are skipped.
+
+        :level: 'message', 'warning' or 'error', type str
+        :text: a text of the message, type str
+
+        """
+        text = text.strip()
+        if text and self.on_message is not None:
+            self.on_message(level, text)
+
+    def ask(self, text, default):
+        if self.answer is None:
+            return default
+        return bool(self.answer(text, default))
+
+    def redirect(self, out):
+        pass
+
+
+
+class Download:
+
+    """
+    A handle of the file downloaded in a background thread.
+    It's similar to concurrent.futures.Future: 'result' waits
+    and returns the path of the file or raises the error,
+    'cancel' stops downloading, the state is saved to resume
+    it later.
+
+    Options are attributes of the command line object:
+    block_size, timeout, checkpoint_interval, checkpoint_bytes,
+    checksum ('algorithm:digest'), piece_hashes (a filename),
+    max_strikes, retries, retry_delay and max_retry_delay (in seconds),
+    streams, auto_tune, write_behind, large_file, direct_io, max_memory,
+    small_file, seed_file, repair (both require piece_hashes), stats (a
+    path of the database of mirrors, empty - not used) and file_size.
+
+    """
+    OPTIONS = ('block_size', 'timeout', 'checkpoint_interval', 'checkpoint_bytes', 'max_strikes', 'retries',
+               'retry_delay', 'max_retry_delay', 'streams', 'auto_tune', 'write_behind', 'large_file',
+               'direct_io', 'max_memory', 'small_file', 'seed_file', 'repair', 'stats', 'file_size')
+    PARSED_OPTIONS = ('checksum', 'piece_hashes') # options given as in the command line
+
+    def __init__(self, urls, dest='', on_progress=None, on_mirror=None, on_message=None, answer=None, **options):
+
+        """
+        :urls: links to mirrors of the file, type sequence <str> or str
+        :dest: a path of the file or a folder ending with a separator, by default the current folder, type str
+        :on_progress: a callable receiving (written bytes, size of the file)
+        :on_mirror: a callable receiving (name, event, value), see Manager.mirror_event
+        :on_message: a callable receiving (level, text)
+        :answer: a callable receiving (question, default answer) and returning bool,
+                 by default default answers are used
+
+        """
+        self.console = CallbackConsole(on_progress, on_message, answer)
+        self.command_line = self.options(urls, dest, options)
+        self.manager = self._manager(queue.Queue()) # results of threads of each file are separated
+        self.manager.mirror_events = on_mirror
+        self.outfile = self._outfile(self.console, dest, self.command_line.large_file, self.command_line.direct_io, self.command_line.repair)
+        self.error = None # an exception raised while downloading
+        self.cancelled = False
+        self.finished = threading.Event()
+        self.callbacks = [] # callables receiving the handle when downloading is finished
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def options(self, urls, dest, options):
+
+        """
+        Creates the command line object without parsing arguments.
+
+        :urls: links to mirrors of the file, type sequence <str> or str
+        :dest: a path to save the file, type str
+        :options: values of options, type dict
+        :return: the command line object, type CommandLine
+
+        """
+        command_line = self._command_line(self.console, ['pymget'])
+        for name, value in options.items():
+            if name in self.PARSED_OPTIONS:
+                getattr(command_line, 'parse_' + name)(value)
+            elif name in self.OPTIONS:
+                setattr(command_line, name, value)
+                if name == 'block_size': # the given block size is not chosen by the speed of mirrors
+                    command_line.auto_block_size = False
+            else:
+                raise TypeError(_("unknown option '{}'").format(name))
+        if isinstance(urls, str):
+            urls = [urls]
+        for link in urls:
+            if not command_line.url_re.match(link):
+                raise ValueError(_("wrong link: '{}'").format(link))
+        command_line.urls = list(map(command_line.create_url, urls))
+        command_line.filename = dest
+        return command_line
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+
+        """
+        Prepares the manager and downloads the file step by step,
+        cancelling is checked between steps.
+
+        """
+        try:
+            self.manager.prepare(self.console, self.command_line, self.outfile)
+            steps = self.manager.steps()
+            for step in steps:
+                if self.cancelled:
+                    steps.throw(KeyboardInterrupt) # the manager cancels threads and saves the context
+                time.sleep(0.001) # the manager doesn't wait on its queue, don't let the loop spin
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.lock:
+                self.finished.set()
+                callbacks, self.callbacks = self.callbacks, []
+            for callback in callbacks:
+                callback(self)
+
+    def cancel(self):
+
+        """
+        Stops downloading, 'result' raises CancelError then.
+
+        :return: False if downloading is already finished, type bool
+
+        """
+        self.cancelled = True
+        return not self.done()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+
+        """
+        Waits until downloading is finished.
+
+        :timeout: max time to wait in seconds, None - wait forever, type float
+        :return: True if downloading is finished, type bool
+
+        """
+        return self.finished.wait(timeout)
+
+    def result(self, timeout=None):
+
+        """
+        Waits until downloading is finished.
+
+        :timeout: max time to wait in seconds, None - wait forever, type float
+        :return: the full path of the downloaded file, type str
+
+        """
+        if not self.wait(timeout):
+            raise TimeoutError(_("downloading is not finished."))
+        if self.error is not None:
+            raise self.error
+        return self.outfile.fullpath
+
+    def add_done_callback(self, callback):
+
+        """
+        :callback: a callable receiving the handle when downloading is finished,
+                   it's called at once if downloading is already finished
+
+        """
+        with self.lock:
+            if not self.finished.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    @property
+    def written_bytes(self):
+        return self.manager.written_bytes
+
+    @property
+    def file_size(self):
+        return self.manager.file_size
+
+    @property
+    def _command_line(self):
+        return CommandLine
+
+    @property
+    def _manager(self):
+        return Manager
+
+    @property
+    def _outfile(self):
+        return OutputFile
+
+
+
+def download(urls, dest='', **options):
+
+    """
+    Starts downloading the file in a background thread.
+
+    :urls: links to mirrors of the file, type sequence <str> or str
+    :dest: a path of the file or a folder ending with a separator, type str
+    :options: callbacks and options, see Download
+    :return: the handle of downloading, type Download
+
+    """
+    return Download(urls, dest, **options).start()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import copy
+import time
+import queue
+from collections import deque
+from abc import ABCMeta, abstractmethod
+
+from . import messages
+from .errors import FatalError, FileError, CancelError
+from .console import IConsole
+from .manager import Manager
+from .outfile import OutputFile
+from .networking import ConnectionPool
+
+class ConnectionSlots:
+
+    """
+    Counts simultaneous connections of several managers.
+
+    """
+    def __init__(self, limit):
+
+        """
+        :limit: max count of connections, type int
+
+        """
+        self.limit = limit
+        self.used = 0
+
+    def acquire(self):
+
+        """
+        Takes a slot if there is a free one.
+
+        :return: True if the slot has been taken, type bool
+
+        """
+        if self.used >= self.limit:
+            return False
+        self.used += 1
+        return True
+
+    def release(self):
+        self.used -= 1
+
+
+
+class JobConsole(IConsole):
+
+    """
+    A console of a file downloaded in batch mode. Messages are
+    prefixed with the name of the file, progressbars of files
+    are not shown, because several files are downloaded at once.
+
+    """
+    def __init__(self, console, name):
+
+        """
+        :console: the console of the program
+        :name: a name of the file, type str
+
+        """
+        self.console = console
+        self.name = name
+
+    def create_progressbar(self, total, old_progress): pass
+
+    def progress(self, complete): pass
+
+    def message(self, text='', end='\n'):
+        if text.strip(): # empty lines around messages of files are useless
+            self.console.message('[{}] {}'.format(self.name, text.strip()), end)
+
+    def error(self, text, end='\n'):
+        self.console.error('[{}] {}'.format(self.name, text), end)
+
+    def warning(self, text, end='\n'):
+        self.console.warning('[{}] {}'.format(self.name, text), end)
+
+    def ask(self, text, default):
+        return self.console.ask('[{}] {}'.format(self.name, text), default)
+
+    def redirect(self, out):
+        self.console.redirect(out)
+
+
+
+class IBatch(metaclass=ABCMeta):
+
+    """
+    An interface for batch download.
+
+    """
+    @abstractmethod
+    def prepare(self, console, command_line): pass
+
+    @abstractmethod
+    def download(self): pass
+
+
+
+class Batch(IBatch):
+
+    """
+    Downloads several files in one thread. Each file has its
+    own manager and mirrors, managers do steps in turn.
+    Connections of all managers are limited together, a new
+    file is started while there are free connections. Idle
+    HTTP(S) connections are reused for next files on the same
+    servers.
+
+    """
+    def __init__(self):
+        self.console = None
+        self.command_line = None
+        self.jobs = deque([]) # files waiting for downloading, tuples (path, urls)
+        self.active = [] # files being downloaded, tuples (name, manager, steps)
+        self.slots = None
+        self.total = 0 # count of files
+        self.done = 0 # count of downloaded files
+        self.failed = 0 # count of failed files
+
+    def prepare(self, console, command_line):
+
+        """
+        Takes the list of files and options from the command line.
+
+        :console: a console object
+        :command_line: a command line object
+
+        """
+        self.console = console
+        self.command_line = command_line
+        self.jobs = deque(command_line.jobs)
+        self.total = len(self.jobs)
+        self.slots = ConnectionSlots(command_line.connections)
+        self._pool().enabled = True # keep connections for next files
+
+    def download(self):
+
+        """
+        Downloads all the files.
+
+        """
+        try:
+            while self.jobs or self.active:
+                self.schedule()
+                time.sleep(0.001) # managers don't wait on their queues, don't let the loop spin
+        except KeyboardInterrupt: # user interrupted process
+            self.cancel()
+            raise CancelError(_("Operation has been cancelled by user."))
+        finally:
+            self._pool().close()
+        self.console.message(_("\n{} of {} files downloaded.").format(self.done, self.total))
+        if self.failed:
+            raise FatalError(_("unable to download {} files.").format(self.failed))
+
+    def schedule(self):
+
+        """
+        Starts waiting files while there are free connections
+        and does a step of each file being downloaded.
+
+        """
+        # a new file needs at least one connection
+        while self.jobs and len(self.active) < self.slots.limit:
+            self.start_job(*self.jobs.popleft())
+        for job in self.active.copy():
+            self.step(job)
+
+    def cancel(self):
+
+        """
+        Cancels downloading of all active files.
+
+        """
+        for name, manager, steps in self.active:
+            try:
+                steps.throw(KeyboardInterrupt) # the manager cancels threads and saves the context
+            except CancelError:
+                pass
+        self.active = []
+
+    def start_job(self, path, urls, console=None):
+
+        """
+        Creates a manager for the file and prepares it.
+
+        :path: a path to save the file relative to the output folder, type str
+        :urls: URL objects of mirrors of the file, type sequence <URL>
+        :console: a console of the file, by default messages are prefixed with its name
+
+        """
+        name = path or urls[0].filename or urls[0].host
+        console = console or JobConsole(self.console, name)
+        options = copy.copy(self.command_line) # options of the file
+        options.urls = urls
+        options.filename = self.output_path(path)
+        options.file_size = 0 # the size, the checksum and hashes of pieces are
+        options.checksum = None # specified for a single file, they are unknown in batch mode
+        options.piece_hashes = None
+        manager = self._manager(queue.Queue()) # results of threads of each file are separated
+        manager.slots = self.slots
+        try:
+            outfile = self._outfile(console, options.filename, options.large_file, options.direct_io)
+            manager.prepare(console, options, outfile)
+        except (FatalError, FileError, CancelError) as e:
+            self.job_failed(name, console, str(e))
+            return
+        self.active.append((name, manager, manager.steps()))
+
+    def output_path(self, path):
+
+        """
+        Creates a path to the file in the output folder.
+
+        :path: a path specified in the jobs file, type str
+        :return: the path for the output file, type str
+
+        """
+        folder = self.command_line.filename
+        if folder and not folder.endswith(os.sep): # -o specifies a folder in batch mode
+            folder += os.sep
+        return os.path.join(folder, path) if path else folder
+
+    def step(self, job):
+
+        """
+        Does a step of downloading the file.
+
+        :job: a tuple (name, manager, steps)
+
+        """
+        name, manager, steps = job
+        try:
+            next(steps)
+            return
+        except StopIteration: # the file is downloaded
+            self.job_done(name, manager)
+        except (FatalError, FileError) as e:
+            self.job_failed(name, manager.console, str(e))
+        self.active.remove(job)
+
+    def job_done(self, name, manager):
+
+        """
+        Counts the downloaded file.
+
+        :name: a name of the file, type str
+        :manager: the manager of the file
+
+        """
+        self.done += 1
+        self.console.message(_("[{}] Done ({} of {} files)").format(name, self.done, self.total))
+
+    def job_failed(self, name, console, text):
+
+        """
+        Counts the file that can't be downloaded.
+
+        :name: a name of the file, type str
+        :console: the console of the file
+        :text: a description of the error, type str
+
+        """
+        self.failed += 1
+        console.error(text)
+
+    @property
+    def _manager(self):
+        return Manager
+
+    @property
+    def _outfile(self):
+        return OutputFile
+
+    @property
+    def _pool(self):
+        return ConnectionPool
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+from abc import ABCMeta, abstractmethod
+
+try:
+    import fcntl
+except ImportError: # files can't be cloned
+    fcntl = None
+
+from . import messages
+from .errors import FileError
+
+class ICache(metaclass=ABCMeta):
+
+    """
+    An interface for a cache of downloaded files.
+
+    """
+    @abstractmethod
+    def keys(self, checksum, urls, file_size, validators): pass
+
+    @abstractmethod
+    def lookup(self, keys): pass
+
+    @abstractmethod
+    def store(self, keys, filename): pass
+
+    @abstractmethod
+    def record(self, hit): pass
+
+
+
+class Cache(ICache):
+
+    """
+    A folder with files downloaded before. A file is found by
+    its checksum if it's specified, otherwise by a link, the size
+    of the file and its ETag or Last-Modified. A file with several keys is kept once,
+    other keys are hard links to it. When the total size exceeds
+    the limit, least recently used files are removed.
+
+    """
+    STATS = 'stats.json' # counts of files copied from the cache and downloaded
+    TEMP_PREFIX = '.tmp' # files being stored
+
+    def __init__(self, path, max_size):
+
+        """
+        :path: the folder of the cache, type str
+        :max_size: max total size of files in bytes, 0 - unlimited, type int
+
+        """
+        self.path = path
+        self.max_size = max_size
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            raise FileError(_("unable to create directory '{}': permission denied.").format(path))
+
+    def keys(self, checksum, urls, file_size, validators):
+
+        """
+        Makes keys of the file.
+
+        :checksum: the checksum of the file or None, type Checksum
+        :urls: links to mirrors of the file, type sequence <URL>
+        :file_size: the size of the file, 0 - unknown, type int
+        :validators: ETag and Last-Modified of the file, names of mirrors are keys, type dict
+        :return: keys of the file, the most reliable first, type list <str>
+
+        """
+        keys = []
+        if checksum:
+            keys.append('{}-{}'.format(checksum.algorithm, checksum.digest))
+        if not file_size:
+            return keys
+        for url in urls:
+            # a link is not enough, the file could be replaced on the server by another one of the same size
+            etag, last_modified = validators.get(url.host) or ('', '')
+            version = etag or last_modified
+            if version:
+                key = '{}\n{}'.format(url.url, version)
+                keys.append('url-{}-{}'.format(hashlib.sha256(key.encode('utf-8')).hexdigest(), file_size))
+        return keys
+
+    def entry(self, key):
+        return os.path.join(self.path, key)
+
+    def lookup(self, keys):
+
+        """
+        Searches the file by the keys.
+
+        :keys: keys of the file, type sequence <str>
+        :return: the path of the file in the cache or None, type str
+
+        """
+        for key in keys:
+            path = self.entry(key)
+            try:
+                os.utime(path) # the file is used recently, it's removed later
+            except OSError:
+                continue
+            return path
+        return None
+
+    def store(self, keys, filename):
+
+        """
+        Copies the downloaded file to the cache. Errors are ignored,
+        the file is just not cached.
+
+        :keys: keys of the file, type sequence <str>
+        :filename: the path of the file, type str
+        :return: True if the file has been stored, type bool
+
+        """
+        if not keys:
+            return False
+        temp = self.entry(self.TEMP_PREFIX + str(os.getpid()))
+        try:
+            with open(filename, 'rb') as src, open(temp, 'wb') as dst:
+                clone_file(src.fileno(), dst.fileno())
+            for key in keys: # a link is replaced at once, other processes don't see a partial file
+                link = temp + '-' + key
+                os.link(temp, link)
+                os.replace(link, self.entry(key))
+        except OSError:
+            return False
+        finally:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+        self.evict()
+        return True
+
+    def evict(self):
+
+        """
+        Removes least recently used files while the
+        total size of the cache exceeds the limit.
+
+        """
+        if not self.max_size:
+            return
+        files = {} # files with their links, inodes are keys
+        for name in os.listdir(self.path):
+            if name == self.STATS or name.startswith(self.TEMP_PREFIX):
+                continue
+            path = self.entry(name)
+            try:
+                stat = os.stat(path)
+            except OSError: # removed by another process
+                continue
+            used, size, paths = files.get(stat.st_ino, (0, stat.st_size, []))
+            files[stat.st_ino] = (max(used, stat.st_mtime), size, paths + [path])
+        total = sum(size for used, size, paths in files.values())
+        for used, size, paths in sorted(files.values()):
+            if total <= self.max_size:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def record(self, hit):
+
+        """
+        Counts the file copied from the cache or downloaded.
+
+        :hit: the file has been copied from the cache, type bool
+        :return: counts of files copied from the cache and of all files, type tuple (int, int)
+
+        """
+        path = self.entry(self.STATS)
+        try:
+            with open(path) as f:
+                stats = json.load(f)
+            hits, total = int(stats['hits']), int(stats['total'])
+        except (OSError, ValueError, KeyError, TypeError): # the first file or the stats are broken
+            hits, total = 0, 0
+        hits += hit
+        total += 1
+        temp = self.entry(self.TEMP_PREFIX + str(os.getpid()) + '-' + self.STATS)
+        try:
+            with open(temp, 'w') as f:
+                json.dump({'hits': hits, 'total': total}, f)
+            os.replace(temp, path)
+        except OSError:
+            pass
+        return hits, total
+
+
+
+FICLONE = 0x40049409 # the ioctl sharing data of files on Linux (Btrfs, XFS)
+COPY_SIZE = 2**20 # files are copied by chunks if the kernel can't copy them
+
+def clone_file(src, dst):
+
+    """
+    Replaces data of one file with data of another one. The file
+    is cloned if the file system supports that, otherwise it's
+    copied in the kernel or by chunks.
+
+    :src: a descriptor of the source file, type int
+    :dst: a descriptor of the destination file opened for writing, type int
+    :return: the size of the file, type int
+
+    """
+    size = os.fstat(src).st_size
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dst, FICLONE, src)
+            return size
+        except OSError: # the file system could not share data
+            pass
+    copy_range = hasattr(os, 'copy_file_range')
+    offset = 0
+    while offset < size:
+        copied = 0
+        if copy_range:
+            try:
+                copied = os.copy_file_range(src, dst, size - offset, offset, offset)
+            except OSError: # e.g. files are on different file systems
+                copy_range = False
+        if not copy_range:
+            copied = os.pwrite(dst, os.pread(src, min(COPY_SIZE, size - offset), offset), offset)
+        if copied == 0: # the source file has been truncated
+            break
+        offset += copied
+    os.ftruncate(dst, offset)
+    return offset
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+class IChecksum(metaclass=ABCMeta):
+
+    """
+    An interface for a checksum.
+
+    """
+    @abstractmethod
+    def update(self, offset, data, written=True): pass
+
+    @abstractmethod
+    def advance(self, read): pass
+
+    @abstractmethod
+    def resume(self, read, ranges): pass
+
+    @abstractmethod
+    def finish(self, read, file_size): pass
+
+    @abstractmethod
+    def verify(self): pass
+
+    @abstractmethod
+    def reset(self): pass
+
+
+
+class Checksum(IChecksum):
+
+    """
+    Calculates a checksum of the whole file while it's downloading.
+    Data are hashed as soon as the contiguous beginning of the file
+    is complete, so verification does not need to read the whole
+    file again when downloading finishes.
+
+    Use 'update' when a part is written, 'advance' to hash parts
+    written earlier that now adjoin the hashed beginning, 'resume'
+    to add parts written in previous sessions, 'finish' to hash
+    the rest of the file and 'verify' to compare digests.
+
+    """
+    # supported algorithms, keys are names used in the command line
+    ALGORITHMS = {
+        'md5': 'md5',
+        'sha1': 'sha1',
+        'sha224': 'sha224',
+        'sha256': 'sha256',
+        'sha384': 'sha384',
+        'sha512': 'sha512',
+        'blake2': 'blake2b',
+        'blake2b': 'blake2b',
+        'blake2s': 'blake2s',
+    }
+
+    READ_SIZE = 4 * 2**20 # the size of data read from the file at once, equals 4MB
+
+    @staticmethod
+    def parse(checksum):
+
+        """
+        Static factory method creating a checksum object
+        from a string in format 'algorithm:hexdigest'.
+
+        :checksum: checksum string, type str
+        :return: the checksum object, type Checksum
+
+        """
+        algorithm, sep, digest = checksum.partition(':')
+        if not sep or not digest:
+            raise ValueError(checksum)
+        return Checksum(algorithm, digest)
+
+    def __init__(self, algorithm, digest):
+
+        """
+        :algorithm: a name of the hash algorithm, type str
+        :digest: expected hex digest of the file, type str
+
+        """
+        algorithm = algorithm.lower().replace('-', '')
+        if algorithm not in self.ALGORITHMS:
+            raise ValueError(algorithm)
+        int(digest, 16) # raises ValueError if digest is not a hex number
+        self.algorithm = algorithm
+        self.digest = digest.lower()
+        self.hash = hashlib.new(self.ALGORITHMS[algorithm])
+        if len(self.digest) != self.hash.digest_size * 2: # the digest is truncated or too long
+            raise ValueError(digest)
+        self.frontier = 0 # the end of hashed beginning of the file
+        self.pending = {} # written parts after the frontier, offset: length
+
+    def update(self, offset, data, written=True):
+
+        """
+        Hashes the data if it continues the hashed beginning of the file,
+        otherwise remembers the part to hash it later. Data that are not
+        yet in the file are not remembered, add them by 'resume' when
+        they are written.
+
+        :offset: an offset of data in the file, type int
+        :data: received data, type bytes
+        :written: data are already written to the file, type bool
+
+        """
+        if offset == self.frontier: # data adjoin the hashed beginning
+            self.hash.update(data)
+            self.frontier += len(data)
+        elif offset > self.frontier and written: # there is a gap before the data
+            self.pending[offset] = len(data)
+
+    def advance(self, read):
+
+        """
+        Hashes parts written earlier that adjoin the hashed beginning.
+
+        :read: a function reading data from the file, takes offset and size
+
+        """
+        while self.frontier in self.pending:
+            end = self.frontier + self.pending.pop(self.frontier)
+            while self.frontier < end: # large parts are read by chunks
+                size = min(self.READ_SIZE, end - self.frontier)
+                self.hash.update(read(self.frontier, size))
+                self.frontier += size
+
+    def resume(self, read, ranges):
+
+        """
+        Hashes parts written without hashing (in previous sessions or
+        by the writer thread) which adjoin the beginning of the file and
+        remembers the rest of them, so they are read once when the hashed
+        beginning reaches them. Parts already hashed are skipped.
+
+        :read: a function reading data from the file, takes offset and size
+        :ranges: written parts, type sequence of tuples (offset, length)
+
+        """
+        for offset, length in ranges:
+            if offset >= self.frontier:
+                self.pending[offset] = length
+        self.advance(read)
+
+    def finish(self, read, file_size):
+
+        """
+        Hashes the rest of the file that has not been hashed yet,
+        normally it's nothing, but parts left after a gap in
+        previous sessions are read from the file.
+
+        :read: a function reading data from the file, takes offset and size
+        :file_size: the size of the file, type int
+
+        """
+        self.pending = {}
+        while self.frontier < file_size:
+            size = min(self.READ_SIZE, file_size - self.frontier)
+            self.hash.update(read(self.frontier, size))
+            self.frontier += size
+
+    def verify(self):
+
+        """
+        Compares the calculated digest with expected one.
+
+        :return: True if digests are equal, type bool
+
+        """
+        return self.hash.hexdigest() == self.digest
+
+    def reset(self):
+
+        """
+        Forgets hashed data, e.g. when the file is downloaded again.
+
+        """
+        self.hash = hashlib.new(self.ALGORITHMS[self.algorithm])
+        self.frontier = 0
+        self.pending = {}
+
+
+
+class IPieceHashes(metaclass=ABCMeta):
+
+    """
+    An interface for piece hashes.
+
+    """
+    @abstractmethod
+    def align(self, block_size): pass
+
+    @abstractmethod
+    def set_file_size(self, file_size): pass
+
+    @abstractmethod
+    def verify(self, offset, data): pass
+
+    @abstractmethod
+    def written(self, offset, length): pass
+
+    @abstractmethod
+    def verify_piece(self, index, data): pass
+
+    @abstractmethod
+    def mismatched(self, read, threads=0): pass
+
+    @abstractmethod
+    def reset(self): pass
+
+
+
+class PieceHashes(IPieceHashes):
+
+    """
+    Hashes of equal pieces of the file. They allow to check
+    each block of data as soon as it's received from a mirror.
+
+    Sidecar file format:
+
+        algorithm piece_length
+        hexdigest of the first piece
+        hexdigest of the second piece
+        ...
+
+    Empty lines and lines beginning with # are ignored.
+
+    """
+    @staticmethod
+    def load(filename):
+
+        """
+        Static factory method loading piece hashes from a sidecar file.
+
+        :filename: a name of the sidecar file, type str
+        :return: the piece hashes object, type PieceHashes
+
+        """
+        with open(filename, 'r') as sidecar:
+            lines = [line.strip() for line in sidecar]
+        lines = [line for line in lines if line and not line.startswith('#')]
+        if not lines:
+            raise ValueError(filename)
+        algorithm, length = lines[0].split()
+        return PieceHashes(algorithm, int(length), lines[1:])
+
+    def __init__(self, algorithm, length, digests):
+
+        """
+        :algorithm: a name of the hash algorithm, type str
+        :length: the length of a piece, type int
+        :digests: hex digests of pieces in order, elements type str
+
+        """
+        algorithm = algorithm.lower().replace('-', '')
+        if algorithm not in Checksum.ALGORITHMS or length <= 0:
+            raise ValueError(algorithm)
+        self.algorithm = Checksum.ALGORITHMS[algorithm]
+        self.length = length
+        self.digests = [digest.lower() for digest in digests]
+        digest_length = hashlib.new(self.algorithm).digest_size * 2
+        for digest in self.digests:
+            int(digest, 16) # raises ValueError if digest is not a hex number
+            if len(digest) != digest_length: # the digest is truncated or too long
+                raise ValueError(digest)
+        if not self.digests:
+            raise ValueError(algorithm)
+        self.file_size = len(self.digests) * length # exact size is set when it's known
+        self.coverage = {} # written parts of pieces crossing block edges, indexes of pieces are keys
+
+    def set_file_size(self, file_size):
+
+        """
+        Checks that pieces cover the whole file and nothing else.
+
+        :file_size: the size of the file, type int
+
+        """
+        if len(self.digests) != -(-file_size // self.length):
+            raise ValueError(file_size)
+        self.file_size = file_size
+
+    def piece_range(self, index):
+
+        """
+        Returns the offset and the size of the piece,
+        the last piece of the file could be shorter.
+
+        :index: an index of the piece, type int
+
+        """
+        start = index * self.length
+        return start, min(self.length, self.file_size - start)
+
+    def edges(self, offset, length):
+
+        """
+        Returns indexes of pieces only partly covered by the part,
+        they can't be verified using data of the part only.
+
+        :offset: an offset of the part, type int
+        :length: the length of the part, type int
+
+        """
+        end = offset + length
+        indexes = []
+        for index in sorted({offset // self.length, (end - 1) // self.length}):
+            start, size = self.piece_range(index)
+            if offset > start or end < start + size:
+                indexes.append(index)
+        return indexes
+
+    def written(self, offset, length):
+
+        """
+        Remembers the part written into the file for pieces
+        crossing its edges.
+
+        :offset: an offset of the part, type int
+        :length: the length of the part, type int
+        :return: pieces completely written now, type list of tuples (index, parts)
+
+        """
+        complete = []
+        for index in self.edges(offset, length):
+            parts = self.coverage.setdefault(index, [])
+            parts.append((offset, length))
+            if self.covered(index, parts):
+                complete.append((index, self.coverage.pop(index)))
+        return complete
+
+    def forget(self, offset, length):
+
+        """
+        Forgets the part, e.g. when it will be downloaded again.
+
+        :offset: an offset of the part, type int
+        :length: the length of the part, type int
+
+        """
+        for index in self.edges(offset, length):
+            parts = self.coverage.get(index, [])
+            if (offset, length) in parts:
+                parts.remove((offset, length))
+
+    def reset(self):
+
+        """
+        Forgets written parts, e.g. when the file is downloaded again.
+
+        """
+        self.coverage = {}
+
+    def covered(self, index, parts):
+
+        """
+        Checks that the parts cover the whole piece.
+
+        :index: an index of the piece, type int
+        :parts: parts of the piece, type sequence of tuples (offset, length)
+
+        """
+        start, size = self.piece_range(index)
+        position = start
+        for offset, length in sorted(parts):
+            if offset > position: # there is a gap
+                return False
+            position = max(position, offset + length)
+        return position >= start + size
+
+    def unaligned(self, ranges):
+
+        """
+        Counts pieces crossing edges of the ranges.
+
+        :ranges: parts of the file, type sequence of tuples (offset, length)
+
+        """
+        return len({index for offset, length in ranges for index in self.edges(offset, length)})
+
+    def verify_piece(self, index, data):
+
+        """
+        Checks the piece.
+
+        :index: an index of the piece, type int
+        :data: data of the piece, type bytes
+
+        """
+        return hashlib.new(self.algorithm, data).hexdigest() == self.digests[index]
+
+    def mismatched(self, read, threads=0):
+
+        """
+        Checks all pieces of the whole file. Pieces are hashed by
+        several threads, hashlib releases the GIL while hashing,
+        so all cores are used.
+
+        :read: a thread-safe function reading data from the file, takes offset and size
+        :threads: count of threads, 0 - a thread per core, type int
+        :return: indexes of pieces which don't match their hashes, type list <int>
+
+        """
+        def check(index):
+            start, size = self.piece_range(index)
+            return self.verify_piece(index, read(start, size))
+        with ThreadPoolExecutor(threads or os.cpu_count() or 1) as executor:
+            checked = executor.map(check, range(len(self.digests)))
+            return [index for index, valid in enumerate(checked) if not valid]
+
+    def align(self, block_size):
+
+        """
+        Rounds block size up to a multiple of the piece length,
+        so each block consists of whole pieces.
+
+        :block_size: block size, type int
+        :return: aligned block size, type int
+
+        """
+        return max(1, -(-block_size // self.length)) * self.length
+
+    def verify(self, offset, data):
+
+        """
+        Checks all whole pieces contained in the data. Pieces
+        crossing edges of the data are checked by 'written' and
+        'verify_piece' when all their parts are written.
+
+        :offset: an offset of data in the file, type int
+        :data: received data, type bytes
+        :return: False if any piece is corrupted, type bool
+
+        """
+        view = memoryview(data)
+        start = -offset % self.length # skip the beginning of a piece started before the data
+        for position in range(start, len(data), self.length):
+            index = (offset + position) // self.length
+            if index >= len(self.digests): # there is no such piece in the file
+                return False
+            piece = view[position:position + self.length]
+            if len(piece) < self.piece_range(index)[1]: # the piece continues after the data
+                continue
+            if not self.verify_piece(index, piece):
+                return False
+        return True
@@ -9,6 +9,8 @@ from abc import ABCMeta, abstractmethod
 
 from . import messages
 from .networking import URL
+from .checksum import Checksum, PieceHashes
+from .metalink import Metalink
 from .errors import CommandLineError
 
 class ICommandLine(metaclass=ABCMeta):
@@ -29,7 +31,15 @@ class CommandLine(ICommandLine):
 
     Use 'parse' method to parse command line
     arguments and then get values from attributes
-    'block_size', 'timeout', 'filename' and 'urls'
+    'block_size', 'timeout', 'filename', 'urls',
+    'checkpoint_interval', 'checkpoint_bytes', 'checksum',
+    'piece_hashes', 'max_strikes', 'write_behind', 'large_file',
+    'direct_io', 'stream_window', 'stream_memory', 'max_memory',
+    'small_file', 'processes', 'jobs', 'recursive', 'connections',
+    'daemon', 'submit', 'socket', 'coordinate', 'worker',
+    'secret', 'shared_storage', 'cache', 'cache_size', 'seed_file',
+    'repair', 'stats', 'auto_block_size', 'retries', 'retry_delay',
+    'max_retry_delay', 'streams', 'auto_tune' and 'file_size'
 
     """
     def __init__(self, console, argv):
@@ -42,9 +52,47 @@ class CommandLine(ICommandLine):
         self.console = console
         self.argv = argv[1:] # the first argument is a name of program, skip it
         self.block_size = 4 * 2**20 # default block size is 4MB
+        self.auto_block_size = True # the block size could be chosen by the speed of mirrors measured before
         self.filename = '' # filename is unknown
         self.timeout = 10 # default timeout is 10 seconds
         self.urls = [] # the list of mirros is empty
+        self.checkpoint_interval = 1 # by default the context is saved not more often than once a second
+        self.checkpoint_bytes = 0 # the checkpoint interval is not specified in bytes
+        self.checksum = None # the checksum of the file is unknown
+        self.piece_hashes = None # hashes of pieces of the file are unknown
+        self.max_strikes = 3 # by default the mirror is deleted after 3 corrupted blocks
+        self.retries = 3 # by default the mirror is deleted after 3 transient errors in a row
+        self.retry_delay = 1 # the delay before the first retry is 1 second
+        self.max_retry_delay = 60 # delays before retries grow up to a minute
+        self.streams = 0 # all mirrors download parts at once
+        self.auto_tune = False # count of parallel streams is not chosen by the throughput
+        self.write_behind = 64 * 2**20 # by default the writer thread queues up to 64MB of data
+        self.large_file = False # written data are not dropped from the page cache
+        self.direct_io = False # data are written through the page cache
+        self.stream_window = 256 * 2**20 # when writing to stdout tasks are given up to 256MB ahead
+        self.stream_memory = 64 * 2**20 # when writing to stdout up to 64MB of blocks are kept in memory
+        self.max_memory = 0 # memory used for data of blocks is not limited
+        self.small_file = 4 * 2**20 # files up to 4MB are received by one request from one mirror
+        self.processes = 0 # threads of mirrors run in this process
+        self.jobs = [] # files to download in batch mode, tuples (path, links)
+        self.recursive = False # links are files, not directories on FTP servers
+        self.connections = 16 # max count of simultaneous connections in batch mode
+        self.daemon = False # files are downloaded by this process, not submitted to the daemon
+        self.submit = False
+        self.socket = os.path.join(os.path.expanduser('~'), '.pymget.sock') # the socket of the daemon
+        self.coordinate = None # the address (host, port) accepting workers of other nodes, None - work alone
+        self.worker = None # the address (host, port) of the coordinator this process works for
+        self.secret = '' # the key authenticating workers and the coordinator
+        self.shared_storage = False # workers of other nodes send data to the coordinator
+        self.cache = '' # the folder of the cache of downloaded files, empty - files are not cached
+        self.cache_size = 10 * 2**30 # by default the cache keeps up to 10GB of files
+        self.seed_file = '' # an older version of the file, its pieces are copied, empty - everything is downloaded
+        self.repair = False # the existing file is rewritten, not repaired
+        self.stats = os.path.join(os.path.expanduser('~'), '.cache', 'pymget', 'mirrors.db') # performance of mirrors, empty - not kept
+        self.file_size = 0 # the size of the file is unknown until connection
+        self.metalink_file = None # description of the file from a metalink
+        self.metalink_filename = '' # a name of the metalink file
+        self.url_options = {} # location and max connections of mirrors, links are keys
         # pattern to search URLs
         self.url_re = re.compile('^(?:https?|ftp)://(?:[\d\w\.-]+(?::\d+)?)/?')
 
@@ -72,7 +120,9 @@ class CommandLine(ICommandLine):
                      --version
 
                      -b block_size                  Specify the size of data block received from 
-                                                    mirrors in each task. Default value is 4MB. 
+                                                    mirrors in each task. By default it's chosen by
+                                                    the speed of mirrors measured before, otherwise
+                                                    4MB is used.
                      --block-size=block_size        Value could be in bytes, kilobytes or megabytes.
                                                     To specify units add symbol K or M.
 
@@ -82,12 +132,182 @@ class CommandLine(ICommandLine):
                      -o filename                    Specify a name of the file data will be saved
                      --out-file=filename            to. By default the filename on the server is
                                                     used. If it's impossible to detect the filename,
-                                                    'out' will be used.
+                                                    'out' will be used. Use '-' to write data to
+                                                    stdout, messages are printed to stderr then.
 
                      -u filename                    Specify the file with links on each line.
                      --urls-file=filename           Links from this file will be added to links from
                                                     command line.
 
+                     -j filename                    Specify a jobs file to download several files.
+                     --jobs=filename                Each line describes a file: links to its mirrors
+                                                    and optionally a path to save the file. The path
+                                                    is relative to the folder specified by -o. Links
+                                                    from command line are downloaded as one more file.
+
+                     -r                             Mirror directory trees from FTP servers. Links
+                     --recursive                    point to the same directory on each server, the
+                                                    tree is listed on the first one and the files are
+                                                    downloaded from all of them in batch mode into the
+                                                    folder specified by -o. Files with the same size
+                                                    and modification time as local ones are skipped.
+
+                     --connections=count            Specify max count of simultaneous connections in
+                                                    batch mode, files are downloaded in parallel while
+                                                    there are free connections. Connections to the
+                                                    same servers are reused. Default value is 16.
+
+                     --daemon                       Run as a daemon downloading files submitted by
+                                                    other pymget processes in batch mode, so all of
+                                                    them share connections. Links from command line
+                                                    are not downloaded, stop the daemon by Ctrl+C.
+
+                     --submit                       Submit the file (or files of the jobs file) to
+                                                    the daemon and wait until it is downloaded. The
+                                                    path specified by -o is relative to the current
+                                                    folder. Press Ctrl+C to cancel submitted files.
+
+                     --socket=path                  Specify the Unix socket of the daemon. Default
+                                                    value is ~/.pymget.sock.
+
+                     -m filename                    Specify a metalink file (RFC 5854 or Metalink 3.0)
+                     --metalink=filename            describing the file. Its mirrors are added to
+                                                    links from command line in order of priority,
+                                                    the size, the checksum and hashes of pieces are
+                                                    used unless they are specified in command line.
+
+                     --checkpoint-interval=interval Specify how often the state of downloading is
+                                                    saved to resume it later. Value could be in
+                                                    seconds (add symbol s or ms for milliseconds)
+                                                    or in bytes (add symbol B, K or M). Default value
+                                                    is 1 second. The state is also saved on exit.
+
+                     --checksum=algorithm:digest    Specify the checksum of the file to verify it.
+                                                    Supported algorithms: md5, sha1, sha224, sha256,
+                                                    sha384, sha512, blake2b (blake2), blake2s.
+                                                    The checksum is calculated while downloading.
+                                                    When downloading is resumed, data written before
+                                                    are read once to continue the calculation.
+
+                     --piece-hashes=filename        Specify the file with hashes of pieces of the file.
+                                                    The first line contains an algorithm and a piece
+                                                    length in bytes, next lines contain hex digests
+                                                    of pieces. Each received block is verified and
+                                                    corrupted blocks are downloaded from other mirrors.
+
+                     --max-strikes=count            Specify how many corrupted blocks a mirror may
+                                                    send before it is deleted. Default value is 3.
+
+                     --retries=count                Specify how many times in a row a mirror is
+                                                    connected again after connection errors, timeouts
+                                                    and HTTP codes 408, 429, 500, 502, 503 and 504
+                                                    before it is deleted. Default value is 3, 0 - the
+                                                    mirror is deleted at the first error.
+
+                     --retry-delay=delay            Specify the delay before the first retry, each
+                                                    next delay is doubled and randomized. The delay
+                                                    asked by the server in Retry-After is respected.
+                                                    Value could be in seconds (add symbol s or ms for
+                                                    milliseconds). Default value is 1 second.
+
+                     --max-retry-delay=delay        Specify the longest delay before a retry. A mirror
+                                                    asking to wait longer is deleted. Default value
+                                                    is 60 seconds.
+
+                     --streams=count                Specify how many parts are downloaded at once,
+                                                    faster mirrors come first. By default all mirrors
+                                                    download parts at once.
+
+                     --auto-tune                    Choose the count of parallel streams: streams are
+                                                    added one by one while the total speed grows by
+                                                    10% at least, the last one is removed when the
+                                                    speed stops growing or errors become more frequent.
+                                                    --streams limits the count. The chosen count and
+                                                    block size are printed to specify them next time.
+
+                     --max-memory=size              Specify a memory budget for data of blocks. New
+                                                    tasks are not given while active tasks and data
+                                                    waiting for writing could exceed it. Value could
+                                                    be in bytes, kilobytes or megabytes (add symbol
+                                                    K or M). By default memory is not limited.
+
+                     --small-file=size              Specify the size of files received by one request
+                                                    from the first HTTP(S) mirror. Other mirrors are
+                                                    not connected, the file is not allocated and the
+                                                    state of downloading is not saved. Default value
+                                                    is 4MB, 0 - always split the file into blocks.
+
+                     --processes=count              Specify a count of worker processes running
+                                                    threads of mirrors. Mirrors are spread across
+                                                    the processes, which write received data to the
+                                                    file themselves, so receiving and decrypting data
+                                                    is not limited by one core. Default value is 0,
+                                                    threads run in the main process.
+
+                     --coordinate=[host:]port       Accept workers of other nodes on the address.
+                                                    Each worker downloads blocks given by this process
+                                                    from all the mirrors, so the download is not limited
+                                                    by one network interface. It requires --secret.
+
+                     --worker=host:port             Work for the coordinator: download blocks it gives
+                                                    and send them to it or write them to shared storage.
+                                                    Links are taken from the coordinator. It requires
+                                                    --secret.
+
+                     --secret=key                   Specify the key authenticating the coordinator and
+                                                    workers. Only trusted nodes should know it.
+
+                     --shared-storage               Workers write blocks to the file themselves, it
+                                                    should be available on all nodes by the same path.
+
+                     --cache=folder                 Keep downloaded files in the folder, a file found
+                                                    there by the checksum or by the link, the size and
+                                                    the ETag (or Last-Modified) is copied instead of
+                                                    downloading.
+
+                     --cache-size=size              Specify max total size of files in the cache, least
+                                                    recently used files are removed. Value could be in
+                                                    bytes, kilobytes or megabytes (add symbol K or M).
+                                                    Default value is 10240M, 0 - unlimited.
+
+                     --seed-file=file               Copy pieces of the file found in its older version
+                                                    instead of downloading them, only changed blocks
+                                                    are downloaded. It requires piece hashes from
+                                                    --piece-hashes or a metalink.
+
+                     --repair                       Check pieces of the existing file by their hashes
+                                                    and download only corrupted blocks. It requires
+                                                    piece hashes from --piece-hashes or a metalink.
+
+                     --stats=file                   Specify the database keeping performance of mirrors
+                                                    between runs. Fast mirrors connect first, mirrors
+                                                    failing recently are skipped. By default it's
+                                                    ~/.cache/pymget/mirrors.db.
+
+                     --no-stats                     Don't use performance of mirrors measured before
+                                                    and don't save it.
+
+                     --write-behind=size            Specify how much received data may wait for
+                                                    writing to disk in a separate thread. Adjacent
+                                                    blocks are written together. Value could be in
+                                                    bytes, kilobytes or megabytes (add symbol K or M).
+                                                    Default value is 64MB, 0 - write synchronously.
+
+                     --large-file                   Flush written data to disk and drop them from
+                                                    the page cache, so downloading of large files
+                                                    doesn't evict data of other programs.
+
+                     --direct-io                    Write aligned data bypassing the page cache
+                                                    (O_DIRECT) in the writer thread, other data are
+                                                    written as with --large-file.
+
+                     --stream-window=size           Specify how far ahead of data written to stdout
+                                                    blocks could be downloaded. Default value is 256MB.
+
+                     --stream-memory=size           Specify how much data received ahead could be
+                                                    kept in memory when writing to stdout, the rest
+                                                    is kept in a temporary file. Default value is 64MB.
+
                     Links should start with protocol http://, https:// or ftp:// and should be
                     splitted with space. If there is argument specifing a file with links in command
                     line, then you may omit links in the command line.""")
@@ -95,27 +315,91 @@ class CommandLine(ICommandLine):
         self.console.message(textwrap.dedent(help_text.format(os.path.basename(__main__.__file__))))
         sys.exit()
 
-    def parse_block_size(self, block_size):
+    def parse_size(self, size, name):
 
         """
-        Parses an argument of block size.
+        Parses a size in bytes, kilobytes or megabytes.
 
-        :block_size: value of argument, type str
+        :size: value of argument, type str
+        :name: a name of argument for the error message, type str
+        :return: the size in bytes, type int
 
         """
         bs_re = re.compile('^(\d+)(\w)?$') # pattern for argument "number + (optional) "char"
-        matches = bs_re.match(block_size)
+        matches = bs_re.match(size)
         if not matches: # argument does not mutch - wrong argument
-            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('block size', block_size))
-        self.block_size = int(matches.group(1)) # assign to block size a value of number
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format(name, size))
+        value = int(matches.group(1)) # a value of number
         if matches.group(2): # there is a char in the parameter
             if matches.group(2) in 'kK': # k or K
-                self.block_size *= 2**10 # that's kilobytes
+                value *= 2**10 # that's kilobytes
             elif matches.group(2) in 'mM': # m or M
-                self.block_size *= 2**20 # that's megabytes
+                value *= 2**20 # that's megabytes
             else:
                 # not m, M, k or K - wrong argument
-                raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('block size', block_size))
+                raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format(name, size))
+        return value
+
+    def parse_block_size(self, block_size):
+
+        """
+        Parses an argument of block size.
+
+        :block_size: value of argument, type str
+
+        """
+        self.block_size = self.parse_size(block_size, 'block size')
+        self.auto_block_size = False
+
+    def parse_stream_window(self, stream_window):
+
+        """
+        Parses an argument of the stream window.
+
+        :stream_window: value of argument, type str
+
+        """
+        self.stream_window = self.parse_size(stream_window, 'stream window')
+
+    def parse_stream_memory(self, stream_memory):
+
+        """
+        Parses an argument of the stream reorder buffer memory limit.
+
+        :stream_memory: value of argument, type str
+
+        """
+        self.stream_memory = self.parse_size(stream_memory, 'stream memory')
+
+    def parse_max_memory(self, max_memory):
+
+        """
+        Parses an argument of the memory budget.
+
+        :max_memory: value of argument, type str
+
+        """
+        self.max_memory = self.parse_size(max_memory, 'max memory')
+
+    def parse_small_file(self, small_file):
+
+        """
+        Parses an argument of the small file size.
+
+        :small_file: value of argument, type str
+
+        """
+        self.small_file = self.parse_size(small_file, 'small file')
+
+    def parse_write_behind(self, write_behind):
+
+        """
+        Parses an argument of the writer queue memory limit.
+
+        :write_behind: value of argument, type str
+
+        """
+        self.write_behind = self.parse_size(write_behind, 'write behind')
 
     def parse_timeout(self, timeout):
 
@@ -131,6 +415,117 @@ class CommandLine(ICommandLine):
             # parameter is not a number - wrong argument
             raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('timeout', timeout))
 
+    def parse_checkpoint_interval(self, interval):
+
+        """
+        Parses an argument of checkpoint interval.
+        The interval could be specified either in seconds
+        or in bytes, the other one is disabled.
+
+        :interval: value of argument, type str
+
+        """
+        ci_re = re.compile('^(\d+(?:\.\d+)?)(ms|s|\w)?$') # pattern for argument "number + (optional) units"
+        matches = ci_re.match(interval)
+        if not matches: # argument does not match - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('checkpoint interval', interval))
+        value = float(matches.group(1))
+        units = matches.group(2)
+        if units is None or units == 's': # seconds
+            self.checkpoint_interval = value
+            self.checkpoint_bytes = 0
+        elif units == 'ms': # milliseconds
+            self.checkpoint_interval = value / 1000
+            self.checkpoint_bytes = 0
+        elif units in 'bBkKmM': # bytes, kilobytes or megabytes
+            multiplier = {'b': 1, 'k': 2**10, 'm': 2**20}[units.lower()]
+            self.checkpoint_bytes = int(value * multiplier)
+            self.checkpoint_interval = 0
+        else:
+            # unknown units - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('checkpoint interval', interval))
+
+    def parse_checksum(self, checksum):
+
+        """
+        Parses an argument of the file checksum.
+
+        :checksum: value of argument in format algorithm:digest, type str
+
+        """
+        try:
+            self.checksum = self._checksum.parse(checksum)
+        except ValueError:
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('checksum', checksum))
+
+    def parse_piece_hashes(self, filename):
+
+        """
+        Parses a file with hashes of pieces.
+
+        :filename: value of parameter (filename), type str
+
+        """
+        try:
+            self.piece_hashes = self._piece_hashes.load(filename)
+        except FileNotFoundError:
+            raise CommandLineError(_("file '{}' not found.").format(filename))
+        except PermissionError:
+            raise CommandLineError(_("unable to read piece hashes file '{}'. Permission denied.").format(filename))
+        except (ValueError, UnicodeDecodeError): # specified file is not a correct piece hashes file
+            raise CommandLineError(_("unable to read piece hashes file '{}'. File is broken.").format(filename))
+
+    def parse_max_strikes(self, max_strikes):
+
+        """
+        Parses an argument of max strikes count.
+
+        :max_strikes: value of argument, type str
+
+        """
+        try:
+            self.max_strikes = int(max_strikes)
+            if self.max_strikes < 1:
+                raise ValueError
+        except ValueError:
+            # parameter is not a positive number - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('max strikes', max_strikes))
+
+    def parse_retries(self, retries):
+
+        """
+        Parses an argument of retries count.
+
+        :retries: value of argument, type str
+
+        """
+        try:
+            self.retries = int(retries)
+            if self.retries < 0:
+                raise ValueError
+        except ValueError:
+            # parameter is not a number - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('retries', retries))
+
+    def parse_delay(self, delay, name):
+
+        """
+        Parses a delay in seconds or milliseconds.
+
+        :delay: value of argument, type str
+        :name: a name of argument for the error message, type str
+        :return: the delay in seconds, type float
+
+        """
+        delay_re = re.compile(r'^(\d+(?:\.\d+)?)(ms|s)?$') # pattern for argument "number + (optional) units"
+        matches = delay_re.match(delay)
+        if not matches: # argument does not match - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format(name, delay))
+        value = float(matches.group(1))
+        if matches.group(2) == 'ms': # milliseconds
+            value /= 1000
+        return value
+
     def parse_urls_file(self, urls_file):
 
         """
@@ -153,6 +548,168 @@ class CommandLine(ICommandLine):
         except UnicodeDecodeError: # specified file is not a correct text file
             raise CommandLineError(_("unable to read links file '{}'. File is broken.").format(urls_file))
      
+    def parse_jobs_file(self, jobs_file):
+
+        """
+        Parses a jobs file. Each line contains links to mirrors of
+        a file separated by spaces and optionally a path to save it.
+        Empty lines and lines beginning with # are skipped.
+
+        :jobs_file: value of parameter (filename), type str
+
+        """
+        try:
+            jobs = []
+            with open(jobs_file, 'r') as lines: # try to open the file in text mode
+                for number, line in enumerate(lines, 1):
+                    words = line.split()
+                    if not words or words[0].startswith('#'):
+                        continue
+                    links = [word for word in words if self.url_re.match(word)]
+                    paths = [word for word in words if not self.url_re.match(word)]
+                    if not links or len(paths) > 1: # there should be links and not more than one path
+                        raise CommandLineError(_("wrong line {} in jobs file '{}'.").format(number, jobs_file))
+                    jobs.append((paths[0] if paths else '', links))
+            self.jobs.extend(jobs)
+        except FileNotFoundError:
+            raise CommandLineError(_("file '{}' not found.").format(jobs_file))
+        except PermissionError:
+            raise CommandLineError(_("unable to read jobs file '{}'. Permission denied.").format(jobs_file))
+        except UnicodeDecodeError: # specified file is not a correct text file
+            raise CommandLineError(_("unable to read jobs file '{}'. File is broken.").format(jobs_file))
+
+    def parse_connections(self, connections):
+
+        """
+        Parses an argument of max connections count.
+
+        :connections: value of argument, type str
+
+        """
+        try:
+            self.connections = int(connections)
+            if self.connections < 1:
+                raise ValueError
+        except ValueError:
+            # parameter is not a positive number - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('connections', connections))
+
+    def parse_processes(self, processes):
+
+        """
+        Parses an argument of worker processes count.
+
+        :processes: value of argument, type str
+
+        """
+        try:
+            self.processes = int(processes)
+            if self.processes < 0:
+                raise ValueError
+        except ValueError:
+            # parameter is not a non-negative number - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('processes', processes))
+
+    def parse_streams(self, streams):
+
+        """
+        Parses an argument of parallel streams count.
+
+        :streams: value of argument, type str
+
+        """
+        try:
+            self.streams = int(streams)
+            if self.streams < 0:
+                raise ValueError
+        except ValueError:
+            # parameter is not a non-negative number - wrong argument
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format('streams', streams))
+
+    def parse_address(self, address, name, host=''):
+
+        """
+        Parses an argument of a network address.
+
+        :address: value of argument in the format host:port, type str
+        :name: a name of the argument, type str
+        :host: the host used if only the port is specified, None - the host is required, type str
+        :return: the address, type tuple (host, port)
+
+        """
+        try:
+            address_host, sep, port = address.rpartition(':')
+            if not sep and host is None:
+                raise ValueError
+            port = int(port)
+            if not 0 < port < 65536:
+                raise ValueError
+        except ValueError:
+            raise CommandLineError(_("wrong argument in the command line. Wrong parameter format of argument '{}': {}").format(name, address))
+        return (address_host or host, port)
+
+    def parse_metalink(self, filename):
+
+        """
+        Parses a metalink file.
+
+        :filename: value of parameter (filename), type str
+
+        """
+        try:
+            files = self._metalink.load(filename)
+        except FileNotFoundError:
+            raise CommandLineError(_("file '{}' not found.").format(filename))
+        except PermissionError:
+            raise CommandLineError(_("unable to read metalink file '{}'. Permission denied.").format(filename))
+        except SyntaxError: # specified file is not a correct XML file
+            raise CommandLineError(_("unable to read metalink file '{}'. File is broken.").format(filename))
+        if not files:
+            raise CommandLineError(_("metalink file '{}' does not describe any file.").format(filename))
+        if len(files) > 1:
+            self.console.warning(_("metalink file '{}' describes several files, only the first one will be downloaded.").format(filename))
+        self.metalink_file = files[0]
+        self.metalink_filename = filename
+        # add mirrors ordered by priority
+        for url, location, max_connections in self.metalink_file.mirrors():
+            self.urls.append(url)
+            self.url_options[url] = (location, max_connections)
+        self.file_size = self.metalink_file.size
+
+    def apply_metalink(self):
+
+        """
+        Uses the filename, the checksum and piece hashes from
+        the metalink if they are not specified in command line.
+
+        """
+        if not self.metalink_file:
+            return
+        if not self.filename and self.metalink_file.name:
+            self.filename = os.path.basename(self.metalink_file.name)
+        try:
+            if not self.checksum:
+                self.checksum = self.metalink_file.checksum()
+            if not self.piece_hashes:
+                self.piece_hashes = self.metalink_file.piece_hashes()
+        except ValueError: # wrong hashes in the metalink
+            raise CommandLineError(_("unable to read metalink file '{}'. File is broken.").format(self.metalink_filename))
+
+    def create_url(self, link):
+
+        """
+        Creates an URL object and applies options
+        of the mirror specified in the metalink.
+
+        :link: a link to the file, type str
+        :return: the URL object, type URL
+
+        """
+        url = URL(link)
+        if link in self.url_options:
+            url.location, url.max_connections = self.url_options[link]
+        return url
+
     def parse_out_file(self, filename):
 
         """
@@ -171,7 +728,7 @@ class CommandLine(ICommandLine):
         :arg: an argument, type str
 
         """
-        name, param = arg.split('=') # split by =
+        name, param = arg.split('=', 1) # split by the first =
         return param # return the second part
 
     def parse(self):
@@ -196,9 +753,53 @@ class CommandLine(ICommandLine):
             elif arg == '-u':
                 # parse URLs file, pass next item to the method
                 self.parse_urls_file(next(args_iterator))
+            elif arg == '-j':
+                # parse jobs file, pass next item to the method
+                self.parse_jobs_file(next(args_iterator))
+            elif arg == '-m' or arg == '--metalink':
+                # parse metalink file, pass next item to the method
+                self.parse_metalink(next(args_iterator))
             elif arg == '-o':
                 # parse the name of outfile, pass next item to the method
                 self.parse_out_file(next(args_iterator))
+            elif arg == '-r' or arg == '--recursive':
+                self.recursive = True
+            elif arg == '--daemon':
+                self.daemon = True
+            elif arg == '--submit':
+                self.submit = True
+            elif arg == '--large-file':
+                self.large_file = True
+            elif arg == '--direct-io':
+                self.direct_io = True
+            elif arg == '--shared-storage':
+                self.shared_storage = True
+            elif arg == '--repair':
+                self.repair = True
+            elif arg == '--no-stats':
+                self.stats = ''
+            elif arg == '--auto-tune':
+                self.auto_tune = True
+            elif arg.startswith('--streams='):
+                # parse parallel streams count, get parameter from long argument
+                self.parse_streams(self.parse_long_arg(arg))
+            elif arg.startswith('--stats='):
+                self.stats = self.parse_long_arg(arg)
+            elif arg.startswith('--coordinate='):
+                # parse the address to accept workers, get parameter from long argument
+                self.coordinate = self.parse_address(self.parse_long_arg(arg), 'coordinate')
+            elif arg.startswith('--worker='):
+                # parse the address of the coordinator, get parameter from long argument
+                self.worker = self.parse_address(self.parse_long_arg(arg), 'worker', None)
+            elif arg.startswith('--secret='):
+                self.secret = self.parse_long_arg(arg)
+            elif arg.startswith('--cache='):
+                self.cache = self.parse_long_arg(arg)
+            elif arg.startswith('--cache-size='):
+                # parse the cache size limit, get parameter from long argument
+                self.cache_size = self.parse_size(self.parse_long_arg(arg), 'cache size')
+            elif arg.startswith('--seed-file='):
+                self.seed_file = self.parse_long_arg(arg)
             elif arg.startswith('--block-size='):
                 # parse block size, get parameter from long argument
                 self.parse_block_size(self.parse_long_arg(arg))
@@ -211,6 +812,57 @@ class CommandLine(ICommandLine):
             elif arg.startswith('--out-file='):
                 # parse the name of outfile, get parameter from long argument
                 self.parse_out_file(self.parse_long_arg(arg))
+            elif arg.startswith('--jobs='):
+                # parse jobs file, get parameter from long argument
+                self.parse_jobs_file(self.parse_long_arg(arg))
+            elif arg.startswith('--connections='):
+                # parse max connections count, get parameter from long argument
+                self.parse_connections(self.parse_long_arg(arg))
+            elif arg.startswith('--socket='):
+                # the path of the socket, get parameter from long argument
+                self.socket = self.parse_long_arg(arg)
+            elif arg.startswith('--metalink='):
+                # parse metalink file, get parameter from long argument
+                self.parse_metalink(self.parse_long_arg(arg))
+            elif arg.startswith('--checkpoint-interval='):
+                # parse checkpoint interval, get parameter from long argument
+                self.parse_checkpoint_interval(self.parse_long_arg(arg))
+            elif arg.startswith('--checksum='):
+                # parse the checksum, get parameter from long argument
+                self.parse_checksum(self.parse_long_arg(arg))
+            elif arg.startswith('--piece-hashes='):
+                # parse piece hashes file, get parameter from long argument
+                self.parse_piece_hashes(self.parse_long_arg(arg))
+            elif arg.startswith('--max-strikes='):
+                # parse max strikes count, get parameter from long argument
+                self.parse_max_strikes(self.parse_long_arg(arg))
+            elif arg.startswith('--retries='):
+                # parse retries count, get parameter from long argument
+                self.parse_retries(self.parse_long_arg(arg))
+            elif arg.startswith('--retry-delay='):
+                # parse the delay before the first retry, get parameter from long argument
+                self.retry_delay = self.parse_delay(self.parse_long_arg(arg), 'retry delay')
+            elif arg.startswith('--max-retry-delay='):
+                # parse the longest delay before a retry, get parameter from long argument
+                self.max_retry_delay = self.parse_delay(self.parse_long_arg(arg), 'max retry delay')
+            elif arg.startswith('--stream-window='):
+                # parse the stream window, get parameter from long argument
+                self.parse_stream_window(self.parse_long_arg(arg))
+            elif arg.startswith('--stream-memory='):
+                # parse the stream memory limit, get parameter from long argument
+                self.parse_stream_memory(self.parse_long_arg(arg))
+            elif arg.startswith('--max-memory='):
+                # parse the memory budget, get parameter from long argument
+                self.parse_max_memory(self.parse_long_arg(arg))
+            elif arg.startswith('--small-file='):
+                # parse the small file size, get parameter from long argument
+                self.parse_small_file(self.parse_long_arg(arg))
+            elif arg.startswith('--processes='):
+                # parse worker processes count, get parameter from long argument
+                self.parse_processes(self.parse_long_arg(arg))
+            elif arg.startswith('--write-behind='):
+                # parse the writer queue limit, get parameter from long argument
+                self.parse_write_behind(self.parse_long_arg(arg))
             elif self.url_re.match(arg): # argument matches the URL pattern
                 self.urls.append(arg) # add it to the list of URLs
             else:
@@ -218,6 +870,54 @@ class CommandLine(ICommandLine):
                 # show warning and skip the argument
                 self.console.warning(_("unknown argument: '{}'").format(arg))
 
+        self.apply_metalink()
+        self.check_cluster()
+        self.check_pieces()
+
         # create URL objects from the links,
         # previously filter them with the URL pattern
-        self.urls = map(lambda url: URL(url), filter(lambda url: self.url_re.match(url), self.urls))
+        self.urls = map(self.create_url, filter(lambda url: self.url_re.match(url), self.urls))
+        if self.jobs: # batch mode
+            self.jobs = [(path, list(map(self.create_url, links))) for path, links in self.jobs]
+            self.urls = list(self.urls)
+            if self.urls: # links from command line are one more file
+                self.jobs.append(('', self.urls))
+
+    def check_cluster(self):
+
+        """
+        Checks options of downloading by several nodes.
+
+        """
+        if (self.coordinate or self.worker) and not self.secret: # anybody could connect otherwise
+            raise CommandLineError(_("the secret is required to work with other nodes, specify --secret."))
+        if self.coordinate and (self.jobs or self.recursive or self.daemon or self.submit):
+            raise CommandLineError(_("only one file could be downloaded with workers of other nodes."))
+
+    def check_pieces(self):
+
+        """
+        Checks options copying or checking pieces of the file
+        by their hashes: the seed file and repairing.
+
+        """
+        if self.seed_file and not self.piece_hashes: # pieces are found by their hashes
+            raise CommandLineError(_("the seed file requires piece hashes, specify --piece-hashes or a metalink."))
+        if self.repair and not self.piece_hashes:
+            raise CommandLineError(_("repairing requires piece hashes, specify --piece-hashes or a metalink."))
+        if self.repair and self.seed_file: # the existing file is the seed itself
+            raise CommandLineError(_("the seed file could not be used when the file is repaired."))
+        if self.seed_file and not os.path.isfile(self.seed_file):
+            raise CommandLineError(_("seed file '{}' is not found.").format(self.seed_file))
+
+    @property
+    def _checksum(self):
+        return Checksum
+
+    @property
+    def _piece_hashes(self):
+        return PieceHashes
+
+    @property
+    def _metalink(self):
+        return Metalink
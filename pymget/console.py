@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
 import time
 from abc import ABCMeta, abstractmethod
 
@@ -36,6 +37,7 @@ class ProgressBar(IProgressBar):
         self.total = total
         self.old_progress = old_progress
         self.start_time = self.time
+        self.out = sys.stdout # a stream the progressbar is printed to
 
     def get_percentage(self, complete):
 
@@ -118,8 +120,8 @@ class ProgressBar(IProgressBar):
         # get progress string
         bar = self._update(complete)
 
-        # write the string to standard output
-        print(bar, end='\r', flush=True)
+        # write the string to the output stream
+        print(bar, end='\r', flush=True, file=self.out)
 
     @property
     def time(self):
@@ -151,6 +153,9 @@ class IConsole(metaclass=ABCMeta):
     @abstractmethod
     def progress(self, complete): pass
 
+    @abstractmethod
+    def redirect(self, out): pass
+
 
 
 class Console(IConsole):
@@ -169,12 +174,14 @@ class Console(IConsole):
     error: prints a text with prefix 'Error: '
     ask: prints a question with answers 'yes' and 'no'
     progress: prints/updates a progressbar
+    redirect: prints everything to another stream
 
     """
     def __init__(self):
         # a flag that indicates a presence of 
         self.newline = True # newline symbol in the end of the last printed line
         self.progressbar = None
+        self.out = sys.stdout # a stream for messages
 
     def create_progressbar(self, total, old_progress):
 
@@ -186,14 +193,28 @@ class Console(IConsole):
 
         """
         self.progressbar = self._progressbar(total, old_progress)
+        self.progressbar.out = self.out
 
     def _out(self, text, end='\n'):
 
         """
-        Prints a text into stdout.
+        Prints a text into the output stream.
+
+        """
+        print(text, end=end, file=self.out)
+
+    def redirect(self, out):
+
+        """
+        Prints messages, questions and the progressbar to another
+        stream, e.g. when stdout is used for downloaded data.
+
+        :out: a text stream, type file object
 
         """
-        print(text, end=end)
+        self.out = out
+        if self.progressbar:
+            self.progressbar.out = out
 
     def message(self, text='', end='\n'):
 
@@ -257,7 +278,11 @@ class Console(IConsole):
 
         # Repeate until user typed a valid answer
         while True:
-            answer = input(question_text).lower()
+            if self.out is sys.stdout:
+                answer = input(question_text).lower()
+            else: # the question should not get into stdout
+                print(question_text, end='', flush=True, file=self.out)
+                answer = input().lower()
             if answer in YES:
                 return True
             if answer in NO:
@@ -278,7 +303,7 @@ class Console(IConsole):
             return
         # if there was printed a message, add an empty line
         if self.newline:
-            print()
+            print(file=self.out)
         self.newline = False # there is not newline symbol in the end of the line now
         self.progressbar.update(complete)
 
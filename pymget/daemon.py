@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import socket
+import selectors
+from abc import ABCMeta, abstractmethod
+
+from .errors import FatalError, CancelError
+from .batch import Batch, JobConsole
+
+class ClientConnection:
+
+    """
+    A connection between the daemon and a client. Messages
+    are JSON objects, each one on a separate line.
+
+    """
+    def __init__(self, sock):
+
+        """
+        :sock: a connected Unix socket, type socket.socket
+
+        """
+        self.sock = sock
+        self.buffer = b'' # received data of an incomplete message
+        self.closed = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self):
+
+        """
+        Receives available data.
+
+        :return: complete messages, type list <dict>
+
+        """
+        try:
+            data = self.sock.recv(2**16)
+        except OSError:
+            data = b''
+        if not data: # the other side has closed the connection
+            self.closed = True
+            return []
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+        messages = []
+        for line in filter(None, lines):
+            try:
+                message = json.loads(line.decode('utf-8'))
+            except ValueError:
+                message = None
+            messages.append(message if isinstance(message, dict) else {})
+        return messages
+
+    def send(self, message):
+
+        """
+        Sends the message, errors close the connection.
+
+        :message: a message, type dict
+
+        """
+        if self.closed:
+            return
+        try:
+            self.sock.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        except OSError:
+            self.closed = True
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+
+class ClientConsole(JobConsole):
+
+    """
+    A console of a file submitted to the daemon. Messages are
+    printed by the daemon prefixed with the number of the job,
+    events of the file are sent to the client, warnings too.
+    Nobody could answer questions, so the default answer is used.
+
+    """
+    def __init__(self, console, job_id, client):
+
+        """
+        :console: the console of the daemon
+        :job_id: a number of the job, type int
+        :client: a connection of the client submitted the job, type ClientConnection
+
+        """
+        JobConsole.__init__(self, console, '#{}'.format(job_id))
+        self.job_id = job_id
+        self.client = client
+
+    def warning(self, text, end='\n'):
+        JobConsole.warning(self, text, end)
+        self.event('warning', text=text)
+
+    def ask(self, text, default):
+        self.warning('{} {}'.format(text, _('yes') if default else _('no')))
+        return default
+
+    def event(self, event, **fields):
+
+        """
+        Sends an event of the file to the client.
+
+        :event: a name of the event, type str
+
+        """
+        fields.update(id=self.job_id, event=event)
+        self.client.send(fields)
+
+
+
+class Daemon(Batch):
+
+    """
+    Downloads files submitted by clients through a Unix socket.
+    Files are downloaded in batch mode, so connections and idle
+    HTTP(S) connections are shared by all files, the process
+    is started once for all of them.
+
+    Requests (one JSON object per line):
+
+        {"urls": [links to mirrors of the file], "path": "/path/to/save"}
+        {"cancel": id of the job}
+
+    Events sent to the client submitted the file:
+
+        {"id": 1, "event": "queued"}
+        {"id": 1, "event": "progress", "written": 1024, "size": 4096}
+        {"id": 1, "event": "warning", "text": "description"}
+        {"id": 1, "event": "done", "path": "/path/to/save/file"}
+        {"id": 1, "event": "failed", "error": "description"}
+
+    """
+    PROGRESS_INTERVAL = 1 # how often progress is sent to clients, in seconds
+
+    def __init__(self):
+        Batch.__init__(self)
+        self.socket_path = ''
+        self.server = None # the listening socket
+        self.selector = None
+        self.last_id = 0 # the number of the last submitted job
+        self.progress_time = 0 # the time progress has been sent last time
+
+    def prepare(self, console, command_line):
+
+        """
+        Takes options from the command line and
+        starts listening the socket.
+
+        :console: a console object
+        :command_line: a command line object
+
+        """
+        Batch.prepare(self, console, command_line)
+        self.jobs.clear() # the daemon downloads only submitted files
+        self.total = 0
+        self.listen(command_line.socket)
+
+    def listen(self, path):
+
+        """
+        Creates the socket available only for the user.
+
+        :path: a path of the socket, type str
+
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise FatalError(_("daemon mode is not supported on this system."))
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                raise FatalError(_("daemon is already running on {}.").format(path))
+            except OSError: # the socket is left by a daemon that has not been stopped correctly
+                os.remove(path)
+            finally:
+                probe.close()
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177) # only the user could connect
+        try:
+            self.server.bind(path)
+        except OSError as e:
+            raise FatalError(_("unable to listen on {}: {}").format(path, e))
+        finally:
+            os.umask(umask)
+        self.socket_path = path
+        self.server.listen()
+        self.server.setblocking(False)
+        self.selector = self._selector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.console.message(_("Listening on {}").format(path))
+
+    def download(self):
+
+        """
+        Downloads submitted files until the daemon is interrupted.
+
+        """
+        try:
+            while True:
+                self.serve(0 if self.active else 0.1) # wait for clients while there is nothing to download
+                self.schedule()
+                self.report_progress()
+                if self.active:
+                    time.sleep(0.001) # managers don't wait on their queues, don't let the loop spin
+        except KeyboardInterrupt: # the daemon is stopped
+            self.cancel()
+            raise CancelError(_("Operation has been cancelled by user."))
+        finally:
+            self.close()
+
+    def serve(self, timeout):
+
+        """
+        Accepts new clients and processes their requests.
+
+        :timeout: max time to wait for requests in seconds, type float
+
+        """
+        for key, mask in self.selector.select(timeout):
+            if key.fileobj is self.server:
+                self.accept()
+                continue
+            client = key.fileobj
+            for message in client.receive():
+                self.process(client, message)
+            if client.closed: # submitted files are downloaded anyway
+                self.selector.unregister(client)
+                client.close()
+
+    def accept(self):
+        try:
+            sock, address = self.server.accept()
+        except OSError:
+            return
+        sock.setblocking(True)
+        sock.settimeout(self.command_line.timeout) # a client which doesn't read events is disconnected
+        self.selector.register(ClientConnection(sock), selectors.EVENT_READ)
+
+    def process(self, client, message):
+
+        """
+        Processes a request of the client.
+
+        :client: a connection of the client, type ClientConnection
+        :message: the request, type dict
+
+        """
+        if 'cancel' in message:
+            self.cancel_job(message['cancel'])
+            return
+        links = message.get('urls')
+        path = message.get('path', '')
+        if not isinstance(links, list) or not isinstance(path, str):
+            client.send({'event': 'error', 'error': _("wrong request.")})
+            return
+        links = [link for link in links if isinstance(link, str) and self.command_line.url_re.match(link)]
+        if not links:
+            client.send({'event': 'error', 'error': _("There are no mirrors to download.")})
+            return
+        self.last_id += 1
+        self.total += 1
+        self.jobs.append((path, list(map(self.command_line.create_url, links)), client, self.last_id))
+        client.send({'id': self.last_id, 'event': 'queued'})
+
+    def cancel_job(self, job_id):
+
+        """
+        Cancels the file waiting or being downloaded.
+
+        :job_id: a number of the job, type int
+
+        """
+        for job in list(self.jobs):
+            if job[3] == job_id:
+                self.jobs.remove(job)
+                self.job_failed(job[0], ClientConsole(self.console, job_id, job[2]), _("Operation has been cancelled by user."))
+        for job in self.active.copy():
+            name, manager, steps = job
+            if manager.console.job_id == job_id:
+                try:
+                    steps.throw(KeyboardInterrupt) # the manager cancels threads and saves the context
+                except CancelError as e:
+                    self.job_failed(name, manager.console, str(e))
+                self.active.remove(job)
+
+    def cancel(self):
+
+        """
+        Cancels all the files, clients are notified.
+
+        """
+        for path, urls, client, job_id in self.jobs:
+            ClientConsole(self.console, job_id, client).event('failed', error=_("Operation has been cancelled by user."))
+        self.jobs.clear()
+        consoles = [manager.console for name, manager, steps in self.active]
+        Batch.cancel(self)
+        for console in consoles:
+            console.event('failed', error=_("Operation has been cancelled by user."))
+
+    def start_job(self, path, urls, client, job_id):
+
+        """
+        Creates a manager for the submitted file.
+
+        :path: a path to save the file, type str
+        :urls: URL objects of mirrors of the file, type sequence <URL>
+        :client: a connection of the client submitted the file, type ClientConnection
+        :job_id: a number of the job, type int
+
+        """
+        Batch.start_job(self, path, urls, ClientConsole(self.console, job_id, client))
+
+    def job_done(self, name, manager):
+        Batch.job_done(self, name, manager)
+        manager.console.event('done', path=manager.outfile.fullpath)
+
+    def job_failed(self, name, console, text):
+        Batch.job_failed(self, name, console, text)
+        console.event('failed', error=text)
+
+    def report_progress(self):
+
+        """
+        Sends progress of files to clients not more often
+        than the progress interval.
+
+        """
+        if time.monotonic() - self.progress_time < self.PROGRESS_INTERVAL:
+            return
+        self.progress_time = time.monotonic()
+        for name, manager, steps in self.active:
+            manager.console.event('progress', written=manager.written_bytes, size=manager.file_size)
+
+    def close(self):
+
+        """
+        Closes connections and removes the socket.
+
+        """
+        self._pool().close()
+        if self.selector:
+            for key in list(self.selector.get_map().values()):
+                key.fileobj.close()
+            self.selector.close()
+        if self.socket_path:
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+    @property
+    def _selector(self):
+        return selectors.DefaultSelector
+
+
+
+class IClient(metaclass=ABCMeta):
+
+    """
+    An interface for a client of the daemon.
+
+    """
+    @abstractmethod
+    def submit(self, jobs, folder): pass
+
+
+
+class Client(IClient):
+
+    """
+    Submits files to the daemon and waits until
+    they are downloaded.
+
+    """
+    def __init__(self, console, socket_path):
+
+        """
+        :console: a console object
+        :socket_path: a path of the socket of the daemon, type str
+
+        """
+        self.console = console
+        self.socket_path = socket_path
+        self.connection = None
+        self.waiting = set() # numbers of submitted jobs not yet completed
+        self.failed = 0 # count of files that could not be downloaded
+        self.single = False # only one file is submitted, its progressbar is shown
+        self.file_size = 0 # the size of the single file when it becomes known
+
+    def submit(self, jobs, folder):
+
+        """
+        Submits the files and waits for them.
+
+        :jobs: files to download, tuples (path, URL objects of mirrors)
+        :folder: a folder or a path from the command line, type str
+
+        """
+        sock = self._socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            raise FatalError(_("unable to connect to the daemon on {}.").format(self.socket_path))
+        self.connection = ClientConnection(sock)
+        submitted = 0
+        for path, urls in jobs:
+            path = os.path.join(folder, path) if path else folder
+            self.connection.send({'urls': [url.url for url in urls], 'path': self.absolute_path(path)})
+            submitted += 1
+        self.single = submitted == 1
+        try:
+            while submitted or self.waiting:
+                messages = self.connection.receive()
+                if self.connection.closed:
+                    raise FatalError(_("the daemon has closed the connection."))
+                for message in messages:
+                    if message.get('event') in ('queued', 'error'):
+                        submitted -= 1
+                    self.process(message)
+        except KeyboardInterrupt: # cancel submitted files
+            for job_id in self.waiting:
+                self.connection.send({'cancel': job_id})
+            raise CancelError(_("Operation has been cancelled by user."))
+        finally:
+            self.connection.close()
+        if self.failed:
+            raise FatalError(_("unable to download {} files.").format(self.failed))
+
+    def process(self, message):
+
+        """
+        Shows the event received from the daemon.
+
+        :message: the event, type dict
+
+        """
+        event = message.get('event')
+        job_id = message.get('id')
+        if event == 'queued':
+            self.waiting.add(job_id)
+            self.console.message(_("File #{} is queued").format(job_id))
+        elif event == 'progress' and self.single and message.get('size'):
+            if not self.file_size: # the size becomes known
+                self.file_size = message['size']
+                self.console.create_progressbar(self.file_size, 0)
+            self.console.progress(message.get('written', 0))
+        elif event == 'warning':
+            self.console.warning('[#{}] {}'.format(job_id, message.get('text', '')))
+        elif event == 'done':
+            self.waiting.discard(job_id)
+            if self.file_size:
+                self.console.progress(self.file_size)
+            self.console.message(_("\nFile #{} is saved to {}").format(job_id, message.get('path')))
+        elif event in ('failed', 'error'):
+            self.waiting.discard(job_id)
+            self.failed += 1
+            self.console.error(message.get('error', ''))
+
+    @staticmethod
+    def absolute_path(path):
+
+        """
+        Makes the path absolute for the daemon working in another
+        directory, the ending separator of a folder is kept.
+
+        :path: a path, type str
+
+        """
+        if not path:
+            return os.getcwd() + os.sep
+        return os.path.abspath(path) + (os.sep if path.endswith(os.sep) else '')
+
+    @property
+    def _socket(self):
+        return socket.socket
@@ -3,7 +3,9 @@
 
 
 import os
+import time
 import queue
+import random
 from collections import deque
 from abc import ABCMeta, abstractmethod
 
@@ -11,7 +13,15 @@ from . import messages
 from .errors import FatalError, CancelError
 from .utils import calc_size
 from .mirrors import Mirror
+from .networking import URL
+from .outfile import Context
 from .data_queue import DataQueue
+from .writer import Writer
+from .workers import WorkerProcess, ProcessMirror, RemoteMirror, Coordinator
+from .cache import Cache
+from .seed import Seed
+from .stats import MirrorStats, MirrorRecord
+from .tuner import Tuner
 
 class IManager(metaclass=ABCMeta):
 
@@ -25,15 +35,24 @@ class IManager(metaclass=ABCMeta):
     @abstractmethod
     def download(self): pass
 
+    @abstractmethod
+    def steps(self): pass
+
+    @abstractmethod
+    def checkpoint(self, force=False): pass
+
     @abstractmethod
     def del_active_part(self, offset): pass
 
     @abstractmethod
-    def add_failed_part(self, offset): pass
+    def add_failed_part(self, offset, received=b''): pass
 
     @abstractmethod
     def delete_mirror(self, name): pass
 
+    @abstractmethod
+    def allocate(self, file_size): pass
+
     @abstractmethod
     def set_file_size(self, task_info): pass
 
@@ -58,15 +77,19 @@ class Manager(IManager):
     gives tasks and process results.    
     
     """
-    def __init__(self):
+    SYNC_INTERVAL = 0.5 # how often progress of other processes downloading the file is read, in seconds
+    BLOCK_TIME = 4 # the chosen block size is downloaded by the fastest mirror measured before in about 4 seconds
+    MIN_CHOSEN_BLOCK = 2**20 # the block size chosen by the speed of mirrors is from 1MB
+    MAX_CHOSEN_BLOCK = 64 * 2**20 # to 64MB
+    TRANSIENT_STATUSES = (0, 408, 429, 500, 502, 503, 504) # connection errors, timeouts and overloaded servers are retried
+
+    def __init__(self, data_queue=None):
 
         """
-        :console: a console object
-        :command_line: a command line object
-        :outfile: an outfile object
+        :data_queue: a queue for results of threads, by default the common DataQueue is used
 
         """
-        self.data_queue = self._dataqueue()
+        self.data_queue = data_queue if data_queue is not None else self._dataqueue()
         self.console = None
         self.outfile = None
         self.block_size = 0
@@ -76,11 +99,63 @@ class Manager(IManager):
         self.server_filename = '' # filename on the server, now is unknown
         self.file_size = 0 # file size if unknown, is will be determined after connect
         self.mirrors = {} # a dictionary for mirrors, names of hosts would be used as keys
-        self.parts_in_progress = [] # a list of active tasksself.context = self.outfile.context # save context related to the file
+        self.parts_in_progress = [] # a list of active tasks
         self.offset = 0
         self.written_bytes = 0 
         self.old_progress = 0
         self.failed_parts = deque([])
+        self.checkpoint_interval = 0 # minimal time between context savings in seconds, 0 - save every change
+        self.checkpoint_bytes = 0 # minimal written bytes count between context savings, 0 - use the time interval
+        self.checkpoint_time = 0 # the time of the last context saving
+        self.checkpoint_written = 0 # written bytes count at the moment of the last context saving
+        self.state_changed = False # a flag that the downloading state differs from the saved context
+        self.checksum = None # a checksum of the whole file, if it's specified the file will be verified
+        self.piece_hashes = None # hashes of pieces, if they are specified each block will be verified
+        self.max_strikes = 0 # count of corrupted blocks after that the mirror is deleted
+        self.part_exclusions = {} # names of mirrors sent corrupted data, offsets of parts are keys
+        self.write_behind = 0 # memory limit of the writer thread queue in bytes, 0 - write data synchronously
+        self.writer = None # the writer thread
+        self.parts_in_writing = {} # parts passed to the writer but not yet written, offset: length
+        self.stream_window = 0 # how far ahead of data written to a stream tasks could be given, in bytes
+        self.max_memory = 0 # memory budget for data of blocks in bytes, 0 - unlimited
+        self.peak_buffered = 0 # max size of data of blocks kept in memory at once
+        self.slots = None # connection slots shared with other managers, None - connections are not limited
+        self.slot_mirrors = set() # names of mirrors holding a connection slot
+        self.small_file = 0 # files not larger are received by one request from one mirror, 0 - always split
+        self.probe = None # a name of the mirror requesting the whole file, other mirrors wait its answer
+        self.whole_file = False # the file has been received by one request, the context is not needed
+        self.mirror_events = None # a callable receiving events of mirrors (name, event, value), None - not reported
+        self.processes = 0 # count of worker processes running threads of mirrors, 0 - threads run in this process
+        self.workers = [] # worker processes
+        self.next_worker = 0 # mirrors are given to worker processes in turn
+        self.shared = False # other processes could download the file too, parts are claimed from the context
+        self.synced_bytes = 0 # written bytes count of all processes at the last synchronization
+        self.coordinator = None # accepts workers of other nodes, None - blocks are downloaded only here
+        self.remote_workers = [] # workers of other nodes
+        self.remote_mirrors = {} # workers running remote mirrors, names of mirrors are keys
+        self.shared_storage = False # remote workers write data to the file themselves
+        self.cache = None # the cache of downloaded files, None - files are not cached
+        self.cached = False # the file has been copied from the cache
+        self.validators = {} # ETag and Last-Modified of the file on mirrors, names of mirrors are keys
+        self.resumed_size = 0 # the size of the file when parts have been downloaded before, 0 - unknown
+        self.confirmed = True # parts downloaded before belong to the file on the servers
+        self.stale_parts = set() # parts of the changed file being downloaded, their results are dropped
+        self.origins = {} # links redirected mirrors have been created from, names of mirrors are keys
+        self.warm = {} # mirrors downloading without requesting the header, their links are values
+        self.seed = None # an older version of the file, pieces found in it are copied, None - everything is downloaded
+        self.repair = False # the existing file is checked, only corrupted blocks are downloaded
+        self.stats = None # performance of mirrors kept between sessions, None - it's not kept
+        self.records = {} # performance of mirrors measured before, names of mirrors are keys
+        self.measurements = {} # performance of mirrors in this session, names of mirrors are keys
+        self.task_started = {} # times of giving tasks and times to the first byte, names of mirrors are keys
+        self.retries = 0 # transient errors in a row after that the mirror is deleted, 0 - deleted at the first error
+        self.retry_delay = 0 # the delay before the first retry in seconds, each next delay is doubled
+        self.max_retry_delay = 0 # the longest delay before a retry in seconds
+        self.failures = {} # counts of transient errors in a row, names of mirrors are keys
+        self.retry_times = {} # times mirrors waiting after errors could connect again, names of mirrors are keys
+        self.streams = 0 # max count of parts downloaded at once, 0 - all mirrors download
+        self.max_streams = 0 # the limit of the count chosen by the tuner, 0 - count of mirrors
+        self.tuner = None # chooses count of parallel streams by the throughput, None - the count is fixed
 
     def prepare(self, console, command_line, outfile):
 
@@ -94,20 +169,280 @@ class Manager(IManager):
         self.outfile = outfile
         self.block_size = command_line.block_size
         self.timeout = command_line.timeout
+        self.checkpoint_interval = command_line.checkpoint_interval
+        self.checkpoint_bytes = command_line.checkpoint_bytes
+        self.checksum = command_line.checksum
+        self.piece_hashes = command_line.piece_hashes
+        self.max_strikes = command_line.max_strikes
+        self.retries = command_line.retries
+        self.retry_delay = command_line.retry_delay
+        self.max_retry_delay = command_line.max_retry_delay
+        self.streams = command_line.streams
+        if command_line.auto_tune: # streams are added while the throughput grows
+            self.tuner = self._tuner()
+            self.max_streams, self.streams = self.streams, self.tuner.streams
+        self.write_behind = command_line.write_behind
+        self.stream_window = command_line.stream_window
+        self.max_memory = command_line.max_memory
+        self.small_file = command_line.small_file
+        self.processes = command_line.processes
+        if not self.outfile.seekable: # blocks are kept in the reorder buffer of the stream anyway
+            self.write_behind = 0
+            self.processes = 0 # worker processes write data to the file themselves
         self.user_path = command_line.filename
-        self.urls = command_line.urls
-        for url in self.urls:
-            self.create_mirror(url) # try to create a mirror
-        if not self.mirrors: # there are no mirrors - error
-            raise FatalError(_("There are no mirrors to download."))
-        if self.server_filename == '': # can't determine a filename
-            self.server_filename = 'out' # use the name 'out'
-        self.outfile.create_path(self.server_filename) # create a path to the file
-        self.context = self.outfile.context # save context related to the file
+        self.urls = list(command_line.urls) # links are used again for workers of other nodes
+        if command_line.stats:
+            self.stats = self._stats(command_line.stats)
+            self.records = self.stats.load([url.host for url in self.urls])
+            self.urls = self.rank_mirrors(self.urls)
+            if command_line.auto_block_size and not self.processes: # worker processes take the size at start
+                self.block_size = self.choose_block_size(self.block_size)
+        if self.piece_hashes: # each block should consist of whole pieces to verify them
+            self.block_size = self.piece_hashes.align(self.block_size)
+        self.start_workers()
+        try:
+            for url in self.urls:
+                self.create_mirror(url) # try to create a mirror
+            if not self.mirrors: # there are no mirrors - error
+                raise FatalError(_("There are no mirrors to download."))
+            if self.server_filename == '': # can't determine a filename
+                self.server_filename = 'out' # use the name 'out'
+            self.outfile.create_path(self.server_filename, self.block_size) # create a path to the file
+            self.context = self.outfile.context # save context related to the file
+            self.adopt_block_size(command_line.block_size)
+        except:
+            self.stop_workers()
+            raise
+        for worker in self.workers:
+            worker.send('open', self.outfile.fullpath) # workers write received data to the file
         self.offset = self.context.offset # get current offset from the context and continue downloading from that offset
         self.written_bytes = self.context.written_bytes # get the count of written bytes (currect progress) from the context 
         self.old_progress = self.written_bytes # save currect progress (necessary for correct calculation of download speed)
         self.failed_parts = deque(self.context.failed_parts) # load a list of failed parts from the context
+        self.validators = dict(self.context.validators) # the file on mirrors is compared with these
+        self.resumed_size = self.context.file_size
+        self.confirmed = self.context.clean # nothing has been downloaded before, nothing could be invalid
+        self.shared = self.context.shared and self.outfile.seekable
+        if self.shared: # failed parts are claimed from the context one by one
+            self.failed_parts = deque()
+            self.synced_bytes = self.written_bytes
+        self.checkpoint_time = self.time # the context is just loaded, so it's actual
+        self.checkpoint_written = self.written_bytes
+        if command_line.cache and self.outfile.seekable:
+            self.cache = self._cache(command_line.cache, command_line.cache_size)
+            if self.copy_cached(command_line.file_size, {}): # validators are not received yet, the file is found by its checksum only
+                return
+        if command_line.seed_file and self.piece_hashes and self.outfile.seekable: # pieces are found by their hashes
+            self.seed = self._seed(command_line.seed_file)
+        self.repair = command_line.repair and bool(self.piece_hashes) and self.outfile.seekable
+        # the size is known in advance (e.g. from a metalink) or from the previous session
+        file_size = command_line.file_size or self.warm_up(command_line.file_size)
+        if file_size:
+            self.allocate(file_size) # allocate the file before connecting to mirrors
+        self.choose_probe(file_size)
+        if command_line.coordinate: # workers of other nodes could join downloading
+            self.shared_storage = command_line.shared_storage and self.outfile.seekable
+            self.coordinator = self._coordinator(command_line.coordinate, command_line.secret, self.block_size, self.timeout)
+
+    def rank_mirrors(self, urls):
+
+        """
+        Orders links by performance of their hosts measured before:
+        fast mirrors connect first, mirrors unknown yet follow them,
+        mirrors not supporting ranges are the last. Mirrors failing
+        recently are skipped unless all mirrors fail.
+
+        :urls: links to the file, type list <URL>
+        :return: ordered links, type list <URL>
+
+        """
+        reliable = [url for url in urls if url.host not in self.records or not self.records[url.host].flaky]
+        if reliable and len(reliable) < len(urls):
+            for url in urls:
+                if url not in reliable:
+                    self.console.warning(_("mirror {} has failed recently, it will not be used.").format(url.host))
+            urls = reliable
+        def rank(url):
+            record = self.records.get(url.host)
+            if record is not None and record.ranges is False:
+                return (2, 0)
+            if record is None or not record.speed:
+                return (1, 0)
+            return (0, -record.speed)
+        return sorted(urls, key=rank)
+
+    def choose_block_size(self, block_size):
+
+        """
+        Chooses the block size by the speed of mirrors measured
+        before, so a block takes a few seconds: slow mirrors don't
+        hold large blocks, fast ones don't waste time on requests.
+
+        :block_size: the default block size, type int
+        :return: the block size, type int
+
+        """
+        speed = max((self.records[url.host].speed for url in self.urls if url.host in self.records), default=0)
+        if not speed: # nothing is known about mirrors
+            return block_size
+        block_size = int(speed * self.BLOCK_TIME) // 2**16 * 2**16
+        return min(max(block_size, self.MIN_CHOSEN_BLOCK), self.MAX_CHOSEN_BLOCK)
+
+    def adopt_block_size(self, block_size):
+
+        """
+        Parts of the file are counted by blocks of the session that
+        has started downloading it, so other processes and later
+        sessions use the same block size.
+
+        :block_size: the block size given in the command line, type int
+
+        """
+        if self.context.block_size:
+            block_size = self.context.block_size
+        elif self.context.clean: # the file is new, the block size of this session is saved
+            return
+        elif self.piece_hashes: # the context has been saved by an old version, blocks had the given size
+            block_size = self.piece_hashes.align(block_size)
+        if block_size == self.block_size:
+            return
+        if self.workers: # worker processes have already taken the block size
+            raise FatalError(_("the file is downloaded by blocks of {0} bytes, specify block size {0}.").format(block_size))
+        self.block_size = block_size
+        for mirror in self.mirrors.values():
+            mirror.block_size = block_size
+
+    def copy_cached(self, file_size, validators):
+
+        """
+        Copies the file from the cache if it has been downloaded
+        before, downloading is complete then.
+
+        :file_size: the size of the file, 0 - unknown, only the checksum is looked up, type int
+        :validators: ETag and Last-Modified of the file just received from mirrors, names of mirrors are keys, type dict
+        :return: True if the file has been copied, type bool
+
+        """
+        if not self.cache:
+            return False
+        path = self.cache.lookup(self.cache.keys(self.checksum, self.urls, file_size, validators))
+        if path is None:
+            return False
+        self.file_size = self.outfile.copy_from(path)
+        self.offset = self.written_bytes = self.file_size
+        self.whole_file = True # the context is not needed
+        self.cached = True
+        self.console.message(_("\nFile {} {} bytes ({}) has been copied from the cache").format(self.outfile.filename, self.file_size, calc_size(self.file_size)))
+        return True
+
+    def update_cache(self):
+
+        """
+        Keeps the downloaded file in the cache and
+        reports how often files are copied from it.
+
+        """
+        if not self.cache:
+            return
+        if not self.cached:
+            self.cache.store(self.cache.keys(self.checksum, self.urls, self.file_size, self.validators), self.outfile.fullpath)
+        hits, total = self.cache.record(self.cached)
+        self.console.message(_("Cache hit rate {}% ({} of {} files)").format(hits * 100 // total, hits, total))
+
+    def warm_up(self, file_size):
+
+        """
+        Lets mirrors download parts at once when downloading is resumed:
+        the size of the file, its validators and capabilities of links
+        are known from the previous session, so headers are not requested.
+        Parts are requested with If-Range, so a changed file is noticed
+        by the first response. A mirror failing its first part connects
+        as usual.
+
+        :file_size: the size of the file if it's known in advance, type int
+        :return: the size of the file if any mirror downloads at once, otherwise 0, type int
+
+        """
+        if self.context.clean or not self.context.file_size or not self.outfile.seekable:
+            return 0
+        if file_size and file_size != self.context.file_size: # the size in advance is checked by headers
+            return 0
+        for name, mirror in list(self.mirrors.items()):
+            link = mirror.url
+            target, flags = self.context.links.get(link.url, ('', 0))
+            if not flags & Context.RANGES: # the link is unknown
+                continue
+            if target: # go to the address the link has been redirected to
+                url = URL(target)
+                url.location = link.location
+                url.max_connections = link.max_connections
+                self.delete_mirror(name)
+                self.create_mirror(url)
+                mirror = self.mirrors.get(url.host)
+                if mirror is None:
+                    continue
+                self.origins[mirror.name] = link
+            self.warm[mirror.name] = link
+            mirror.file_size = self.context.file_size
+            mirror.validator = self.validators.get(mirror.name)
+            mirror.need_connect = False
+            mirror.ready = True
+        return self.context.file_size if self.warm else 0
+
+    def warmed(self, name):
+
+        """
+        Reports the mirror downloading without the header
+        as connected when it has downloaded the first part.
+
+        :name: a name of the mirror, type str
+
+        """
+        if self.warm.pop(name, None) is None:
+            return
+        self.mirror_event(name, 'connected', self.file_size)
+        self.mirrors[name].connect_message(self.console)
+
+    def remember_link(self, name):
+
+        """
+        Saves to the context that the link of the mirror supports
+        ranges and where it has been redirected, so the mirror
+        doesn't request the header in the next session.
+
+        :name: a name of the mirror, type str
+
+        """
+        if self.whole_file or not self.outfile.seekable:
+            return
+        mirror = self.mirrors[name]
+        if mirror.url.protocol == 'ftp': # FTP mirrors connect for each part anyway
+            return
+        link = self.origins.get(name, mirror.url)
+        target = mirror.url.url if link.url != mirror.url.url else ''
+        if self.context.links.get(link.url) != (target, Context.RANGES):
+            self.context.remember(self.file_size, {}, {link.url: (target, Context.RANGES)})
+
+    def choose_probe(self, file_size):
+
+        """
+        Chooses the first mirror that could receive a small file by one
+        request. Other mirrors don't connect until it's known that the
+        file is larger, so a small file costs a single request.
+
+        :file_size: the size of the file if it's known in advance, type int
+
+        """
+        if not self.small_file or file_size > self.small_file:
+            return
+        if self.piece_hashes: # pieces are verified by blocks
+            return
+        if self.offset or self.failed_parts: # the file has been partially downloaded before
+            return
+        for name, mirror in self.mirrors.items():
+            if mirror.fetches_small_files:
+                self.probe = name
+                return
 
     def create_mirror(self, url):
 
@@ -118,11 +453,49 @@ class Manager(IManager):
         :url: the URL object describes the download link, type URL
 
         """
-        mirror = self._mirror.create(url, self.block_size, self.timeout)
+        if self.workers: # threads of mirrors run in worker processes in turn
+            worker = self.workers[self.next_worker % len(self.workers)]
+            self.next_worker += 1
+            mirror = self._process_mirror(url, self.block_size, self.timeout, worker)
+        else:
+            mirror = self._mirror.create(url, self.block_size, self.timeout)
+        mirror.data_queue = self.data_queue # threads of the mirror report to this manager
         # compare filename on this server with other ones
         if self.check_filename(mirror):
             self.mirrors[url.host] = mirror # add the mirror to the list
 
+    def accept_workers(self):
+
+        """
+        Adds workers of other nodes accepted by the coordinator.
+        Each of them runs its own mirror of every link.
+
+        """
+        if not self.coordinator:
+            return
+        for worker in self.coordinator.accepted():
+            worker.start()
+            if self.shared_storage: # the path should be the same on all nodes
+                worker.send('open', os.path.abspath(self.outfile.fullpath))
+            self.remote_workers.append(worker)
+            for url in self.urls:
+                self.create_remote_mirror(url, worker)
+            self.console.message(_("Worker {} has joined downloading").format(worker.name))
+
+    def create_remote_mirror(self, url, worker):
+
+        """
+        Creates a mirror running on another node.
+
+        :url: the URL object describes the download link, type URL
+        :worker: the worker of the node, type RemoteWorker
+
+        """
+        mirror = self._remote_mirror(url, self.block_size, self.timeout, worker)
+        mirror.data_queue = self.data_queue
+        self.mirrors[mirror.name] = mirror
+        self.remote_mirrors[mirror.name] = worker
+
     def check_filename(self, mirror):
 
         """
@@ -153,11 +526,47 @@ class Manager(IManager):
 
         """
         for name, mirror in self.mirrors.items():
+            if self.probe and name != self.probe: # wait until the file turns out to be large
+                continue
             if mirror.wait_connection(): # threads of the mirror are not running
+                self.release_slot(name) # the connection is idle
                 if mirror.ready: # check the mirror is ready to take a task
-                    self.give_task(mirror) # give a task
-                elif mirror.need_connect: # check the mirror needs a connection
-                    mirror.connect() # start a connection
+                    if self.take_slot(name) and not self.give_task(mirror): # give a task
+                        self.release_slot(name) # there is no task for the mirror
+                elif mirror.need_connect and self.retry_times.get(name, 0) <= self.time: # the mirror needs a connection
+                    if self.take_slot(name):
+                        self.retry_times.pop(name, None) # the first attempt after the delay probes the mirror
+                        # start a connection, the probing mirror requests the whole file at once
+                        mirror.connect(self.small_file if name == self.probe else 0)
+
+    def take_slot(self, name):
+
+        """
+        Takes a connection slot for the mirror if connections
+        are limited for several managers.
+
+        :name: a name of the mirror, type str
+        :return: True if the mirror could start a thread, type bool
+
+        """
+        if self.slots is None or name in self.slot_mirrors:
+            return True
+        if not self.slots.acquire():
+            return False
+        self.slot_mirrors.add(name)
+        return True
+
+    def release_slot(self, name):
+
+        """
+        Returns the connection slot of the mirror.
+
+        :name: a name of the mirror, type str
+
+        """
+        if name in self.slot_mirrors:
+            self.slot_mirrors.remove(name)
+            self.slots.release()
 
     def give_task(self, mirror):
 
@@ -165,16 +574,98 @@ class Manager(IManager):
         Gives a task to the mirror.
 
         :mirror: the mirror object, type Mirror
+        :return: True if the task has been given, type bool
 
         """
-        if self.failed_parts: # there is failed task
-            failed_offset = self.failed_parts.popleft() # get the offset of that task
+        if not self.memory_available(): # wait until written data free the memory
+            return False
+        if self.streams and len(self.parts_in_progress) >= self.streams: # enough parts are downloaded at once
+            return False
+        failed_offset = self.take_failed_part(mirror)
+        if failed_offset is None and self.shared: # take a part no process is downloading
+            failed_offset = self.context.claim(self.block_size, self.file_size)
+        if failed_offset is not None: # there is failed task
             mirror.download(failed_offset) # start download the part
             self.parts_in_progress.append(failed_offset) # add the offset to the list of active parts
-        elif self.offset < self.file_size or self.file_size == 0: # the file is not complete
+        elif self.shared: # other processes download the rest of the file
+            return False
+        elif (self.offset < self.file_size or self.file_size == 0) and self.in_window(): # the file is not complete
             mirror.download(self.offset) # start download from current offset
             self.parts_in_progress.append(self.offset) # add the offset to the list of active parts
             self.offset += self.block_size # increase current offset
+        else:
+            return False
+        self.task_started[mirror.name] = (self.time, None)
+        self.state_changed = True
+        if self.max_memory: # the memory is watched only when it's limited
+            self.peak_buffered = max(self.peak_buffered, self.buffered_bytes())
+        return True
+
+    def buffered_bytes(self):
+
+        """
+        Calculates memory used for data of blocks: a whole block
+        is reserved for each active task until its data are written,
+        data waiting in the writer thread and in the reorder
+        buffer of a stream are added.
+
+        :return: size of data in bytes, type int
+
+        """
+        buffered = len(self.parts_in_progress) * self.block_size
+        if self.writer:
+            buffered += self.writer.queued_bytes
+        return buffered + self.outfile.buffered_bytes
+
+    def memory_available(self):
+
+        """
+        Checks that one more block fits into the memory budget.
+        A task is given anyway if nothing is buffered, otherwise
+        downloading would stop when a block is larger than the budget.
+
+        :return: True if a task could be given, type bool
+
+        """
+        if not self.max_memory:
+            return True
+        buffered = self.buffered_bytes()
+        return buffered == 0 or buffered + self.block_size <= self.max_memory
+
+    def in_window(self):
+
+        """
+        Checks that the next part is not too far ahead of data
+        written to a stream, so the reorder buffer is bounded.
+        Parts of a seekable file could be downloaded in any order.
+
+        :return: True if a task could be given from the current offset, type bool
+
+        """
+        if self.outfile.seekable:
+            return True
+        return self.offset < self.outfile.frontier + max(self.stream_window, self.block_size)
+
+    def take_failed_part(self, mirror):
+
+        """
+        Takes a failed part from the queue. Parts which data has been
+        corrupted by the mirror are left for other mirrors, but if
+        there are no such mirrors the part could be given to this one.
+
+        :mirror: the mirror object, type Mirror
+        :return: the offset of the part or None if there is no suitable part
+
+        """
+        for offset in self.failed_parts:
+            excluded = self.part_exclusions.get(offset, ())
+            if mirror.name in excluded:
+                # check other mirrors that could download the part
+                if any(name not in excluded for name in self.mirrors if name != mirror.name):
+                    continue
+            self.failed_parts.remove(offset)
+            return offset
+        return None
 
     def keep_download(self):
 
@@ -192,10 +683,28 @@ class Manager(IManager):
         """
         Downloads the file.
 
+        """
+        steps = self.steps()
+        try:
+            for step in steps:
+                pass
+        except KeyboardInterrupt: # interrupted between steps
+            steps.throw(KeyboardInterrupt) # cancel downloading inside the generator
+
+    def steps(self):
+
+        """
+        Downloads the file step by step. Each step waits mirrors
+        and processes received results. It allows to download
+        several files in one thread.
+
         """
         with self.outfile: # open output file
             try:
+                self.start_writer()
                 while self.keep_download(): # downloading is not complete
+                    yield # let other downloads do their steps
+                    self.accept_workers() # workers of other nodes could join at any time
                     self.wait_connections() # wait mirrors (connections, giving tasks)
                     while True:
                         try:
@@ -205,25 +714,189 @@ class Manager(IManager):
                                 # process given result from the mirror
                                 task_info.process(self)
                             finally:
-                                needle_parts = self.parts_in_progress.copy() # save non-completed parts
-                                needle_parts.extend(self.failed_parts) # add failed parts
-                                self.context.update(self.offset, self.written_bytes, needle_parts) # save the context
+                                self.collect_written() # take parts written by the writer thread
+                                self.checkpoint() # save the context if it's time to do that
                         except queue.Empty: # if the queue is empty
                             # it meats that there is nothing to do
                             # and we need to wait mirrors or give a new task
                             break # quit the loop (go to waiting mirrors)
+                    self.collect_written()
+                    if self.shared: # see progress of other processes
+                        self.checkpoint()
+                    # wait while other processes download the rest or mirrors wait to retry
+                    if not self.parts_in_progress and (self.shared or self.retry_times):
+                        time.sleep(0.01)
+                self.stop_writer() # write the rest of data
+                self.verify_checksum() # all data are written, check the file
+                if self.max_memory:
+                    self.console.message(_("\nPeak memory for data of blocks {} of {}").format(calc_size(self.peak_buffered), calc_size(self.max_memory)))
+                if self.tuner and not self.tuner.settled: # downloading is over before the count has been settled
+                    self.report_tuning()
             except KeyboardInterrupt: # user interrupted process
                 # cancel all active threads
                 for mirror in self.mirrors.values():
                     mirror.cancel()
                 raise CancelError(_("Operation has been cancelled by user."))
             finally:
+                if self.coordinator: # don't accept new workers
+                    self.coordinator.close()
                 # loop for shut down the program
                 for mirror in self.mirrors.values():
                     mirror.join() # wait threads
                     mirror.close() # close connection
-                self.console.message() # print empty string to console
+                self.stop_workers()
+                try:
+                    self.stop_writer() # data accepted from mirrors should be written before saving the context
+                finally:
+                    self.checkpoint(True) # save the last state of downloading regardless of the interval
+                    self.save_stats()
+                    self.console.message() # print empty string to console
         self.context.delete() # remove the context file
+        self.update_cache()
+
+    def start_workers(self):
+
+        """
+        Starts worker processes if mirrors should run in them.
+
+        """
+        for i in range(self.processes):
+            worker = self._worker_process(self.block_size, self.timeout)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop_workers(self):
+
+        """
+        Stops worker processes, their mirrors should be closed before.
+
+        """
+        for worker in self.workers + self.remote_workers:
+            worker.stop()
+        self.workers = []
+        self.remote_workers = []
+
+    def start_writer(self):
+
+        """
+        Starts the writer thread if writing behind is enabled.
+
+        """
+        if self.write_behind:
+            self.writer = self._writer(self.outfile, self.write_behind)
+            self.writer.start()
+
+    def stop_writer(self):
+
+        """
+        Waits the writer thread writes the rest of the queue
+        and processes the parts written.
+
+        """
+        if not self.writer:
+            return
+        self.writer.close()
+        try:
+            self.collect_written()
+        finally:
+            self.writer = None
+
+    def collect_written(self):
+
+        """
+        Processes parts written by the writer thread since the last call.
+
+        """
+        if not self.writer:
+            return
+        for offset, length in self.writer.take_written():
+            del self.parts_in_writing[offset]
+            self.state_changed = True
+            self.data_written(offset, length)
+        if self.writer.error: # unwritten parts stay in the context and will be downloaded again
+            raise self.writer.error
+
+    def verify_checksum(self):
+
+        """
+        Compares the checksum of the downloaded file with
+        specified one. Only the part of the file that has not
+        been hashed during downloading is read.
+
+        """
+        if not self.checksum: # the checksum is not specified
+            return
+        self.checksum.finish(self.outfile.read, self.file_size) # hash the rest of the file
+        if not self.checksum.verify():
+            self.state_changed = False # downloading is complete, there is nothing to save
+            self.context.delete() # remove the context file, all parts have been downloaded
+            raise FatalError(_("checksum of the file {} does not match. The file is corrupted.").format(self.outfile.filename))
+        self.console.message(_("\nChecksum {} OK").format(self.checksum.algorithm))
+
+    def checkpoint_due(self):
+
+        """
+        Checks whether it's time to save the context.
+
+        :return: True if the interval since the last saving is over, type bool
+
+        """
+        if self.checkpoint_bytes: # the interval is specified in bytes
+            return self.written_bytes - self.checkpoint_written >= self.checkpoint_bytes
+        return self.time - self.checkpoint_time >= self.checkpoint_interval
+
+    def checkpoint(self, force=False):
+
+        """
+        Saves the context if the state of downloading has changed
+        since the last saving and the checkpoint interval is over.
+        State changes made within the interval are saved together.
+
+        :force: save the context regardless of the interval, type bool
+
+        """
+        if self.shared and not self.whole_file:
+            self.synchronize(force)
+            return
+        if not self.state_changed or self.whole_file: # nothing to save
+            return
+        if not force and not self.checkpoint_due(): # too early
+            return
+        needle_parts = self.parts_in_progress.copy() # save non-completed parts
+        needle_parts.extend(self.failed_parts) # add failed parts
+        needle_parts.extend(self.parts_in_writing) # parts not yet written by the writer thread
+        written_bytes = self.written_bytes - sum(self.parts_in_writing.values())
+        self.context.update(self.offset, written_bytes, needle_parts) # save the context
+        self.state_changed = False
+        self.checkpoint_time = self.time
+        self.checkpoint_written = self.written_bytes
+
+    def synchronize(self, final=False):
+
+        """
+        Adds data written by this process to the shared context and
+        takes progress of other processes. Besides checkpoints, the
+        context is read every SYNC_INTERVAL seconds, so the end of
+        downloading is noticed when other processes write the rest.
+
+        :final: downloading is over, parts not written by this process
+                are returned to the context for other processes, type bool
+
+        """
+        due = self.state_changed and self.checkpoint_due()
+        if not final and not due and self.time - self.checkpoint_time < self.SYNC_INTERVAL:
+            return
+        self.outfile.flush() # other processes could read data written by this one
+        in_writing = sum(self.parts_in_writing.values())
+        leased_parts = self.parts_in_progress + list(self.failed_parts) + list(self.parts_in_writing)
+        written_bytes = self.context.sync(self.written_bytes - in_writing - self.synced_bytes, leased_parts, final)
+        if written_bytes is None: # the process that wrote the last part has deleted the context
+            written_bytes = self.file_size
+        self.synced_bytes = written_bytes
+        self.written_bytes = written_bytes + in_writing
+        self.state_changed = False
+        self.checkpoint_time = self.time
+        self.checkpoint_written = self.written_bytes
 
     def del_active_part(self, offset):
 
@@ -234,17 +907,59 @@ class Manager(IManager):
 
         """
         self.parts_in_progress.remove(offset)
+        self.state_changed = True
 
-    def add_failed_part(self, offset):
+    def add_failed_part(self, offset, received=b''):
 
         """
-        Adds failed task in the list.
+        Adds failed task in the list. Data received before the
+        error are written, so only the rest of the part is added.
+        A failed part runs from its offset to the end of its block.
 
         :offset: an offset of the part, type int
+        :received: data of the part received before the error, type bytes
 
         """
         self.del_active_part(offset) # failed task is inactive
-        self.failed_parts.append(offset)
+        if received:
+            offset = self.salvage(offset, received)
+        if offset is not None: # the rest of the part is downloaded again
+            self.failed_parts.append(offset)
+        self.state_changed = True
+
+    def part_end(self, offset):
+
+        """
+        :offset: an offset of the part, type int
+        :return: the end of the block containing the part, type int
+
+        """
+        end = (offset // self.block_size + 1) * self.block_size
+        return min(end, self.file_size) if self.file_size else end
+
+    def salvage(self, offset, received):
+
+        """
+        Writes data of the failed part received before the error,
+        so a part failed near its end is not downloaded whole again.
+        If pieces are verified, only whole pieces are kept.
+
+        :offset: an offset of the part, type int
+        :received: data received before the error, type bytes
+        :return: the offset of the rest of the part or None if the part is complete, type int
+
+        """
+        end = self.part_end(offset)
+        length = min(len(received), end - offset)
+        if self.piece_hashes and offset + length < self.file_size: # the rest of a piece is dropped
+            length -= (offset + length) % self.piece_hashes.length
+        if length <= 0:
+            return offset
+        data = received[:length]
+        if self.piece_hashes and not self.piece_hashes.verify(offset, data): # the whole part is downloaded again
+            return offset
+        self.store(offset, data)
+        return offset + length if offset + length < end else None
 
     def delete_mirror(self, name):
 
@@ -257,8 +972,150 @@ class Manager(IManager):
         mirror = self.mirrors[name]
         mirror.join()
         del self.mirrors[name]
+        self.remote_mirrors.pop(name, None)
+        self.failures.pop(name, None)
+        self.retry_times.pop(name, None)
+        self.mirror_event(name, 'deleted')
+        self.release_slot(name)
+        if name == self.probe: # other mirrors could connect now
+            self.probe = None
 
-    def set_file_size(self, name, file_size):
+    def allocate(self, file_size):
+
+        """
+        Saves the size of the file and allocates a space on HDD.
+
+        :file_size: a size of the file, type int
+
+        """
+        self.file_size = file_size
+        if self.piece_hashes:
+            try:
+                self.piece_hashes.set_file_size(file_size)
+            except ValueError:
+                raise FatalError(_("piece hashes do not match the file: {} pieces of {} bytes do not cover {} bytes.").format(len(self.piece_hashes.digests), self.piece_hashes.length, file_size))
+        if not self.outfile.seekable or self.whole_file: # a stream is written sequentially, a small file at once
+            pass
+        elif self.written_bytes == 0 and self.repair: # the file has been downloaded, but it's corrupted
+            self.repair_file()
+        elif self.written_bytes == 0: # the file is new, otherwise it already has full size
+            if not self.shared or self.outfile.size() < self.file_size: # another process could have allocated it
+                self.outfile.seek(self.file_size - 1) # seek to last byte
+                self.outfile.write(b'\x00') # write zero
+                if self.workers or self.shared or self.coordinator: # other processes write the file by their own descriptors
+                    self.outfile.flush()
+            if self.seed:
+                self.copy_seeded()
+        else: # the file has been partially downloaded in previous sessions
+            if self.checksum: # hash data written in previous sessions
+                self.checksum.resume(self.outfile.read, self.written_ranges())
+            if self.piece_hashes: # pieces partially written before can't be verified
+                unaligned = self.piece_hashes.unaligned(self.written_ranges())
+                if unaligned:
+                    self.console.warning(_("{} pieces crossing edges of data downloaded before can't be verified.").format(unaligned))
+            for offset, length in self.written_ranges():
+                self.outfile.release(offset, length)
+        self.console.create_progressbar(self.file_size, self.old_progress)
+        downloading_msg = _("\nDownloading file {} {} bytes ({}):\n").format(self.outfile.filename, self.file_size, calc_size(self.file_size))
+        self.console.message(downloading_msg)
+
+    def copy_seeded(self):
+
+        """
+        Copies blocks of the new file found in the seed file,
+        only other blocks are given to mirrors. A block is copied
+        if all its pieces have been found, pieces are checked by
+        their hashes, so copied data don't need downloading.
+
+        """
+        found = self.seed.match(self.piece_hashes)
+        length = self.piece_hashes.length
+        failed_parts = []
+        copied = 0
+        for offset in range(0, self.file_size, self.block_size):
+            size = min(self.block_size, self.file_size - offset)
+            pieces = range(offset // length, (offset + size - 1) // length + 1)
+            if not all(index in found for index in pieces):
+                failed_parts.append(offset)
+                continue
+            for index in pieces:
+                start, piece_size = self.piece_hashes.piece_range(index)
+                self.outfile.seek(start)
+                self.outfile.write(self.seed.read(found[index], piece_size))
+            copied += size
+        self.seed.close()
+        if not copied:
+            return
+        self.outfile.flush() # other processes could read the copied data
+        if self.keep_written(failed_parts):
+            self.console.message(_("\n{} of {} bytes ({}) have been copied from seed file {}").format(copied, self.file_size, calc_size(copied), self.seed.path))
+
+    def repair_file(self):
+
+        """
+        Checks pieces of the existing file by their hashes,
+        only blocks containing corrupted pieces are downloaded.
+
+        """
+        if self.outfile.size() != self.file_size: # the file has been cut or it's larger
+            self.outfile.truncate(self.file_size)
+        self.console.message(_("\nChecking file {}...").format(self.outfile.filename))
+        corrupted = self.piece_hashes.mismatched(self.outfile.read)
+        length = self.piece_hashes.length
+        failed_parts = sorted({index * length // self.block_size * self.block_size for index in corrupted})
+        if self.keep_written(failed_parts):
+            self.console.message(_("{} of {} pieces are corrupted, {} blocks will be downloaded again").format(len(corrupted), len(self.piece_hashes.digests), len(failed_parts)))
+
+    def keep_written(self, failed_parts):
+
+        """
+        Marks all blocks of the file except failed parts as
+        written, e.g. blocks copied from the seed file.
+
+        :failed_parts: offsets of blocks to download, type list <int>
+        :return: False if another process has started downloading,
+                 all blocks are downloaded as usual then, type bool
+
+        """
+        offset = -(-self.file_size // self.block_size) * self.block_size # all parts have been given
+        written_bytes = self.file_size - sum(self.part_end(part) - part for part in failed_parts)
+        if not self.context.seed(offset, written_bytes, failed_parts):
+            return False
+        self.offset = offset
+        self.written_bytes = self.old_progress = self.checkpoint_written = written_bytes
+        if self.shared: # failed parts are claimed from the context
+            self.synced_bytes = written_bytes
+        else:
+            self.failed_parts = deque(failed_parts)
+        if self.checksum: # hash the written data
+            self.checksum.resume(self.outfile.read, self.written_ranges())
+        return True
+
+    def written_ranges(self):
+
+        """
+        Calculates parts of the file written in previous sessions:
+        everything before the current offset except needle parts.
+        Parts not yet written by other processes are needle too.
+
+        :return: a list of tuples (offset, length)
+
+        """
+        ranges = []
+        start = 0
+        offset, needle_parts = self.offset, self.failed_parts
+        if self.shared:
+            offset, needle_parts = self.context.offset, self.context.needle_parts()
+        end = min(offset, self.file_size)
+        for offset in sorted(needle_parts):
+            if offset > start:
+                ranges.append((start, min(offset, end) - start))
+            start = max(start, self.part_end(offset))
+        if end > start:
+            ranges.append((start, end - start))
+        return [(offset, length) for offset, length in ranges if length > 0]
+
+    def set_file_size(self, name, file_size, validator=('', '')):
 
         """
         Set the size of the file at first call and allocate
@@ -267,25 +1124,179 @@ class Manager(IManager):
 
         :name: a name of the mirror that sent a TaskInfo object, type str
         :file_size: a size of the file received from the mirror, type int
+        :validator: ETag and Last-Modified of the file, empty if unknown, type tuple (str, str)
 
         """
+        if not self.check_validator(name, file_size, validator): # the file has been changed on the mirror
+            return
         if self.file_size == 0: # first call (the filesize is not yet known)
-            self.file_size = file_size
-            self.console.create_progressbar(self.file_size, self.old_progress)
-            self.outfile.seek(self.file_size - 1) # seek to last byte
-            self.outfile.write(b'\x00') # write zero
-            downloading_msg = _("\nDownloading file {} {} bytes ({}):\n").format(self.outfile.filename, self.file_size, calc_size(self.file_size))
-            self.console.message(downloading_msg)
+            if not self.whole_file and self.copy_cached(file_size, {name: validator}): # the same file has been downloaded before
+                return
+            self.allocate(file_size)
         elif self.file_size != file_size: # call is not the first and the size differs
             # the file is broken or it's another file
             self.console.error(_("size of the file on the server {} {} bytes differs with received before {} bytes.").format(name, file_size, self.file_size))
             self.delete_mirror(name) # delete the mirror
             return
+        if name == self.probe: # the file is large, other mirrors could connect now
+            self.probe = None
+        self.remember_validator(name, file_size, validator)
         mirror = self.mirrors[name]
         mirror.file_size = file_size # save the filename in the mirror
+        mirror.validator = self.validators.get(name) # parts are requested only from this file
         mirror.ready = True # mark the mirror as ready to download a part
+        self.mirror_event(name, 'connected', file_size)
         mirror.connect_message(self.console) # print connection message
 
+    def compare_file(self, name, file_size, validator):
+
+        """
+        Compares the file on the mirror with the file which parts
+        have been downloaded: ETags are compared if both are known,
+        otherwise Last-Modified are compared.
+
+        :name: a name of the mirror, type str
+        :file_size: the size of the file on the mirror, type int
+        :validator: ETag and Last-Modified of the file, type tuple (str, str)
+        :return: True if the file has been changed, False if it's the same file,
+                 None if it's unknown, type bool
+
+        """
+        if self.resumed_size and file_size != self.resumed_size:
+            return True
+        known = self.validators.get(name)
+        if not known:
+            return None
+        for new, old in zip(validator, known):
+            if new and old:
+                return new != old
+        return None
+
+    def check_validator(self, name, file_size, validator):
+
+        """
+        Checks the file on the mirror has not been changed since parts
+        were downloaded. If it has been changed before anything is
+        downloaded in this session, downloading starts again, otherwise
+        only the mirror is deleted and other mirrors go on.
+
+        :name: a name of the mirror, type str
+        :file_size: the size of the file on the mirror, type int
+        :validator: ETag and Last-Modified of the file, type tuple (str, str)
+        :return: True if the mirror could be used, type bool
+
+        """
+        changed = self.compare_file(name, file_size, validator)
+        if changed is False: # parts downloaded before are valid
+            self.confirmed = True
+        if not changed or (not self.confirmed and self.restart(name, file_size, validator)):
+            return True
+        self.mirror_event(name, 'changed')
+        self.console.error(_("the file on the server {} has been changed, the mirror will not be used.").format(name))
+        self.delete_mirror(name)
+        if not self.mirrors: # if no mirror remains
+            # downloading impossible, quit program
+            raise FatalError(_("unable to download the file."))
+        return False
+
+    def remember_validator(self, name, file_size, validator):
+
+        """
+        Saves the size of the file and its validators on the mirror to
+        the context, so the next session could check them.
+
+        :name: a name of the mirror, type str
+        :file_size: the size of the file on the mirror, type int
+        :validator: ETag and Last-Modified of the file, type tuple (str, str)
+
+        """
+        validators = {name: validator} if any(validator) and self.validators.get(name) != validator else {}
+        self.validators.update(validators) # the file is kept in the cache by them
+        if self.whole_file: # the context is not needed
+            return
+        if validators or self.context.file_size != file_size:
+            self.context.remember(file_size, validators)
+
+    def restart(self, name, file_size, validator):
+
+        """
+        Forgets parts downloaded before, the file has been changed on
+        the server. Results of parts being downloaded are dropped.
+
+        :name: a name of the mirror, type str
+        :file_size: the size of the new file, type int
+        :validator: ETag and Last-Modified of the new file, type tuple (str, str)
+        :return: False if other processes are downloading the file, so it can't be restarted, type bool
+
+        """
+        validators = {name: validator} if any(validator) else {}
+        if not self.context.restart(file_size, validators):
+            return False
+        self.console.warning(_("the file on the server {} has been changed since the previous session, downloading starts again.").format(name))
+        self.stale_parts.update(self.parts_in_progress)
+        self.parts_in_progress = []
+        self.failed_parts = deque()
+        self.part_exclusions = {}
+        self.offset = 0
+        self.written_bytes = 0
+        self.old_progress = 0
+        self.synced_bytes = 0
+        self.checkpoint_written = 0
+        self.validators = validators
+        self.resumed_size = 0
+        self.confirmed = True
+        if self.checksum:
+            self.checksum.reset()
+        if self.piece_hashes:
+            self.piece_hashes.reset()
+        if self.outfile.seekable: # data of the old file are not needed
+            self.outfile.truncate(0)
+        self.file_size = 0 # the new file is allocated again
+        return True
+
+    def stale_part(self, name, offset):
+
+        """
+        Checks the part has been requested before downloading
+        restarted, its result is dropped then.
+
+        :name: a name of the mirror that sent a TaskInfo object, type str
+        :offset: an offset of the part, type int
+        :return: True if the part is stale, type bool
+
+        """
+        if offset not in self.stale_parts:
+            return False
+        self.stale_parts.remove(offset)
+        self.mirrors[name].done() # the mirror is free
+        return True
+
+    def file_changed(self, name, offset, file_size, validator):
+
+        """
+        Executes when the mirror has sent the whole file instead of
+        the part, because the file has been changed since its
+        validators were taken.
+
+        :name: a name of the mirror that sent a TaskInfo object, type str
+        :offset: an offset of the part, type int
+        :file_size: the size of the new file, -1 - unknown, type int
+        :validator: ETag and Last-Modified of the new file, type tuple (str, str)
+
+        """
+        if not self.stale_part(name, offset):
+            self.add_failed_part(offset) # the part will be downloaded again
+        self.warm.pop(name, None) # the header is received with the new file
+        mirror = self.mirrors[name]
+        mirror.done()
+        if validator == mirror.validator: # the file is the same, but the server ignores the range
+            self.do_error(name, 200)
+        elif file_size < 0: # the new file is checked by its header
+            mirror.ready = False
+            mirror.need_connect = True
+        else:
+            self.set_file_size(name, file_size, validator)
+
     def redirect(self, name, location):
 
         """
@@ -296,30 +1307,142 @@ class Manager(IManager):
         :location: a new location of the file for redirect, type networking.URL
 
         """
+        old_url = self.mirrors[name].url
+        location.location = old_url.location # the limits of the mirror are applied to the new address
+        location.max_connections = old_url.max_connections
+        origin = self.origins.pop(name, old_url) # the link given by the user
+        probe = name == self.probe
+        worker = self.remote_mirrors.get(name)
+        self.mirror_event(name, 'redirected', location.url)
         self.delete_mirror(name)
-        self.create_mirror(location)
+        if worker is not None: # the mirror runs on another node
+            self.create_remote_mirror(location, worker)
+        else:
+            self.create_mirror(location)
+        if location.host in self.mirrors:
+            self.origins[location.host] = origin
+        if probe and location.host in self.mirrors: # the new address requests the whole file too
+            self.probe = location.host
         self.console.message(_("Redirect from mirror {} to address {}:").format(name, location.url))
 
-    def do_error(self, name, status):
+    def do_error(self, name, status, retry_after=0):
 
         """
         Executes if an error has occurred.
 
         :name: a name of the mirror that sent a TaskInfo object, type str
         :status: a status code of the error, type int
+        :retry_after: the delay asked by the server in seconds, 0 - not asked, type float
 
         """
+        link = self.warm.pop(name, None)
+        if link is not None: # the mirror has failed without the header, connect it as usual
+            self.reconnect(name, link)
+            return
+        self.mirror_event(name, 'error', status)
+        self.measure_error(name, status)
+        if self.tuner is not None: # errors could be caused by too many streams
+            self.tuner.error()
         if status == 0: # connection error
             self.console.error(_("unable to connect to the server {}").format(name))
         elif status == 200: # the mirror does not support partial downlaod
-            self.console.error(_("server {} does not support partial downloading.").fotmat(tname))
+            self.console.error(_("server {} does not support partial downloading.").format(name))
         else: # another error (probably HTTP 4xx/5xx)
             self.console.error(_("wrong server response. Code {}").format(status))
+        if self.retry(name, status, retry_after): # the error could be temporary
+            return
         self.delete_mirror(name) # delete the mirror
         if not self.mirrors: # if no mirror remains
             # downloading impossible, quit program
             raise FatalError(_("unable to download the file."))
 
+    def retry(self, name, status, retry_after=0):
+
+        """
+        Schedules a new connection of the mirror after a transient
+        error. Delays grow exponentially with the count of errors in
+        a row and are randomized, so mirrors are not hammered by all
+        clients at once. The delay asked by the server is respected.
+        The first connection after the delay probes the mirror: it
+        returns into rotation after a part is downloaded, otherwise
+        it waits longer until the count of retries is exhausted.
+
+        :name: a name of the mirror, type str
+        :status: a status code of the error, type int
+        :retry_after: the delay asked by the server in seconds, 0 - not asked, type float
+        :return: True if the mirror will be retried, False if it should be deleted, type bool
+
+        """
+        failures = self.failures.get(name, 0)
+        if status not in self.TRANSIENT_STATUSES or failures >= self.retries:
+            return False
+        if retry_after > self.max_retry_delay: # the server is unavailable for too long
+            return False
+        # jitter: the delay is randomized between a half and the whole of it
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** failures) * random.uniform(0.5, 1)
+        delay = max(delay, retry_after)
+        self.failures[name] = failures + 1
+        self.retry_times[name] = self.time + delay
+        self.console.warning(_("mirror {} will be retried in {:.1f} seconds.").format(name, delay))
+        mirror = self.mirrors[name]
+        mirror.close()
+        mirror.task_progress = 0 # the task is over, data received before the error are written
+        mirror.ready = False
+        mirror.need_connect = True
+        if name == self.probe: # other mirrors could connect meanwhile
+            self.probe = None
+        return True
+
+    def tune(self, progress):
+
+        """
+        Passes the progress to the tuner and applies the count
+        of parallel streams it has chosen. The chosen settings
+        are printed, so they could be specified next time.
+
+        :progress: bytes downloaded by all mirrors, type int
+
+        """
+        if self.tuner is None:
+            return
+        if not self.tuner.update(self.time, progress, self.max_streams or len(self.mirrors)):
+            return
+        self.streams = self.tuner.streams
+        if self.tuner.settled:
+            self.report_tuning()
+        else:
+            self.console.message(_("\nAuto-tuning: {}/s, trying {} parallel streams").format(calc_size(int(self.tuner.speed)), self.streams))
+
+    def report_tuning(self):
+
+        """
+        Prints the settings chosen by the tuner.
+
+        """
+        self.console.message(_("\nAuto-tuning has chosen {} parallel streams ({}/s) and block size {}, specify --streams={} -b {} to use them.").format(
+                             self.streams, calc_size(int(self.tuner.speed)), calc_size(self.block_size), self.streams, self.block_size))
+
+    def reconnect(self, name, link):
+
+        """
+        Connects the mirror by its link given by the user,
+        e.g. the address it has been redirected to before
+        is not valid anymore.
+
+        :name: a name of the mirror, type str
+        :link: the link of the mirror, type URL
+
+        """
+        mirror = self.mirrors[name]
+        if link.url != mirror.url.url:
+            self.delete_mirror(name)
+            self.origins.pop(name, None)
+            self.create_mirror(link)
+            return
+        mirror.close()
+        mirror.ready = False
+        mirror.need_connect = True
+
     def set_progress(self, name, task_progress):
 
         """
@@ -332,13 +1455,39 @@ class Manager(IManager):
         # update the progress of the mirror
         mirror = self.mirrors[name]
         mirror.task_progress = task_progress
+        started, first_byte = self.task_started.get(name, (0, 0))
+        if first_byte is None: # the first data of the task
+            self.task_started[name] = (started, self.time - started)
         # progress is written data + current progress of
         # active tasks
         progress = self.written_bytes + sum(map(lambda m: m.task_progress, self.mirrors.values()))
+        self.tune(progress)
         # update the progress in the console, to calculate download speed
         # pass the progress of current session
         self.console.progress(progress)
 
+    def write_small_file(self, name, data, validator=('', '')):
+
+        """
+        Writes the whole file received by one request. The file
+        is written at once, so the space is not allocated in
+        advance and the context is not saved.
+
+        :name: a name of the mirror that sent a TaskInfo object, type str
+        :data: data of the file, type bytes
+        :validator: ETag and Last-Modified of the file, empty if unknown, type tuple (str, str)
+
+        """
+        if self.file_size and self.file_size != len(data): # the size is known in advance and differs
+            self.set_file_size(name, len(data)) # report the error and delete the mirror
+            return
+        self.whole_file = True
+        self.set_file_size(name, len(data), validator)
+        self.offset = self.file_size # there is nothing to give other mirrors
+        self.parts_in_progress.append(0)
+        self.write_data(name, 0, data)
+        self.console.progress(self.written_bytes)
+
     def write_data(self, name, offset, data):
 
         """
@@ -349,13 +1498,202 @@ class Manager(IManager):
         :data: data of the task given to the mirror, type bytes
 
         """
+        if self.piece_hashes and not self.piece_hashes.verify(offset, data):
+            self.reject_data(name, offset) # data are corrupted, download the part again
+            return
+        self.part_exclusions.pop(offset, None) # the part is done, forget mirrors that failed it
         self.del_active_part(offset) # the task becomes inactive
-        self.outfile.seek(offset) # seek to offset of the task
-        self.outfile.write(data) # write data
+        self.confirmed = True # downloading goes on with the file on the servers
+        self.warmed(name)
+        self.remember_link(name)
+        self.measure(name, len(data))
+        self.failures.pop(name, None) # the mirror works again
+        self.store(offset, data)
+        mirror = self.mirrors[name]
+        mirror.done() # mark the mirror as completed downloading
+
+    def store(self, offset, data):
+
+        """
+        Writes data to the file at once or passes them to the writer thread.
+
+        :offset: an offset of data in the file, type int
+        :data: data to write, type bytes
+
+        """
         self.written_bytes += len(data) # increase the written bytes count
+        if self.writer: # the data will be written in the writer thread
+            if self.checksum: # hash data while they are in memory
+                self.checksum.update(offset, data, False)
+            self.parts_in_writing[offset] = len(data)
+            self.writer.put(offset, data)
+        else:
+            self.outfile.seek(offset) # seek to offset of the task
+            self.outfile.write(data) # write data
+            if self.checksum: # hash data while they are in memory
+                self.checksum.update(offset, data)
+            self.data_written(offset, len(data))
+
+    def part_written(self, name, offset, length):
+
+        """
+        Processes the part written to the file by a worker process.
+        Data are read back from the file to verify and hash them.
+
+        :name: a name of the mirror that downloaded the part, type str
+        :offset: an offset of the part, type int
+        :length: the length of the part, type int
+
+        """
+        if self.piece_hashes and not self.piece_hashes.verify(offset, self.outfile.read(offset, length)):
+            self.reject_data(name, offset) # data are corrupted, download the part again
+            return
+        self.part_exclusions.pop(offset, None) # the part is done, forget mirrors that failed it
+        self.del_active_part(offset) # the task becomes inactive
+        self.confirmed = True # downloading goes on with the file on the servers
+        self.warmed(name)
+        self.remember_link(name)
+        self.measure(name, length)
+        self.failures.pop(name, None) # the mirror works again
+        self.written_bytes += length # increase the written bytes count
+        if self.checksum: # the part could not be remembered by the checksum before
+            self.checksum.resume(self.outfile.read, [(offset, length)])
+        self.data_written(offset, length)
         mirror = self.mirrors[name]
         mirror.done() # mark the mirror as completed downloading
 
+    def data_written(self, offset, length):
+
+        """
+        Processes the part written to the file: verifies pieces
+        and hashes data that could be read back now.
+
+        :offset: an offset of the written part, type int
+        :length: the length of the part, type int
+
+        """
+        if self.piece_hashes: # check pieces that have been written by several parts
+            self.verify_edges(offset, length)
+        if self.checksum:
+            if self.writer: # the part could not be remembered by the checksum before
+                self.checksum.resume(self.outfile.read, [(offset, length)])
+            else:
+                self.checksum.advance(self.outfile.read) # hash following parts written before
+        self.outfile.release(offset, length) # data are not needed in memory anymore
+
+    def verify_edges(self, offset, length):
+
+        """
+        Checks pieces crossing edges of the written part when all their
+        parts are written. The pieces are read back from the file.
+        If a piece is corrupted, all its parts are downloaded again.
+
+        :offset: an offset of the written part, type int
+        :length: the length of the part, type int
+
+        """
+        for index, parts in self.piece_hashes.written(offset, length):
+            start, size = self.piece_hashes.piece_range(index)
+            if self.piece_hashes.verify_piece(index, self.outfile.read(start, size)):
+                continue
+            self.console.warning(_("piece {} written by several blocks is corrupted, the blocks will be downloaded again.").format(index))
+            for part_offset, part_length in parts:
+                self.piece_hashes.forget(part_offset, part_length) # the part is not written anymore
+                self.written_bytes -= part_length
+                self.failed_parts.append(part_offset)
+            self.state_changed = True
+
+    def reject_data(self, name, offset):
+
+        """
+        Requeues the part which data has been corrupted and
+        gives a strike to the mirror. The mirror is deleted
+        when it has got too many strikes.
+
+        :name: a name of the mirror that sent corrupted data, type str
+        :offset: an offset of the part, type int
+
+        """
+        self.console.warning(_("data received from the mirror {} are corrupted.").format(name))
+        self.mirror_event(name, 'corrupted', offset)
+        self.part_exclusions.setdefault(offset, set()).add(name) # the part should be downloaded from another mirror
+        self.add_failed_part(offset)
+        mirror = self.mirrors[name]
+        mirror.done() # the mirror is free
+        mirror.strikes += 1
+        if mirror.strikes >= self.max_strikes: # the mirror is unreliable
+            self.console.error(_("mirror {} has sent corrupted data {} times and will not be used anymore.").format(name, mirror.strikes))
+            self.delete_mirror(name)
+            if not self.mirrors: # if no mirror remains
+                # downloading impossible, quit program
+                raise FatalError(_("unable to download the file."))
+
+    def measure(self, name, length):
+
+        """
+        Measures throughput and the time to the first byte of
+        the part written by the mirror. Measurements are saved
+        when downloading is over.
+
+        :name: a name of the mirror, type str
+        :length: the length of the part, type int
+
+        """
+        started, first_byte = self.task_started.pop(name, (None, None))
+        if not self.stats or started is None or name in self.remote_mirrors: # remote mirrors are measured on other nodes
+            return
+        elapsed = max(self.time - started, 0.001)
+        record = self.measurements.setdefault(name, MirrorRecord())
+        record.part(length / elapsed, elapsed if first_byte is None else first_byte)
+        if not self.whole_file: # the part has been requested by a range
+            record.ranges = True
+
+    def measure_error(self, name, status):
+
+        """
+        Counts the error of the mirror.
+
+        :name: a name of the mirror, type str
+        :status: a status code of the error, type int
+
+        """
+        self.task_started.pop(name, None)
+        if not self.stats or name in self.remote_mirrors:
+            return
+        record = self.measurements.setdefault(name, MirrorRecord())
+        record.errors += 1
+        if status == 200: # the mirror does not support ranges
+            record.ranges = False
+
+    def save_stats(self):
+
+        """
+        Saves performance of mirrors measured in this session.
+
+        """
+        if not self.stats:
+            return
+        self.stats.save(self.measurements)
+        self.measurements = {}
+
+    def mirror_event(self, name, event, value=None):
+
+        """
+        Passes an event of the mirror to the application
+        embedding pymget if it wants to receive them.
+
+        :name: a name of the mirror, type str
+        :event: 'connected', 'redirected', 'error', 'corrupted', 'changed' or 'deleted', type str
+        :value: the size of the file, a new address, a status code or an offset of the part
+
+        """
+        if self.mirror_events is not None:
+            self.mirror_events(name, event, value)
+
+    @property
+    def time(self):
+        return time.monotonic()
+
     @property
     def _dataqueue(self):
         return DataQueue
@@ -363,3 +1701,39 @@ class Manager(IManager):
     @property
     def _mirror(self):
         return Mirror
+
+    @property
+    def _process_mirror(self):
+        return ProcessMirror
+
+    @property
+    def _worker_process(self):
+        return WorkerProcess
+
+    @property
+    def _remote_mirror(self):
+        return RemoteMirror
+
+    @property
+    def _coordinator(self):
+        return Coordinator
+
+    @property
+    def _cache(self):
+        return Cache
+
+    @property
+    def _seed(self):
+        return Seed
+
+    @property
+    def _stats(self):
+        return MirrorStats
+
+    @property
+    def _tuner(self):
+        return Tuner
+
+    @property
+    def _writer(self):
+        return Writer
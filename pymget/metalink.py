@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import xml.etree.ElementTree as etree
+
+from .checksum import Checksum, PieceHashes
+
+class MetalinkFile:
+
+    """
+    Description of a file from a metalink: its name, size,
+    mirrors, a checksum and hashes of pieces.
+
+    """
+    LOWEST_PRIORITY = 999999 # priority of mirrors without specified priority
+
+    # hash algorithms in order of preference
+    HASH_PREFERENCE = ['sha512', 'sha384', 'sha256', 'sha224', 'sha1', 'md5']
+
+    def __init__(self, name):
+
+        """
+        :name: a name of the file, type str
+
+        """
+        self.name = name
+        self.size = 0 # the size is unknown
+        self.urls = [] # a list of tuples (priority, order, url, location, max connections)
+        self.hashes = {} # whole file hex digests, algorithm names are keys
+        self.pieces = None # a tuple (algorithm, piece length, list of hex digests)
+
+    def add_url(self, url, priority=None, location='', max_connections=0):
+
+        """
+        Adds a mirror of the file.
+
+        :url: a link to the file, type str
+        :priority: priority of the mirror, 1 is the highest, type int
+        :location: ISO 3166-1 country code of the mirror, type str
+        :max_connections: max count of connections to the mirror, 0 - unlimited, type int
+
+        """
+        if priority is None:
+            priority = self.LOWEST_PRIORITY
+        # the order is added to keep mirrors with equal priority in the original order
+        self.urls.append((priority, len(self.urls), url, location, max_connections))
+
+    def sorted_urls(self):
+
+        """
+        Returns links to the file ordered by priority.
+
+        """
+        return [url for url, location, max_connections in self.mirrors()]
+
+    def mirrors(self):
+
+        """
+        Returns mirrors of the file ordered by priority.
+
+        :return: a list of tuples (url, location, max connections)
+
+        """
+        return [(url, location, max_connections) for priority, order, url, location, max_connections in sorted(self.urls)]
+
+    def checksum(self):
+
+        """
+        Creates a checksum object using the most secure
+        supported algorithm among the hashes of the file.
+
+        :return: the checksum object or None if there are no supported hashes
+        :raises ValueError: the hash is broken
+
+        """
+        for algorithm in self.HASH_PREFERENCE:
+            if algorithm in self.hashes:
+                return Checksum(algorithm, self.hashes[algorithm])
+        return None
+
+    def piece_hashes(self):
+
+        """
+        Creates a piece hashes object.
+
+        :return: the piece hashes object or None if there are no supported piece hashes
+        :raises ValueError: hashes are broken
+
+        """
+        if not self.pieces:
+            return None
+        algorithm, length, digests = self.pieces
+        if algorithm not in Checksum.ALGORITHMS: # the algorithm is not supported
+            return None
+        return PieceHashes(algorithm, length, digests)
+
+
+
+class Metalink:
+
+    """
+    Reads metalink files (RFC 5854 and Metalink 3.0).
+    The file is parsed in streaming mode and elements are
+    released as soon as they are processed, so metalinks
+    with thousands of mirrors are loaded fast.
+
+    """
+    @staticmethod
+    def local_name(tag):
+
+        """
+        Removes the namespace from the tag name.
+
+        """
+        return tag.rsplit('}', 1)[-1]
+
+    # types of Metalink 3.0 resources that link to the file itself
+    DOWNLOAD_TYPES = ('', 'http', 'https', 'ftp')
+
+    @staticmethod
+    def algorithm(hash_type):
+
+        """
+        Translates the hash type to the name of algorithm, e.g. sha-256 to sha256.
+
+        """
+        return hash_type.lower().replace('-', '')
+
+    @staticmethod
+    def number(value, default):
+
+        """
+        Converts an attribute to int.
+
+        """
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    @classmethod
+    def load(cls, source):
+
+        """
+        Parses the metalink.
+
+        :source: a filename or a file object
+        :return: described files, type list <MetalinkFile>
+
+        """
+        files = []
+        current = None # the file which elements are being parsed
+        pieces = None # the pieces element which hashes are being parsed
+        path = [] # local names of open elements
+        resources_connections = 0 # max connections specified for all resources of the file
+        events = etree.iterparse(source, events=('start', 'end'))
+        for event, element in events:
+            tag = cls.local_name(element.tag)
+            if event == 'start':
+                path.append(tag)
+                if tag == 'file':
+                    current = MetalinkFile(element.get('name', ''))
+                    files.append(current)
+                elif tag == 'pieces' and current is not None:
+                    pieces = (cls.algorithm(element.get('type', '')), cls.number(element.get('length'), 0), [])
+                elif tag == 'resources':
+                    resources_connections = cls.number(element.get('maxconnections'), 0)
+                continue
+            path.pop()
+            if current is None: # elements outside of a file element
+                element.clear()
+                continue
+            text = (element.text or '').strip()
+            if tag == 'url':
+                # skip links to torrents and other non-downloadable resources
+                if element.get('type', '').lower() not in cls.DOWNLOAD_TYPES:
+                    element.clear()
+                    continue
+                priority = cls.number(element.get('priority'), None)
+                preference = cls.number(element.get('preference'), None)
+                if priority is None and preference is not None:
+                    # Metalink 3.0 preference is from 0 to 100, the highest is the best
+                    priority = 101 - preference
+                max_connections = cls.number(element.get('maxconnections'), resources_connections)
+                current.add_url(text, priority, element.get('location', ''), max_connections)
+            elif tag == 'size' and path and path[-1] == 'file':
+                current.size = cls.number(text, 0)
+            elif tag == 'hash' and path and path[-1] == 'pieces' and pieces is not None:
+                pieces[2].append(text.lower())
+            elif tag == 'hash':
+                current.hashes[cls.algorithm(element.get('type', ''))] = text.lower()
+            elif tag == 'pieces' and pieces is not None:
+                current.pieces = pieces
+                pieces = None
+            elif tag == 'resources':
+                resources_connections = 0
+            elif tag == 'file':
+                current = None
+            element.clear() # release memory of processed elements
+        return files
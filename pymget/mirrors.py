@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from abc import ABCMeta, abstractproperty, abstractmethod
+from http import client
 
 from . import messages
 from .networking import *
@@ -13,7 +14,7 @@ class IMirror(metaclass=ABCMeta):
 
     """
     @abstractmethod
-    def connect(self): pass
+    def connect(self, probe_size=0): pass
 
     @abstractmethod
     def download(self, offset): pass
@@ -44,6 +45,8 @@ class Mirror(IMirror):
     Abstract base class for mirrors
 
     """
+    fetches_small_files = False # the mirror could receive a small file by one request instead of the header
+
     @staticmethod
     def create(url, block_size, timeout):
 
@@ -74,26 +77,37 @@ class Mirror(IMirror):
         self.url = url
         self.block_size = block_size
         self.timeout = timeout
+        self.location = url.location # country code of the mirror
+        # max count of simultaneous connections, the mirror uses one
+        # connection at a time, so any positive limit is respected
+        self.max_connections = url.max_connections
         self.file_size = 0 # the file size will be determined after connect
+        self.validator = None # ETag and Last-Modified of the file, parts are requested only from the same file
         self.task_progress = 0 # the progress of current task
+        self.strikes = 0 # count of corrupted blocks received from the mirror
         self.conn = None # the connection object
         self.need_connect = True # the flag of a need to connect
         self.ready = False # the flag of a rediness to download a part
         self.conn_thread = None # connection thread object
         self.dnl_thread = None # download thread object
+        self.data_queue = None # a queue for results of threads, None - the common DataQueue
 
-    def connect(self):
+    def connect(self, probe_size=0):
 
         """
         Starts connection thread to connect to the server.
 
+        :probe_size: a file not larger is received at once, if the mirror
+                     fetches small files, 0 - request only the header, type int
+
         """
         self.ready = False # the mirror is not ready 
         self.need_connect = False # the mirror does not need a connection
         # create a connection thread
         # property connetion_thread should be implemented in subclasses
         self.conn_thread = self.connection_thread(self.url, self.timeout)
-        self.conn_thread.start()
+        self.conn_thread.probe_size = probe_size
+        self.start_thread(self.conn_thread)
 
     def wait_connection(self):
 
@@ -134,7 +148,21 @@ class Mirror(IMirror):
         # create download thread
         # property download_thread should be implemented in subclasses
         self.dnl_thread = self.download_thread(self.url, self.conn, offset, self.block_size)
-        self.dnl_thread.start()
+        self.dnl_thread.validator = self.validator
+        self.start_thread(self.dnl_thread)
+
+    def start_thread(self, thread):
+
+        """
+        Starts the thread, it reports to the queue of the mirror
+        if the mirror has its own queue.
+
+        :thread: a connection or download thread, type NetworkThread
+
+        """
+        if self.data_queue is not None:
+            thread.data_queue = self.data_queue
+        thread.start()
 
     def cancel(self):
 
@@ -217,6 +245,45 @@ class HTTXMirror(Mirror):
     Abstract base class for HTTP and HTTPs mirrors.
 
     """
+    fetches_small_files = True
+
+    def close(self):
+
+        """
+        Keeps the connection for other files on the server if
+        the pool is enabled and the connection is idle, otherwise
+        closes it.
+
+        """
+        pool = self._pool()
+        if pool.enabled and self.conn and self.ready: # the last task has been completed
+            pool.put(self.url.protocol, self.url.host, self.conn)
+            self.conn = None
+            return
+        Mirror.close(self)
+
+    def download(self, offset):
+
+        """
+        Starts downlaod thread that downloads the next part. If the
+        header has not been requested (downloading is resumed), an
+        idle connection is taken from the pool or a new one is
+        opened by the request.
+
+        :offset: the offset of the part, type int
+
+        """
+        if self.conn is None:
+            self.conn = self._pool().take(self.url.protocol, self.url.host) or self.protocol(self.url.host, timeout=self.timeout)
+        Mirror.download(self, offset)
+
+    @property
+    def _pool(self):
+        return ConnectionPool
+
+    @abstractproperty
+    def protocol(self): pass # abstract property, should return a class of connection object
+
     @property
     def download_thread(self):
 
@@ -241,6 +308,10 @@ class HTTPMirror(HTTXMirror):
         """
         return HTTPThread
 
+    @property
+    def protocol(self):
+        return client.HTTPConnection
+
 class HTTPSMirror(HTTXMirror):
 
     """
@@ -256,6 +327,10 @@ class HTTPSMirror(HTTXMirror):
         """
         return HTTPSThread
 
+    @property
+    def protocol(self):
+        return client.HTTPSConnection
+
 class FTPMirror(Mirror):
 
     """
@@ -316,7 +391,7 @@ class FTPMirror(Mirror):
         # create download thread
         # but FTP downlaod thread also needs file_size argument
         self.dnl_thread = self.download_thread(self.url, self.conn, offset, self.block_size, self.file_size)
-        self.dnl_thread.start()
+        self.start_thread(self.dnl_thread)
 
     def connect_message(self, console):
 
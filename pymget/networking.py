@@ -2,15 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import re
+import time
 import platform
 import threading
 from http import client
+from email.utils import parsedate_to_datetime
 import ftplib
 from abc import ABCMeta, abstractmethod, abstractproperty
 
 from . import __version__
 from .task_info import *
 from .data_queue import DataQueue
+from .utils import singleton
+from .errors import MirrorError
 
 VERSION = '1.40'
 
@@ -38,10 +42,70 @@ class URL:
         self.request = matches.group(3) if matches.group(3) else '/' # the request beginning with /
         self.path = matches.group(4) if matches.group(4) else '' # path to the file without beginning /
         self.filename = matches.group(5) if matches.group(5) else '' # filename
+        self.location = '' # ISO 3166-1 country code of the server if it's known
+        self.max_connections = 0 # max count of connections to the server, 0 - unlimited
 
 
 
 
+@singleton
+class ConnectionPool:
+
+    """
+    Keeps idle HTTP(S) connections to reuse them for other
+    files on the same servers. It's single for the whole
+    program. The pool is disabled by default, connections
+    are closed when a mirror is closed then.
+
+    """
+    def __init__(self):
+        self.enabled = False
+        self.connections = {} # idle connections, tuples (protocol, host) are keys
+        self.lock = threading.Lock()
+
+    def take(self, protocol, host):
+
+        """
+        Takes an idle connection to the server.
+
+        :protocol: http or https, type str
+        :host: the host with a port if present, type str
+        :return: a connection object or None if there is no one
+
+        """
+        with self.lock:
+            connections = self.connections.get((protocol, host))
+            return connections.pop() if connections else None
+
+    def put(self, protocol, host, conn):
+
+        """
+        Keeps the connection for reuse.
+
+        :protocol: http or https, type str
+        :host: the host with a port if present, type str
+        :conn: the connection object, type client.HTTPConnection or client.HTTPSConnection
+
+        """
+        with self.lock:
+            self.connections.setdefault((protocol, host), []).append(conn)
+
+    def close(self):
+
+        """
+        Closes all idle connections.
+
+        """
+        with self.lock:
+            connections, self.connections = self.connections, {}
+        for conn in (conn for conns in connections.values() for conn in conns):
+            try:
+                conn.close()
+            except:
+                pass
+
+
+
 class INetworkThread(metaclass=ABCMeta):
 
     """
@@ -88,6 +152,10 @@ class NetworkThread(threading.Thread, INetworkThread):
     def _dataqueue(self):
         return DataQueue
 
+    @property
+    def _pool(self):
+        return ConnectionPool
+
     @abstractmethod
     def run(self): pass # runs in separate thread, should be implemented in inherited classes
 
@@ -113,6 +181,7 @@ class ConnectionThread(NetworkThread):
         self.url = url
         self.timeout = timeout
         self.conn = None
+        self.probe_size = 0 # a file not larger is fetched by one request, 0 - request only the header
 
     def run(self):
         """
@@ -137,6 +206,39 @@ class ConnectionThread(NetworkThread):
     @abstractproperty
     def protocol(self): pass
 
+def validator(response):
+
+    """
+    Takes validators of the file from the response, they
+    change when the file is replaced on the server.
+
+    :response: the response of the server, type client.HTTPResponse
+    :return: ETag and Last-Modified, empty if absent, type tuple (str, str)
+
+    """
+    return response.getheader('ETag', ''), response.getheader('Last-Modified', '')
+
+def retry_after(response):
+
+    """
+    Takes the delay the overloaded server asks to wait before
+    the next request. Retry-After contains either seconds or
+    a date.
+
+    :response: the response of the server, type client.HTTPResponse
+    :return: the delay in seconds, 0 - the server has not asked to wait, type float
+
+    """
+    if response.status not in (429, 503): # the header is meaningful only for these codes
+        return 0
+    value = (response.getheader('Retry-After') or '').strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError): # the header is absent or broken
+        return 0
+
 class HTTXThread(ConnectionThread):
 
     """
@@ -185,8 +287,79 @@ class HTTXThread(ConnectionThread):
         """
         # sends User-Agent and Refferer (main page on the server) in the header, 
         # it's necessary when the server blocks downloading via links from other resources
-        headers = {'User-Agent': self.user_agent, 'Refferer': '{}://{}/'.format(self.url.protocol, self.url.host)}
+        self.conn = self._pool().take(self.url.protocol, self.url.host) # reuse an idle connection to the server
+        if self.conn:
+            try:
+                return self.request_file()
+            except (OSError, client.HTTPException): # the server has closed the connection
+                self.conn.close()
         self.conn = self.protocol(self.url.host, timeout=self.timeout)
+        return self.request_file()
+
+    def request_file(self):
+
+        """
+        Requests the whole file if it could be small,
+        otherwise requests the header of the file.
+
+        """
+        if self.probe_size:
+            info = self.request_small_file()
+            if info:
+                return info
+        return self.request_head()
+
+    def request_small_file(self):
+
+        """
+        Requests the beginning of the file up to the probe size.
+        If it's the whole file, data are received at once, otherwise
+        only the size is taken and the rest of the response is
+        dropped with the connection, the next request reopens it.
+
+        :return: a TaskInfo object or None if the size is unknown
+
+        """
+        headers = {'User-Agent': self.user_agent, 'Refferer': '{}://{}/'.format(self.url.protocol, self.url.host),
+                    'Range': 'bytes=0-{}'.format(self.probe_size - 1)}
+        self.conn.request('GET', self.url.request, headers=headers)
+        response = self.conn.getresponse()
+
+        # status 3xx
+        if response.status // 100 == 3:
+            location = response.getheader('Location')
+            return self.redirect(location, response.status)
+
+        if response.status == 416: # the range is not satisfiable, probably the file is empty
+            response.read()
+            return None
+
+        if response.status not in (200, 206): # HTTP(S) error
+            return TaskHeadError(self.url.host, response.status, retry_after(response))
+
+        length = int(response.getheader('Content-Length', -1))
+        try:
+            # the server that supports ranges tells the size in 'bytes 0-end/size'
+            file_size = int(response.getheader('Content-Range').rpartition('/')[2]) if response.status == 206 else length
+        except (AttributeError, ValueError): # the size is unknown
+            file_size = -1
+        if 0 < file_size == length <= self.probe_size: # the response contains the whole file
+            data = response.read()
+            if len(data) == file_size:
+                return TaskSmallFile(self.url.host, response.status, data, *validator(response))
+            raise MirrorError
+        self.conn.close() # don't receive the beginning of a large file
+        if file_size < 0:
+            return None
+        return TaskHeadData(self.url.host, 200, file_size, *validator(response)) # set the code 200 as for the header
+
+    def request_head(self):
+
+        """
+        Requests the header of the file.
+
+        """
+        headers = {'User-Agent': self.user_agent, 'Refferer': '{}://{}/'.format(self.url.protocol, self.url.host)}
         self.conn.request('HEAD', self.url.request, headers=headers)
         response = self.conn.getresponse()
 
@@ -196,10 +369,10 @@ class HTTXThread(ConnectionThread):
             return self.redirect(location, response.status)
 
         if response.status != 200: # HTTP(S) error
-            return TaskHeadError(self.url.host, response.status)
+            return TaskHeadError(self.url.host, response.status, retry_after(response))
 
         file_size = int(response.getheader('Content-Length'))
-        info = TaskHeadData(self.url.host, response.status, file_size)
+        info = TaskHeadData(self.url.host, response.status, file_size, *validator(response))
         response.close()
         return info
 
@@ -275,6 +448,9 @@ class DownloadThread(NetworkThread):
         self.conn = conn
         self.offset = offset
         self.block_size = block_size
+        # the part runs to the end of its block, the rest of a failed part starts inside the block
+        self.length = block_size - offset % block_size
+        self.validator = None # ETag and Last-Modified of the file downloaded before, type tuple (str, str)
 
 class HTTXDownloadThread(DownloadThread):
 
@@ -284,6 +460,23 @@ class HTTXDownloadThread(DownloadThread):
     of HTTP and HTTPS after connection.
 
     """
+    def if_range(self):
+
+        """
+        Chooses the validator for the If-Range header: the server sends
+        the range only if the file has not been changed, otherwise it
+        sends the whole new file. Weak ETags can't be used for ranges.
+
+        :return: the value of the header or an empty string, type str
+
+        """
+        if not self.validator:
+            return ''
+        etag, last_modified = self.validator
+        if etag and not etag.startswith('W/'):
+            return etag
+        return last_modified
+
     def run(self):
         """
         Downloads the file, runs in separate thread.
@@ -291,17 +484,28 @@ class HTTXDownloadThread(DownloadThread):
         """
         # sends download range from offset to offset + block_size - 1 (including) in the header
         headers = {'User-Agent': self.user_agent, 'Refferer': '{}://{}/'.format(self.url.protocol, self.url.host), 
-                    'Range': 'bytes={}-{}'.format(self.offset, self.offset + self.block_size - 1)}
+                    'Range': 'bytes={}-{}'.format(self.offset, self.offset + self.length - 1)}
+        if_range = self.if_range()
+        if if_range: # the part is valid only for the file downloaded before
+            headers['If-Range'] = if_range
         status = 0 # set status to 0 that means a connection error
+        delay = 0 # the server has not asked to wait
+        data = bytearray() # data buffer, grows in place without copying received data
         try:
             self.conn.request('GET', self.url.request, headers=headers)
             response = self.conn.getresponse()
+            # the file has been changed, the server sends it whole
+            if response.status == 200 and if_range:
+                file_size = int(response.getheader('Content-Length', -1))
+                info = TaskChanged(self.url.host, response.status, self.offset, file_size, *validator(response))
+                self.conn.close() # don't receive the new file
+                return
             # the server does not support partial downloading - error
             if response.status != 206:
                 status = response.status
+                delay = retry_after(response)
                 raise MirrorError
             part_size = int(response.getheader('Content-Length')) # actual count of bytes sent by the server
-            data = b'' # data buffer
             # loop while all data will be received
             while part_size > len(data):
                 if self.cancelled.is_set(): # if the thread has been cancelled
@@ -309,6 +513,8 @@ class HTTXDownloadThread(DownloadThread):
                     # because a loop in the main thread already broken
                     raise Exception
                 data_fragment = response.read(self.FRAGMENT_SIZE)
+                if not data_fragment: # the connection has been closed before the end of the part
+                    raise MirrorError
                 data += data_fragment # add data to the buffer
                 # put progress information into the queue
                 info = TaskProgress(self.url.host, response.status, len(data))
@@ -317,8 +523,9 @@ class HTTXDownloadThread(DownloadThread):
             info = TaskData(self.url.host, response.status, self.offset, data)
             response.close()
         except:
-            # if an error has occurred - create a TaskError object
-            info = TaskError(self.url.host, status, self.offset)
+            # if an error has occurred - create a TaskError object,
+            # data received before the error are kept
+            info = TaskError(self.url.host, status, self.offset, delay, data)
         finally:
             self.data_queue.put(info) # put result TaskInfo object into the queue
             self.ready.set() # mark the thread as comleted
@@ -348,19 +555,19 @@ class FTPDownloadThread(DownloadThread):
         Downloads the file, runs in separate thread.
 
         """
-        data = b'' # data buffer
+        data = bytearray() # data buffer, grows in place without copying received data
         try:
             sock = self.conn.transfercmd('RETR ' + self.url.filename, self.offset)
-            # loop while received data size is less than block size
+            # loop while received data size is less than the part length
             # however the last block could be lesser than that size
-            while len(data) < self.block_size:
+            while len(data) < self.length:
                 if self.cancelled.is_set(): # if the thread has been cancelled
                     # stop the thread, the TaskError would not be processed
                     # because a loop in the main thread already broken
                     raise Exception
                 # get data, but not more than fragment size
                 # and the size remaining to full block
-                data_fragment = sock.recv(min(self.block_size - len(data), self.FRAGMENT_SIZE))
+                data_fragment = sock.recv(min(self.length - len(data), self.FRAGMENT_SIZE))
                 if not data_fragment: # if there is no data - error
                     raise MirrorError
                 data += data_fragment # add data to the buffer
@@ -373,8 +580,9 @@ class FTPDownloadThread(DownloadThread):
             info = TaskData(self.url.host, 206, self.offset, data)
             sock.close()
         except:
-            # if an error has occurred - create a TaskError object
-            info = TaskError(self.url.host, 0, self.offset)
+            # if an error has occurred - create a TaskError object,
+            # data received before the error are kept
+            info = TaskError(self.url.host, 0, self.offset, 0, data)
         finally:
             self.conn.close()
             self.data_queue.put(info) # put result TaskInfo object into the queue
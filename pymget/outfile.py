@@ -2,11 +2,20 @@
 # -*- coding: utf-8 -*-
 
 import os
+import mmap
 import struct
+import tempfile
+import threading
 from abc import ABCMeta, abstractmethod
 
+try:
+    import fcntl
+except ImportError: # the context can't be locked (e.g. on Windows), it belongs to one process
+    fcntl = None
+
 from . import messages
 from .errors import FileError, CancelError
+from .cache import clone_file
 
 # Output file class
 
@@ -17,7 +26,7 @@ class IOutputFile(metaclass=ABCMeta):
 
     """
     @abstractmethod
-    def create_path(self, filename): pass
+    def create_path(self, filename, block_size=0): pass
 
     @abstractmethod
     def __enter__(self): pass
@@ -31,6 +40,15 @@ class IOutputFile(metaclass=ABCMeta):
     @abstractmethod
     def write(self, data): pass
 
+    @abstractmethod
+    def read(self, offset, size): pass
+
+    @abstractmethod
+    def write_at(self, offset, chunks): pass
+
+    @abstractmethod
+    def release(self, offset, length): pass
+
 
 class OutputFile(IOutputFile):
 
@@ -42,13 +60,30 @@ class OutputFile(IOutputFile):
 
     seek: moves internal pointer to specified offset
     write: writes data to the file
+    read: reads data written to the file before
+    write_at: writes data to specified offset, could be called from another thread
+    release: marks data as written, in large file mode they are removed from the page cache
+
+    Large file mode is intended for files that don't fit into memory.
+    The written beginning of the file is flushed to disk and the page
+    cache is advised to drop it, so downloading does not evict data
+    of other programs. With direct I/O aligned writes bypass the page
+    cache (O_DIRECT), other writes are done as usual.
 
     """
-    def __init__(self, console, user_path):
+    seekable = True # data could be written to any offset and read back
+
+    ALIGNMENT = 4096 # direct I/O requires offsets, sizes and buffers aligned to the block size of the device
+    RELEASE_SIZE = 64 * 2**20 # the page cache is released by ranges not less than 64MB
+
+    def __init__(self, console, user_path, large_file=False, direct_io=False, repair=False):
 
         """
         :console: a console object
         :user_path: path for file saving specified by user, type str
+        :large_file: drop written data from the page cache, type bool
+        :direct_io: write aligned data bypassing the page cache, type bool
+        :repair: the existing file is updated instead of rewriting, type bool
 
         """
         self.console = console
@@ -56,14 +91,25 @@ class OutputFile(IOutputFile):
         self.filename = ''
         self.path = ''
         self.fullpath = ''
-
-    def create_path(self, filename):
+        self.lock = threading.Lock() # the writer thread and the manager share the file pointer
+        self.large_file = large_file or direct_io
+        self.direct_io = direct_io
+        self.direct_fd = None # a descriptor of the file opened with O_DIRECT
+        self.direct_buffer = None # page aligned memory for direct writes
+        self.frontier = 0 # the end of the written beginning of the file
+        self.pending = {} # written parts after the frontier, offset: length
+        self.released = 0 # the end of the beginning of the file dropped from the page cache
+        self.buffered_bytes = 0 # data are not kept in memory, they are written at once
+        self.repair = repair
+
+    def create_path(self, filename, block_size=0):
 
         """
         Creates a path to the file using a path specified by user
         and a filename on the server.
 
         :filename: filename on the server, type str
+        :block_size: parts of a new file are counted by blocks of this size, 0 - unknown, type int
 
         """
         if not self.user_path: # user has not specified a path
@@ -87,8 +133,17 @@ class OutputFile(IOutputFile):
             self.fullpath = self.user_path # use specified by user path as fullpath
             self.check_folders() # check all folders in the path for existence
         self.context = self._context(self.fullpath) # create context related to the file
-        self.context.open_context() #open the context
-        self.file = self.open_file() # open the file (get mode from the context)
+        self.context.open_context() #open the context, it's locked until the file is opened
+        if self.context.clean: # other processes and later sessions use the same blocks
+            self.context.block_size = block_size
+        try:
+            self.file = self.open_file() # open the file (get mode from the context)
+        except:
+            self.context.file_opened(False)
+            raise
+        self.context.file_opened(True) # other processes could join downloading now
+        if self.direct_io:
+            self.open_direct()
 
     def check_folders(self):
         
@@ -98,7 +153,7 @@ class OutputFile(IOutputFile):
         a confirmation to create it.
 
         """
-        if os.path.isdir(self.path): # the directory exists
+        if not self.path or os.path.isdir(self.path): # the file is in current directory or the directory exists
             return # do nothing
         if not self.console.ask(_("Directory {} does not exist. Do you want to create that?").format(self.path), True): # ask for creating
             # user denied a request
@@ -116,6 +171,7 @@ class OutputFile(IOutputFile):
 
         """
         Opens a file for writing or updating.
+        A file being repaired is opened for updating.
         Checks an existence of the context (file *.pymget): 
         if it does not exist (the context is clean) - creates a new file
         or asks for rewriting existing file.
@@ -123,6 +179,13 @@ class OutputFile(IOutputFile):
         the file does not exist - asks for creating a new file.
 
         """
+        if self.repair and self.context.clean: # corrupted pieces of the existing file are downloaded again
+            try:
+                return open(self.fullpath, 'rb+')
+            except FileNotFoundError:
+                raise FileError(_("file '{}' is not found, there is nothing to repair.").format(self.fullpath))
+            except:
+                raise FileError(_("unable to open file '{}': permission denied.").format(self.fullpath))
         if self.context.clean: # the context is clean (the first session)
             if os.path.isfile(self.fullpath): # the file exists
                 # ask for rewriting
@@ -131,7 +194,7 @@ class OutputFile(IOutputFile):
                     raise CancelError(_("Operation has been cancelled by user.")) # cancelling download
             # the file does not exist or user answered 'yes'
             try:
-                return open(self.fullpath, 'wb') # open the file for writing (if it exists all data will be lost)
+                return open(self.fullpath, 'wb+') # open the file for writing (if it exists all data will be lost)
             except:
                 # can't create the file
                 raise FileError(_("unable to create file '{}': permission denied.").format(self.fullpath))
@@ -151,6 +214,23 @@ class OutputFile(IOutputFile):
                 self.context.reset() # reset the context
                 return self.open_file() # retry open the file without context
 
+    def open_direct(self):
+
+        """
+        Opens the file once more for direct writes.
+        If the system or the file system doesn't support
+        direct I/O, the page cache is just released.
+
+        """
+        flags = getattr(os, 'O_DIRECT', 0)
+        if flags and hasattr(os, 'pwrite'):
+            try:
+                self.direct_fd = os.open(self.fullpath, os.O_WRONLY | flags)
+                return
+            except OSError:
+                pass
+        self.console.warning(_("direct I/O is not supported for file '{}', the page cache will be released after writing.").format(self.fullpath))
+
     def __enter__(self):
 
         """
@@ -169,6 +249,9 @@ class OutputFile(IOutputFile):
 
         """
         try:
+            if self.large_file: # release the rest of written data
+                self.drop_cache(self.released, self.frontier - self.released)
+            self.close_direct()
             self.file.close()
         except:
             return False # exception has not been catched
@@ -201,12 +284,381 @@ class OutputFile(IOutputFile):
             # it it faised - writing error
             raise FileError(_("Failed to write file '{}'.").format(self.filename))
 
+    def copy_from(self, path):
+
+        """
+        Replaces data of the file with a copy of another file.
+
+        :path: the path of the source file, type str
+        :return: the size of the file, type int
+
+        """
+        try:
+            with self.lock:
+                self.file.flush()
+                with open(path, 'rb') as f:
+                    return clone_file(f.fileno(), self.file.fileno())
+        except OSError:
+            raise FileError(_("unable to copy file '{}'.").format(path))
+
+    def size(self):
+
+        """
+        :return: the current size of the file on the disk, type int
+
+        """
+        return os.fstat(self.file.fileno()).st_size
+
+    def truncate(self, size):
+
+        """
+        Cuts the file, e.g. when a changed file is downloaded again.
+
+        :size: the new size of the file, type int
+
+        """
+        try:
+            with self.lock:
+                self.file.flush()
+                self.file.truncate(size)
+        except:
+            raise FileError(_("Failed to write file '{}'.").format(self.filename))
+
+    def flush(self):
+
+        """
+        Writes buffered data, so they don't overwrite
+        data written by worker processes later
+        and other processes could read them.
+
+        """
+        try:
+            with self.lock:
+                self.file.flush()
+        except:
+            raise FileError(_("Failed to write file '{}'.").format(self.filename))
+
+    def read(self, offset, size):
+
+        """
+        Reads data written into the file before.
+
+        :offset: position of data in the file, type int
+        :size: size of data, type int
+        :return: data, type bytes
+
+        """
+        try:
+            with self.lock:
+                self.file.flush() # drop buffered data, worker processes could have written the file
+                self.file.seek(offset, 0)
+                return self.file.read(size)
+        except:
+            # if it failed - reading error
+            raise FileError(_("Failed to read file '{}'.").format(self.filename))
+
+    def write_at(self, offset, chunks):
+
+        """
+        Writes adjacent chunks of data by a single call.
+        The file pointer is moved and used under the lock,
+        so the method could be called from another thread.
+
+        :offset: position of the first chunk in the file, type int
+        :chunks: data to write, type sequence <bytes>
+
+        """
+        try:
+            with self.lock:
+                if self.direct_fd is not None and self.write_direct(offset, chunks):
+                    return
+                self.file.seek(offset, 0)
+                self.file.write(b''.join(chunks))
+        except:
+            # if it failed - writing error
+            raise FileError(_("Failed to write file '{}'.").format(self.filename))
+
+    def write_direct(self, offset, chunks):
+
+        """
+        Writes data bypassing the page cache. Data are copied
+        to aligned memory, unaligned parts are not written.
+        If the file system rejects direct writes, direct I/O
+        is turned off.
+
+        :offset: position of the first chunk in the file, type int
+        :chunks: data to write, type sequence <bytes>
+        :return: True if data have been written, type bool
+
+        """
+        size = sum(map(len, chunks))
+        if offset % self.ALIGNMENT or size % self.ALIGNMENT or size == 0:
+            return False # write unaligned data through the page cache
+        if self.direct_buffer is None or len(self.direct_buffer) < size:
+            if self.direct_buffer is not None:
+                self.direct_buffer.close()
+            self.direct_buffer = mmap.mmap(-1, size) # anonymous memory is aligned to pages
+        self.file.flush() # data written to the file object before must not overwrite direct writes
+        with memoryview(self.direct_buffer) as buffer:
+            position = 0
+            for data in chunks:
+                buffer[position:position + len(data)] = data
+                position += len(data)
+            try:
+                if os.pwrite(self.direct_fd, buffer[:size], offset) == size:
+                    return True
+            except OSError:
+                pass
+        self.close_direct() # the file system doesn't support direct writes, use the page cache
+        return False
+
+    def close_direct(self):
+
+        """
+        Closes the descriptor for direct writes and frees the buffer.
+
+        """
+        if self.direct_fd is not None:
+            os.close(self.direct_fd)
+            self.direct_fd = None
+        if self.direct_buffer is not None:
+            self.direct_buffer.close()
+            self.direct_buffer = None
+
+    def release(self, offset, length):
+
+        """
+        Marks the part as written. In large file mode the written
+        beginning of the file is removed from the page cache when
+        it has grown enough since the last release.
+
+        :offset: an offset of the written part, type int
+        :length: the length of the part, type int
+
+        """
+        if not self.large_file:
+            return
+        if offset >= self.frontier:
+            self.pending[offset] = length
+        while self.frontier in self.pending: # move the frontier through adjoining parts
+            self.frontier += self.pending.pop(self.frontier)
+        if self.frontier - self.released >= self.RELEASE_SIZE:
+            self.drop_cache(self.released, self.frontier - self.released)
+
+    def drop_cache(self, offset, length):
+
+        """
+        Writes the part to disk and advises the system
+        to drop it from the page cache. Errors are ignored,
+        it's just an advice.
+
+        :offset: an offset of the part, type int
+        :length: the length of the part, type int
+
+        """
+        if length <= 0:
+            return
+        try:
+            with self.lock:
+                self.file.flush()
+            fd = self.file.fileno()
+            if hasattr(os, 'fdatasync'): # dirty pages are not dropped, so write them first
+                os.fdatasync(fd)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+        self.released = offset + length
+
     @property
     def _context(self):
         return Context
 
 
 
+class StreamOutput(IOutputFile):
+
+    """
+    Writes data to a stream (stdout or a pipe) in order of offsets.
+    Blocks received ahead of the stream are kept in a reorder buffer
+    until all data before them are written. When the buffer exceeds
+    the memory limit, blocks are spilled to a temporary file.
+    Downloading to a stream can't be resumed, so the context is empty.
+
+    Methods:
+
+    seek: sets the offset of data passed to 'write'
+    write: puts data into the reorder buffer
+    write_at: puts data at specified offset into the reorder buffer
+    read: reads data from the reorder buffer
+    release: writes buffered data that adjoin the stream
+
+    """
+    seekable = False # data are written once in order
+
+    def __init__(self, console, stream, memory_limit):
+
+        """
+        :console: a console object
+        :stream: a binary stream data are written to
+        :memory_limit: max size of blocks kept in memory, type int
+
+        """
+        self.console = console
+        self.stream = stream
+        self.memory_limit = memory_limit
+        self.filename = '<stdout>'
+        self.frontier = 0 # the end of data written to the stream
+        self.position = 0 # the offset set by 'seek'
+        self.blocks = {} # blocks in memory, offsets are keys
+        self.spilled = {} # blocks in the spill file, offset: (position in the spill file, length)
+        self.buffered_bytes = 0 # size of blocks in memory
+        self.spill = None # a temporary file for blocks that don't fit into memory
+        self.spill_size = 0
+        self.lock = threading.Lock() # blocks are put by the writer thread and taken by the manager
+
+    def create_path(self, filename, block_size=0):
+
+        """
+        There is no path for the stream, just creates an empty context.
+
+        :filename: filename on the server, type str
+        :block_size: block size, type int
+
+        """
+        self.context = self._context()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+
+        """
+        Flushes the stream and removes the spill file.
+
+        """
+        try:
+            if self.spill:
+                self.spill.close()
+            self.stream.flush()
+        except:
+            return False # exception has not been catched
+
+    def seek(self, offset):
+        self.position = offset
+
+    def write(self, data):
+        self.write_at(self.position, [data])
+
+    def write_at(self, offset, chunks):
+
+        """
+        Puts data into the reorder buffer.
+
+        :offset: position of the first chunk in the file, type int
+        :chunks: data to write, type sequence <bytes>
+
+        """
+        data = b''.join(chunks)
+        with self.lock:
+            # the block adjoining the stream will be written soon, keep it in memory anyway
+            if offset != self.frontier and self.buffered_bytes + len(data) > self.memory_limit:
+                self.spill_block(offset, data)
+            else:
+                self.blocks[offset] = data
+                self.buffered_bytes += len(data)
+
+    def spill_block(self, offset, data):
+
+        """
+        Writes the block to the end of the spill file.
+
+        :offset: an offset of the block in the file, type int
+        :data: data of the block, type bytes
+
+        """
+        try:
+            if self.spill is None:
+                self.spill = tempfile.TemporaryFile()
+            self.spill.seek(self.spill_size)
+            self.spill.write(data)
+        except:
+            raise FileError(_("Failed to write temporary file."))
+        self.spilled[offset] = (self.spill_size, len(data))
+        self.spill_size += len(data)
+
+    def take_block(self, offset):
+
+        """
+        Removes the block from the buffer.
+
+        :offset: an offset of the block in the file, type int
+        :return: data of the block, type bytes
+
+        """
+        if offset in self.blocks:
+            data = self.blocks.pop(offset)
+            self.buffered_bytes -= len(data)
+            return data
+        position, length = self.spilled.pop(offset)
+        data = self.read_spill(position, length)
+        if not self.spilled: # the spill file is empty, reuse it from the beginning
+            self.spill_size = 0
+        return data
+
+    def read_spill(self, position, length):
+        try:
+            self.spill.seek(position)
+            return self.spill.read(length)
+        except:
+            raise FileError(_("Failed to read temporary file."))
+
+    def read(self, offset, size):
+
+        """
+        Reads data from the reorder buffer. Data already
+        written to the stream can't be read.
+
+        :offset: position of data in the file, type int
+        :size: size of data, type int
+        :return: data, type bytes
+
+        """
+        with self.lock:
+            for start, data in self.blocks.items():
+                if start <= offset < start + len(data):
+                    return data[offset - start:offset - start + size]
+            for start, (position, length) in self.spilled.items():
+                if start <= offset < start + length:
+                    return self.read_spill(position + offset - start, min(size, start + length - offset))
+        raise FileError(_("Failed to read file '{}'.").format(self.filename))
+
+    def release(self, offset, length):
+
+        """
+        Writes to the stream all buffered blocks that adjoin it.
+
+        :offset: an offset of the written part, type int
+        :length: the length of the part, type int
+
+        """
+        while True:
+            with self.lock:
+                if self.frontier not in self.blocks and self.frontier not in self.spilled:
+                    return
+                data = self.take_block(self.frontier)
+            try:
+                self.stream.write(data)
+            except:
+                raise FileError(_("Failed to write file '{}'.").format(self.filename))
+            self.frontier += len(data)
+
+    @property
+    def _context(self):
+        return StreamContext
+
+
+
 # Context class
 
 class IContext(metaclass=ABCMeta):
@@ -218,9 +670,21 @@ class IContext(metaclass=ABCMeta):
     @abstractmethod
     def open_context(self): pass
 
+    @abstractmethod
+    def file_opened(self, opened): pass
+
     @abstractmethod
     def update(self, offset, written_bytes, failed_parts): pass
 
+    @abstractmethod
+    def remember(self, file_size, validators, links=None): pass
+
+    @abstractmethod
+    def restart(self, file_size, validators): pass
+
+    @abstractmethod
+    def seed(self, offset, written_bytes, failed_parts): pass
+
     @abstractmethod
     def reset(self): pass
 
@@ -229,6 +693,44 @@ class IContext(metaclass=ABCMeta):
     
 
 
+class StreamContext(IContext):
+
+    """
+    An empty context of downloading to a stream. Nothing
+    is saved, because the downloading can't be resumed.
+
+    """
+    def __init__(self):
+        self.failed_parts = []
+        self.offset = 0
+        self.written_bytes = 0
+        self.clean = True
+        self.shared = False
+        self.file_size = 0
+        self.validators = {}
+        self.links = {}
+        self.block_size = 0
+
+    def open_context(self): pass
+
+    def file_opened(self, opened): pass
+
+    def update(self, offset, written_bytes, failed_parts): pass
+
+    def remember(self, file_size, validators, links=None): pass
+
+    def restart(self, file_size, validators):
+        return True
+
+    def seed(self, offset, written_bytes, failed_parts):
+        return False
+
+    def reset(self): pass
+
+    def delete(self): pass
+
+
+
 class Context(IContext):
 
     """
@@ -236,6 +738,11 @@ class Context(IContext):
     of downloading and loads this information after restart.
     It helps resume downloading after error.
 
+    Several processes could download the same file together:
+    the context file is locked while a process changes it, and
+    each part being downloaded is leased to the process. Parts
+    leased to processes which have exited are downloaded again.
+
     File format:
 
     Header:
@@ -244,8 +751,23 @@ class Context(IContext):
         failed parts count, type int
     Body:
         a list of offsets of failed parts, type int
+    Leases (only if there are leased parts or the file size is known):
+        leased parts count, type int
+        a list of pairs (offset of the part, pid of the process), type int
+    Validators (only if the file size is known):
+        the size of the file, type int
+        mirrors count, type int
+        for each mirror: its name, ETag and Last-Modified of the file,
+        each is a length (type int) and UTF-8 encoded text
+    Links (optional):
+        links count, type int
+        for each link: the link and the address it's redirected to
+        (empty if it's not) as texts, flags of the link, type int
+    Block size (optional, previous sections are saved empty if needed):
+        the size of blocks parts of the file are counted by, type int
 
     """
+    RANGES = 1 # a flag of the link supporting ranges
     def __init__(self, filename):
 
         """
@@ -256,11 +778,89 @@ class Context(IContext):
         self.failed_parts = [] # parts still need to download
         self.offset = 0 # current offset
         self.written_bytes = 0 # written bytes count
+        self.leases = {} # parts being downloaded by processes, offset: pid
+        self.file_size = 0 # the size of the file when parts have been downloaded, 0 - unknown
+        self.validators = {} # ETag and Last-Modified of the file on mirrors, names of mirrors are keys
+        self.links = {} # addresses links are redirected to and flags of links, links are keys
+        self.block_size = 0 # the size of blocks parts are counted by, 0 - unknown (saved by an old version)
+        self.pid = os.getpid()
+        self.lock_fd = None # the descriptor of the locked context file
+        self.shared = self._fcntl is not None # parts are claimed from the context, see 'claim'
 
     def open_context(self):
 
         """
-        Opens a context file.
+        Opens a context file. It stays locked until the output file
+        is opened, so another process starting at the same time
+        doesn't rewrite the file and joins downloading instead.
+
+        """
+        self.lock(True)
+        self.read()
+        self.reclaim()
+
+    def file_opened(self, opened):
+
+        """
+        Saves the context, so other processes see that the file
+        is being downloaded, and unlocks it. If the file has not
+        been opened, the new context file is removed.
+
+        :opened: the output file has been opened, type bool
+
+        """
+        if self.lock_fd is None:
+            return
+        try:
+            if opened:
+                self.write()
+            elif self.clean:
+                self.delete()
+        finally:
+            self.unlock()
+
+    def lock(self, create=False):
+
+        """
+        Locks the context file, waits while another process holds it.
+        A file that has been deleted or replaced while waiting is
+        opened again.
+
+        :create: create the file if it doesn't exist, type bool
+        :return: False if the file doesn't exist, type bool
+
+        """
+        if self._fcntl is None:
+            return True
+        flags = os.O_RDWR | (os.O_CREAT if create else 0)
+        while True:
+            try:
+                fd = os.open(self.filename, flags, 0o644)
+            except FileNotFoundError:
+                return False
+            except OSError: # the context can't be shared, it's written as usual
+                self.shared = False
+                return True
+            self._fcntl.flock(fd, self._fcntl.LOCK_EX)
+            try:
+                locked = os.fstat(fd).st_ino == os.stat(self.filename).st_ino
+            except FileNotFoundError:
+                locked = False
+            if locked:
+                self.lock_fd = fd
+                return True
+            os.close(fd)
+
+    def unlock(self):
+        if self.lock_fd is not None:
+            os.close(self.lock_fd) # closing the descriptor releases the lock
+            self.lock_fd = None
+
+    def read(self):
+
+        """
+        Reads the context file. An empty or broken file means
+        that the context does not exist.
 
         """
         try:
@@ -272,12 +872,261 @@ class Context(IContext):
                 if failed_parts_len > 0:
                     data = f.read(struct.calcsize('N' * failed_parts_len)) # read failed parts
                     # and unpack them
-                    self.failed_parts = struct.unpack('N' * failed_parts_len, data)
+                    self.failed_parts = list(struct.unpack('N' * failed_parts_len, data))
+                else:
+                    self.failed_parts = []
+                self.leases = {}
+                self.read_sections(f)
         except: # open file failed or wrong file format
             self.clean = True # consider that context does not exist (it's a first session)
         else: # there are no errors
             self.clean = False # context exists (resume downloading)
 
+    def read_sections(self, f):
+
+        """
+        Reads optional sections of the context file,
+        the file ends before the first absent section.
+
+        :f: the context file after the body, type file
+
+        """
+        data = f.read(struct.calcsize('q')) # leases are absent if nothing is leased
+        if len(data) != struct.calcsize('q'):
+            return
+        leases_len, = struct.unpack('q', data)
+        data = f.read(struct.calcsize('NN' * leases_len))
+        leases = struct.unpack('NN' * leases_len, data)
+        self.leases = dict(zip(leases[::2], leases[1::2]))
+        data = f.read(struct.calcsize('Nq')) # validators are absent if the size is unknown
+        if len(data) != struct.calcsize('Nq'):
+            return
+        self.file_size, validators_len = struct.unpack('Nq', data)
+        for i in range(validators_len):
+            name, etag, last_modified = (read_text(f) for j in range(3))
+            self.validators[name] = (etag, last_modified) # validators saved by other processes are added to known ones
+        data = f.read(struct.calcsize('q')) # links are absent if nothing is known about them
+        if len(data) != struct.calcsize('q'):
+            return
+        links_len, = struct.unpack('q', data)
+        for i in range(links_len):
+            link, target = read_text(f), read_text(f)
+            flags, = struct.unpack('q', f.read(struct.calcsize('q')))
+            self.links[link] = (target, flags)
+        data = f.read(struct.calcsize('N')) # the block size is absent in contexts of old versions
+        if len(data) == struct.calcsize('N'):
+            self.block_size, = struct.unpack('N', data)
+
+    def write(self):
+
+        """
+        Saves the context to the file.
+
+        """
+        failed_parts_len = len(self.failed_parts)
+        try:
+            pattern = 'NNq' + 'N' * failed_parts_len # create a pattern depending on failed parts count
+            # pack data
+            data = struct.pack(pattern, self.offset, self.written_bytes, failed_parts_len, *self.failed_parts)
+            if self.leases or self.file_size or self.block_size:
+                leases = [value for lease in self.leases.items() for value in lease]
+                data += struct.pack('q' + 'NN' * len(self.leases), len(self.leases), *leases)
+            if self.file_size or self.block_size:
+                data += struct.pack('Nq', self.file_size, len(self.validators))
+                for name, (etag, last_modified) in self.validators.items():
+                    data += b''.join(map(pack_text, (name, etag, last_modified)))
+            if self.links and self.file_size or self.block_size: # links follow validators
+                data += struct.pack('q', len(self.links))
+                for link, (target, flags) in self.links.items():
+                    data += pack_text(link) + pack_text(target) + struct.pack('q', flags)
+            if self.block_size:
+                data += struct.pack('N', self.block_size)
+            # save data to the context file
+            with open(self.filename, 'wb') as f:
+                f.write(data)
+        except:
+            pass
+
+    def reclaim(self):
+
+        """
+        Returns parts leased to processes which have exited to failed parts.
+
+        """
+        for offset, pid in list(self.leases.items()):
+            if not self.running(pid):
+                del self.leases[offset]
+                self.failed_parts.append(offset)
+
+    @staticmethod
+    def running(pid):
+        try:
+            os.kill(pid, 0) # the signal is not sent, the process is just checked
+        except ProcessLookupError:
+            return False
+        except OSError: # the process exists, but it belongs to another user
+            pass
+        return True
+
+    def claim(self, block_size, file_size):
+
+        """
+        Leases a part to this process: a failed part or the part
+        at the current offset.
+
+        :block_size: block size, type int
+        :file_size: the size of the file, type int
+        :return: the offset of the part or None if all parts have been given, type int
+
+        """
+        if not self.lock():
+            return None # the context has been deleted, the file is complete
+        try:
+            self.read()
+            self.reclaim()
+            if self.failed_parts:
+                offset = self.failed_parts.pop(0)
+            elif self.offset < file_size:
+                offset = self.offset
+                self.offset += block_size
+            else:
+                return None
+            self.leases[offset] = self.pid
+            self.write()
+            return offset
+        finally:
+            self.unlock()
+
+    def sync(self, written_bytes, leased_parts, release=False):
+
+        """
+        Adds bytes written by this process to the context and
+        returns progress of all processes. Leases of parts which
+        are not leased anymore are removed, they have been written.
+
+        :written_bytes: bytes written since the last call, type int
+        :leased_parts: offsets of parts this process is downloading or has failed, type sequence <int>
+        :release: return the leased parts to failed parts, so other processes download them, type bool
+        :return: written bytes count of all processes or None if the context
+                 has been deleted (the file is complete), type int
+
+        """
+        if not self.lock():
+            return None
+        try:
+            self.read()
+            self.reclaim()
+            for offset, pid in list(self.leases.items()):
+                if pid == self.pid:
+                    del self.leases[offset]
+            for offset in leased_parts:
+                if release:
+                    self.failed_parts.append(offset)
+                else:
+                    self.leases[offset] = self.pid
+            self.written_bytes += written_bytes
+            self.write()
+            return self.written_bytes
+        finally:
+            self.unlock()
+
+    def remember(self, file_size, validators, links=None):
+
+        """
+        Saves the size of the file, its validators on mirrors and
+        capabilities of links, so the next session finds out whether
+        the file has been changed on the server since parts were
+        downloaded, and mirrors download parts without requesting
+        headers.
+
+        :file_size: the size of the file, type int
+        :validators: ETag and Last-Modified of the file, names of mirrors are keys,
+                     type dict {str: tuple (str, str)}
+        :links: addresses links are redirected to (empty if they are not) and
+                flags of links, links are keys, type dict {str: tuple (str, int)}
+
+        """
+        if not self.lock():
+            return # the context has been deleted, the file is complete
+        try:
+            if self.lock_fd is not None: # other processes could have changed the context
+                self.read()
+            self.file_size = file_size
+            self.validators.update(validators)
+            self.links.update(links or {})
+            self.write()
+        finally:
+            self.unlock()
+
+    def restart(self, file_size, validators):
+
+        """
+        Forgets all parts downloaded before, the file has been
+        changed on the server. The file can't be restarted while
+        other processes are downloading it.
+
+        :file_size: the size of the new file, type int
+        :validators: ETag and Last-Modified of the new file, names of mirrors are keys,
+                     type dict {str: tuple (str, str)}
+        :return: True if the context has been restarted, type bool
+
+        """
+        if not self.lock():
+            return False
+        try:
+            if self.lock_fd is not None:
+                self.read()
+                self.reclaim()
+                if any(pid != self.pid for pid in self.leases.values()):
+                    return False
+            self.offset = 0
+            self.written_bytes = 0
+            self.failed_parts = []
+            self.leases = {}
+            self.file_size = file_size
+            self.validators = dict(validators)
+            self.write()
+            return True
+        finally:
+            self.unlock()
+
+    def seed(self, offset, written_bytes, failed_parts):
+
+        """
+        Saves parts copied from a seed file if nothing has been
+        downloaded yet. Otherwise another process has started
+        downloading, the copied parts are downloaded as usual.
+
+        :offset: current offset, type int
+        :written_bytes: copied bytes count, type int
+        :failed_parts: offsets of parts not found in the seed file, type sequence <int>
+        :return: True if the parts have been saved, type bool
+
+        """
+        if not self.lock():
+            return False
+        try:
+            if self.lock_fd is not None:
+                self.read()
+                self.reclaim()
+            if self.offset or self.written_bytes or self.failed_parts or self.leases:
+                return False
+            self.offset = offset
+            self.written_bytes = written_bytes
+            self.failed_parts = list(failed_parts)
+            self.write()
+            return True
+        finally:
+            self.unlock()
+
+    def needle_parts(self):
+
+        """
+        :return: offsets of parts not yet written by any process, type list <int>
+
+        """
+        return list(self.failed_parts) + list(self.leases)
+
     def modified(self, offset, written_bytes, failed_parts):
 
         """
@@ -309,16 +1158,7 @@ class Context(IContext):
         self.offset = offset
         self.written_bytes = written_bytes
         self.failed_parts = failed_parts
-        failed_parts_len = len(self.failed_parts)
-        try:
-            pattern = 'NNq' + 'N' * failed_parts_len # create a pattern depending on failed parts count
-            # pack data
-            data = struct.pack(pattern, self.offset, self.written_bytes, failed_parts_len, *self.failed_parts)
-            # save data to the context file
-            with open(self.filename, 'wb') as f:
-                f.write(data)
-        except:
-            pass
+        self.write()
 
     def reset(self):
 
@@ -326,6 +1166,10 @@ class Context(IContext):
         Resets the context.
 
         """
+        self.leases = {}
+        self.file_size = 0
+        self.validators = {}
+        self.links = {}
         self.update(0, 0, [])
         self.clean = True
 
@@ -339,3 +1183,32 @@ class Context(IContext):
             os.remove(self.filename)
         except:
             pass # just ignore erros, probably file does not exist
+
+    @property
+    def _fcntl(self):
+        return fcntl
+
+
+
+def pack_text(text):
+
+    """
+    :text: a text to save in the context, type str
+    :return: the length of encoded text and the text, type bytes
+
+    """
+    data = text.encode('utf-8')
+    return struct.pack('q', len(data)) + data
+
+def read_text(f):
+
+    """
+    :f: the context file, type file
+    :return: the text saved by 'pack_text', type str
+
+    """
+    length, = struct.unpack('q', f.read(struct.calcsize('q')))
+    data = f.read(length)
+    if len(data) != length: # the file is truncated
+        raise ValueError(length)
+    return data.decode('utf-8')
@@ -2,13 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import signal
 
 from . import __version__
 from .errors import CancelError
 from .console import Console
 from .manager import Manager
 from .command_line import CommandLine
-from .outfile import OutputFile
+from .outfile import OutputFile, StreamOutput
+from .batch import Batch
+from .recursive import Recursive
+from .daemon import Daemon, Client
+from .workers import work_for
 
 class PyMGet:
 
@@ -20,8 +25,25 @@ class PyMGet:
         self.argv = argv
         self.manager = self._manager() # create a manager object
         self.console = self._console() # create the Console object
+        if self.stdout_output(argv): # stdout is used for data, even the version should not get there
+            self.console.redirect(sys.stderr)
         self.console.message('\nPyMGet v{}\n'.format(__version__)) # print an information about program
 
+    @staticmethod
+    def stdout_output(argv):
+
+        """
+        Checks that data are written to stdout ('-o -').
+        It's necessary to know before parsing the command line.
+
+        :argv: a sequence of argument, elements type str
+        :return: True if the output file is '-', type bool
+
+        """
+        if '--out-file=-' in argv:
+            return True
+        return any(arg == '-o' and value == '-' for arg, value in zip(argv, argv[1:]))
+
     def run(self):
 
         """
@@ -31,7 +53,32 @@ class PyMGet:
         try:
             self.cl = self._command_line(self.console, self.argv)
             self.cl.parse() # parse command line
-            self.outfile = self._outfile(self.console, self.cl.filename) # create an outfile object
+            if self.cl.worker: # blocks are downloaded for the coordinator on another node
+                self._work_for(self.console, self.cl.worker, self.cl.secret)
+                return
+            if self.cl.daemon: # files are submitted by other processes
+                self.batch = self._daemon()
+                self.batch.prepare(self.console, self.cl)
+                self.batch.download()
+                return
+            if self.cl.submit: # files are downloaded by the daemon
+                jobs = self.cl.jobs or [('', list(self.cl.urls))]
+                self._client(self.console, self.cl.socket).submit(jobs, self.cl.filename)
+                return
+            if self.cl.recursive: # directory trees are mirrored
+                self.batch = self._recursive()
+                self.batch.prepare(self.console, self.cl)
+                self.batch.download()
+                return
+            if self.cl.jobs: # several files are downloaded
+                self.batch = self._batch()
+                self.batch.prepare(self.console, self.cl)
+                self.batch.download()
+                return
+            if self.cl.filename == '-': # write data to stdout, messages are already redirected
+                self.outfile = self._stream(self.console, sys.stdout.buffer, self.cl.stream_memory)
+            else:
+                self.outfile = self._outfile(self.console, self.cl.filename, self.cl.large_file, self.cl.direct_io, self.cl.repair) # create an outfile object
             self.manager.prepare(self.console, self.cl, self.outfile) # prepare the manager object
             self.manager.download() # start downloading
         except CancelError as e: # user cancelled downloading
@@ -53,6 +100,30 @@ class PyMGet:
     def _outfile(self):
         return OutputFile
 
+    @property
+    def _batch(self):
+        return Batch
+
+    @property
+    def _recursive(self):
+        return Recursive
+
+    @property
+    def _daemon(self):
+        return Daemon
+
+    @property
+    def _client(self):
+        return Client
+
+    @property
+    def _work_for(self):
+        return work_for
+
+    @property
+    def _stream(self):
+        return StreamOutput
+
     @property
     def _manager(self):
         return Manager
@@ -65,5 +136,8 @@ def start():
     The main entry point.
 
     """
+    # SIGTERM interrupts downloading the same way as Ctrl+C,
+    # so the state of downloading is saved before exit
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     app = PyMGet(sys.argv)
     app.run()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import ftplib
+import calendar
+import threading
+from abc import ABCMeta, abstractmethod
+
+from .errors import FatalError
+from .batch import Batch
+from .networking import URL
+
+def parse_ftp_time(timestamp):
+
+    """
+    Converts a time from MLSD or MDTM answers to a timestamp.
+
+    :timestamp: a time in format YYYYMMDDHHMMSS[.sss] (UTC), type str
+    :return: seconds since the epoch or None if the time is wrong, type int
+
+    """
+    try:
+        timestamp = timestamp[:14]
+        fields = (timestamp[0:4], timestamp[4:6], timestamp[6:8], timestamp[8:10], timestamp[10:12], timestamp[12:14])
+        return calendar.timegm(tuple(map(int, fields)))
+    except ValueError:
+        return None
+
+
+def parse_list_line(line):
+
+    """
+    Parses a line of LIST answer in the Unix format:
+    'drwxr-xr-x 2 user group 4096 Jan  1 12:00 name'.
+
+    :line: a line of the answer, type str
+    :return: a tuple (name, type, size) or None if the line is unknown,
+             type is 'dir' or 'file', links and other entries are skipped
+
+    """
+    fields = line.split(None, 8)
+    if len(fields) < 9 or fields[8] in ('.', '..'):
+        return None
+    if fields[0].startswith('d'):
+        return fields[8], 'dir', 0
+    if fields[0].startswith('-'):
+        try:
+            return fields[8], 'file', int(fields[4])
+        except ValueError:
+            return None
+    return None
+
+
+def safe_name(name):
+
+    """
+    Checks that the name of an entry received from the server
+    names a file in the directory, not a path elsewhere, so
+    a hostile server could not write files outside the output folder.
+
+    :name: a name of the entry, type str
+    :return: True if the name could be used, type bool
+
+    """
+    if name in ('', '.', '..') or '/' in name or '\\' in name:
+        return False
+    return not os.path.isabs(name)
+
+
+
+class FTPListThread(threading.Thread):
+
+    """
+    Lists directories of the tree by its own control connection.
+    Several threads take directories from the common queue and
+    put subdirectories found back into the queue.
+
+    Servers without MLSD are listed by LIST, times of files
+    are requested by MDTM then.
+
+    """
+    def __init__(self, tree):
+
+        """
+        :tree: the tree being listed, type FTPTree
+
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.tree = tree
+        self.conn = None
+        self.mlsd = True # the server supports MLSD until it refuses
+
+    def run(self):
+        while True:
+            path = self.tree.directories.get()
+            if path is None: # the tree is listed
+                break
+            try:
+                if self.tree.error is None:
+                    self.list_directory(path)
+            except Exception as e:
+                self.tree.error = e
+            finally:
+                self.tree.directories.task_done()
+        try:
+            self.conn.quit()
+        except:
+            pass
+
+    def list_directory(self, path):
+
+        """
+        Lists the directory, adds files to the tree
+        and subdirectories to the queue.
+
+        :path: a path to the directory relative to the root of the tree, type str
+
+        """
+        if self.conn is None:
+            self.conn = self.tree.protocol(self.tree.url.host, 'anonymous', '', timeout=self.tree.timeout)
+            self.conn.voidcmd('TYPE I')
+        remote = self.tree.remote_path(path)
+        for name, kind, size, mtime in self.entries(remote):
+            child = path + '/' + name if path else name
+            if not safe_name(name): # the entry points outside the directory
+                self.tree.reject(child)
+            elif kind == 'dir':
+                self.tree.directories.put(child)
+            elif kind == 'file':
+                self.tree.add_file(child, size, mtime)
+
+    def entries(self, remote):
+
+        """
+        Reads entries of the directory.
+
+        :remote: a path to the directory on the server, type str
+        :return: a list of tuples (name, type, size, mtime)
+
+        """
+        if self.mlsd:
+            try:
+                entries = []
+                for name, facts in self.conn.mlsd(remote, ['type', 'size', 'modify']):
+                    kind = facts.get('type', '').lower()
+                    if kind in ('file', 'dir'):
+                        entries.append((name, kind, int(facts.get('size', 0)), parse_ftp_time(facts.get('modify', ''))))
+                return entries
+            except ftplib.error_perm: # MLSD is not supported
+                self.mlsd = False
+        lines = []
+        self.conn.retrlines('LIST ' + remote if remote else 'LIST', lines.append)
+        entries = []
+        for name, kind, size in filter(None, map(parse_list_line, lines)):
+            mtime = self.modification_time(remote + '/' + name if remote else name) if kind == 'file' and safe_name(name) else None
+            entries.append((name, kind, size, mtime))
+        return entries
+
+    def modification_time(self, remote):
+
+        """
+        Requests the modification time of the file.
+
+        :remote: a path to the file on the server, type str
+        :return: seconds since the epoch or None if it's unknown, type int
+
+        """
+        try:
+            return parse_ftp_time(self.conn.sendcmd('MDTM ' + remote).split()[-1])
+        except ftplib.error_perm:
+            return None
+
+
+
+class IFTPTree(metaclass=ABCMeta):
+
+    """
+    An interface for a tree of files on an FTP server.
+
+    """
+    @abstractmethod
+    def list(self): pass
+
+
+
+class FTPTree(IFTPTree):
+
+    """
+    Lists all files in a directory on an FTP server and
+    its subdirectories using several control connections.
+
+    """
+    def __init__(self, url, timeout, connections):
+
+        """
+        :url: the URL object of the directory, type URL
+        :timeout: timeout in seconds, type int
+        :connections: count of control connections, type int
+
+        """
+        self.url = url
+        self.timeout = timeout
+        self.connections = connections
+        self.root = url.request.strip('/') # paths are relative to the login directory as for downloading
+        self.directories = queue.Queue() # directories waiting for listing, relative to the root
+        self.files = [] # found files, tuples (path, size, mtime)
+        self.rejected = [] # paths of entries which names are not allowed
+        self.error = None # an exception raised while listing
+        self.lock = threading.Lock()
+
+    def list(self):
+
+        """
+        Lists the tree.
+
+        :return: files, a list of tuples (path relative to the root, size, mtime)
+
+        """
+        threads = [self._thread(self) for i in range(self.connections)]
+        for thread in threads:
+            thread.start()
+        self.directories.put('')
+        self.directories.join() # all directories are listed
+        for thread in threads:
+            self.directories.put(None) # stop the threads
+        for thread in threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+        return sorted(self.files)
+
+    def add_file(self, path, size, mtime):
+        with self.lock:
+            self.files.append((path, size, mtime))
+
+    def reject(self, path):
+        with self.lock:
+            self.rejected.append(path)
+
+    def remote_path(self, path):
+
+        """
+        Creates a path on the server.
+
+        :path: a path relative to the root of the tree, type str
+
+        """
+        return '/'.join(filter(None, (self.root, path)))
+
+    @property
+    def protocol(self):
+        return ftplib.FTP
+
+    @property
+    def _thread(self):
+        return FTPListThread
+
+
+
+class Recursive(Batch):
+
+    """
+    Mirrors directory trees from FTP servers. The tree is listed on
+    the first server, each file is downloaded from all the mirrors
+    in batch mode. Files of a single block are downloaded from one
+    mirror, mirrors are used in turn. Files which local copies
+    have the same size and modification time are skipped, the
+    time of downloaded files is set as on the server.
+
+    """
+    LIST_CONNECTIONS = 4 # max count of control connections for listing
+
+    def __init__(self):
+        Batch.__init__(self)
+        self.mirrors = [] # URL objects of the tree on all mirrors
+        self.times = {} # modification times of files being downloaded, paths are keys
+        self.skipped = 0 # count of files that are up to date
+
+    def prepare(self, console, command_line):
+
+        """
+        Lists the tree and makes jobs for files that
+        are missing or changed.
+
+        :console: a console object
+        :command_line: a command line object
+
+        """
+        Batch.prepare(self, console, command_line)
+        self.mirrors = [url for url in command_line.urls if url.protocol == 'ftp']
+        if not self.mirrors:
+            raise FatalError(_("There are no FTP mirrors to download."))
+        files = self.list_tree()
+        mirror = 0
+        for path, size, mtime in files:
+            if not self.inside(path): # the file would be written outside the output folder
+                self.console.warning(_("file '{}' is outside the output folder and will be skipped.").format(path))
+                continue
+            if self.up_to_date(path, size, mtime):
+                self.skipped += 1
+                continue
+            if size <= command_line.block_size: # a single block is downloaded from one mirror
+                mirrors = [self.mirrors[mirror % len(self.mirrors)]]
+                mirror += 1
+            else:
+                mirrors = self.mirrors
+            self.jobs.append((path, [URL(url.url.rstrip('/') + '/' + path) for url in mirrors]))
+            self.times[path] = mtime
+        self.total = len(self.jobs)
+        self.console.message(_("{} files found, {} are up to date.").format(len(files), self.skipped))
+
+    def list_tree(self):
+
+        """
+        Lists the tree on the first mirror that answers.
+
+        :return: files, a list of tuples (path, size, mtime)
+
+        """
+        connections = min(self.LIST_CONNECTIONS, self.command_line.connections)
+        for url in self.mirrors:
+            self.console.message(_("Listing {} ...").format(url.url))
+            tree = self._tree(url, self.command_line.timeout, connections)
+            try:
+                files = tree.list()
+            except (OSError, EOFError, ftplib.Error) as e:
+                self.console.error(_("unable to list directory on the server {}: {}").format(url.host, e))
+                continue
+            for path in tree.rejected:
+                self.console.warning(_("entry '{}' has a wrong name and will be skipped.").format(path))
+            return files
+        raise FatalError(_("unable to list the directory."))
+
+    def inside(self, path):
+
+        """
+        Checks that the file is saved inside the output folder.
+
+        :path: a path of the file relative to the root of the tree, type str
+        :return: True if the path does not leave the output folder, type bool
+
+        """
+        folder = os.path.abspath(self.output_path('') or os.curdir)
+        fullpath = os.path.abspath(self.output_path(path))
+        return fullpath != folder and os.path.commonpath([folder, fullpath]) == folder
+
+    def up_to_date(self, path, size, mtime):
+
+        """
+        Checks that the local copy of the file has the same size
+        and modification time and it's not partially downloaded.
+
+        :path: a path of the file relative to the root of the tree, type str
+        :size: the size of the file on the server, type int
+        :mtime: the modification time on the server or None if it's unknown, type int
+
+        """
+        if mtime is None:
+            return False
+        fullpath = self.output_path(path)
+        if os.path.exists(fullpath + '.pymget'): # downloading should be resumed
+            return False
+        try:
+            stat = os.stat(fullpath)
+        except OSError:
+            return False
+        return stat.st_size == size and int(stat.st_mtime) == mtime
+
+    def start_job(self, path, urls):
+
+        """
+        Creates directories of the file and replaces the
+        changed local copy, then starts downloading.
+
+        :path: a path to save the file relative to the output folder, type str
+        :urls: URL objects of mirrors of the file, type sequence <URL>
+
+        """
+        if not self.inside(path): # the file would be written outside the output folder
+            self.console.error(_("[{}] the file is outside the output folder.").format(path))
+            self.failed += 1
+            return
+        fullpath = self.output_path(path)
+        try:
+            os.makedirs(os.path.dirname(fullpath) or '.', exist_ok=True)
+            if not os.path.exists(fullpath + '.pymget') and os.path.isfile(fullpath):
+                os.remove(fullpath) # the file has been changed on the server
+        except OSError as e:
+            self.console.error('[{}] {}'.format(path, e))
+            self.failed += 1
+            return
+        Batch.start_job(self, path, urls)
+
+    def job_done(self, name, manager):
+
+        """
+        Sets the modification time of the downloaded file
+        as on the server.
+
+        :name: a path of the file, type str
+        :manager: the manager of the file
+
+        """
+        Batch.job_done(self, name, manager)
+        mtime = self.times.pop(name, None)
+        if mtime is not None:
+            try:
+                os.utime(manager.outfile.fullpath, (mtime, mtime))
+            except OSError:
+                pass
+
+    @property
+    def _tree(self):
+        return FTPTree
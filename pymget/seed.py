@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+from abc import ABCMeta, abstractmethod
+
+from . import messages
+from .errors import FileError
+
+class ISeed(metaclass=ABCMeta):
+
+    """
+    An interface for an older version of the downloaded file.
+
+    """
+    @abstractmethod
+    def match(self, piece_hashes): pass
+
+    @abstractmethod
+    def read(self, offset, size): pass
+
+    @abstractmethod
+    def close(self): pass
+
+
+
+class Seed(ISeed):
+
+    """
+    An older version of the file. Pieces of the new file
+    are looked up in it by their hashes, pieces found are
+    copied instead of downloading. The seed is hashed by
+    pieces from its beginning, so pieces which have been
+    changed in place or moved by whole pieces are found.
+
+    """
+    def __init__(self, path):
+
+        """
+        :path: the path of the older file, type str
+
+        """
+        self.path = path
+        try:
+            self.file = open(path, 'rb')
+        except OSError:
+            raise FileError(_("unable to read seed file '{}'.").format(path))
+
+    def match(self, piece_hashes):
+
+        """
+        Finds pieces of the new file in the seed.
+
+        :piece_hashes: hashes of pieces of the new file with the known size, type PieceHashes
+        :return: offsets of pieces in the seed, indexes of pieces in the new file are keys, type dict {int: int}
+
+        """
+        wanted = {} # indexes of pieces, digests are keys
+        for index, digest in enumerate(piece_hashes.digests):
+            wanted.setdefault(digest, []).append(index)
+        found = {}
+        offset = 0
+        while wanted:
+            data = self.read(offset, piece_hashes.length)
+            if not data:
+                break
+            for index in wanted.pop(hashlib.new(piece_hashes.algorithm, data).hexdigest(), ()):
+                found[index] = offset
+            offset += len(data)
+        last = len(piece_hashes.digests) - 1 # the shorter last piece is found at the end of the seed or at the same offset
+        if last < 0 or last in found:
+            return found
+        start, size = piece_hashes.piece_range(last)
+        if size < piece_hashes.length:
+            data = self.read(start, size)
+            if len(data) == size and piece_hashes.verify_piece(last, data):
+                found[last] = start
+        return found
+
+    def read(self, offset, size):
+
+        """
+        :offset: an offset in the seed, type int
+        :size: count of bytes, type int
+        :return: data, shorter at the end of the seed, type bytes
+
+        """
+        try:
+            self.file.seek(offset)
+            return self.file.read(size)
+        except OSError:
+            raise FileError(_("unable to read seed file '{}'.").format(self.path))
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import sqlite3
+from abc import ABCMeta, abstractmethod
+
+class MirrorRecord:
+
+    """
+    Measurements of a mirror: average throughput and time to
+    the first byte of parts, counts of written parts and errors
+    and support of ranges.
+
+    """
+    FLAKY_ERRORS = 2.5 # a mirror failed about 3 times recently (counts decay) and more often than it succeeded is skipped
+
+    def __init__(self, speed=0, ttfb=0, parts=0, errors=0, ranges=None):
+
+        """
+        :speed: average throughput of a part in bytes per second, type float
+        :ttfb: average time to the first byte of a part in seconds, type float
+        :parts: count of written parts, type float
+        :errors: count of errors, type float
+        :ranges: the mirror supports ranges, None - unknown, type bool
+
+        """
+        self.speed = speed
+        self.ttfb = ttfb
+        self.parts = parts
+        self.errors = errors
+        self.ranges = ranges
+
+    @property
+    def flaky(self):
+        return self.errors >= self.FLAKY_ERRORS and self.errors > self.parts
+
+    def part(self, speed, ttfb):
+
+        """
+        Adds a written part to averages.
+
+        :speed: throughput of the part in bytes per second, type float
+        :ttfb: time to the first byte of the part in seconds, type float
+
+        """
+        self.speed = (self.speed * self.parts + speed) / (self.parts + 1)
+        self.ttfb = (self.ttfb * self.parts + ttfb) / (self.parts + 1)
+        self.parts += 1
+
+    def decay(self, weight):
+
+        """
+        Makes old measurements less important.
+
+        :weight: the weight of measurements, from 0 to 1, type float
+
+        """
+        self.parts *= weight
+        self.errors *= weight
+
+    def merge(self, other):
+
+        """
+        Adds measurements of a new session.
+
+        :other: measurements of the session, type MirrorRecord
+
+        """
+        parts = self.parts + other.parts
+        if parts:
+            self.speed = (self.speed * self.parts + other.speed * other.parts) / parts
+            self.ttfb = (self.ttfb * self.parts + other.ttfb * other.parts) / parts
+        self.parts = parts
+        self.errors += other.errors
+        if other.ranges is not None:
+            self.ranges = other.ranges
+
+
+
+class IMirrorStats(metaclass=ABCMeta):
+
+    """
+    An interface for performance of mirrors measured before.
+
+    """
+    @abstractmethod
+    def load(self, hosts): pass
+
+    @abstractmethod
+    def save(self, records): pass
+
+    @abstractmethod
+    def close(self): pass
+
+
+
+class MirrorStats(IMirrorStats):
+
+    """
+    Performance of mirrors measured in previous sessions, kept in
+    a SQLite database shared by all processes. Counts of parts and
+    errors decay, so a mirror that failed yesterday is tried again
+    today. Statistics are optional: if the database can't be used,
+    nothing is known and nothing is saved.
+
+    """
+    HALF_LIFE = 24 * 3600 # counts lose half of their weight in a day
+    SCHEMA = '''CREATE TABLE IF NOT EXISTS mirrors (
+                    host TEXT PRIMARY KEY,
+                    updated REAL NOT NULL,
+                    speed REAL NOT NULL,
+                    ttfb REAL NOT NULL,
+                    parts REAL NOT NULL,
+                    errors REAL NOT NULL,
+                    ranges INTEGER
+                )'''
+
+    def __init__(self, path):
+
+        """
+        :path: the path of the database, type str
+
+        """
+        self.path = path
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, timeout=5, isolation_level=None) # transactions are started explicitly
+            self.db.execute(self.SCHEMA)
+        except (OSError, sqlite3.Error):
+            self.db = None
+
+    def weight(self, updated):
+
+        """
+        :updated: the time of measurements, type float
+        :return: the weight of measurements now, type float
+
+        """
+        return 0.5 ** (max(0, time.time() - updated) / self.HALF_LIFE)
+
+    def read(self, host):
+
+        """
+        :host: a name of the mirror, type str
+        :return: decayed measurements or None if the mirror is unknown, type MirrorRecord
+
+        """
+        row = self.db.execute('SELECT updated, speed, ttfb, parts, errors, ranges FROM mirrors WHERE host = ?', (host,)).fetchone()
+        if row is None:
+            return None
+        updated, speed, ttfb, parts, errors, ranges = row
+        record = MirrorRecord(speed, ttfb, parts, errors, None if ranges is None else bool(ranges))
+        record.decay(self.weight(updated))
+        return record
+
+    def load(self, hosts):
+
+        """
+        :hosts: names of mirrors, type sequence <str>
+        :return: measurements of known mirrors, names are keys, type dict {str: MirrorRecord}
+
+        """
+        if self.db is None:
+            return {}
+        records = {}
+        try:
+            for host in hosts:
+                record = self.read(host)
+                if record is not None:
+                    records[host] = record
+        except sqlite3.Error:
+            return {}
+        return records
+
+    def save(self, records):
+
+        """
+        Adds measurements of the session to measurements of
+        previous sessions.
+
+        :records: measurements of the session, names of mirrors are keys, type dict {str: MirrorRecord}
+
+        """
+        if self.db is None or not records:
+            return
+        try:
+            self.db.execute('BEGIN IMMEDIATE') # other processes don't save the same mirrors meanwhile
+            try:
+                for host, session in records.items():
+                    record = self.read(host) or MirrorRecord()
+                    record.merge(session)
+                    ranges = None if record.ranges is None else int(record.ranges)
+                    self.db.execute('INSERT OR REPLACE INTO mirrors VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (host, time.time(), record.speed, record.ttfb, record.parts, record.errors, ranges))
+                self.db.execute('COMMIT')
+            except:
+                self.db.execute('ROLLBACK')
+                raise
+        except sqlite3.Error: # the database is locked too long or broken, the session is not saved
+            pass
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
@@ -3,6 +3,8 @@
 
 from abc import ABCMeta, abstractmethod
 
+from .errors import FileError
+
 class ITaskInfo(metaclass=ABCMeta):
 
     """
@@ -36,16 +38,20 @@ class TaskHeadData(TaskInfo):
     Contains information of the file.
     
     """
-    def __init__(self, name, status, file_size):
+    def __init__(self, name, status, file_size, etag='', last_modified=''):
 
         """
         :name: name of the mirror put the object in the queue, type str
         :status: status of performance, type int
         :file_size: file size, type int
+        :etag: ETag of the file, empty if unknown, type str
+        :last_modified: Last-Modified of the file, empty if unknown, type str
 
         """
         TaskInfo.__init__(self, name, status)
         self.file_size = file_size
+        self.etag = etag
+        self.last_modified = last_modified
 
     def process(self, manager):
 
@@ -53,7 +59,36 @@ class TaskHeadData(TaskInfo):
         Executes when connection to server succed.
 
         """
-        manager.set_file_size(self.name, self.file_size) # tell file size to the Manager
+        manager.set_file_size(self.name, self.file_size, (self.etag, self.last_modified)) # tell file size to the Manager
+
+class TaskSmallFile(TaskInfo):
+
+    """
+    Contains data of the whole file received by one request.
+    
+    """
+    def __init__(self, name, status, data, etag='', last_modified=''):
+
+        """
+        :name: name of the mirror put the object in the queue, type str
+        :status: status of performance, type int
+        :data: file data, type bytes
+        :etag: ETag of the file, empty if unknown, type str
+        :last_modified: Last-Modified of the file, empty if unknown, type str
+
+        """
+        TaskInfo.__init__(self, name, status)
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def process(self, manager):
+
+        """
+        Executes when the small file is received.
+
+        """
+        manager.write_small_file(self.name, self.data, (self.etag, self.last_modified)) # write the whole file
 
 class TaskRedirect(TaskInfo):
 
@@ -111,13 +146,24 @@ class TaskHeadError(TaskInfo):
     Contains information about connection error.
     
     """
+    def __init__(self, name, status, retry_after=0):
+
+        """
+        :name: name of the mirror put the object in the queue, type str
+        :status: status of performance, type int
+        :retry_after: seconds the server asked to wait before the next request, 0 - not asked, type float
+
+        """
+        TaskInfo.__init__(self, name, status)
+        self.retry_after = retry_after
+
     def process(self, manager):
 
         """
         Executes when a connection error has occurred.
 
         """
-        manager.do_error(self.name, self.status) # process an error
+        manager.do_error(self.name, self.status, self.retry_after) # process an error
 
 class TaskError(TaskHeadError):
 
@@ -125,16 +171,19 @@ class TaskError(TaskHeadError):
     Contains information about download error.
     
     """
-    def __init__(self, name, status, offset):
+    def __init__(self, name, status, offset, retry_after=0, received=b''):
 
         """
         :name: name of the mirror put the object in the queue, type str
         :status: status of performance, type int
         :offset: offset given to the task, type int
+        :retry_after: seconds the server asked to wait before the next request, 0 - not asked, type float
+        :received: data of the part received before the error, type bytes
 
         """
-        TaskHeadError.__init__(self, name, status)
+        TaskHeadError.__init__(self, name, status, retry_after)
         self.offset = offset
+        self.received = received
 
     def process(self, manager):
 
@@ -142,7 +191,8 @@ class TaskError(TaskHeadError):
         Executes when a download error has occurred.
 
         """
-        manager.add_failed_part(self.offset) # add the task to failed
+        if not manager.stale_part(self.name, self.offset): # the part has not been dropped by restarting
+            manager.add_failed_part(self.offset, self.received) # add the rest of the task to failed
         TaskHeadError.process(self, manager) # process an
 
 class TaskData(TaskError):
@@ -169,4 +219,91 @@ class TaskData(TaskError):
         Executes when the task successfully completed.
 
         """
-        manager.write_data(self.name, self.offset, self.data) # write data
+        if not manager.stale_part(self.name, self.offset): # data of the old file are dropped
+            manager.write_data(self.name, self.offset, self.data) # write data
+
+class TaskChanged(TaskError):
+
+    """
+    Contains validators of the file which has been changed
+    on the server, a part of the old file has been requested.
+    
+    """
+    def __init__(self, name, status, offset, file_size, etag='', last_modified=''):
+
+        """
+        :name: name of the mirror put the object in the queue, type str
+        :status: status of performance, type int
+        :offset: offset given to the task, type int
+        :file_size: the size of the new file, -1 - unknown, type int
+        :etag: ETag of the new file, empty if unknown, type str
+        :last_modified: Last-Modified of the new file, empty if unknown, type str
+
+        """
+        TaskError.__init__(self, name, status, offset)
+        self.file_size = file_size
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def process(self, manager):
+
+        """
+        Executes when the server has sent the new file instead of the part.
+
+        """
+        manager.file_changed(self.name, self.offset, self.file_size, (self.etag, self.last_modified))
+
+class TaskWritten(TaskError):
+
+    """
+    Contains a part written to the file by a worker process.
+    
+    """
+    def __init__(self, name, status, offset, length):
+
+        """
+        :name: name of the mirror put the object in the queue, type str
+        :status: status of performance, type int
+        :offset: offset given to the task, type int
+        :length: length of written data, type int
+
+        """
+        TaskError.__init__(self, name, status, offset)
+        self.length = length
+
+    def process(self, manager):
+
+        """
+        Executes when the worker process has written the part.
+
+        """
+        if not manager.stale_part(self.name, self.offset): # data of the old file are dropped
+            manager.part_written(self.name, self.offset, self.length)
+
+class TaskWriteError(TaskError):
+
+    """
+    Contains an error of writing data by a worker process.
+    
+    """
+    def __init__(self, name, status, offset, error):
+
+        """
+        :name: name of the mirror put the object in the queue, type str
+        :status: status of performance, type int
+        :offset: offset given to the task, type int
+        :error: a description of the error, type str
+
+        """
+        TaskError.__init__(self, name, status, offset)
+        self.error = error
+
+    def process(self, manager):
+
+        """
+        Executes when the worker process failed to write the part.
+
+        """
+        if not manager.stale_part(self.name, self.offset):
+            manager.add_failed_part(self.offset) # the part will be downloaded again
+        raise FileError(self.error)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from abc import ABCMeta, abstractmethod
+
+class ITuner(metaclass=ABCMeta):
+
+    """
+    An interface for choosing count of parallel streams.
+
+    """
+    @abstractmethod
+    def update(self, now, progress, max_streams): pass
+
+    @abstractmethod
+    def error(self): pass
+
+
+
+class Tuner(ITuner):
+
+    """
+    Chooses count of parallel streams by the aggregate throughput.
+    Downloading starts with one stream, a stream is added while each
+    one makes the throughput noticeably higher. When the throughput
+    stops growing or errors become more frequent, the last added
+    stream is removed and the count is settled.
+
+    """
+    WINDOW = 3 # the throughput is measured over 3 seconds with each count of streams
+    GAIN = 1.1 # a stream is kept if it makes the throughput 10% higher at least
+
+    def __init__(self):
+        self.streams = 1 # current count of parallel streams
+        self.settled = False # the count has been chosen, it's not changed anymore
+        self.speed = 0 # the best throughput in bytes per second
+        self.start = None # the time and the progress at the start of the window, type tuple (float, int)
+        self.errors = 0 # errors in the current window
+        self.last_errors = None # errors in the previous window, None - nothing is measured yet
+
+    def update(self, now, progress, max_streams):
+
+        """
+        Measures the throughput and changes count of streams at
+        the end of the window.
+
+        :now: current time in seconds, type float
+        :progress: bytes downloaded by all streams, type int
+        :max_streams: count of streams that could run, e.g. count of mirrors, type int
+        :return: True if the count of streams has been changed or settled, type bool
+
+        """
+        if self.settled:
+            return False
+        if self.start is None:
+            self.start = now, progress
+            return False
+        start_time, start_progress = self.start
+        if now - start_time < self.WINDOW:
+            return False
+        speed = (progress - start_progress) / (now - start_time)
+        errors, self.errors = self.errors, 0
+        self.start = now, progress
+        if self.last_errors is not None and errors > self.last_errors: # more streams cause errors
+            self.back_off()
+        elif self.last_errors is not None and speed < self.speed * self.GAIN: # the throughput has reached a plateau
+            self.back_off()
+        elif self.streams >= max_streams: # all streams help, there are no more
+            self.speed = speed
+            self.settled = True
+        else:
+            self.speed = speed
+            self.last_errors = errors
+            self.streams += 1
+        return True
+
+    def back_off(self):
+        self.streams = max(1, self.streams - 1)
+        self.settled = True
+
+    def error(self):
+        self.errors += 1
@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import signal
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+from abc import ABCMeta, abstractmethod
+
+from . import messages
+from .errors import FatalError, CancelError
+from .mirrors import IMirror, Mirror
+from .task_info import TaskProgress, TaskData, TaskError, TaskHeadError, TaskWritten, TaskWriteError
+
+class Worker:
+
+    """
+    Runs threads of mirrors in a worker process, so receiving and
+    decrypting data is not limited by one core. Received data are
+    written to the output file at once, the manager is told only
+    offsets and lengths of written parts. A worker on another node
+    sends received data to the manager unless the file is on
+    shared storage.
+
+    Commands of the manager are tuples (name of the method, arguments...).
+
+    """
+    def __init__(self, conn, block_size, timeout):
+
+        """
+        :conn: the end of the pipe connected to the manager, type multiprocessing.Connection
+        :block_size: block size, type int
+        :timeout: timeout in seconds, type int
+
+        """
+        self.conn = conn
+        self.block_size = block_size
+        self.timeout = timeout
+        self.path = '' # the full path of the output file, empty - data are sent to the manager
+        self.fd = None # the output file is opened when the first part is received
+        self.mirrors = {} # real mirrors, names are keys
+        self.names = {} # names given by the manager, names of real mirrors (hosts) are keys
+        self.busy = set() # names of mirrors which threads are running
+        self.data_queue = queue.Queue() # results of threads of all the mirrors
+        self.commands = {
+            'open': self.open,
+            'connect': self.connect,
+            'download': self.download,
+            'cancel': self.cancel,
+            'close': self.close,
+        }
+
+    def run(self):
+
+        """
+        Executes commands of the manager and sends
+        results of threads until the manager stops it.
+
+        """
+        try:
+            while True:
+                if self.conn.poll(0 if self.busy else 0.01): # threads are waited while forwarding results
+                    command, *args = self.conn.recv()
+                    if command == 'stop':
+                        break
+                    self.commands[command](*args)
+                self.forward()
+        except (EOFError, OSError): # the manager has gone
+            pass
+        finally:
+            self.stop()
+
+    def open(self, path):
+        self.path = path
+
+    def mirror(self, name, url):
+
+        """
+        Returns the mirror, a new mirror is created if the
+        address has changed (e.g. the old one has been redirected).
+
+        :name: a name of the mirror, type str
+        :url: the URL object of the mirror, type URL
+
+        """
+        mirror = self.mirrors.get(name)
+        if mirror is None or mirror.url.url != url.url:
+            mirror = self._mirror.create(url, self.block_size, self.timeout)
+            mirror.data_queue = self.data_queue
+            self.mirrors[name] = mirror
+            self.names[mirror.name] = name
+        return mirror
+
+    def connect(self, name, url):
+        self.mirror(name, url).connect()
+        self.busy.add(name)
+
+    def download(self, name, offset, file_size, validator=None, url=None):
+        # the mirror could download without connecting when downloading is resumed
+        mirror = self.mirrors[name] if url is None else self.mirror(name, url)
+        mirror.file_size = file_size
+        mirror.validator = validator
+        mirror.download(offset)
+        self.busy.add(name)
+
+    def cancel(self, name):
+        if name in self.mirrors:
+            self.mirrors[name].cancel()
+
+    def close(self, name):
+        mirror = self.mirrors.pop(name, None)
+        if mirror is not None:
+            mirror.join()
+            mirror.close()
+
+    def forward(self):
+
+        """
+        Writes received data and sends results of threads to the
+        manager. Only the last progress of each mirror is sent,
+        mirrors which threads have finished are reported idle
+        after their results.
+
+        """
+        finished = [name for name in self.busy if self.mirrors[name].wait_connection()]
+        progress = {} # the last progress of mirrors, names are keys
+        while True:
+            try:
+                task_info = self.data_queue.get_nowait()
+            except queue.Empty:
+                break
+            task_info.name = self.names.get(task_info.name, task_info.name) # results are reported by names of the manager
+            if isinstance(task_info, TaskProgress):
+                progress[task_info.name] = task_info
+                continue
+            progress.pop(task_info.name, None) # the task is over, its progress is not needed
+            if isinstance(task_info, TaskData) and self.path:
+                task_info = self.write(task_info)
+            self.conn.send(('task', task_info))
+        for task_info in progress.values():
+            self.conn.send(('task', task_info))
+        for name in finished:
+            self.busy.discard(name)
+            self.conn.send(('idle', name))
+
+    def write(self, task_info):
+
+        """
+        Writes data of the part to the output file.
+
+        :task_info: received data, type TaskData
+        :return: the result for the manager, type TaskWritten or TaskWriteError
+
+        """
+        try:
+            if self.fd is None:
+                self.fd = os.open(self.path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+            os.lseek(self.fd, task_info.offset, os.SEEK_SET)
+            data = memoryview(task_info.data)
+            while data:
+                data = data[os.write(self.fd, data):]
+        except OSError:
+            error = _("Failed to write file '{}'.").format(self.path)
+            return TaskWriteError(task_info.name, task_info.status, task_info.offset, error)
+        return TaskWritten(task_info.name, task_info.status, task_info.offset, len(task_info.data))
+
+    def stop(self):
+
+        """
+        Cancels threads, closes connections and the file.
+
+        """
+        for mirror in self.mirrors.values():
+            mirror.cancel()
+        for mirror in self.mirrors.values():
+            mirror.join()
+            mirror.close()
+        if self.fd is not None:
+            os.close(self.fd)
+
+    @property
+    def _mirror(self):
+        return Mirror
+
+
+
+def run_worker(conn, block_size, timeout):
+
+    """
+    The entry point of a worker process.
+
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the manager cancels downloading on Ctrl+C
+    Worker(conn, block_size, timeout).run()
+
+
+
+class IWorkerProcess(metaclass=ABCMeta):
+
+    """
+    An interface for WorkerProcess.
+
+    """
+    @abstractmethod
+    def start(self): pass
+
+    @abstractmethod
+    def send(self, *command): pass
+
+    @abstractmethod
+    def stop(self): pass
+
+
+
+class WorkerProcess(IWorkerProcess):
+
+    """
+    A worker process running threads of several mirrors. Results
+    are received by a thread and put into queues of the mirrors.
+
+    """
+    STOP_TIMEOUT = 10 # how long the process is waited before it's terminated, in seconds
+
+    def __init__(self, block_size, timeout):
+
+        """
+        :block_size: block size, type int
+        :timeout: timeout in seconds, type int
+
+        """
+        context = multiprocessing.get_context('spawn') # don't fork threads of the manager
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(child_conn, block_size, timeout), daemon=True)
+        self.child_conn = child_conn
+        self.mirrors = {} # mirrors running in the process, names are keys
+        self.alive = True # the process has not exited
+        self.reader = threading.Thread(target=self.read, daemon=True)
+
+    def start(self):
+        self.process.start()
+        self.child_conn.close() # the process has its own copy
+        self.reader.start()
+
+    def send(self, *command):
+
+        """
+        Sends the command to the process. If the process has
+        died, the reader thread reports tasks of its mirrors failed.
+
+        """
+        try:
+            self.conn.send(command)
+        except OSError:
+            pass
+
+    def read(self):
+
+        """
+        Receives results until the process exits.
+
+        """
+        while True:
+            try:
+                kind, value = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            mirror = self.mirrors.get(value if kind == 'idle' else value.name)
+            if mirror is None: # the mirror has been replaced
+                continue
+            if kind == 'idle':
+                mirror.idle.set()
+            else:
+                mirror.data_queue.put(value)
+        self.alive = False # commands sent later fail mirrors at once
+        for mirror in list(self.mirrors.values()):
+            mirror.fail()
+
+    def stop(self):
+
+        """
+        Stops the process, its mirrors should be closed before.
+
+        """
+        self.send('stop')
+        self.process.join(self.STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.reader.join()
+        self.conn.close()
+
+
+
+class ProcessMirror(IMirror):
+
+    """
+    A mirror which threads run in a worker process. It keeps
+    the state of the mirror for the manager and sends commands
+    to the real mirror in the process.
+
+    """
+    fetches_small_files = False # data are not passed to the manager, a small file is split as usual
+
+    def __init__(self, url, block_size, timeout, worker):
+
+        """
+        :url: the URL object describes the download link, type URL
+        :block_size: block size, type int
+        :timeout: timeout in seconds, type int
+        :worker: the process running threads of the mirror, type WorkerProcess
+
+        """
+        self.url = url
+        self.block_size = block_size
+        self.timeout = timeout
+        self.location = url.location # country code of the mirror
+        self.max_connections = url.max_connections
+        self.file_size = 0 # the file size will be determined after connect
+        self.validator = None # ETag and Last-Modified of the file, parts are requested only from the same file
+        self.task_progress = 0 # the progress of current task
+        self.strikes = 0 # count of corrupted blocks received from the mirror
+        self.need_connect = True # the flag of a need to connect
+        self.ready = False # the flag of a rediness to download a part
+        self.reconnects = url.protocol == 'ftp' # FTP mirrors connect for each task
+        self.connected = False # the connection message has been shown
+        self.offset = None # the offset of the part being downloaded
+        self.data_queue = None # a queue of the manager for results
+        self.idle = threading.Event() # threads of the mirror are not running
+        self.idle.set()
+        self.lock = threading.Lock() # the reader thread and the manager could fail the task together
+        self.worker = worker
+        worker.mirrors[self.name] = self
+
+    def connect(self, probe_size=0):
+        self.ready = False
+        self.need_connect = False
+        self.offset = None
+        self.idle.clear()
+        self.send('connect', self.name, self.url)
+
+    def download(self, offset):
+        self.ready = False
+        self.offset = offset
+        self.idle.clear()
+        self.send('download', self.name, offset, self.file_size, self.validator, self.url)
+
+    def wait_connection(self):
+        return self.idle.wait(0.001)
+
+    def send(self, *command):
+        self.worker.send(*command)
+        if not self.worker.alive: # the process has exited, nobody would answer
+            self.fail()
+
+    def cancel(self):
+        self.worker.send('cancel', self.name)
+
+    def join(self):
+        self.idle.wait()
+
+    def done(self):
+        self.task_progress = 0
+        self.ready = not self.reconnects
+        self.need_connect = self.reconnects
+
+    def connect_message(self, console):
+        if self.connected:
+            return
+        self.connected = True
+        console.message(_("Connecting to {} OK").format(self.url.host))
+
+    def close(self):
+        self.worker.send('close', self.name)
+
+    def fail(self):
+
+        """
+        Reports the current task failed when the worker process has died.
+
+        """
+        with self.lock:
+            if self.idle.is_set():
+                return
+            if self.offset is None:
+                self.data_queue.put(TaskHeadError(self.name, 0))
+            else:
+                self.data_queue.put(TaskError(self.name, 0, self.offset))
+            self.idle.set()
+
+    @property
+    def name(self):
+        return self.url.host
+
+    @property
+    def filename(self):
+        return self.url.filename
+
+
+
+class RemoteWorker(WorkerProcess):
+
+    """
+    A worker on another node connected to the coordinator.
+    Commands and results are passed the same way as
+    to a worker process.
+
+    """
+    def __init__(self, conn, name):
+
+        """
+        :conn: the connection to the worker, type multiprocessing.Connection
+        :name: the address of the worker, type str
+
+        """
+        self.conn = conn
+        self.name = name
+        self.mirrors = {} # mirrors running on the node, names are keys
+        self.alive = True # the worker is connected
+        self.reader = threading.Thread(target=self.read, daemon=True)
+
+    def start(self):
+        self.reader.start()
+
+    def stop(self):
+
+        """
+        Stops the worker, its mirrors should be closed before.
+
+        """
+        self.send('stop')
+        self.reader.join(self.STOP_TIMEOUT)
+        self.conn.close()
+
+
+
+class RemoteMirror(ProcessMirror):
+
+    """
+    A mirror which threads run on another node. Each node runs
+    its own mirror of every link, so names of mirrors include
+    the address of the node.
+
+    """
+    def connect_message(self, console):
+        if self.connected:
+            return
+        self.connected = True
+        console.message(_("Connecting to {} from {} OK").format(self.url.host, self.worker.name))
+
+    @property
+    def name(self):
+        return '{}@{}'.format(self.url.host, self.worker.name)
+
+
+
+class Coordinator:
+
+    """
+    Accepts workers of other nodes. Workers are authenticated by
+    the secret, then they are told the block size and the timeout.
+    Accepted workers are taken by the manager, which gives them
+    blocks as to its own mirrors.
+
+    """
+    def __init__(self, address, secret, block_size, timeout):
+
+        """
+        :address: the address to listen, type tuple (host, port)
+        :secret: the key authenticating workers, type str
+        :block_size: block size, type int
+        :timeout: timeout in seconds, type int
+
+        """
+        self.secret = secret.encode('utf-8')
+        self.block_size = block_size
+        self.timeout = timeout
+        try:
+            self.listener = Listener(address, authkey=self.secret)
+        except OSError as e:
+            raise FatalError(_("unable to accept workers on {}:{}: {}").format(address[0], address[1], e.strerror))
+        self.address = self.listener.address # the port is known if any port has been requested
+        self.workers = queue.Queue() # accepted workers not yet taken by the manager
+        self.closed = False
+        self.thread = threading.Thread(target=self.accept, daemon=True)
+        self.thread.start()
+
+    def accept(self):
+
+        """
+        Accepts workers until the coordinator is closed.
+
+        """
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (multiprocessing.AuthenticationError, EOFError, ConnectionError): # a wrong secret or the worker has gone
+                continue
+            except OSError: # the listener is closed
+                break
+            if self.closed: # the connection just wakes up the thread
+                conn.close()
+                break
+            try:
+                conn.send((self.block_size, self.timeout))
+            except OSError:
+                conn.close()
+                continue
+            host, port = self.listener.last_accepted
+            self.workers.put(self._remote_worker(conn, '{}:{}'.format(host, port)))
+
+    def accepted(self):
+
+        """
+        :return: workers accepted since the last call, type list <RemoteWorker>
+
+        """
+        workers = []
+        while True:
+            try:
+                workers.append(self.workers.get_nowait())
+            except queue.Empty:
+                return workers
+
+    def close(self):
+
+        """
+        Stops accepting workers, workers already
+        accepted but not taken are disconnected.
+
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            Client(self.address, authkey=self.secret).close() # wake up the accepting thread
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            pass
+        self.thread.join(WorkerProcess.STOP_TIMEOUT)
+        self.listener.close()
+        for worker in self.accepted():
+            worker.conn.close()
+
+    @property
+    def _remote_worker(self):
+        return RemoteWorker
+
+
+
+def work_for(console, address, secret):
+
+    """
+    Runs this process as a worker of the coordinator on another
+    node until the coordinator stops it.
+
+    :console: the console object
+    :address: the address of the coordinator, type tuple (host, port)
+    :secret: the key authenticating the worker, type str
+
+    """
+    try:
+        conn = Client(address, authkey=secret.encode('utf-8'))
+        block_size, timeout = conn.recv()
+    except multiprocessing.AuthenticationError:
+        raise FatalError(_("the coordinator {}:{} has rejected the secret.").format(*address))
+    except (OSError, EOFError):
+        raise FatalError(_("unable to connect to the coordinator {}:{}.").format(*address))
+    console.message(_("Working for the coordinator {}:{}").format(*address))
+    try:
+        Worker(conn, block_size, timeout).run()
+    except KeyboardInterrupt: # blocks given to the worker are downloaded by others
+        raise CancelError(_("Operation has been cancelled by user."))
+    finally:
+        conn.close()
+    console.message(_("The coordinator has finished downloading."))
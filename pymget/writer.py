@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from abc import ABCMeta, abstractmethod
+
+from .errors import FileError
+
+class IWriter(metaclass=ABCMeta):
+
+    """
+    An interface for a writer.
+
+    """
+    @abstractmethod
+    def start(self): pass
+
+    @abstractmethod
+    def put(self, offset, data): pass
+
+    @abstractmethod
+    def take_written(self): pass
+
+    @abstractmethod
+    def close(self): pass
+
+
+def coalesce(blocks):
+
+    """
+    Merges adjacent blocks into runs of sequential data.
+
+    :blocks: data of blocks, offsets are keys, type dict
+    :return: a list of runs [offset, length, [data of blocks]], sorted by offset
+
+    """
+    runs = []
+    for offset in sorted(blocks):
+        data = blocks[offset]
+        if runs and runs[-1][0] + runs[-1][1] == offset: # the block continues the previous run
+            runs[-1][1] += len(data)
+            runs[-1][2].append(data)
+        else:
+            runs.append([offset, len(data), [data]])
+    return runs
+
+
+class Writer(threading.Thread, IWriter):
+
+    """
+    Writes data to the output file in a separate thread,
+    so a slow disk doesn't stall the manager. Blocks waiting
+    in the queue are merged with adjacent ones and written
+    by a single call. Written parts are reported back
+    to the manager through 'take_written'.
+
+    When the queue holds more data than the memory limit,
+    'put' blocks until the writer catches up.
+
+    """
+    def __init__(self, outfile, memory_limit):
+
+        """
+        :outfile: an outfile object
+        :memory_limit: max size of queued data in bytes, type int
+
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.outfile = outfile
+        self.memory_limit = memory_limit
+        self.blocks = {} # data waiting for writing, offsets are keys
+        self.queued_bytes = 0 # size of data that have been put but not yet written
+        self.written = [] # written parts not yet taken by the manager, tuples (offset, length)
+        self.error = None # an exception raised while writing
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, offset, data):
+
+        """
+        Adds data to the queue. Blocks while the queue is full.
+
+        :offset: an offset of data in the file, type int
+        :data: data to write, type bytes
+
+        """
+        with self.condition:
+            # a block larger than the limit is accepted when the queue is empty
+            while self.error is None and self.queued_bytes and self.queued_bytes + len(data) > self.memory_limit:
+                self.condition.wait(0.1)
+            if self.error is not None:
+                raise self.error
+            self.blocks[offset] = data
+            self.queued_bytes += len(data)
+            self.condition.notify_all()
+
+    def take_written(self):
+
+        """
+        Returns parts written since the last call. If writing
+        has failed, check 'error' after taking written parts.
+
+        :return: a list of tuples (offset, length)
+
+        """
+        with self.condition:
+            written, self.written = self.written, []
+            return written
+
+    def close(self):
+
+        """
+        Writes the rest of the queue and stops the thread.
+
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.join()
+
+    def run(self):
+
+        """
+        Takes all queued blocks at once and writes them
+        by runs of adjacent blocks.
+
+        """
+        while True:
+            with self.condition:
+                while not self.blocks and not self.closed:
+                    self.condition.wait()
+                if not self.blocks: # closed and nothing to write
+                    return
+                blocks, self.blocks = self.blocks, {}
+            written = []
+            size = 0
+            try:
+                for offset, length, chunks in coalesce(blocks):
+                    self.outfile.write_at(offset, chunks)
+                    chunk_offset = offset
+                    for data in chunks: # report parts as they have been put
+                        written.append((chunk_offset, len(data)))
+                        chunk_offset += len(data)
+                    size += length
+            except FileError as e:
+                with self.condition:
+                    self.written.extend(written) # these parts are written anyway
+                    self.error = e
+                    self.blocks = {}
+                    self.queued_bytes = 0
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.written.extend(written)
+                self.queued_bytes -= size
+                self.condition.notify_all()
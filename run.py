@@ -2,4 +2,5 @@
 
 from pymget import pymget
 
-pymget.start()
+if __name__ == '__main__': # worker processes import this module
+    pymget.start()
@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from pymget import api
+from pymget.errors import CancelError, CommandLineError, FatalError
+
+class TestCallbackConsole(unittest.TestCase):
+
+    def test_progress(self):
+        on_progress = Mock()
+        console = api.CallbackConsole(on_progress=on_progress)
+        console.create_progressbar(100, 10)
+        on_progress.assert_called_with(10, 100)
+        console.progress(50)
+        on_progress.assert_called_with(50, 100)
+
+    def test_messages(self):
+        on_message = Mock()
+        console = api.CallbackConsole(on_message=on_message)
+        console.message()
+        self.assertFalse(on_message.called)
+        console.warning('\ncorrupted\n')
+        on_message.assert_called_with('warning', 'corrupted')
+        console.error('failed')
+        on_message.assert_called_with('error', 'failed')
+
+    def test_no_callbacks(self):
+        console = api.CallbackConsole()
+        console.message('text')
+        console.progress(10)
+        self.assertTrue(console.ask('Create?', True))
+        self.assertFalse(console.ask('Rewrite?', False))
+
+    def test_answer(self):
+        answer = Mock(return_value=1)
+        console = api.CallbackConsole(answer=answer)
+        self.assertIs(console.ask('Rewrite?', False), True)
+        answer.assert_called_with('Rewrite?', False)
+
+
+
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = Mock(written_bytes=10, file_size=20)
+        self.outfile = Mock(fullpath='/tmp/file')
+        patchers = [patch.object(api.Download, '_manager', Mock(return_value=self.manager)),
+                    patch.object(api.Download, '_outfile', Mock(return_value=self.outfile))]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_options(self):
+        on_mirror = Mock()
+        download = api.Download(['http://one.com/file', 'ftp://two.com/file'], '/tmp/', on_mirror=on_mirror,
+                                block_size=2**20, retries=5, checksum='md5:' + '0' * 32)
+        command_line = download.command_line
+        self.assertEqual([url.url for url in command_line.urls], ['http://one.com/file', 'ftp://two.com/file'])
+        self.assertEqual(command_line.filename, '/tmp/')
+        self.assertEqual(command_line.block_size, 2**20)
+        self.assertFalse(command_line.auto_block_size) # the given size is not chosen by the speed of mirrors
+        self.assertEqual(command_line.retries, 5)
+        self.assertEqual(command_line.checksum.algorithm, 'md5')
+        self.assertIs(self.manager.mirror_events, on_mirror)
+        self.assertEqual(download.written_bytes, 10)
+        self.assertEqual(download.file_size, 20)
+
+    def test_wrong_options(self):
+        with self.assertRaises(TypeError):
+            api.Download('http://one.com/file', blocksize=1)
+        with self.assertRaises(ValueError):
+            api.Download('file://one.com/file')
+        with self.assertRaises(CommandLineError):
+            api.Download('http://one.com/file', checksum='wrong')
+
+    def test_result(self):
+        self.manager.steps.return_value = iter([None, None])
+        download = api.download('http://one.com/file', '/tmp/')
+        self.assertEqual(download.result(5), '/tmp/file')
+        self.assertTrue(download.done())
+        self.assertIs(self.manager.prepare.call_args[0][0], download.console)
+
+    def test_result_error(self):
+        self.manager.prepare.side_effect = FatalError('failed')
+        callback = Mock()
+        download = api.Download('http://one.com/file')
+        download.add_done_callback(callback)
+        download.start()
+        with self.assertRaises(FatalError):
+            download.result(5)
+        callback.assert_called_with(download)
+        download.add_done_callback(callback) # called at once
+        self.assertEqual(callback.call_count, 2)
+
+    def test_cancel(self):
+        steps = Mock()
+        steps.__iter__ = Mock(return_value=steps)
+        steps.__next__ = Mock(return_value=None)
+        steps.throw.side_effect = CancelError('cancelled')
+        self.manager.steps.return_value = steps
+        download = api.Download('http://one.com/file')
+        self.assertTrue(download.cancel())
+        download.start()
+        with self.assertRaises(CancelError):
+            download.result(5)
+        steps.throw.assert_called_with(KeyboardInterrupt)
+        self.assertFalse(download.cancel())
+
+    def test_result_timeout(self):
+        download = api.Download('http://one.com/file')
+        with self.assertRaises(TimeoutError):
+            download.result(0)
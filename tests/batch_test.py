@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import Mock, patch
+import os
+
+from pymget import batch
+from pymget.errors import FatalError, FileError, CancelError
+
+class TestConnectionSlots(unittest.TestCase):
+
+    def test_acquire_release(self):
+        slots = batch.ConnectionSlots(2)
+        self.assertTrue(slots.acquire())
+        self.assertTrue(slots.acquire())
+        self.assertFalse(slots.acquire())
+        slots.release()
+        self.assertTrue(slots.acquire())
+
+
+
+
+class TestJobConsole(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.job_console = batch.JobConsole(self.console, 'file')
+
+    def test_message_prefixed(self):
+        self.job_console.message('\nConnected\n')
+        self.console.message.assert_called_with('[file] Connected', '\n')
+
+    def test_empty_message_skipped(self):
+        self.job_console.message()
+        self.assertFalse(self.console.message.called)
+
+    def test_error_prefixed(self):
+        self.job_console.error('failed')
+        self.console.error.assert_called_with('[file] failed', '\n')
+
+    def test_no_progressbar(self):
+        self.job_console.create_progressbar(100, 0)
+        self.job_console.progress(50)
+        self.assertFalse(self.console.create_progressbar.called)
+        self.assertFalse(self.console.progress.called)
+
+
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.command_line = Mock()
+        self.command_line.filename = ''
+        self.command_line.connections = 4
+        self.url = Mock(filename='file', host='server.com')
+        self.command_line.jobs = [('', [self.url]), ('dir/other', [self.url])]
+        self.pool = Mock()
+        self.manager = Mock()
+        with patch.object(batch.Batch, '_pool', self.pool):
+            self.batch = batch.Batch()
+            self.batch.prepare(self.console, self.command_line)
+
+    def test_prepare(self):
+        self.assertEqual(self.batch.total, 2)
+        self.assertEqual(self.batch.slots.limit, 4)
+        self.assertTrue(self.pool.return_value.enabled)
+
+    def test_output_path(self):
+        self.assertEqual(self.batch.output_path(''), '')
+        self.assertEqual(self.batch.output_path('dir/file'), 'dir/file')
+        self.command_line.filename = 'out'
+        self.assertEqual(self.batch.output_path(''), 'out' + os.sep)
+        self.assertEqual(self.batch.output_path('file'), os.path.join('out', 'file'))
+
+    def test_start_job(self):
+        with patch.object(batch.Batch, '_manager', Mock(return_value=self.manager)), \
+                patch.object(batch.Batch, '_outfile', Mock()):
+            self.batch.start_job('dir/other', [self.url])
+        options = self.manager.prepare.call_args[0][1]
+        self.assertIsNot(options, self.command_line)
+        self.assertEqual(options.filename, 'dir/other')
+        self.assertIsNone(options.checksum)
+        self.assertIs(self.manager.slots, self.batch.slots)
+        self.assertEqual(len(self.batch.active), 1)
+
+    def test_start_job_failed(self):
+        self.manager.prepare.side_effect = FatalError('failed')
+        with patch.object(batch.Batch, '_manager', Mock(return_value=self.manager)), \
+                patch.object(batch.Batch, '_outfile', Mock()):
+            self.batch.start_job('', [self.url])
+        self.assertEqual(self.batch.failed, 1)
+        self.assertEqual(self.batch.active, [])
+
+    def test_step(self):
+        steps = iter([None])
+        job = ('file', self.manager, steps)
+        self.batch.active.append(job)
+        self.batch.step(job)
+        self.assertEqual(self.batch.active, [job])
+        self.batch.step(job)
+        self.assertEqual(self.batch.active, [])
+        self.assertEqual(self.batch.done, 1)
+
+    def test_step_failed(self):
+        steps = Mock()
+        steps.__next__ = Mock(side_effect=FileError('failed'))
+        job = ('file', self.manager, steps)
+        self.batch.active.append(job)
+        self.batch.step(job)
+        self.assertEqual(self.batch.active, [])
+        self.assertEqual(self.batch.failed, 1)
+        self.manager.console.error.assert_called_with('failed')
+
+    def test_download(self):
+        self.batch.start_job = Mock()
+        with patch.object(batch.Batch, '_pool', self.pool):
+            self.batch.download()
+        self.assertEqual(self.batch.start_job.call_count, 2)
+        self.pool.return_value.close.assert_called_with()
+
+    def test_download_failed(self):
+        self.batch.jobs.clear()
+        self.batch.failed = 1
+        with patch.object(batch.Batch, '_pool', self.pool):
+            with self.assertRaises(FatalError):
+                self.batch.download()
+
+    def test_download_cancel(self):
+        self.batch.jobs.clear()
+        steps = Mock()
+        steps.throw.side_effect = CancelError('cancelled')
+        self.batch.active.append(('file', self.manager, steps))
+        self.batch.step = Mock(side_effect=KeyboardInterrupt)
+        with patch.object(batch.Batch, '_pool', self.pool):
+            with self.assertRaises(CancelError):
+                self.batch.download()
+        steps.throw.assert_called_with(KeyboardInterrupt)
+        self.pool.return_value.close.assert_called_with()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import Mock, patch
+import os
+import tempfile
+
+from pymget import cache
+from pymget.networking import URL
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = cache.Cache(os.path.join(self.tmp.name, 'cache'), 0)
+        self.file = os.path.join(self.tmp.name, 'file')
+        with open(self.file, 'wb') as f:
+            f.write(b'\x01' * 100)
+
+    def test_keys(self):
+        checksum = Mock(algorithm='sha256', digest='abc')
+        urls = [URL('http://one.com/file'), URL('http://two.com/file')]
+        validators = {'one.com': ('"a"', ''), 'two.com': ('', 'Mon, 01 Jan 2024 00:00:00 GMT')}
+        self.assertEqual(self.cache.keys(checksum, urls, 0, validators), ['sha256-abc'])
+        keys = self.cache.keys(None, urls, 100, validators)
+        self.assertEqual(len(keys), 2)
+        self.assertTrue(keys[0].endswith('-100'))
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(self.cache.keys(checksum, urls, 100, {}), ['sha256-abc']) # a link without a validator is not enough
+        self.assertEqual(len(self.cache.keys(None, urls, 100, {'one.com': ('"a"', '')})), 1)
+
+    def test_file_changed_with_same_size(self):
+        urls = [URL('http://one.com/file')]
+        self.cache.store(self.cache.keys(None, urls, 100, {'one.com': ('"a"', '')}), self.file)
+        self.assertIsNotNone(self.cache.lookup(self.cache.keys(None, urls, 100, {'one.com': ('"a"', '')})))
+        self.assertIsNone(self.cache.lookup(self.cache.keys(None, urls, 100, {'one.com': ('"b"', '')})))
+        self.assertIsNone(self.cache.lookup(self.cache.keys(None, urls, 100, {})))
+
+    def test_store_and_lookup(self):
+        self.assertIsNone(self.cache.lookup(['a']))
+        self.assertTrue(self.cache.store(['a', 'b'], self.file))
+        path = self.cache.lookup(['c', 'b'])
+        self.assertEqual(path, self.cache.entry('b'))
+        self.assertEqual(os.stat(path).st_ino, os.stat(self.cache.entry('a')).st_ino) # the file is kept once
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'\x01' * 100)
+        self.assertEqual(sorted(os.listdir(self.cache.path)), ['a', 'b'])
+
+    def test_store_missing_file(self):
+        self.assertFalse(self.cache.store(['a'], self.file + '.missing'))
+        self.assertEqual(os.listdir(self.cache.path), [])
+
+    def test_evict(self):
+        self.cache.store(['old'], self.file)
+        os.utime(self.cache.entry('old'), (1, 1))
+        self.cache.store(['new'], self.file)
+        self.cache.max_size = 150
+        self.cache.evict()
+        self.assertEqual(os.listdir(self.cache.path), ['new'])
+
+    def test_record(self):
+        self.assertEqual(self.cache.record(False), (0, 1))
+        self.assertEqual(self.cache.record(True), (1, 2))
+        with open(self.cache.entry(cache.Cache.STATS), 'w') as f:
+            f.write('broken')
+        self.assertEqual(self.cache.record(True), (1, 1))
+
+
+
+
+class TestCloneFile(unittest.TestCase):
+
+    def test_clone_file(self):
+        with tempfile.TemporaryFile() as src, tempfile.TemporaryFile() as dst:
+            src.write(b'\x01' * 100)
+            src.flush()
+            dst.write(b'\x00' * 200)
+            dst.flush()
+            with patch.object(cache, 'fcntl', None), patch.object(cache, 'COPY_SIZE', 30):
+                with patch('os.copy_file_range', side_effect=OSError, create=True):
+                    self.assertEqual(cache.clone_file(src.fileno(), dst.fileno()), 100)
+            dst.seek(0)
+            self.assertEqual(dst.read(), b'\x01' * 100)
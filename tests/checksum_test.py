@@ -0,0 +1,216 @@
+import unittest
+from unittest.mock import Mock, patch
+import hashlib
+
+from pymget.checksum import Checksum, PieceHashes
+
+class TestChecksum(unittest.TestCase):
+
+    def setUp(self):
+        self.data = bytes(range(256)) * 4
+        self.digest = hashlib.sha256(self.data).hexdigest()
+        self.checksum = Checksum('sha256', self.digest)
+        self.read = lambda offset, size: self.data[offset:offset + size]
+
+    def test_parse(self):
+        checksum = Checksum.parse('SHA-256:' + self.digest)
+        self.assertEqual(checksum.algorithm, 'sha256')
+        self.assertEqual(checksum.digest, self.digest)
+
+    def test_parse_blake2(self):
+        checksum = Checksum.parse('blake2:' + hashlib.blake2b().hexdigest())
+        self.assertEqual(checksum.hash.name, 'blake2b')
+
+    def test_reset(self):
+        self.checksum.update(0, b'\xff' * 10)
+        self.checksum.update(20, b'\xff', True)
+        self.checksum.reset()
+        self.assertEqual((self.checksum.frontier, self.checksum.pending), (0, {}))
+        self.checksum.update(0, self.data)
+        self.assertTrue(self.checksum.verify())
+
+    def test_parse_truncated_digest(self):
+        with self.assertRaises(ValueError):
+            Checksum.parse('sha256:ab')
+
+    def test_parse_without_digest(self):
+        with self.assertRaises(ValueError):
+            Checksum.parse('sha256')
+
+    def test_parse_unknown_algorithm(self):
+        with self.assertRaises(ValueError):
+            Checksum.parse('crc32:ab')
+
+    def test_parse_wrong_digest(self):
+        with self.assertRaises(ValueError):
+            Checksum.parse('md5:xyz')
+
+    def test_update_in_order(self):
+        self.checksum.update(0, self.data[:512])
+        self.checksum.update(512, self.data[512:])
+        self.assertEqual(self.checksum.frontier, 1024)
+        self.assertTrue(self.checksum.verify())
+
+    def test_update_out_of_order(self):
+        self.checksum.update(512, self.data[512:])
+        self.assertEqual(self.checksum.frontier, 0)
+        self.assertEqual(self.checksum.pending, {512: 512})
+        self.checksum.update(0, self.data[:512])
+        read = Mock(side_effect=self.read)
+        self.checksum.advance(read)
+        read.assert_called_once_with(512, 512)
+        self.assertEqual(self.checksum.frontier, 1024)
+        self.assertTrue(self.checksum.verify())
+
+    def test_update_not_written(self):
+        self.checksum.update(512, self.data[512:], False)
+        self.assertEqual(self.checksum.pending, {})
+        self.checksum.update(0, self.data[:512], False)
+        self.assertEqual(self.checksum.frontier, 512)
+        read = Mock(side_effect=self.read)
+        self.checksum.resume(read, [(0, 512), (512, 512)]) # both parts are written now
+        read.assert_called_once_with(512, 512)
+        self.assertTrue(self.checksum.verify())
+
+    def test_advance_with_gap(self):
+        self.checksum.update(512, self.data[512:])
+        read = Mock(side_effect=self.read)
+        self.checksum.advance(read)
+        self.assertFalse(read.called)
+        self.assertEqual(self.checksum.frontier, 0)
+
+    def test_advance_large_part_by_chunks(self):
+        self.checksum.READ_SIZE = 256
+        self.checksum.update(512, self.data[512:])
+        self.checksum.update(0, self.data[:512])
+        read = Mock(side_effect=self.read)
+        self.checksum.advance(read)
+        self.assertEqual(read.call_count, 2)
+        self.assertTrue(self.checksum.verify())
+
+    def test_resume(self):
+        read = Mock(side_effect=self.read)
+        self.checksum.resume(read, [(0, 256), (512, 256)])
+        read.assert_called_once_with(0, 256)
+        self.assertEqual(self.checksum.frontier, 256)
+        self.checksum.update(256, self.data[256:512])
+        self.checksum.advance(read)
+        read.assert_called_with(512, 256)
+        self.checksum.update(768, self.data[768:])
+        read.reset_mock()
+        self.checksum.finish(read, len(self.data))
+        self.assertFalse(read.called)
+        self.assertTrue(self.checksum.verify())
+
+    def test_finish_reads_the_rest(self):
+        self.checksum.update(0, self.data[:256])
+        self.checksum.update(768, self.data[768:])
+        read = Mock(side_effect=self.read)
+        self.checksum.finish(read, len(self.data))
+        read.assert_called_once_with(256, 768)
+        self.assertTrue(self.checksum.verify())
+
+    def test_verify_mismatch(self):
+        self.checksum.update(0, b'\x00' * 1024)
+        self.assertFalse(self.checksum.verify())
+
+
+
+
+class TestPieceHashes(unittest.TestCase):
+
+    def setUp(self):
+        self.data = bytes(range(256)) * 4 + b'\x01' * 100
+        self.digests = [hashlib.sha1(self.data[i:i + 256]).hexdigest() for i in range(0, len(self.data), 256)]
+        self.hashes = PieceHashes('sha1', 256, self.digests)
+
+    @patch('builtins.open')
+    def test_load(self, open_mock):
+        lines = ['# comment\n', 'SHA-1 256\n', '\n'] + [d + '\n' for d in self.digests]
+        open_mock.return_value.__enter__.return_value = lines
+        hashes = PieceHashes.load('test')
+        self.assertEqual(hashes.algorithm, 'sha1')
+        self.assertEqual(hashes.length, 256)
+        self.assertEqual(hashes.digests, self.digests)
+
+    @patch('builtins.open')
+    def test_load_empty(self, open_mock):
+        open_mock.return_value.__enter__.return_value = []
+        with self.assertRaises(ValueError):
+            PieceHashes.load('test')
+
+    def test_wrong_digest_length(self):
+        with self.assertRaises(ValueError):
+            PieceHashes('sha1', 256, ['abcd'])
+
+    def test_wrong_digest(self):
+        with self.assertRaises(ValueError):
+            PieceHashes('sha1', 256, ['x' * 40])
+
+    def test_set_file_size(self):
+        self.hashes.set_file_size(len(self.data))
+        self.assertEqual(self.hashes.piece_range(4), (1024, 100))
+
+    def test_set_file_size_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.hashes.set_file_size(len(self.data) + 256)
+        with self.assertRaises(ValueError):
+            self.hashes.set_file_size(1024)
+
+    def test_edges(self):
+        self.hashes.set_file_size(len(self.data))
+        self.assertEqual(self.hashes.edges(0, 512), [])
+        self.assertEqual(self.hashes.edges(100, 512), [0, 2])
+        self.assertEqual(self.hashes.edges(1024, 100), [])
+
+    def test_written_and_verify_piece(self):
+        self.hashes.set_file_size(len(self.data))
+        self.assertEqual(self.hashes.written(0, 300), [])
+        complete = self.hashes.written(300, 500)
+        self.assertEqual(complete, [(1, [(0, 300), (300, 500)])])
+        start, size = self.hashes.piece_range(1)
+        self.assertTrue(self.hashes.verify_piece(1, self.data[start:start + size]))
+        self.assertIn(3, self.hashes.coverage)
+
+    def test_forget(self):
+        self.hashes.set_file_size(len(self.data))
+        self.hashes.written(0, 300)
+        self.hashes.forget(0, 300)
+        self.assertEqual(self.hashes.coverage[1], [])
+
+    def test_unaligned(self):
+        self.hashes.set_file_size(len(self.data))
+        self.assertEqual(self.hashes.unaligned([(0, 300), (512, 512)]), 1)
+
+    def test_verify_piece_continues_after_data(self):
+        self.hashes.set_file_size(len(self.data))
+        self.assertTrue(self.hashes.verify(0, self.data[:300]))
+
+    def test_align(self):
+        self.assertEqual(self.hashes.align(1000), 1024)
+        self.assertEqual(self.hashes.align(512), 512)
+        self.assertEqual(self.hashes.align(10), 256)
+
+    def test_verify_ok(self):
+        self.assertTrue(self.hashes.verify(0, self.data[:512]))
+        self.assertTrue(self.hashes.verify(512, self.data[512:]))
+
+    def test_verify_last_piece(self):
+        self.assertTrue(self.hashes.verify(1024, self.data[1024:]))
+
+    def test_verify_corrupted(self):
+        data = bytearray(self.data[256:512])
+        data[10] ^= 0xff
+        self.assertFalse(self.hashes.verify(256, bytes(data)))
+
+    def test_verify_out_of_file(self):
+        self.assertFalse(self.hashes.verify(2048, b'\x00' * 256))
+
+    def test_mismatched(self):
+        self.hashes.set_file_size(len(self.data))
+        data = bytearray(self.data)
+        data[300] ^= 0xff
+        data[-1] ^= 0xff
+        read = lambda offset, size: bytes(data[offset:offset + size])
+        self.assertEqual(self.hashes.mismatched(read, 2), [1, 4])
+        self.assertEqual(self.hashes.mismatched(lambda offset, size: self.data[offset:offset + size]), [])
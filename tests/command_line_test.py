@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import Mock, MagicMock, patch
 
 from pymget.command_line import CommandLine
+from pymget.metalink import Metalink
 from pymget.errors import CommandLineError
 
 class TestCommandLine(unittest.TestCase):
@@ -72,6 +73,75 @@ class TestCommandLine(unittest.TestCase):
             for url in map(lambda t: t.strip('\r\n'), links):
                 self.assertIn(url, self.cl.urls)
 
+    def test_jobs_file_parser_ok(self):
+        lines = ['# comment\n', '\n', 'http://server.com/a http://server.net/a dir/a\n', 'ftp://server.org/b\n']
+        jobs_file_mock = MagicMock()
+        jobs_file_mock.__enter__.return_value = lines
+        with patch('builtins.open', return_value=jobs_file_mock):
+            self.cl.parse_jobs_file('')
+        self.assertEqual(self.cl.jobs, [('dir/a', ['http://server.com/a', 'http://server.net/a']), ('', ['ftp://server.org/b'])])
+
+    def test_jobs_file_parser_wrong_line(self):
+        jobs_file_mock = MagicMock()
+        jobs_file_mock.__enter__.return_value = ['http://server.com/a one two\n']
+        with patch('builtins.open', return_value=jobs_file_mock):
+            with self.assertRaises(CommandLineError):
+                self.cl.parse_jobs_file('')
+        self.assertEqual(self.cl.jobs, [])
+
+    @patch('builtins.open', side_effect=FileNotFoundError())
+    def test_jobs_file_parser_not_found(self, open_mock):
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_jobs_file('')
+
+    def test_parser_jobs_with_urls_in_command_line(self):
+        jobs_file_mock = MagicMock()
+        jobs_file_mock.__enter__.return_value = ['http://server.com/a\n']
+        cl = CommandLine(self.console, ['test', '--jobs=jobs.txt', '--connections=4', 'http://server.net/b'])
+        with patch('builtins.open', return_value=jobs_file_mock):
+            cl.parse()
+        self.assertEqual(cl.connections, 4)
+        self.assertEqual([(path, [url.url for url in urls]) for path, urls in cl.jobs],
+                         [('', ['http://server.com/a']), ('', ['http://server.net/b'])])
+
+    def test_connections_parser_wrong(self):
+        for connections in ('0', '-1', 'x'):
+            with self.assertRaises(CommandLineError):
+                self.cl.parse_connections(connections)
+
+    def test_parser_daemon_options(self):
+        cl = CommandLine(self.console, ['test', '--daemon', '--socket=/tmp/pymget.sock'])
+        self.assertFalse(cl.daemon)
+        cl.parse()
+        self.assertTrue(cl.daemon)
+        self.assertFalse(cl.submit)
+        self.assertEqual(cl.socket, '/tmp/pymget.sock')
+        cl = CommandLine(self.console, ['test', '--submit', 'http://server.com/a'])
+        cl.parse()
+        self.assertTrue(cl.submit)
+
+    def test_processes_parser(self):
+        self.cl.parse_processes('4')
+        self.assertEqual(self.cl.processes, 4)
+        for processes in ('-1', 'x'):
+            with self.assertRaises(CommandLineError):
+                self.cl.parse_processes(processes)
+
+    def test_address_parser(self):
+        self.assertEqual(self.cl.parse_address('8000', 'coordinate'), ('', 8000))
+        self.assertEqual(self.cl.parse_address('node:8000', 'worker', None), ('node', 8000))
+        for address in ('8000', 'node:x', 'node:70000'):
+            with self.assertRaises(CommandLineError):
+                self.cl.parse_address(address, 'worker', None)
+
+    def test_parser_cluster(self):
+        cl = CommandLine(self.console, ['test', '--coordinate=8000', '--secret=a=b', '--shared-storage'])
+        cl.parse()
+        self.assertEqual((cl.coordinate, cl.secret, cl.shared_storage), (('', 8000), 'a=b', True))
+        cl = CommandLine(self.console, ['test', '--worker=node:8000'])
+        with self.assertRaises(CommandLineError): # the secret is required
+            cl.parse()
+
     def test_parser_wrong_urls(self):
         args = ['test', 'server.com', 'htt://server.org']
         cl = CommandLine(self.console, args)
@@ -151,3 +221,205 @@ class TestCommandLine(unittest.TestCase):
         urls = list(map(lambda u: u.url, cl.urls))
         for url in map(lambda t: t.strip('\r\n'), links):
             self.assertIn(url, urls)
+
+    def test_checkpoint_interval_parser_with_seconds(self):
+        self.cl.parse_checkpoint_interval('5')
+        self.assertEqual(self.cl.checkpoint_interval, 5)
+        self.assertEqual(self.cl.checkpoint_bytes, 0)
+
+    def test_checkpoint_interval_parser_with_milliseconds(self):
+        self.cl.parse_checkpoint_interval('250ms')
+        self.assertEqual(self.cl.checkpoint_interval, 0.25)
+        self.assertEqual(self.cl.checkpoint_bytes, 0)
+
+    def test_checkpoint_interval_parser_with_bytes(self):
+        self.cl.parse_checkpoint_interval('8M')
+        self.assertEqual(self.cl.checkpoint_bytes, 8 * 1024 * 1024)
+        self.assertEqual(self.cl.checkpoint_interval, 0)
+
+    def test_checkpoint_interval_parser_with_wrong_symbol(self):
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_checkpoint_interval('5h')
+
+    def test_parser_checkpoint_interval_long_argument(self):
+        args = ['test', '--checkpoint-interval=0.5s']
+        cl = CommandLine(self.console, args)
+        cl.parse()
+        self.assertEqual(cl.checkpoint_interval, 0.5)
+
+    def test_checksum_parser(self):
+        self.cl.parse_checksum('md5:d41d8cd98f00b204e9800998ecf8427e')
+        self.assertEqual(self.cl.checksum.algorithm, 'md5')
+
+    def test_checksum_parser_wrong_format(self):
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_checksum('d41d8cd98f00b204e9800998ecf8427e')
+
+    def test_parser_checksum_long_argument(self):
+        args = ['test', '--checksum=sha1:da39a3ee5e6b4b0d3255bfef95601890afd80709']
+        cl = CommandLine(self.console, args)
+        cl.parse()
+        self.assertEqual(cl.checksum.digest, 'da39a3ee5e6b4b0d3255bfef95601890afd80709')
+
+    @patch('builtins.open', side_effect=FileNotFoundError())
+    def test_piece_hashes_parser_not_found(self, open_mock):
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_piece_hashes('')
+
+    def test_piece_hashes_parser_broken(self):
+        hashes_file_mock = MagicMock()
+        hashes_file_mock.__enter__.return_value = ['sha256\n']
+        with patch('builtins.open', return_value=hashes_file_mock):
+            with self.assertRaises(CommandLineError):
+                self.cl.parse_piece_hashes('')
+
+    def test_seed_file_requires_piece_hashes(self):
+        with patch('os.path.isfile', return_value=True):
+            with self.assertRaises(CommandLineError):
+                CommandLine(self.console, ['test', '--seed-file=old', 'http://server.com/file']).parse()
+            cl = CommandLine(self.console, ['test', '--seed-file=old'])
+            cl.piece_hashes = Mock()
+            cl.parse()
+            self.assertEqual(cl.seed_file, 'old')
+
+    def test_seed_file_not_found(self):
+        self.cl.seed_file = '/nonexistent/file'
+        self.cl.piece_hashes = Mock()
+        with self.assertRaises(CommandLineError):
+            self.cl.check_pieces()
+
+    def test_repair(self):
+        with self.assertRaises(CommandLineError):
+            CommandLine(self.console, ['test', '--repair', 'http://server.com/file']).parse()
+        self.cl.repair = True
+        self.cl.piece_hashes = Mock()
+        self.cl.check_pieces()
+        self.cl.seed_file = 'old'
+        with self.assertRaises(CommandLineError):
+            self.cl.check_pieces()
+
+    def test_stats(self):
+        self.assertTrue(self.cl.stats.endswith('mirrors.db'))
+        self.assertTrue(self.cl.auto_block_size)
+        cl = CommandLine(self.console, ['test', '--stats=/tmp/stats.db', '-b', '1M'])
+        cl.parse()
+        self.assertEqual(cl.stats, '/tmp/stats.db')
+        self.assertFalse(cl.auto_block_size)
+        cl = CommandLine(self.console, ['test', '--no-stats'])
+        cl.parse()
+        self.assertEqual(cl.stats, '')
+
+    def test_max_strikes_parser(self):
+        self.cl.parse_max_strikes('5')
+        self.assertEqual(self.cl.max_strikes, 5)
+
+    def test_max_strikes_parser_with_zero(self):
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_max_strikes('0')
+
+    def test_retry_parsers(self):
+        cl = CommandLine(self.console, ['test', '--retries=5', '--retry-delay=500ms', '--max-retry-delay=30'])
+        cl.parse()
+        self.assertEqual((cl.retries, cl.retry_delay, cl.max_retry_delay), (5, 0.5, 30))
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_retries('-1')
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_delay('1m', 'retry delay')
+
+    def test_streams_parser(self):
+        cl = CommandLine(self.console, ['test', '--streams=4', '--auto-tune'])
+        cl.parse()
+        self.assertEqual(cl.streams, 4)
+        self.assertTrue(cl.auto_tune)
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_streams('many')
+
+    def test_stream_parsers(self):
+        self.cl.parse_stream_window('1M')
+        self.cl.parse_stream_memory('512K')
+        self.assertEqual(self.cl.stream_window, 2**20)
+        self.assertEqual(self.cl.stream_memory, 512 * 2**10)
+
+    def test_max_memory_parser(self):
+        self.cl.parse_max_memory('512M')
+        self.assertEqual(self.cl.max_memory, 512 * 2**20)
+
+    def test_write_behind_parser(self):
+        self.cl.parse_write_behind('16M')
+        self.assertEqual(self.cl.write_behind, 16 * 2**20)
+
+    def test_write_behind_parser_disabled(self):
+        self.cl.parse_write_behind('0')
+        self.assertEqual(self.cl.write_behind, 0)
+
+    def test_parser_small_file_long_argument(self):
+        cl = CommandLine(self.console, ['test', '--small-file=64k'])
+        cl.parse()
+        self.assertEqual(cl.small_file, 64 * 1024)
+
+    def test_write_behind_parser_wrong_units(self):
+        with self.assertRaises(CommandLineError):
+            self.cl.parse_write_behind('16x')
+
+    def test_metalink_parser(self):
+        meta = Mock(size=100)
+        meta.mirrors.return_value = [('http://server.com/file', 'de', 2)]
+        with patch.object(Metalink, 'load', return_value=[meta]):
+            self.cl.parse_metalink('test.meta4')
+        self.assertEqual(self.cl.urls, ['http://server.com/file'])
+        self.assertEqual(self.cl.url_options, {'http://server.com/file': ('de', 2)})
+        self.assertEqual(self.cl.file_size, 100)
+        self.assertIs(self.cl.metalink_file, meta)
+
+    def test_metalink_parser_several_files(self):
+        meta = Mock(size=0)
+        meta.mirrors.return_value = []
+        with patch.object(Metalink, 'load', return_value=[meta, Mock(size=0)]):
+            self.cl.parse_metalink('test.meta4')
+        self.assertTrue(self.console.warning.called)
+
+    def test_metalink_parser_empty(self):
+        with patch.object(Metalink, 'load', return_value=[]):
+            with self.assertRaises(CommandLineError):
+                self.cl.parse_metalink('test.meta4')
+
+    def test_metalink_parser_broken(self):
+        with patch.object(Metalink, 'load', side_effect=SyntaxError):
+            with self.assertRaises(CommandLineError):
+                self.cl.parse_metalink('test.meta4')
+
+    def test_apply_metalink(self):
+        self.cl.metalink_file = Mock()
+        self.cl.metalink_file.name = 'dir/file.iso'
+        self.cl.apply_metalink()
+        self.assertEqual(self.cl.filename, 'file.iso')
+        self.assertIs(self.cl.checksum, self.cl.metalink_file.checksum.return_value)
+        self.assertIs(self.cl.piece_hashes, self.cl.metalink_file.piece_hashes.return_value)
+
+    def test_apply_metalink_does_not_override(self):
+        self.cl.metalink_file = Mock()
+        self.cl.filename = 'out'
+        self.cl.checksum = checksum = Mock()
+        self.cl.apply_metalink()
+        self.assertEqual(self.cl.filename, 'out')
+        self.assertIs(self.cl.checksum, checksum)
+
+    def test_parser_metalink_long_argument(self):
+        meta = Mock(size=100)
+        meta.name = 'file'
+        meta.mirrors.return_value = [('http://server.com/file', 'de', 2)]
+        args = ['test', '--metalink=test.meta4']
+        cl = CommandLine(self.console, args)
+        with patch.object(Metalink, 'load', return_value=[meta]):
+            cl.parse()
+        urls = list(cl.urls)
+        self.assertEqual([u.url for u in urls], ['http://server.com/file'])
+        self.assertEqual(urls[0].location, 'de')
+        self.assertEqual(urls[0].max_connections, 2)
+
+    def test_apply_metalink_broken_hash(self):
+        self.cl.metalink_file = Mock()
+        self.cl.metalink_file.name = 'file'
+        self.cl.metalink_file.checksum.side_effect = ValueError
+        with self.assertRaises(CommandLineError):
+            self.cl.apply_metalink()
@@ -84,6 +84,22 @@ class TestConsole(unittest.TestCase):
         self.assertFalse(self.console.ask('Test', False))
 
 
+    @patch('builtins.input', return_value='yes')
+    def test_ask_redirected(self, input_mock):
+        out = Mock()
+        self.console.redirect(out)
+        self.assertTrue(self.console.ask('Test', True))
+        input_mock.assert_called_with()
+        out.write.assert_any_call('Test (YES/no): ')
+
+    def test_redirect_progressbar(self):
+        self.console.create_progressbar(100, 0)
+        out = Mock()
+        self.console.redirect(out)
+        self.assertIs(self.console.out, out)
+        self.assertIs(self.console.progressbar.out, out)
+
+
 
 class TestProgressBar(unittest.TestCase):
 
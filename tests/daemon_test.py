@@ -0,0 +1,250 @@
+import unittest
+from unittest.mock import Mock, patch
+import os
+import json
+import socket
+import tempfile
+import threading
+
+from pymget import daemon
+from pymget.errors import CancelError, FatalError
+
+class TestClientConnection(unittest.TestCase):
+
+    def setUp(self):
+        self.sock, self.other = socket.socketpair()
+        self.addCleanup(self.other.close)
+        self.connection = daemon.ClientConnection(self.sock)
+        self.addCleanup(self.connection.close)
+
+    def test_receive(self):
+        self.other.sendall(b'{"urls": []}\n[1]\nwrong\n{"cancel"')
+        self.assertEqual(self.connection.receive(), [{'urls': []}, {}, {}])
+        self.other.sendall(b': 1}\n')
+        self.assertEqual(self.connection.receive(), [{'cancel': 1}])
+        self.assertFalse(self.connection.closed)
+
+    def test_receive_closed(self):
+        self.other.close()
+        self.assertEqual(self.connection.receive(), [])
+        self.assertTrue(self.connection.closed)
+
+    def test_send(self):
+        self.connection.send({'id': 1, 'event': 'queued'})
+        self.assertEqual(json.loads(self.other.recv(1024).decode('utf-8')), {'id': 1, 'event': 'queued'})
+
+    def test_send_error(self):
+        self.connection.sock = Mock()
+        self.connection.sock.sendall.side_effect = BrokenPipeError
+        self.connection.send({})
+        self.assertTrue(self.connection.closed)
+
+
+
+
+class TestClientConsole(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.client = Mock()
+        self.job_console = daemon.ClientConsole(self.console, 3, self.client)
+
+    def test_event(self):
+        self.job_console.event('progress', written=10, size=20)
+        self.client.send.assert_called_with({'id': 3, 'event': 'progress', 'written': 10, 'size': 20})
+
+    def test_ask_default(self):
+        self.assertFalse(self.job_console.ask('Rewrite?', False))
+        self.assertTrue(self.job_console.ask('Create?', True))
+        self.assertEqual(self.client.send.call_args[0][0]['event'], 'warning')
+        self.assertTrue(self.console.warning.called)
+
+
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.command_line = Mock()
+        self.command_line.connections = 4
+        self.command_line.timeout = 10
+        self.command_line.jobs = [('', [Mock()])]
+        self.command_line.create_url = lambda link: link
+        self.command_line.url_re.match.side_effect = lambda link: link.startswith('http')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.command_line.socket = os.path.join(self.tmp.name, 'pymget.sock')
+        self.pool = Mock()
+        patcher = patch.object(daemon.Daemon, '_pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.daemon = daemon.Daemon()
+        self.client = Mock()
+
+    def prepare(self):
+        self.daemon.prepare(self.console, self.command_line)
+        self.addCleanup(self.daemon.close)
+
+    def test_prepare(self):
+        self.prepare()
+        self.assertEqual(len(self.daemon.jobs), 0)
+        self.assertEqual(self.daemon.total, 0)
+        self.assertTrue(os.path.exists(self.command_line.socket))
+
+    def test_prepare_already_running(self):
+        self.prepare()
+        with self.assertRaises(FatalError):
+            daemon.Daemon().listen(self.command_line.socket)
+
+    def test_prepare_stale_socket(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.command_line.socket)
+        stale.close() # the file is left without a listening socket
+        self.prepare()
+        self.assertIsNotNone(self.daemon.server)
+
+    def test_close_removes_socket(self):
+        self.daemon.prepare(self.console, self.command_line)
+        self.daemon.close()
+        self.assertFalse(os.path.exists(self.command_line.socket))
+
+    def test_process(self):
+        self.daemon.command_line = self.command_line
+        self.daemon.process(self.client, {'urls': ['http://a.com/f', 'wrong'], 'path': '/tmp/'})
+        self.assertEqual(list(self.daemon.jobs), [('/tmp/', ['http://a.com/f'], self.client, 1)])
+        self.assertEqual(self.daemon.total, 1)
+        self.client.send.assert_called_with({'id': 1, 'event': 'queued'})
+
+    def test_process_wrong_request(self):
+        self.daemon.command_line = self.command_line
+        for message in ({}, {'urls': 'http://a.com/f'}, {'urls': ['wrong']}):
+            self.daemon.process(self.client, message)
+            self.assertEqual(self.client.send.call_args[0][0]['event'], 'error')
+        self.assertEqual(len(self.daemon.jobs), 0)
+
+    def test_cancel_queued_job(self):
+        self.daemon.console = self.console
+        self.daemon.jobs.append(('', [], self.client, 1))
+        self.daemon.process(self.client, {'cancel': 1})
+        self.assertEqual(len(self.daemon.jobs), 0)
+        self.assertEqual(self.daemon.failed, 1)
+        self.assertEqual(self.client.send.call_args[0][0]['event'], 'failed')
+
+    def test_cancel_active_job(self):
+        manager = Mock()
+        manager.console.job_id = 2
+        steps = Mock()
+        steps.throw.side_effect = CancelError('cancelled')
+        self.daemon.active.append(('file', manager, steps))
+        self.daemon.cancel_job(2)
+        steps.throw.assert_called_with(KeyboardInterrupt)
+        self.assertEqual(self.daemon.active, [])
+        manager.console.event.assert_called_with('failed', error='cancelled')
+
+    def test_cancel(self):
+        self.daemon.console = self.console
+        self.daemon.jobs.append(('', [], self.client, 1))
+        manager = Mock()
+        self.daemon.active.append(('file', manager, Mock()))
+        self.daemon.cancel()
+        self.assertEqual(len(self.daemon.jobs), 0)
+        self.assertEqual(self.daemon.active, [])
+        self.client.send.assert_called_with({'id': 1, 'event': 'failed', 'error': 'Operation has been cancelled by user.'})
+        manager.console.event.assert_called_with('failed', error='Operation has been cancelled by user.')
+
+    @patch('pymget.batch.Batch.start_job')
+    def test_start_job(self, start_job_mock):
+        self.daemon.console = self.console
+        self.daemon.start_job('/tmp/', [], self.client, 5)
+        console = start_job_mock.call_args[0][3]
+        self.assertIsInstance(console, daemon.ClientConsole)
+        self.assertEqual(console.job_id, 5)
+
+    def test_job_done(self):
+        self.daemon.console = self.console
+        manager = Mock()
+        manager.outfile.fullpath = '/tmp/file'
+        self.daemon.job_done('file', manager)
+        self.assertEqual(self.daemon.done, 1)
+        manager.console.event.assert_called_with('done', path='/tmp/file')
+
+    def test_report_progress(self):
+        manager = Mock(written_bytes=10, file_size=20)
+        self.daemon.active.append(('file', manager, Mock()))
+        self.daemon.report_progress()
+        manager.console.event.assert_called_with('progress', written=10, size=20)
+        manager.console.event.reset_mock()
+        self.daemon.report_progress() # too early
+        self.assertFalse(manager.console.event.called)
+
+    def test_serve(self):
+        self.prepare()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(client.close)
+        client.connect(self.command_line.socket)
+        self.daemon.serve(1) # accept
+        client.sendall(b'{"urls": ["http://a.com/f"], "path": ""}\n')
+        self.daemon.serve(1)
+        self.assertEqual(len(self.daemon.jobs), 1)
+        self.assertEqual(json.loads(client.recv(1024).decode('utf-8')), {'id': 1, 'event': 'queued'})
+
+
+
+
+class TestClient(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.client = daemon.Client(self.console, '/tmp/pymget.sock')
+
+    def test_absolute_path(self):
+        self.assertEqual(daemon.Client.absolute_path(''), os.getcwd() + os.sep)
+        self.assertEqual(daemon.Client.absolute_path('dir' + os.sep), os.path.join(os.getcwd(), 'dir') + os.sep)
+        self.assertEqual(daemon.Client.absolute_path('file'), os.path.join(os.getcwd(), 'file'))
+
+    def test_process(self):
+        self.client.single = True
+        self.client.process({'id': 1, 'event': 'queued'})
+        self.assertEqual(self.client.waiting, {1})
+        self.client.process({'id': 1, 'event': 'progress', 'written': 10, 'size': 20})
+        self.console.create_progressbar.assert_called_with(20, 0)
+        self.console.progress.assert_called_with(10)
+        self.client.process({'id': 1, 'event': 'done', 'path': '/tmp/file'})
+        self.assertEqual(self.client.waiting, set())
+        self.assertEqual(self.client.failed, 0)
+
+    def test_process_failed(self):
+        self.client.waiting.add(1)
+        self.client.process({'id': 1, 'event': 'failed', 'error': 'failed'})
+        self.assertEqual(self.client.waiting, set())
+        self.assertEqual(self.client.failed, 1)
+        self.console.error.assert_called_with('failed')
+
+    def test_submit(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.client.socket_path = os.path.join(tmp.name, 'pymget.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(self.client.socket_path)
+        server.listen()
+        requests = []
+        def serve():
+            conn, address = server.accept()
+            requests.append(json.loads(conn.makefile().readline()))
+            conn.sendall(b'{"id": 1, "event": "queued"}\n{"id": 1, "event": "done", "path": "/tmp/f"}\n')
+            conn.close()
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.client.submit([('', [Mock(url='http://a.com/f')])], 'out')
+        thread.join()
+        self.assertEqual(requests, [{'urls': ['http://a.com/f'], 'path': os.path.join(os.getcwd(), 'out')}])
+        self.assertEqual(self.client.waiting, set())
+
+    def test_submit_no_daemon(self):
+        sock = Mock()
+        sock.connect.side_effect = FileNotFoundError
+        with patch.object(daemon.Client, '_socket', Mock(return_value=sock)):
+            with self.assertRaises(FatalError):
+                self.client.submit([], '')
@@ -1,9 +1,13 @@
 import unittest
-from unittest.mock import Mock, MagicMock, patch
+import os
+from unittest.mock import Mock, MagicMock, patch, ANY
 import queue
 
 from pymget import manager
-from pymget.errors import FatalError, CancelError
+from pymget.networking import URL
+from pymget.outfile import Context
+from pymget.stats import MirrorRecord
+from pymget.errors import FatalError, FileError, CancelError
 
 class testManager(unittest.TestCase):
 
@@ -13,11 +17,29 @@ class testManager(unittest.TestCase):
         self.console = Mock()
         self.command_line = Mock()
         self.command_line.urls = []
+        self.command_line.file_size = 0
+        self.command_line.write_behind = 0
+        self.command_line.stream_window = 0
+        self.command_line.max_memory = 0
+        self.command_line.small_file = 0
+        self.command_line.processes = 0
+        self.command_line.coordinate = None
+        self.command_line.cache = ''
+        self.command_line.seed_file = ''
+        self.command_line.repair = False
+        self.command_line.stats = ''
+        self.command_line.streams = 0
+        self.command_line.auto_tune = False
         self.context = Mock()
         self.outfile = MagicMock()
         self.outfile.context.failed_parts = []
         self.outfile.context.offset = 0
         self.outfile.context.written_bytes = 0
+        self.outfile.context.shared = False
+        self.outfile.context.file_size = 0
+        self.outfile.context.validators = {}
+        self.outfile.context.links = {}
+        self.outfile.context.block_size = 0
         self.task_info = Mock()
         self.task_info.name = 'test'
         self.task_info.file_size = 100
@@ -34,18 +56,27 @@ class testManager(unittest.TestCase):
         self.assertEqual(self.manager.old_progress, 0)
         self.assertEqual(len(self.manager.failed_parts), 0)
 
+    def test_prepare_known_file_size(self):
+        self.command_line.file_size = 100
+        self.manager.allocate = Mock()
+        self.manager.prepare(Mock(), self.command_line, self.outfile)
+        self.manager.allocate.assert_called_with(100)
+
     def test_prepare_no_mirrors(self):
         self.manager.mirrors = {}
         with self.assertRaises(FatalError):
             self.manager.prepare(Mock(), self.command_line, self.outfile)
 
-    def test_create_mirror_ok(self):
+    @patch('pymget.manager.Mirror.create')
+    def test_create_mirror_ok(self, create_mock):
         self.manager.mirrors = {}
         self.manager.check_filename = Mock(return_value=True)
         self.manager.create_mirror(Mock())
         self.assertEqual(len(self.manager.mirrors), 1)
+        self.assertIs(create_mock.return_value.data_queue, self.manager.data_queue)
 
-    def test_create_mirror_wrong_name(self):
+    @patch('pymget.manager.Mirror.create')
+    def test_create_mirror_wrong_name(self, create_mock):
         self.manager.mirrors = {}
         self.manager.check_filename = Mock(return_value=False)
         self.manager.create_mirror(Mock())
@@ -121,6 +152,79 @@ class testManager(unittest.TestCase):
         self.assertFalse(self.mirror.connect.called)
         self.assertTrue(self.manager.give_task.called)
 
+    def test_wait_connections_no_slot(self):
+        self.mirror.need_connect = True
+        self.mirror.ready = False
+        self.mirror.wait_connection = Mock(return_value=True)
+        self.manager.slots = Mock()
+        self.manager.slots.acquire.return_value = False
+        self.manager.wait_connections()
+        self.assertFalse(self.mirror.connect.called)
+        self.assertEqual(self.manager.slot_mirrors, set())
+
+    def test_wait_connections_releases_slot(self):
+        self.mirror.need_connect = False
+        self.mirror.ready = True
+        self.mirror.wait_connection = Mock(return_value=True)
+        self.manager.slots = Mock()
+        self.manager.slots.acquire.return_value = True
+        self.manager.slot_mirrors.add('test')
+        self.manager.give_task = Mock(return_value=False)
+        self.manager.wait_connections()
+        self.assertEqual(self.manager.slots.release.call_count, 2) # idle and without task
+        self.assertEqual(self.manager.slot_mirrors, set())
+
+    def test_take_slot_once(self):
+        self.manager.slots = Mock()
+        self.manager.slots.acquire.return_value = True
+        self.assertTrue(self.manager.take_slot('test'))
+        self.assertTrue(self.manager.take_slot('test'))
+        self.assertEqual(self.manager.slots.acquire.call_count, 1)
+        self.manager.release_slot('test')
+        self.manager.release_slot('test')
+        self.assertEqual(self.manager.slots.release.call_count, 1)
+
+    def test_delete_mirror_releases_slot(self):
+        self.manager.slots = Mock()
+        self.manager.slot_mirrors.add('test')
+        self.manager.delete_mirror('test')
+        self.manager.slots.release.assert_called_with()
+
+    def test_give_task_streams(self):
+        self.manager.block_size = 10
+        self.manager.file_size = 100
+        self.manager.streams = 2
+        self.manager.parts_in_progress = [0, 10]
+        self.assertFalse(self.manager.give_task(self.mirror))
+        self.manager.streams = 3
+        self.assertTrue(self.manager.give_task(self.mirror))
+
+    def test_prepare_auto_tune(self):
+        self.command_line.auto_tune = True
+        self.command_line.streams = 3
+        self.manager.prepare(Mock(), self.command_line, self.outfile)
+        self.assertEqual((self.manager.streams, self.manager.max_streams), (1, 3)) # one stream at first
+
+    def test_tune(self):
+        self.manager.tuner = Mock(streams=2, settled=False, speed=2**20)
+        self.manager.tuner.update.return_value = False
+        self.manager.tune(100)
+        self.manager.tuner.update.assert_called_with(ANY, 100, 1) # one mirror
+        self.assertEqual(self.manager.streams, 0)
+        self.manager.tuner.update.return_value = True
+        self.manager.tune(200)
+        self.assertEqual(self.manager.streams, 2)
+        self.manager.tuner.settled = True
+        self.manager.block_size = 2**20
+        self.manager.tune(300)
+        self.assertIn('--streams=2 -b 1048576', self.console.message.call_args[0][0]) # the settings could be pinned
+
+    def test_do_error_tuner(self):
+        self.manager.tuner = Mock()
+        self.manager.delete_mirror = Mock()
+        self.manager.do_error('test', 0)
+        self.manager.tuner.error.assert_called_with()
+
     def test_give_task_failed_part(self):
         self.manager.mirrors = {}
         self.manager.failed_parts.append(10)
@@ -128,6 +232,22 @@ class testManager(unittest.TestCase):
         self.mirror.download.assert_called_with(10)
         self.assertIn(10, self.manager.parts_in_progress)
 
+    def test_give_task_failed_part_excluded(self):
+        self.mirror.name = 'test'
+        self.manager.mirrors['test2'] = Mock()
+        self.manager.failed_parts.extend([10, 20])
+        self.manager.part_exclusions[10] = {'test'}
+        self.manager.give_task(self.mirror)
+        self.mirror.download.assert_called_with(20)
+        self.assertEqual(list(self.manager.failed_parts), [10])
+
+    def test_give_task_failed_part_excluded_no_other_mirrors(self):
+        self.mirror.name = 'test'
+        self.manager.failed_parts.append(10)
+        self.manager.part_exclusions[10] = {'test'}
+        self.manager.give_task(self.mirror)
+        self.mirror.download.assert_called_with(10)
+
     def test_give_task_first_part(self):
         self.manager.mirrors = {}
         self.manager.give_task(self.mirror)
@@ -154,6 +274,110 @@ class testManager(unittest.TestCase):
         self.assertNotIn(100, self.manager.parts_in_progress)
         self.assertEqual(self.manager.offset, 100)
 
+    def test_give_task_shared(self):
+        self.manager.shared = True
+        self.manager.file_size = 100
+        self.manager.block_size = 10
+        self.context.claim.return_value = 30
+        self.assertTrue(self.manager.give_task(self.mirror))
+        self.context.claim.assert_called_with(10, 100)
+        self.mirror.download.assert_called_with(30)
+        self.context.claim.return_value = None # other processes have taken the rest
+        self.assertFalse(self.manager.give_task(self.mirror))
+        self.assertEqual(self.manager.offset, 0)
+
+    def test_synchronize(self):
+        self.manager.shared = True
+        self.manager.state_changed = True
+        self.manager.synced_bytes = 100
+        self.manager.written_bytes = 150
+        self.manager.parts_in_progress = [10]
+        self.manager.parts_in_writing = {20: 30}
+        self.context.sync.return_value = 400 # other processes have written data too
+        self.manager.checkpoint()
+        self.outfile.flush.assert_called_with()
+        self.context.sync.assert_called_with(20, [10, 20], False)
+        self.assertEqual((self.manager.synced_bytes, self.manager.written_bytes), (400, 430))
+        self.manager.checkpoint(True)
+        self.context.sync.assert_called_with(0, [10, 20], True)
+
+    def test_synchronize_context_deleted(self):
+        self.manager.shared = True
+        self.manager.file_size = 100
+        self.context.sync.return_value = None
+        self.manager.checkpoint(True)
+        self.assertFalse(self.manager.keep_download())
+
+    def test_written_ranges_shared(self):
+        self.manager.shared = True
+        self.manager.file_size = 100
+        self.manager.block_size = 10
+        self.context.offset = 50
+        self.context.needle_parts.return_value = [10, 30]
+        self.assertEqual(self.manager.written_ranges(), [(0, 10), (20, 10), (40, 10)])
+
+    def test_give_task_stream_window(self):
+        self.manager.outfile.seekable = False
+        self.manager.outfile.frontier = 100
+        self.manager.stream_window = 200
+        self.manager.block_size = 100
+        self.manager.file_size = 1000
+        self.manager.offset = 200
+        self.manager.give_task(self.mirror)
+        self.mirror.download.assert_called_with(200)
+        self.manager.give_task(self.mirror) # the offset is 300, too far ahead of the stream
+        self.assertEqual(self.mirror.download.call_count, 1)
+        self.assertEqual(self.manager.offset, 300)
+
+    def test_give_task_stream_failed_part(self):
+        self.manager.outfile.seekable = False
+        self.manager.outfile.frontier = 0
+        self.manager.file_size = 1000
+        self.manager.offset = 500
+        self.manager.failed_parts.append(0)
+        self.manager.give_task(self.mirror)
+        self.mirror.download.assert_called_with(0)
+
+    def test_prepare_stream(self):
+        self.command_line.write_behind = 2**20
+        self.outfile.seekable = False
+        self.manager.prepare(Mock(), self.command_line, self.outfile)
+        self.assertEqual(self.manager.write_behind, 0)
+
+    def test_allocate_stream(self):
+        self.outfile.seekable = False
+        self.manager.allocate(100)
+        self.assertFalse(self.outfile.write.called)
+
+    def test_give_task_memory_budget(self):
+        self.manager.outfile.buffered_bytes = 0
+        self.manager.max_memory = 250
+        self.manager.block_size = 100
+        self.manager.file_size = 1000
+        self.manager.give_task(self.mirror)
+        self.manager.give_task(self.mirror)
+        self.manager.give_task(self.mirror) # the third block does not fit into the budget
+        self.assertEqual(self.manager.parts_in_progress, [0, 100])
+        self.assertEqual(self.manager.peak_buffered, 200)
+
+    def test_give_task_memory_budget_with_writer(self):
+        self.manager.outfile.buffered_bytes = 0
+        self.manager.writer = Mock(queued_bytes=200)
+        self.manager.max_memory = 250
+        self.manager.block_size = 100
+        self.manager.file_size = 1000
+        self.manager.give_task(self.mirror)
+        self.assertFalse(self.mirror.download.called)
+
+    def test_give_task_block_larger_than_budget(self):
+        self.manager.outfile.buffered_bytes = 0
+        self.manager.max_memory = 50
+        self.manager.block_size = 100
+        self.manager.file_size = 1000
+        self.manager.give_task(self.mirror)
+        self.manager.give_task(self.mirror)
+        self.assertEqual(self.manager.parts_in_progress, [0])
+
     def test_download_all_done(self):
         self.manager.written_bytes = 100
         self.manager.file_size = 100
@@ -182,6 +406,72 @@ class testManager(unittest.TestCase):
         self.context.update.assert_called_with(0, 0, [0])
         self.context.delete.assert_called_with()
 
+    def test_steps(self):
+        self.manager.keep_download = Mock(side_effect=[True, True, False])
+        self.manager.data_queue.get = Mock(side_effect=queue.Empty)
+        self.manager.wait_connections = Mock()
+        steps = self.manager.steps()
+        next(steps)
+        self.assertFalse(self.manager.wait_connections.called)
+        next(steps)
+        self.assertEqual(self.manager.wait_connections.call_count, 1)
+        with self.assertRaises(StopIteration):
+            next(steps)
+        self.context.delete.assert_called_with()
+
+    def test_steps_cancel(self):
+        self.manager.keep_download = Mock(return_value=True)
+        steps = self.manager.steps()
+        next(steps)
+        with self.assertRaises(CancelError):
+            steps.throw(KeyboardInterrupt)
+        self.mirror.cancel.assert_called_with()
+        self.mirror.close.assert_called_with()
+
+    def test_checkpoint_not_changed(self):
+        self.manager.checkpoint(True)
+        self.assertFalse(self.context.update.called)
+
+    def test_checkpoint_interval_not_over(self):
+        self.manager.state_changed = True
+        self.manager.checkpoint_interval = 10
+        self.manager.checkpoint_time = self.manager.time
+        self.manager.checkpoint()
+        self.assertFalse(self.context.update.called)
+        self.assertTrue(self.manager.state_changed)
+
+    def test_checkpoint_interval_over(self):
+        self.manager.state_changed = True
+        self.manager.checkpoint_interval = 10
+        self.manager.checkpoint_time = self.manager.time - 10
+        self.manager.parts_in_progress.append(10)
+        self.manager.failed_parts.append(20)
+        self.manager.checkpoint()
+        self.context.update.assert_called_with(0, 0, [10, 20])
+        self.assertFalse(self.manager.state_changed)
+
+    def test_checkpoint_bytes(self):
+        self.manager.state_changed = True
+        self.manager.checkpoint_bytes = 100
+        self.manager.checkpoint_time = self.manager.time
+        self.manager.written_bytes = 50
+        self.manager.checkpoint()
+        self.assertFalse(self.context.update.called)
+        self.manager.written_bytes = 100
+        self.manager.checkpoint()
+        self.context.update.assert_called_with(0, 100, [])
+
+    def test_checkpoint_force(self):
+        self.manager.state_changed = True
+        self.manager.checkpoint_interval = 10
+        self.manager.checkpoint_time = self.manager.time
+        self.manager.checkpoint(True)
+        self.context.update.assert_called_with(0, 0, [])
+
+    def test_set_progress_does_not_change_state(self):
+        self.manager.set_progress('test', 20)
+        self.assertFalse(self.manager.state_changed)
+
     def test_del_active_part(self):
         self.manager.parts_in_progress.extend([10, 20, 30])
         self.manager.del_active_part(20)
@@ -197,11 +487,48 @@ class testManager(unittest.TestCase):
         self.assertIn(30, self.manager.parts_in_progress)
         self.assertIn(20, self.manager.failed_parts)
 
+    def test_add_failed_part_received(self):
+        self.manager.block_size = 100
+        self.manager.file_size = 250
+        self.manager.parts_in_progress.extend([100, 200])
+        self.manager.add_failed_part(100, b'\x01'*30)
+        self.outfile.seek.assert_called_with(100)
+        self.outfile.write.assert_called_with(b'\x01'*30)
+        self.assertEqual(self.manager.written_bytes, 30)
+        self.assertEqual(list(self.manager.failed_parts), [130]) # only the rest of the block
+        self.manager.add_failed_part(200, b'\x01'*50) # the last part is complete
+        self.assertEqual(list(self.manager.failed_parts), [130])
+        self.assertEqual(self.manager.written_bytes, 80)
+
+    def test_add_failed_part_received_pieces(self):
+        self.manager.block_size = 100
+        self.manager.file_size = 1000
+        self.manager.piece_hashes = Mock(length=20)
+        self.manager.piece_hashes.written.return_value = []
+        self.manager.parts_in_progress.extend([100, 200])
+        self.manager.add_failed_part(100, b'\x01'*50)
+        self.manager.piece_hashes.verify.assert_called_with(100, b'\x01'*40) # only whole pieces are kept
+        self.assertEqual(list(self.manager.failed_parts), [140])
+        self.manager.piece_hashes.verify.return_value = False
+        self.manager.add_failed_part(200, b'\x01'*50)
+        self.assertEqual(list(self.manager.failed_parts), [140, 200]) # corrupted data are dropped
+        self.assertEqual(self.manager.written_bytes, 40)
+
     def test_delete_mirror(self):
         self.manager.delete_mirror('test')
         self.mirror.join.assert_called_with()
         self.assertNotIn(self.mirror, self.manager.mirrors)
 
+    def test_mirror_events(self):
+        events = Mock()
+        self.manager.mirror_events = events
+        self.manager.delete_mirror = Mock()
+        self.manager.do_error('test', 404)
+        events.assert_called_with('test', 'error', 404)
+        del self.manager.delete_mirror
+        self.manager.delete_mirror('test')
+        events.assert_called_with('test', 'deleted', None)
+
     def test_do_error_not_last_mirror(self):
         self.manager.delete_mirror = Mock()
         self.manager.do_error('test', 0)
@@ -214,14 +541,147 @@ class testManager(unittest.TestCase):
             self.manager.do_error('test', 0)
         self.manager.delete_mirror.assert_called_with('test')
 
+    @patch('random.uniform', return_value=1)
+    def test_do_error_retried(self, uniform_mock):
+        self.manager.retries = 2
+        self.manager.retry_delay = 1
+        self.manager.max_retry_delay = 60
+        self.manager.probe = 'test'
+        self.manager.delete_mirror = Mock()
+        now = self.manager.time
+        self.manager.do_error('test', 503)
+        self.assertFalse(self.manager.delete_mirror.called)
+        self.mirror.close.assert_called_with()
+        self.assertTrue(self.mirror.need_connect)
+        self.assertIsNone(self.manager.probe) # other mirrors don't wait for the failed probe
+        self.assertEqual(self.manager.failures['test'], 1)
+        self.assertAlmostEqual(self.manager.retry_times['test'], now + 1, 1)
+        self.manager.do_error('test', 0) # the probe has failed, the delay is doubled
+        self.assertAlmostEqual(self.manager.retry_times['test'], now + 2, 1)
+        self.manager.do_error('test', 0) # retries are exhausted
+        self.manager.delete_mirror.assert_called_with('test')
+
+    def test_do_error_retry_after(self):
+        self.manager.retries = 2
+        self.manager.retry_delay = 1
+        self.manager.max_retry_delay = 60
+        self.manager.delete_mirror = Mock()
+        now = self.manager.time
+        self.manager.do_error('test', 429, 30)
+        self.assertAlmostEqual(self.manager.retry_times['test'], now + 30, 1)
+        self.manager.do_error('test', 429, 3600) # the server is unavailable for too long
+        self.manager.delete_mirror.assert_called_with('test')
+
+    def test_do_error_not_retried(self):
+        self.manager.retries = 2
+        self.manager.delete_mirror = Mock()
+        self.manager.do_error('test', 404) # the file is not found, that's not temporary
+        self.manager.delete_mirror.assert_called_with('test')
+        self.manager.retries = 0
+        self.manager.delete_mirror.reset_mock()
+        self.manager.do_error('test', 503)
+        self.manager.delete_mirror.assert_called_with('test')
+
+    def test_wait_connections_retry_time(self):
+        self.mirror.need_connect = True
+        self.mirror.ready = False
+        self.mirror.wait_connection = Mock(return_value=True)
+        self.manager.retry_times['test'] = self.manager.time + 60
+        self.manager.wait_connections()
+        self.assertFalse(self.mirror.connect.called)
+        self.manager.retry_times['test'] = self.manager.time - 1
+        self.manager.wait_connections()
+        self.assertTrue(self.mirror.connect.called)
+        self.assertEqual(self.manager.retry_times, {})
+
+    def test_write_data_resets_failures(self):
+        self.manager.del_active_part = Mock()
+        self.manager.failures['test'] = 2
+        self.manager.write_data('test', 100, b'\x00'*10)
+        self.assertEqual(self.manager.failures, {})
+
     def test_redirect(self):
         url_mock = Mock()
         self.manager.create_mirror = Mock()
         self.manager.delete_mirror = Mock()
+        self.mirror.url.max_connections = 2
         self.manager.redirect('test', url_mock)
         self.manager.create_mirror.assert_called_with(url_mock)
+        self.assertEqual(url_mock.max_connections, 2)
         self.manager.delete_mirror.assert_called_with('test')
 
+    def test_choose_probe(self):
+        self.mirror.fetches_small_files = True
+        self.manager.small_file = 100
+        self.manager.choose_probe(0)
+        self.assertEqual(self.manager.probe, 'test')
+
+    def test_choose_probe_large_file(self):
+        self.mirror.fetches_small_files = True
+        self.manager.small_file = 100
+        self.manager.choose_probe(101)
+        self.assertIsNone(self.manager.probe)
+
+    def test_choose_probe_resumed(self):
+        self.mirror.fetches_small_files = True
+        self.manager.small_file = 100
+        self.manager.offset = 10
+        self.manager.choose_probe(0)
+        self.assertIsNone(self.manager.probe)
+
+    def test_choose_probe_no_http(self):
+        self.mirror.fetches_small_files = False
+        self.manager.small_file = 100
+        self.manager.choose_probe(0)
+        self.assertIsNone(self.manager.probe)
+
+    def test_wait_connections_probe(self):
+        mirror2 = Mock()
+        self.manager.mirrors['test2'] = mirror2
+        self.manager.probe = 'test'
+        self.manager.small_file = 100
+        self.mirror.need_connect = True
+        self.mirror.ready = False
+        self.mirror.wait_connection = Mock(return_value=True)
+        self.manager.wait_connections()
+        self.mirror.connect.assert_called_with(100)
+        self.assertFalse(mirror2.wait_connection.called)
+        self.assertFalse(mirror2.connect.called)
+
+    def test_set_file_size_probe(self):
+        self.manager.probe = 'test'
+        self.manager.set_file_size('test', 1000)
+        self.assertIsNone(self.manager.probe)
+
+    def test_redirect_probe(self):
+        url_mock = Mock(host='test2')
+        self.manager.probe = 'test'
+        self.manager.create_mirror = Mock(side_effect=lambda url: self.manager.mirrors.update({url.host: Mock()}))
+        self.manager.redirect('test', url_mock)
+        self.assertEqual(self.manager.probe, 'test2')
+
+    def test_write_small_file(self):
+        data = b'\x01'*10
+        self.manager.probe = 'test'
+        self.manager.write_small_file('test', data, ('"a"', ''))
+        self.assertIsNone(self.manager.probe)
+        self.assertEqual(self.manager.validators, {'test': ('"a"', '')}) # the file is cached by them
+        self.assertEqual(self.manager.file_size, 10)
+        self.assertEqual(self.manager.written_bytes, 10)
+        self.assertFalse(self.manager.keep_download())
+        self.outfile.seek.assert_called_once_with(0) # the file is not allocated
+        self.outfile.write.assert_called_once_with(data)
+        self.manager.checkpoint(True)
+        self.assertFalse(self.context.update.called)
+
+    def test_write_small_file_size_differs(self):
+        self.manager.file_size = 20
+        self.manager.probe = 'test'
+        self.manager.write_small_file('test', b'\x01'*10)
+        self.assertFalse(self.outfile.write.called)
+        self.assertNotIn('test', self.manager.mirrors)
+        self.assertIsNone(self.manager.probe)
+
     def test_set_progress(self):
         mirror2 = Mock()
         mirror2.task_progress = 10
@@ -240,6 +700,345 @@ class testManager(unittest.TestCase):
         self.mirror.done.assert_called_with()
         self.outfile.seek.assert_called_with(100)
         self.outfile.write.assert_called_with(data)
+        self.outfile.release.assert_called_with(100, 10)
+
+    def test_write_data_with_checksum(self):
+        data = b'\x00'*10
+        self.manager.del_active_part = Mock()
+        self.manager.checksum = Mock()
+        self.manager.write_data('test', 100, data)
+        self.manager.checksum.update.assert_called_with(100, data)
+        self.manager.checksum.advance.assert_called_with(self.outfile.read)
+
+    def test_write_data_behind(self):
+        data = b'\x00'*10
+        self.manager.del_active_part = Mock()
+        self.manager.writer = Mock()
+        self.manager.checksum = Mock()
+        self.manager.write_data('test', 100, data)
+        self.manager.writer.put.assert_called_with(100, data)
+        self.manager.checksum.update.assert_called_with(100, data, False)
+        self.assertFalse(self.outfile.write.called)
+        self.assertEqual(self.manager.parts_in_writing, {100: 10})
+        self.assertEqual(self.manager.written_bytes, 10)
+        self.mirror.done.assert_called_with()
+
+    def test_part_written(self):
+        self.manager.del_active_part = Mock()
+        self.manager.checksum = Mock()
+        self.manager.part_written('test', 100, 10)
+        self.assertEqual(self.manager.written_bytes, 10)
+        self.manager.del_active_part.assert_called_with(100)
+        self.manager.checksum.resume.assert_called_with(self.outfile.read, [(100, 10)])
+        self.assertFalse(self.outfile.write.called)
+        self.mirror.done.assert_called_with()
+
+    def test_part_written_corrupted(self):
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.verify.return_value = False
+        self.manager.reject_data = Mock()
+        self.manager.part_written('test', 100, 10)
+        self.manager.piece_hashes.verify.assert_called_with(100, self.outfile.read.return_value)
+        self.manager.reject_data.assert_called_with('test', 100)
+        self.assertEqual(self.manager.written_bytes, 0)
+
+    def test_prepare_workers(self):
+        worker_cls = Mock()
+        process_mirror_cls = Mock()
+        process_mirror_cls.return_value.filename = 'file'
+        self.command_line.processes = 2
+        self.command_line.urls = [Mock(host='one'), Mock(host='two'), Mock(host='three')]
+        self.outfile.seekable = True
+        with patch.object(manager.Manager, '_worker_process', worker_cls), \
+                patch.object(manager.Manager, '_process_mirror', process_mirror_cls):
+            self.manager.prepare(Mock(), self.command_line, self.outfile)
+        self.assertEqual(len(self.manager.workers), 2)
+        workers = [call[0][3] for call in process_mirror_cls.call_args_list]
+        self.assertEqual(workers, [worker_cls.return_value] * 3)
+        worker_cls.return_value.send.assert_called_with('open', self.outfile.fullpath)
+        self.manager.stop_workers()
+        worker_cls.return_value.stop.assert_called_with()
+        self.assertEqual(self.manager.workers, [])
+
+    def test_prepare_stats(self):
+        stats_cls = Mock()
+        stats_cls.return_value.load.return_value = {'one': MirrorRecord(2**20, 0.1, 5, 0, True)}
+        self.command_line.stats = '/tmp/stats.db'
+        self.command_line.auto_block_size = True
+        self.command_line.block_size = 4 * 2**20
+        self.command_line.piece_hashes = None
+        self.command_line.urls = [URL('http://two/file'), URL('http://one/file')]
+        self.manager.mirrors = {}
+        self.manager.check_filename = Mock(return_value=True)
+        with patch.object(manager.Manager, '_stats', stats_cls), patch('pymget.manager.Mirror.create') as create_mock:
+            self.manager.prepare(Mock(), self.command_line, self.outfile)
+        stats_cls.return_value.load.assert_called_with(['two', 'one'])
+        self.assertEqual(list(self.manager.mirrors), ['one', 'two']) # the known fast mirror connects first
+        self.assertEqual(self.manager.block_size, 4 * 2**20) # it downloads 4MB in 4 seconds
+        self.outfile.create_path.assert_called_with('out', 4 * 2**20)
+
+    def test_rank_mirrors(self):
+        self.manager.records = {'slow': MirrorRecord(10, 1, 5), 'fast': MirrorRecord(100, 1, 5),
+                                'flaky': MirrorRecord(100, 1, 1, 4), 'whole': MirrorRecord(1000, 1, 5, 0, False)}
+        urls = [URL('http://' + host + '/file') for host in ('new', 'whole', 'flaky', 'slow', 'fast')]
+        self.assertEqual([url.host for url in self.manager.rank_mirrors(urls)], ['fast', 'slow', 'new', 'whole'])
+        self.assertTrue(self.console.warning.called)
+        self.assertEqual([url.host for url in self.manager.rank_mirrors(urls[2:3])], ['flaky']) # there are no other mirrors
+
+    def test_choose_block_size(self):
+        self.manager.urls = [URL('http://one/file'), URL('http://two/file')]
+        self.assertEqual(self.manager.choose_block_size(100), 100) # nothing is known
+        self.manager.records = {'one': MirrorRecord(10 * 2**20, 1, 5), 'two': MirrorRecord(2**20, 1, 5), 'other': MirrorRecord(2**30, 1, 5)}
+        self.assertEqual(self.manager.choose_block_size(100), 40 * 2**20)
+        self.manager.records = {'one': MirrorRecord(1000, 1, 5)}
+        self.assertEqual(self.manager.choose_block_size(100), manager.Manager.MIN_CHOSEN_BLOCK)
+
+    def test_adopt_block_size(self):
+        self.manager.block_size = 100
+        self.context.block_size = 200
+        self.manager.adopt_block_size(100)
+        self.assertEqual((self.manager.block_size, self.mirror.block_size), (200, 200)) # blocks of the first session
+        self.context.block_size = 0
+        self.context.clean = False
+        self.manager.adopt_block_size(50) # the context of an old version
+        self.assertEqual(self.manager.block_size, 50)
+        self.context.clean = True
+        self.manager.adopt_block_size(300)
+        self.assertEqual(self.manager.block_size, 50)
+
+    def test_adopt_block_size_with_workers(self):
+        self.manager.block_size = 100
+        self.manager.workers = [Mock()]
+        self.context.block_size = 200
+        with self.assertRaises(FatalError):
+            self.manager.adopt_block_size(100)
+
+    def test_measure(self):
+        self.manager.stats = Mock()
+        self.mirror.name = 'test'
+        self.manager.file_size = 1000
+        self.manager.block_size = 100
+        with patch.object(manager.Manager, 'time', 10):
+            self.manager.give_task(self.mirror)
+        with patch.object(manager.Manager, 'time', 11):
+            self.manager.set_progress('test', 10)
+        with patch.object(manager.Manager, 'time', 12):
+            self.manager.set_progress('test', 20)
+        with patch.object(manager.Manager, 'time', 14):
+            self.manager.write_data('test', 0, b'\x00' * 100)
+        record = self.manager.measurements['test']
+        self.assertEqual((record.speed, record.ttfb, record.parts, record.ranges), (25, 1, 1, True))
+        self.manager.mirrors['other'] = Mock()
+        self.manager.give_task(self.mirror)
+        self.manager.do_error('test', 200)
+        self.assertEqual((record.errors, record.ranges), (1, False))
+        self.manager.save_stats()
+        self.manager.stats.save.assert_called_with({'test': record})
+        self.assertEqual(self.manager.measurements, {})
+
+    def test_accept_workers(self):
+        worker = Mock()
+        worker.name = 'node:1000'
+        def remote_mirror(url, block_size, timeout, worker):
+            mirror = Mock()
+            mirror.name = url.host + '@' + worker.name
+            return mirror
+        remote_mirror_cls = Mock(side_effect=remote_mirror)
+        self.manager.coordinator = Mock()
+        self.manager.coordinator.accepted.return_value = [worker]
+        self.manager.shared_storage = True
+        self.outfile.fullpath = 'file'
+        self.manager.urls = [Mock(host='one'), Mock(host='two')]
+        with patch.object(manager.Manager, '_remote_mirror', remote_mirror_cls):
+            self.manager.accept_workers()
+        worker.start.assert_called_with()
+        worker.send.assert_called_with('open', os.path.abspath('file'))
+        self.assertEqual(self.manager.remote_workers, [worker])
+        self.assertEqual(self.manager.remote_mirrors, {'one@node:1000': worker, 'two@node:1000': worker})
+        self.assertIn('two@node:1000', self.manager.mirrors)
+        self.manager.stop_workers()
+        worker.stop.assert_called_with()
+
+    def test_redirect_remote_mirror(self):
+        worker = Mock()
+        location = Mock()
+        self.manager.remote_mirrors['test'] = worker
+        self.manager.create_remote_mirror = Mock()
+        self.manager.create_mirror = Mock()
+        self.manager.redirect('test', location)
+        self.manager.create_remote_mirror.assert_called_with(location, worker)
+        self.assertFalse(self.manager.create_mirror.called)
+        self.assertEqual(self.manager.remote_mirrors, {})
+
+    def test_copy_cached(self):
+        self.manager.cache = Mock()
+        self.manager.cache.lookup.return_value = '/cache/key'
+        self.manager.cache.record.return_value = (1, 1)
+        self.outfile.copy_from.return_value = 100
+        self.manager.set_file_size('test', 100, ('"a"', ''))
+        self.manager.cache.keys.assert_called_with(self.manager.checksum, self.manager.urls, 100, {'test': ('"a"', '')})
+        self.outfile.copy_from.assert_called_with('/cache/key')
+        self.assertFalse(self.manager.keep_download())
+        self.assertTrue(self.manager.cached)
+        self.manager.update_cache()
+        self.assertFalse(self.manager.cache.store.called)
+        self.manager.cache.record.assert_called_with(True)
+
+    def test_update_cache_downloaded(self):
+        self.manager.cache = Mock()
+        self.manager.cache.record.return_value = (0, 1)
+        self.manager.update_cache()
+        self.manager.cache.store.assert_called_with(self.manager.cache.keys.return_value, self.outfile.fullpath)
+        self.manager.cache.keys.assert_called_with(self.manager.checksum, self.manager.urls, self.manager.file_size, self.manager.validators)
+
+    def test_prepare_stream_without_workers(self):
+        worker_cls = Mock()
+        self.command_line.processes = 2
+        self.outfile.seekable = False
+        with patch.object(manager.Manager, '_worker_process', worker_cls):
+            self.manager.prepare(Mock(), self.command_line, self.outfile)
+        self.assertFalse(worker_cls.called)
+
+    def test_prepare_workers_stopped_on_error(self):
+        worker_cls = Mock()
+        self.command_line.processes = 1
+        self.outfile.seekable = True
+        self.manager.mirrors = {}
+        with patch.object(manager.Manager, '_worker_process', worker_cls):
+            with self.assertRaises(FatalError):
+                self.manager.prepare(Mock(), self.command_line, self.outfile)
+        worker_cls.return_value.stop.assert_called_with()
+
+    def test_collect_written(self):
+        self.manager.writer = Mock()
+        self.manager.writer.error = None
+        self.manager.writer.take_written.return_value = [(100, 10)]
+        self.manager.checksum = Mock()
+        self.manager.parts_in_writing = {100: 10, 110: 10}
+        self.manager.collect_written()
+        self.assertEqual(self.manager.parts_in_writing, {110: 10})
+        self.manager.checksum.resume.assert_called_with(self.outfile.read, [(100, 10)])
+        self.assertTrue(self.manager.state_changed)
+
+    def test_collect_written_error(self):
+        self.manager.writer = Mock()
+        self.manager.writer.error = FileError('error')
+        self.manager.writer.take_written.return_value = []
+        with self.assertRaises(FileError):
+            self.manager.collect_written()
+
+    def test_stop_writer(self):
+        writer = Mock()
+        writer.error = None
+        writer.take_written.return_value = [(0, 10)]
+        self.manager.writer = writer
+        self.manager.parts_in_writing = {0: 10}
+        self.manager.stop_writer()
+        writer.close.assert_called_with()
+        self.assertIsNone(self.manager.writer)
+        self.assertEqual(self.manager.parts_in_writing, {})
+
+    def test_checkpoint_parts_in_writing(self):
+        self.manager.state_changed = True
+        self.manager.written_bytes = 30
+        self.manager.parts_in_writing = {10: 10}
+        self.manager.checkpoint(True)
+        self.context.update.assert_called_with(0, 20, [10])
+
+    def test_verify_checksum_ok(self):
+        self.manager.file_size = 100
+        self.manager.checksum = Mock()
+        self.manager.checksum.verify.return_value = True
+        self.manager.verify_checksum()
+        self.manager.checksum.finish.assert_called_with(self.outfile.read, 100)
+        self.assertFalse(self.context.delete.called)
+
+    def test_verify_checksum_mismatch(self):
+        self.manager.checksum = Mock()
+        self.manager.checksum.verify.return_value = False
+        with self.assertRaises(FatalError):
+            self.manager.verify_checksum()
+        self.context.delete.assert_called_with()
+
+    def test_write_data_corrupted(self):
+        data = b'\x00'*10
+        self.mirror.strikes = 0
+        self.manager.max_strikes = 3
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.verify.return_value = False
+        self.manager.parts_in_progress.append(100)
+        self.manager.write_data('test', 100, data)
+        self.assertFalse(self.outfile.write.called)
+        self.assertEqual(self.manager.written_bytes, 0)
+        self.assertIn(100, self.manager.failed_parts)
+        self.assertEqual(self.manager.part_exclusions[100], {'test'})
+        self.assertEqual(self.mirror.strikes, 1)
+        self.mirror.done.assert_called_with()
+
+    def test_write_data_corrupted_last_strike(self):
+        self.mirror.strikes = 2
+        self.manager.max_strikes = 3
+        self.manager.mirrors['test2'] = Mock()
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.verify.return_value = False
+        self.manager.parts_in_progress.append(100)
+        self.manager.write_data('test', 100, b'\x00')
+        self.assertNotIn('test', self.manager.mirrors)
+
+    def test_write_data_corrupted_last_mirror(self):
+        self.mirror.strikes = 0
+        self.manager.max_strikes = 1
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.verify.return_value = False
+        self.manager.parts_in_progress.append(100)
+        with self.assertRaises(FatalError):
+            self.manager.write_data('test', 100, b'\x00')
+
+    def test_write_data_verified(self):
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.verify.return_value = True
+        self.manager.piece_hashes.written.return_value = []
+        self.manager.part_exclusions[100] = {'test2'}
+        self.manager.parts_in_progress.append(100)
+        self.manager.write_data('test', 100, b'\x00')
+        self.outfile.write.assert_called_with(b'\x00')
+        self.assertNotIn(100, self.manager.part_exclusions)
+
+    def test_verify_edges_ok(self):
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.written.return_value = [(1, [(0, 15), (15, 15)])]
+        self.manager.piece_hashes.piece_range.return_value = (10, 10)
+        self.manager.piece_hashes.verify_piece.return_value = True
+        self.manager.written_bytes = 30
+        self.manager.verify_edges(15, 15)
+        self.outfile.read.assert_called_with(10, 10)
+        self.assertEqual(self.manager.written_bytes, 30)
+        self.assertFalse(self.manager.failed_parts)
+
+    def test_verify_edges_corrupted(self):
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.written.return_value = [(1, [(0, 15), (15, 15)])]
+        self.manager.piece_hashes.piece_range.return_value = (10, 10)
+        self.manager.piece_hashes.verify_piece.return_value = False
+        self.manager.written_bytes = 30
+        self.manager.verify_edges(15, 15)
+        self.assertEqual(self.manager.written_bytes, 0)
+        self.assertEqual(list(self.manager.failed_parts), [0, 15])
+        self.assertTrue(self.console.warning.called)
+
+    def test_allocate_piece_hashes_mismatch(self):
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.set_file_size.side_effect = ValueError
+        self.manager.piece_hashes.digests = ['a']
+        with self.assertRaises(FatalError):
+            self.manager.allocate(100)
+
+    def test_allocate_resumed_file_with_piece_hashes(self):
+        self.manager.written_bytes = 10
+        self.manager.piece_hashes = Mock()
+        self.manager.piece_hashes.unaligned.return_value = 2
+        self.manager.allocate(100)
+        self.assertTrue(self.console.warning.called)
 
     def test_set_file_size_first(self):
         self.manager.set_file_size('test', 100)
@@ -250,6 +1049,100 @@ class testManager(unittest.TestCase):
         self.outfile.seek.assert_called_with(99)
         self.outfile.write.assert_called_with(b'\x00')
 
+    def test_allocate_resumed_file(self):
+        self.manager.written_bytes = 10
+        self.manager.allocate(100)
+        self.assertEqual(self.manager.file_size, 100)
+        self.assertFalse(self.outfile.write.called)
+
+    def test_allocate_resumed_file_with_checksum(self):
+        self.manager.written_bytes = 10
+        self.manager.checksum = Mock()
+        self.manager.written_ranges = Mock(return_value=[(0, 10)])
+        self.manager.allocate(100)
+        self.manager.checksum.resume.assert_called_with(self.outfile.read, [(0, 10)])
+
+    def seeded(self, found, shared=False):
+        self.manager.seed = Mock()
+        self.manager.seed.match.return_value = found
+        self.manager.seed.read.side_effect = lambda offset, size: b'\x01' * size
+        self.manager.piece_hashes = Mock(length=10, digests=['a'] * 5)
+        self.manager.piece_hashes.piece_range.side_effect = lambda index: (index * 10, min(10, 45 - index * 10))
+        self.manager.block_size = 20
+        self.manager.shared = shared
+        self.context.seed.return_value = True
+
+    def test_allocate_seeded(self):
+        self.seeded({0: 0, 1: 30, 2: 10, 4: 40}) # the block 20 lacks the piece 3
+        self.manager.allocate(45)
+        self.assertEqual(self.outfile.write.call_count, 4) # the zero byte and pieces of blocks 0 and 40
+        self.assertEqual(self.manager.seed.read.call_args_list[-1][0], (40, 5))
+        self.context.seed.assert_called_with(60, 25, [20])
+        self.assertEqual((self.manager.offset, self.manager.written_bytes, self.manager.old_progress), (60, 25, 25))
+        self.assertEqual(list(self.manager.failed_parts), [20])
+        self.manager.seed.close.assert_called_with()
+        self.console.create_progressbar.assert_called_with(45, 25)
+        self.manager.give_task(self.mirror)
+        self.mirror.download.assert_called_with(20) # only the changed block is downloaded
+
+    def test_allocate_seeded_shared(self):
+        self.seeded({0: 0, 1: 10}, True)
+        self.outfile.size.return_value = 45
+        self.manager.allocate(45)
+        self.context.seed.assert_called_with(60, 20, [20, 40])
+        self.assertEqual(list(self.manager.failed_parts), []) # parts are claimed from the context
+        self.assertEqual((self.manager.written_bytes, self.manager.synced_bytes), (20, 20))
+
+    def test_allocate_seeded_after_other_process(self):
+        self.seeded({0: 0, 1: 10}, True)
+        self.outfile.size.return_value = 45
+        self.context.seed.return_value = False
+        self.manager.allocate(45)
+        self.assertEqual((self.manager.offset, self.manager.written_bytes), (0, 0)) # copied parts are downloaded as usual
+
+    def test_allocate_nothing_seeded(self):
+        self.seeded({1: 10})
+        self.manager.allocate(45)
+        self.assertFalse(self.context.seed.called)
+        self.assertEqual(self.manager.offset, 0)
+
+    def test_allocate_repaired(self):
+        self.manager.repair = True
+        self.manager.piece_hashes = Mock(length=10, digests=['a'] * 5)
+        self.manager.piece_hashes.mismatched.return_value = [1, 3] # pieces of blocks 0 and 20
+        self.manager.block_size = 20
+        self.manager.checksum = Mock()
+        self.outfile.size.return_value = 45
+        self.context.seed.return_value = True
+        self.manager.allocate(45)
+        self.manager.piece_hashes.mismatched.assert_called_with(self.outfile.read)
+        self.assertFalse(self.outfile.write.called) # the file is not allocated again
+        self.assertFalse(self.outfile.truncate.called)
+        self.context.seed.assert_called_with(60, 5, [0, 20])
+        self.assertEqual(list(self.manager.failed_parts), [0, 20])
+        self.manager.checksum.resume.assert_called_with(self.outfile.read, [(40, 5)])
+
+    def test_allocate_repaired_cut_file(self):
+        self.manager.repair = True
+        self.manager.piece_hashes = Mock(length=10, digests=['a'] * 5)
+        self.manager.piece_hashes.mismatched.return_value = []
+        self.manager.block_size = 20
+        self.outfile.size.return_value = 30
+        self.context.seed.return_value = True
+        self.manager.allocate(45)
+        self.outfile.truncate.assert_called_with(45)
+        self.context.seed.assert_called_with(60, 45, [])
+        self.assertEqual(self.manager.written_bytes, 45) # the file is complete
+
+    def test_written_ranges(self):
+        self.manager.file_size = 95
+        self.manager.block_size = 10
+        self.manager.offset = 100
+        self.manager.failed_parts.extend([30, 10, 90])
+        self.assertEqual(self.manager.written_ranges(), [(0, 10), (20, 10), (40, 50)])
+        self.manager.failed_parts.append(55) # the rest of a part failed after receiving data
+        self.assertEqual(self.manager.written_ranges(), [(0, 10), (20, 10), (40, 15), (60, 30)])
+
     def test_set_file_size_equals(self):
         self.manager.file_size = 100
         self.manager.set_file_size('test', 100)
@@ -257,6 +1150,156 @@ class testManager(unittest.TestCase):
         self.assertTrue(self.mirror.ready)
         self.mirror.connect_message.assert_called_with(self.console)
 
+    def test_set_file_size_remembers_validator(self):
+        self.context.file_size = 0
+        self.manager.set_file_size('test', 100, ('"abc"', ''))
+        self.context.remember.assert_called_with(100, {'test': ('"abc"', '')})
+        self.assertEqual(self.mirror.validator, ('"abc"', ''))
+
+    def test_set_file_size_same_file(self):
+        self.manager.confirmed = False
+        self.manager.resumed_size = 100
+        self.manager.validators = {'test': ('"abc"', 'Mon, 19 Oct 2026 10:00:00 GMT')}
+        self.manager.set_file_size('test', 100, ('"abc"', 'Tue, 20 Oct 2026 10:00:00 GMT')) # ETags are compared first
+        self.assertTrue(self.manager.confirmed)
+        self.assertFalse(self.context.restart.called)
+        self.assertTrue(self.mirror.ready)
+
+    def test_set_file_size_changed_restarts(self):
+        self.manager.confirmed = False
+        self.manager.resumed_size = 100
+        self.manager.validators = {'test': ('"abc"', '')}
+        self.manager.offset = self.manager.written_bytes = 50
+        self.manager.failed_parts.append(10)
+        self.manager.parts_in_progress = [40]
+        self.manager.checksum = Mock()
+        self.manager.set_file_size('test', 200, ('"new"', ''))
+        self.context.restart.assert_called_with(200, {'test': ('"new"', '')})
+        self.assertTrue(self.console.warning.called)
+        self.assertEqual((self.manager.offset, self.manager.written_bytes, list(self.manager.failed_parts)), (0, 0, []))
+        self.assertEqual(self.manager.stale_parts, {40})
+        self.manager.checksum.reset.assert_called_with()
+        self.outfile.truncate.assert_called_with(0)
+        self.assertEqual(self.manager.file_size, 200) # the new file is allocated
+        self.assertTrue(self.mirror.ready)
+
+    def test_set_file_size_changed_after_confirmation(self):
+        self.manager.validators = {'test': ('"abc"', '')}
+        self.manager.delete_mirror = Mock()
+        self.manager.set_file_size('test', 100, ('"new"', ''))
+        self.assertFalse(self.context.restart.called)
+        self.manager.delete_mirror.assert_called_with('test')
+        self.assertEqual(self.manager.file_size, 0)
+
+    def test_set_file_size_changed_other_process(self):
+        self.manager.confirmed = False
+        self.manager.validators = {'test': ('"abc"', '')}
+        self.context.restart.return_value = False
+        self.manager.mirrors['other'] = Mock()
+        self.manager.delete_mirror = Mock()
+        self.manager.set_file_size('test', 100, ('"new"', ''))
+        self.manager.delete_mirror.assert_called_with('test')
+
+    def test_warm_up(self):
+        self.manager.mirrors = {}
+        self.manager.urls = [URL('http://one.com/file'), URL('http://two.com/file'), URL('http://new.com/file')]
+        self.manager.check_filename = Mock(return_value=True)
+        for url in self.manager.urls:
+            self.manager.create_mirror(url)
+        self.context.clean = False
+        self.context.file_size = 1000
+        self.context.links = {'http://one.com/file': ('', Context.RANGES),
+                              'http://two.com/file': ('http://cdn.com/file', Context.RANGES)}
+        self.manager.validators = {'one.com': ('"abc"', '')}
+        self.assertEqual(self.manager.warm_up(0), 1000)
+        self.assertEqual(set(self.manager.mirrors), {'one.com', 'cdn.com', 'new.com'})
+        self.assertEqual(set(self.manager.warm), {'one.com', 'cdn.com'})
+        self.assertEqual(self.manager.origins['cdn.com'].url, 'http://two.com/file')
+        one = self.manager.mirrors['one.com']
+        self.assertTrue(one.ready)
+        self.assertFalse(one.need_connect)
+        self.assertEqual((one.file_size, one.validator), (1000, ('"abc"', '')))
+        self.assertTrue(self.manager.mirrors['new.com'].need_connect) # the link is unknown, the header is requested
+
+    def test_warm_up_new_file(self):
+        self.context.clean = True
+        self.assertEqual(self.manager.warm_up(0), 0)
+        self.context.clean = False
+        self.context.file_size = 1000
+        self.assertEqual(self.manager.warm_up(2000), 0) # the size in advance differs
+
+    def test_warmed(self):
+        self.manager.warm['test'] = Mock()
+        self.manager.warmed('test')
+        self.manager.warmed('test')
+        self.assertEqual(self.mirror.connect_message.call_count, 1)
+
+    def test_do_error_warm_reconnects(self):
+        link = URL('http://two.com/file')
+        self.mirror.url = URL('http://cdn.com/file')
+        self.manager.mirrors = {'cdn.com': self.mirror}
+        self.manager.warm['cdn.com'] = link
+        self.manager.create_mirror = Mock()
+        self.manager.do_error('cdn.com', 404)
+        self.manager.create_mirror.assert_called_with(link) # the link is redirected elsewhere now
+        self.assertNotIn('cdn.com', self.manager.mirrors)
+        self.assertFalse(self.console.error.called)
+
+    def test_do_error_warm_same_link(self):
+        self.mirror.url = URL('http://one.com/file')
+        self.manager.warm['test'] = self.mirror.url
+        self.manager.do_error('test', 0)
+        self.mirror.close.assert_called_with()
+        self.assertTrue(self.mirror.need_connect)
+        self.assertIn('test', self.manager.mirrors)
+
+    def test_remember_link(self):
+        self.mirror.url = URL('http://cdn.com/file')
+        self.manager.origins['test'] = URL('http://two.com/file')
+        self.manager.file_size = 1000
+        self.context.links = {}
+        self.manager.remember_link('test')
+        self.context.remember.assert_called_with(1000, {}, {'http://two.com/file': ('http://cdn.com/file', Context.RANGES)})
+        self.context.links = {'http://two.com/file': ('http://cdn.com/file', Context.RANGES)}
+        self.context.remember.reset_mock()
+        self.manager.remember_link('test')
+        self.assertFalse(self.context.remember.called)
+
+    def test_redirect_keeps_origin(self):
+        self.mirror.url = URL('http://two.com/file')
+        self.manager.create_mirror = lambda url: self.manager.mirrors.update({url.host: Mock(url=url)})
+        self.manager.redirect('test', URL('http://cdn.com/file'))
+        self.assertEqual(self.manager.origins['cdn.com'].url, 'http://two.com/file')
+
+    def test_stale_part(self):
+        self.manager.stale_parts = {10}
+        self.assertFalse(self.manager.stale_part('test', 20))
+        self.assertTrue(self.manager.stale_part('test', 10))
+        self.mirror.done.assert_called_with()
+        self.assertEqual(self.manager.stale_parts, set())
+
+    def test_file_changed(self):
+        self.manager.parts_in_progress = [10]
+        self.mirror.validator = ('"abc"', '')
+        self.manager.set_file_size = Mock()
+        self.manager.file_changed('test', 10, 100, ('"new"', ''))
+        self.assertEqual(list(self.manager.failed_parts), [10])
+        self.manager.set_file_size.assert_called_with('test', 100, ('"new"', ''))
+
+    def test_file_changed_ranges_ignored(self):
+        self.manager.parts_in_progress = [10]
+        self.mirror.validator = ('"abc"', '')
+        self.manager.do_error = Mock()
+        self.manager.file_changed('test', 10, 100, ('"abc"', ''))
+        self.manager.do_error.assert_called_with('test', 200)
+
+    def test_file_changed_unknown_size(self):
+        self.manager.parts_in_progress = [10]
+        self.mirror.validator = ('"abc"', '')
+        self.manager.file_changed('test', 10, -1, ('', ''))
+        self.assertFalse(self.mirror.ready)
+        self.assertTrue(self.mirror.need_connect)
+
     def test_set_file_size_differs(self):
         self.manager.file_size = 200
         self.manager.delete_mirror = Mock()
@@ -0,0 +1,104 @@
+import unittest
+import io
+
+from pymget.metalink import Metalink, MetalinkFile
+
+METALINK4 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+  <published>2010-05-01T12:15:02Z</published>
+  <file name="example.iso">
+    <size>1024</size>
+    <hash type="md5">0123456789abcdef0123456789abcdef</hash>
+    <hash type="sha-256">ABABABABABABABABABABABABABABABABABABABABABABABABABABABABABABABAB</hash>
+    <pieces length="512" type="sha-1">
+      <hash>aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa</hash>
+      <hash>bbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbbb</hash>
+    </pieces>
+    <url location="de" priority="2">http://ftp.example.com/example.iso</url>
+    <url>http://example.net/example.iso</url>
+    <url location="us" priority="1">ftp://ftp.example.org/example.iso</url>
+  </file>
+</metalink>
+'''
+
+METALINK3 = b'''<?xml version="1.0" encoding="UTF-8"?>
+<metalink version="3.0" xmlns="http://www.metalinker.org/">
+  <files>
+    <file name="example.iso">
+      <size>2048</size>
+      <verification>
+        <hash type="sha1">1234</hash>
+      </verification>
+      <resources maxconnections="2">
+        <url type="http" preference="10" maxconnections="1">http://slow.example.com/example.iso</url>
+        <url type="http" preference="90">http://fast.example.com/example.iso</url>
+        <url type="bittorrent" preference="100">http://torrent.example.com/example.iso.torrent</url>
+      </resources>
+    </file>
+  </files>
+</metalink>
+'''
+
+class TestMetalink(unittest.TestCase):
+
+    def test_load_metalink4(self):
+        files = Metalink.load(io.BytesIO(METALINK4))
+        self.assertEqual(len(files), 1)
+        meta = files[0]
+        self.assertEqual(meta.name, 'example.iso')
+        self.assertEqual(meta.size, 1024)
+        self.assertEqual(meta.hashes, {'md5': '0123456789abcdef0123456789abcdef', 'sha256': 'abababababababababababababababababababababababababababababababab'})
+        self.assertEqual(meta.pieces, ('sha1', 512, ['a' * 40, 'b' * 40]))
+        self.assertEqual(meta.sorted_urls(), [
+            'ftp://ftp.example.org/example.iso',
+            'http://ftp.example.com/example.iso',
+            'http://example.net/example.iso',
+        ])
+
+    def test_load_metalink3(self):
+        meta = Metalink.load(io.BytesIO(METALINK3))[0]
+        self.assertEqual(meta.size, 2048)
+        self.assertEqual(meta.hashes, {'sha1': '1234'})
+        self.assertEqual(meta.sorted_urls(), [
+            'http://fast.example.com/example.iso',
+            'http://slow.example.com/example.iso',
+        ])
+        self.assertEqual(meta.mirrors(), [
+            ('http://fast.example.com/example.iso', '', 2),
+            ('http://slow.example.com/example.iso', '', 1),
+        ])
+
+    def test_load_several_files(self):
+        data = b'<metalink xmlns="urn:ietf:params:xml:ns:metalink"><file name="a"/><file name="b"/></metalink>'
+        files = Metalink.load(io.BytesIO(data))
+        self.assertEqual([f.name for f in files], ['a', 'b'])
+
+    def test_load_broken(self):
+        with self.assertRaises(SyntaxError):
+            Metalink.load(io.BytesIO(b'<metalink><file>'))
+
+    def test_checksum_preference(self):
+        meta = Metalink.load(io.BytesIO(METALINK4))[0]
+        checksum = meta.checksum()
+        self.assertEqual(checksum.algorithm, 'sha256')
+        self.assertEqual(checksum.digest, 'abababababababababababababababababababababababababababababababab')
+
+    def test_checksum_none(self):
+        self.assertIsNone(MetalinkFile('test').checksum())
+
+    def test_piece_hashes(self):
+        meta = Metalink.load(io.BytesIO(METALINK4))[0]
+        hashes = meta.piece_hashes()
+        self.assertEqual(hashes.length, 512)
+        self.assertEqual(hashes.digests, ['a' * 40, 'b' * 40])
+
+    def test_checksum_broken_hash(self):
+        data = METALINK4.replace(b'ABABABABABABABABABABABABABABABABABABABABABABABABABABABABABABABAB', b'not a hex')
+        meta = Metalink.load(io.BytesIO(data))[0]
+        with self.assertRaises(ValueError):
+            meta.checksum()
+
+    def test_piece_hashes_unsupported(self):
+        meta = MetalinkFile('test')
+        meta.pieces = ('tiger', 512, ['aaaa'])
+        self.assertIsNone(meta.piece_hashes())
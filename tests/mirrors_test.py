@@ -44,6 +44,12 @@ class testMirror(unittest.TestCase):
         conn_thread_init_mock.assert_called_with(url, 0)
         conn_thread_start_mock.assert_called_with()
 
+    @patch.object(nw.HTTPThread, 'start')
+    @patch.object(nw.HTTPThread, '__init__', return_value=None)
+    def test_connect_probe(self, conn_thread_init_mock, conn_thread_start_mock):
+        self.mirror.connect(100)
+        self.assertEqual(self.mirror.conn_thread.probe_size, 100)
+
     @patch.object(nw.HTTXDownloadThread, 'start')
     @patch.object(nw.HTTXDownloadThread, '__init__', return_value=None)
     def test_download_start(self, dnl_thread_init_mock, dnl_thread_start_mock):
@@ -56,6 +62,20 @@ class testMirror(unittest.TestCase):
         dnl_thread_init_mock.assert_called_with(url, conn, 0, 10)
         dnl_thread_start_mock.assert_called_with()
 
+    @patch('http.client.HTTPConnection')
+    @patch.object(nw.HTTXDownloadThread, 'start')
+    def test_download_without_connection(self, dnl_thread_start_mock, conn_mock):
+        self.mirror.url = Mock(protocol='http', host='server.com')
+        self.mirror.timeout = 5
+        self.mirror.validator = ('"abc"', '')
+        pool = Mock()
+        pool.return_value.take.return_value = None
+        with patch.object(mirrors.HTTXMirror, '_pool', pool):
+            self.mirror.download(0)
+        conn_mock.assert_called_with('server.com', timeout=5)
+        self.assertIs(self.mirror.dnl_thread.conn, conn_mock.return_value)
+        self.assertEqual(self.mirror.dnl_thread.validator, ('"abc"', ''))
+
     def test_cancel_with_connection_thread(self):
         conn_thread = Mock()
         self.mirror.conn_thread = conn_thread
@@ -166,6 +166,159 @@ class TestHTTXConnection(unittest.TestCase):
         self.assertIsInstance(info, ti.TaskHeadError)
         self.assertEqual(info.status, 404)
 
+    @patch('http.client.HTTPConnection')
+    def test_connect_pooled(self, conn_mock):
+        pooled = Mock()
+        pooled.getresponse.return_value = Mock(status=200)
+        pooled.getresponse.return_value.getheader.return_value = '100'
+        pool = Mock()
+        pool.return_value.take.return_value = pooled
+        with patch.object(nw.NetworkThread, '_pool', pool):
+            conn = nw.HTTPThread(Mock(), 0)
+            info = conn.connect()
+        self.assertIsInstance(info, ti.TaskHeadData)
+        self.assertIs(conn.conn, pooled)
+        conn_mock.assert_not_called()
+
+    @patch('http.client.HTTPConnection')
+    def test_connect_pooled_closed(self, conn_mock):
+        pooled = Mock()
+        pooled.request.side_effect = ConnectionResetError
+        conn_mock.return_value.getresponse.return_value = Mock(status=200)
+        conn_mock.return_value.getresponse.return_value.getheader.return_value = '100'
+        pool = Mock()
+        pool.return_value.take.return_value = pooled
+        with patch.object(nw.NetworkThread, '_pool', pool):
+            conn = nw.HTTPThread(Mock(), 0)
+            info = conn.connect()
+        self.assertIsInstance(info, ti.TaskHeadData)
+        pooled.close.assert_called_with()
+        self.assertIs(conn.conn, conn_mock.return_value)
+
+
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def response(self, status, value):
+        response = Mock(status=status)
+        response.getheader.return_value = value
+        return response
+
+    def test_seconds(self):
+        self.assertEqual(nw.retry_after(self.response(429, '120')), 120)
+
+    @patch('time.time', return_value=1792404000) # Mon, 19 Oct 2026 10:00:00 GMT
+    def test_date(self, time_mock):
+        self.assertEqual(nw.retry_after(self.response(503, 'Mon, 19 Oct 2026 10:01:00 GMT')), 60)
+        self.assertEqual(nw.retry_after(self.response(503, 'Mon, 19 Oct 2026 09:00:00 GMT')), 0) # already passed
+
+    def test_ignored(self):
+        self.assertEqual(nw.retry_after(self.response(500, '120')), 0) # only for 429 and 503
+        self.assertEqual(nw.retry_after(self.response(503, None)), 0)
+        self.assertEqual(nw.retry_after(self.response(503, 'soon')), 0)
+
+
+
+class TestHTTXSmallFile(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = nw.HTTPThread(Mock(host='server.com'), 0)
+        self.conn.conn = Mock()
+        self.conn.probe_size = 100
+        self.response = Mock()
+        self.conn.conn.getresponse.return_value = self.response
+
+    def headers(self, status, length, content_range=None):
+        self.response.status = status
+        headers = {'Content-Length': str(length), 'Content-Range': content_range}
+        self.response.getheader = lambda name, default=None: headers.get(name) or default
+
+    def test_small_file(self):
+        self.headers(206, 10, 'bytes 0-9/10')
+        self.response.read.return_value = b'\x00'*10
+        info = self.conn.request_file()
+        self.assertIsInstance(info, ti.TaskSmallFile)
+        self.assertEqual(info.data, b'\x00'*10)
+        headers = self.conn.conn.request.call_args[1]['headers']
+        self.assertEqual(headers['Range'], 'bytes=0-99')
+        self.assertFalse(self.conn.conn.close.called)
+
+    def test_small_file_without_ranges(self):
+        self.headers(200, 10)
+        self.response.read.return_value = b'\x00'*10
+        info = self.conn.request_file()
+        self.assertIsInstance(info, ti.TaskSmallFile)
+
+    def test_small_file_validator(self):
+        self.headers(200, 10)
+        getheader = self.response.getheader
+        self.response.getheader = lambda name, default=None: '"abc"' if name == 'ETag' else getheader(name, default)
+        self.response.read.return_value = b'\x00'*10
+        info = self.conn.request_file()
+        self.assertEqual((info.etag, info.last_modified), ('"abc"', ''))
+
+    def test_large_file(self):
+        self.headers(206, 100, 'bytes 0-99/1000')
+        info = self.conn.request_file()
+        self.assertIsInstance(info, ti.TaskHeadData)
+        self.assertEqual(info.file_size, 1000)
+        self.assertEqual((info.etag, info.last_modified), ('', ''))
+        self.assertFalse(self.response.read.called)
+        self.conn.conn.close.assert_called_with()
+
+    def test_empty_file(self):
+        self.headers(416, 0)
+        self.conn.request_head = Mock()
+        info = self.conn.request_file()
+        self.assertIs(info, self.conn.request_head.return_value)
+
+    def test_error(self):
+        self.headers(404, 0)
+        info = self.conn.request_file()
+        self.assertIsInstance(info, ti.TaskHeadError)
+        self.assertEqual(info.status, 404)
+
+    def test_no_probe(self):
+        self.conn.probe_size = 0
+        self.conn.request_head = Mock()
+        info = self.conn.request_file()
+        self.assertIs(info, self.conn.request_head.return_value)
+        self.assertFalse(self.conn.conn.request.called)
+
+
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = nw.ConnectionPool()
+        self.pool.close()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_singleton(self):
+        self.assertIs(nw.ConnectionPool(), self.pool)
+
+    def test_take_empty(self):
+        self.assertIsNone(self.pool.take('http', 'server.com'))
+
+    def test_put_take(self):
+        conn = Mock()
+        self.pool.put('http', 'server.com', conn)
+        self.assertIsNone(self.pool.take('https', 'server.com'))
+        self.assertIs(self.pool.take('http', 'server.com'), conn)
+        self.assertIsNone(self.pool.take('http', 'server.com'))
+
+    def test_close(self):
+        conn = Mock()
+        conn.close.side_effect = OSError
+        self.pool.put('http', 'server.com', conn)
+        self.pool.close()
+        conn.close.assert_called_with()
+        self.assertIsNone(self.pool.take('http', 'server.com'))
+
 
 
 
@@ -218,6 +371,23 @@ class TestHTTXDownload(unittest.TestCase):
         self.assertIsInstance(info, ti.TaskError)
         self.assertEqual(info.status, 200)
 
+    def test_run_get_data_changed(self):
+        self.dnl.validator = ('"abc"', 'Mon, 19 Oct 2026 10:00:00 GMT')
+        self.response.status = 200
+        self.dnl.run()
+        self.headers['If-Range'] = '"abc"'
+        self.dnl.conn.request.assert_called_with('GET', '/test', headers=self.headers)
+        info = self.dnl.data_queue.put.call_args[0][0]
+        self.assertIsInstance(info, ti.TaskChanged)
+        self.assertEqual((info.offset, info.file_size, info.etag), (0, 100, '100'))
+        self.assertFalse(self.response.read.called) # the new file is not received
+        self.dnl.conn.close.assert_called_with()
+
+    def test_if_range(self):
+        self.assertEqual(self.dnl.if_range(), '')
+        self.dnl.validator = ('W/"abc"', 'Mon, 19 Oct 2026 10:00:00 GMT') # weak ETags can't be used for ranges
+        self.assertEqual(self.dnl.if_range(), 'Mon, 19 Oct 2026 10:00:00 GMT')
+
     def test_run_get_data_http_error(self):
         self.response.status = 404
         self.dnl.run()
@@ -227,6 +397,14 @@ class TestHTTXDownload(unittest.TestCase):
         self.assertIsInstance(info, ti.TaskError)
         self.assertEqual(info.status, 404)
 
+    def test_run_get_data_retry_after(self):
+        self.response.status = 503
+        self.response.getheader.return_value = '30'
+        self.dnl.run()
+        info = self.dnl.data_queue.put.call_args[0][0]
+        self.assertIsInstance(info, ti.TaskError)
+        self.assertEqual((info.status, info.retry_after), (503, 30))
+
     def test_run_get_data_get_error(self):
         self.response.read = Mock(side_effect=Exception)
         self.dnl.run()
@@ -244,6 +422,20 @@ class TestHTTXDownload(unittest.TestCase):
         self.assertTrue(self.dnl.ready, ti.TaskError)
         self.assertEqual(info.status, 0)
 
+    def test_run_get_data_partial(self):
+        self.response.read = Mock(side_effect=[b'\x01'*50, Exception])
+        self.dnl.run()
+        info = self.dnl.data_queue.put.call_args[0][0]
+        self.assertIsInstance(info, ti.TaskError)
+        self.assertEqual(info.received, b'\x01'*50) # received data are not thrown away
+
+    def test_run_rest_of_part(self):
+        dnl = nw.HTTXDownloadThread(Mock(request='/test', protocol='http', host='server.com'), self.dnl.conn, 1000, 4096)
+        dnl.data_queue = Mock()
+        dnl.run()
+        self.headers['Range'] = 'bytes=1000-4095' # up to the end of the block
+        dnl.conn.request.assert_called_with('GET', '/test', headers=self.headers)
+
 
 class TestFTPDownload(unittest.TestCase):
     
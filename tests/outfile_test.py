@@ -1,9 +1,11 @@
 import unittest
 from unittest.mock import Mock, PropertyMock, MagicMock, patch, DEFAULT
 
+import io
 import os
 import platform
 import struct
+import tempfile
 
 from pymget import outfile
 from pymget.errors import FileError, CancelError
@@ -13,8 +15,18 @@ class TestOutputFile(unittest.TestCase):
     def setUp(self):
         self.console = Mock()
         self.console.ask.return_value = True
+        patcher = patch.object(outfile.Context, '_fcntl', None) # the context file is not created
+        patcher.start()
+        self.addCleanup(patcher.stop)
         self.of = outfile.OutputFile(self.console, '')
 
+    @patch('os.path.isfile', return_value=False)
+    def test_create_path_saves_block_size(self, isfile_mock):
+        self.of.open_file = Mock(return_value=None)
+        with patch.object(outfile.Context, 'write'):
+            self.of.create_path('test', 100)
+        self.assertEqual(self.of.context.block_size, 100)
+
     def test_create_path_without_user_path(self):
         self.of.open_file = Mock(return_value=None)
         self.of.create_path('test')
@@ -52,6 +64,11 @@ class TestOutputFile(unittest.TestCase):
         self.assertEqual(self.of.path, 'folder')
         self.assertEqual(self.of.fullpath, os.path.join('folder', 'test'))
 
+    def test_check_folders_current_directory(self):
+        self.of.path = ''
+        self.assertEqual(self.of.check_folders(), None)
+        self.assertFalse(self.console.ask.called)
+
     @patch('os.path.isdir', return_value=True)
     def test_check_folders_existing_directory(self, isdir_mock):
         self.of.path = 'path/to/folder'
@@ -93,7 +110,7 @@ class TestOutputFile(unittest.TestCase):
         self.of.fullpath = 'path/to/file'
         self.assertEqual(self.of.open_file(), open_mock.return_value)
         isfile_mock.assert_called_with('path/to/file')
-        open_mock.assert_called_with('path/to/file', 'wb')
+        open_mock.assert_called_with('path/to/file', 'wb+')
 
     @patch('os.path.isfile', return_value=False)
     @patch('builtins.open', side_effect=PermissionError)
@@ -113,7 +130,7 @@ class TestOutputFile(unittest.TestCase):
         self.of.fullpath = 'path/to/file'
         self.assertEqual(self.of.open_file(), open_mock.return_value)
         isfile_mock.assert_called_with('path/to/file')
-        open_mock.assert_called_with('path/to/file', 'wb')
+        open_mock.assert_called_with('path/to/file', 'wb+')
 
     @patch('os.path.isfile', return_value=True)
     @patch('builtins.open')
@@ -144,6 +161,22 @@ class TestOutputFile(unittest.TestCase):
             self.of.open_file()
         isfile_mock.assert_called_with('path/to/file')
 
+    @patch('builtins.open')
+    def test_open_file_repair(self, open_mock):
+        self.of.repair = True
+        self.of.context = Mock(clean=True)
+        self.of.fullpath = 'path/to/file'
+        self.assertEqual(self.of.open_file(), open_mock.return_value)
+        open_mock.assert_called_with('path/to/file', 'rb+') # the file is not rewritten
+        self.assertFalse(self.console.ask.called)
+
+    @patch('builtins.open', side_effect=FileNotFoundError)
+    def test_open_file_repair_not_found(self, open_mock):
+        self.of.repair = True
+        self.of.context = Mock(clean=True)
+        with self.assertRaises(FileError):
+            self.of.open_file()
+
     @patch('os.path.isfile', return_value=False)
     @patch('builtins.open', side_effect=[FileNotFoundError, DEFAULT])
     def test_open_file_old_context_file_not_exists_answer_yes(self, open_mock, isfile_mock):
@@ -153,7 +186,7 @@ class TestOutputFile(unittest.TestCase):
         self.assertEqual(self.of.open_file(), open_mock.return_value)
         isfile_mock.assert_called_with('path/to/file')
         open_mock.assert_any_call('path/to/file', 'rb+')
-        open_mock.assert_any_call('path/to/file', 'wb')
+        open_mock.assert_any_call('path/to/file', 'wb+')
 
     @patch('os.path.isfile', return_value=False)
     @patch('builtins.open', side_effect=FileNotFoundError)
@@ -188,6 +221,85 @@ class TestOutputFile(unittest.TestCase):
         self.of.file.seek.assert_called_with(100, 0)
         self.of.file.close.assert_called_with()
 
+    def test_read_file_ok(self):
+        self.of.file = Mock()
+        self.of.file.read.return_value = b'\x00'*10
+        self.assertEqual(self.of.read(100, 10), b'\x00'*10)
+        self.of.file.seek.assert_called_with(100, 0)
+        self.of.file.read.assert_called_with(10)
+
+    def test_read_file_failed(self):
+        self.of.file = Mock()
+        self.of.file.read = Mock(side_effect=Exception)
+        with self.assertRaises(FileError):
+            self.of.read(100, 10)
+
+    def test_write_at_ok(self):
+        self.of.file = Mock()
+        self.of.write_at(100, [b'\x00'*10, b'\x01'*10])
+        self.of.file.seek.assert_called_with(100, 0)
+        self.of.file.write.assert_called_once_with(b'\x00'*10 + b'\x01'*10)
+
+    def test_write_at_failed(self):
+        self.of.file = Mock()
+        self.of.file.write = Mock(side_effect=Exception)
+        with self.assertRaises(FileError):
+            self.of.write_at(100, [b'\x00'*10])
+
+    def test_release_not_large_file(self):
+        self.of.drop_cache = Mock()
+        self.of.release(0, 100)
+        self.assertEqual(self.of.frontier, 0)
+        self.assertFalse(self.of.drop_cache.called)
+
+    def test_release_frontier(self):
+        self.of.large_file = True
+        self.of.RELEASE_SIZE = 200
+        self.of.drop_cache = Mock()
+        self.of.release(100, 100)
+        self.assertEqual(self.of.frontier, 0)
+        self.of.release(0, 100)
+        self.assertEqual(self.of.frontier, 200)
+        self.of.drop_cache.assert_called_with(0, 200)
+
+    def test_release_below_release_size(self):
+        self.of.large_file = True
+        self.of.drop_cache = Mock()
+        self.of.release(0, 100)
+        self.assertFalse(self.of.drop_cache.called)
+
+    @unittest.skipUnless(hasattr(os, 'posix_fadvise'), 'posix_fadvise is not supported')
+    @patch('os.posix_fadvise')
+    @patch('os.fdatasync')
+    def test_drop_cache(self, fdatasync_mock, fadvise_mock):
+        self.of.file = Mock()
+        self.of.file.fileno.return_value = 3
+        self.of.drop_cache(100, 200)
+        fdatasync_mock.assert_called_with(3)
+        fadvise_mock.assert_called_with(3, 100, 200, os.POSIX_FADV_DONTNEED)
+        self.assertEqual(self.of.released, 300)
+
+    def test_write_direct_unaligned(self):
+        self.of.file = Mock()
+        self.of.direct_fd = 3
+        self.of.write_at(100, [b'\x00'*4096])
+        self.of.file.write.assert_called_with(b'\x00'*4096)
+
+    @unittest.skipUnless(hasattr(os, 'O_DIRECT'), 'direct I/O is not supported')
+    def test_write_direct(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.of.user_path = os.path.join(tmp, 'file')
+            self.of.direct_io = True
+            self.of.create_path('test')
+            if self.of.direct_fd is None:
+                self.skipTest('direct I/O is not supported by the file system')
+            self.of.file.write = Mock(side_effect=self.of.file.write)
+            with self.of:
+                self.of.write_at(4096, [b'\x01'*4096, b'\x02'*4096])
+                self.assertFalse(self.of.file.write.called)
+            with open(self.of.fullpath, 'rb') as f:
+                self.assertEqual(f.read(), b'\x00'*4096 + b'\x01'*4096 + b'\x02'*4096)
+
     def test_seek_file_failed(self):
         self.of.file = Mock()
         self.of.file.seek = Mock(side_effect=Exception)
@@ -199,9 +311,64 @@ class TestOutputFile(unittest.TestCase):
 
 
 
+class TestStreamOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.BytesIO()
+        self.so = outfile.StreamOutput(Mock(), self.stream, 20)
+        self.so.create_path('test')
+
+    def test_in_order(self):
+        with self.so:
+            self.so.seek(0)
+            self.so.write(b'a'*10)
+            self.so.release(0, 10)
+        self.assertEqual(self.stream.getvalue(), b'a'*10)
+        self.assertEqual(self.so.frontier, 10)
+
+    def test_reorder(self):
+        self.so.write_at(10, [b'b'*10])
+        self.so.release(10, 10)
+        self.assertEqual(self.stream.getvalue(), b'')
+        self.assertEqual(self.so.read(15, 5), b'b'*5)
+        self.so.write_at(0, [b'a'*10])
+        self.so.release(0, 10)
+        self.assertEqual(self.stream.getvalue(), b'a'*10 + b'b'*10)
+        self.assertEqual(self.so.buffered_bytes, 0)
+
+    def test_spill(self):
+        self.so.write_at(10, [b'b'*10])
+        self.so.write_at(20, [b'c'*10])
+        self.so.write_at(30, [b'd'*10]) # the memory limit is exceeded
+        self.assertEqual(list(self.so.spilled), [30])
+        self.assertEqual(self.so.read(30, 10), b'd'*10)
+        self.so.write_at(0, [b'a'*10]) # the block adjoining the stream is kept in memory
+        self.assertIn(0, self.so.blocks)
+        self.so.release(0, 10)
+        self.assertEqual(self.stream.getvalue(), b'a'*10 + b'b'*10 + b'c'*10 + b'd'*10)
+        self.assertEqual(self.so.spill_size, 0)
+        self.so.spill.close()
+
+    def test_read_written_data(self):
+        self.so.write_at(0, [b'a'*10])
+        self.so.release(0, 10)
+        with self.assertRaises(FileError):
+            self.so.read(0, 10)
+
+    def test_empty_context(self):
+        self.assertTrue(self.so.context.clean)
+        self.assertEqual(self.so.context.written_bytes, 0)
+        self.so.context.update(10, 10, [])
+        self.assertEqual(self.so.context.offset, 0)
+
+
+
 class TestContext(unittest.TestCase):
 
     def setUp(self):
+        patcher = patch.object(outfile.Context, '_fcntl', None) # files are mocked, they can't be locked
+        patcher.start()
+        self.addCleanup(patcher.stop)
         self.context = outfile.Context('test')
 
     @patch('builtins.open', side_effect=FileNotFoundError)
@@ -220,13 +387,13 @@ class TestContext(unittest.TestCase):
         self.assertEqual(self.context.offset, 10)
         self.assertEqual(self.context.written_bytes, 10)
         self.assertFalse(self.context.failed_parts)
-        read.assert_called_with(struct.calcsize('NNq'))
+        read.assert_any_call(struct.calcsize('NNq'))
 
     @patch('builtins.open')
     def test_open_context_with_failed_parts(self, open_mock):
         data = struct.pack('NNq', 10, 10, 2)
         failed_parts_data = struct.pack('NN', 20, 20)
-        read = Mock(side_effect=[data, failed_parts_data])
+        read = Mock(side_effect=[data, failed_parts_data, b''])
         open_mock.return_value.__enter__.return_value.read = read
         self.context.open_context()
         self.assertFalse(self.context.clean)
@@ -274,3 +441,121 @@ class TestContext(unittest.TestCase):
     def test_delete_empty(self, remove_mock):
         self.context.delete()
         remove_mock.assert_called_with('test.pymget')
+
+    def test_reset_clears_leases(self):
+        self.context.leases = {0: 1}
+        self.context.update = Mock()
+        self.context.reset()
+        self.assertEqual(self.context.leases, {})
+
+
+
+
+@unittest.skipIf(outfile.fcntl is None, 'files can not be locked')
+class TestSharedContext(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'file')
+        self.context = self.open()
+
+    def open(self):
+        context = outfile.Context(self.path)
+        context.open_context()
+        context.file_opened(True)
+        return context
+
+    def test_file_opened_saves_context(self):
+        self.assertTrue(self.context.clean)
+        self.assertTrue(self.context.shared)
+        self.assertIsNone(self.context.lock_fd)
+        self.assertFalse(self.open().clean) # another process resumes downloading
+
+    def test_file_not_opened(self):
+        self.context.delete()
+        context = outfile.Context(self.path)
+        context.open_context()
+        context.file_opened(False)
+        self.assertFalse(os.path.exists(context.filename))
+
+    def test_claim(self):
+        other = self.open()
+        self.assertEqual(self.context.claim(10, 25), 0)
+        self.assertEqual(other.claim(10, 25), 10)
+        self.assertEqual(self.context.claim(10, 25), 20)
+        self.assertIsNone(other.claim(10, 25))
+        self.assertEqual(self.open().leases, {0: os.getpid(), 10: os.getpid(), 20: os.getpid()})
+
+    def test_sync(self):
+        self.context.claim(10, 30)
+        self.context.claim(10, 30)
+        self.assertEqual(self.context.sync(10, [10]), 10) # the part 0 has been written
+        self.assertEqual(self.open().leases, {10: os.getpid()})
+        self.assertEqual(self.context.sync(5, [10], True), 15)
+        context = self.open()
+        self.assertEqual((context.leases, context.failed_parts), ({}, [10]))
+        self.assertEqual(context.claim(10, 30), 10) # released parts are claimed first
+
+    def test_remember(self):
+        self.context.remember(1000, {'server.com': ('"abc"', ''), 'другой.рф': ('', 'Mon, 19 Oct 2026 10:00:00 GMT')})
+        context = self.open()
+        self.assertEqual(context.file_size, 1000)
+        self.assertEqual(context.validators, {'server.com': ('"abc"', ''), 'другой.рф': ('', 'Mon, 19 Oct 2026 10:00:00 GMT')})
+        self.assertEqual(context.leases, {})
+        self.assertEqual(context.links, {})
+        self.context.remember(1000, {}, {'http://one.com/file': ('http://two.com/file', outfile.Context.RANGES)})
+        self.assertEqual(self.open().links, {'http://one.com/file': ('http://two.com/file', outfile.Context.RANGES)})
+
+    def test_block_size(self):
+        self.context.block_size = 100
+        self.context.write()
+        context = self.open()
+        self.assertEqual((context.block_size, context.file_size, context.validators, context.links), (100, 0, {}, {}))
+        context.remember(1000, {'server.com': ('"abc"', '')}, {'http://one.com/file': ('', outfile.Context.RANGES)})
+        context = self.open()
+        self.assertEqual((context.block_size, context.file_size), (100, 1000))
+        self.assertEqual(context.links, {'http://one.com/file': ('', outfile.Context.RANGES)})
+
+    def test_block_size_unknown(self):
+        self.context.remember(1000, {'server.com': ('"abc"', '')}) # saved by an old version
+        self.assertEqual(self.open().block_size, 0)
+
+    def test_restart(self):
+        self.context.claim(10, 30)
+        self.context.remember(30, {'server.com': ('"abc"', '')})
+        self.assertTrue(self.context.restart(40, {'server.com': ('"new"', '')}))
+        context = self.open()
+        self.assertEqual((context.offset, context.leases, context.file_size), (0, {}, 40))
+        self.assertEqual(context.validators, {'server.com': ('"new"', '')})
+
+    def test_restart_other_process(self):
+        self.context.leases = {0: 1}
+        self.context.write()
+        with patch.object(outfile.Context, 'running', return_value=True):
+            self.assertFalse(self.context.restart(40, {}))
+        self.assertEqual(self.open().leases, {0: 1})
+
+    def test_seed(self):
+        self.assertTrue(self.context.seed(30, 20, [10]))
+        context = self.open()
+        self.assertEqual((context.offset, context.written_bytes, context.failed_parts), (30, 20, [10]))
+        self.assertEqual(context.claim(10, 30), 10)
+        self.assertFalse(self.context.seed(30, 20, [10])) # another process has started downloading
+
+    def test_sync_deleted(self):
+        self.context.delete()
+        self.assertIsNone(self.context.sync(10, []))
+        self.assertIsNone(self.context.claim(10, 30))
+        self.assertFalse(os.path.exists(self.context.filename))
+
+    def test_reclaim_exited_process(self):
+        self.context.leases = {0: 1, 10: os.getpid()}
+        with patch.object(outfile.Context, 'running', side_effect=lambda pid: pid != 1):
+            self.context.reclaim()
+        self.assertEqual((self.context.leases, self.context.failed_parts), ({10: os.getpid()}, [0]))
+
+    def test_running(self):
+        self.assertTrue(outfile.Context.running(os.getpid()))
+        with patch('os.kill', side_effect=ProcessLookupError):
+            self.assertFalse(outfile.Context.running(1))
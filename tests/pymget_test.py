@@ -10,8 +10,25 @@ class TestPyMGet(unittest.TestCase):
     def setUp(self):
         self.cl_cls = Mock()
         self.outfile_cls = Mock()
+        self.stream_cls = Mock()
+        self.batch_cls = Mock()
+        self.recursive_cls = Mock()
+        self.daemon_cls = Mock()
+        self.client_cls = Mock()
+        self.work_for = Mock()
+        self.cl_cls.return_value.jobs = []
+        self.cl_cls.return_value.recursive = False
+        self.cl_cls.return_value.daemon = False
+        self.cl_cls.return_value.submit = False
+        self.cl_cls.return_value.worker = None
         pymget.PyMGet._command_line = PropertyMock(return_value=self.cl_cls)
         pymget.PyMGet._outfile = PropertyMock(return_value=self.outfile_cls)
+        pymget.PyMGet._stream = PropertyMock(return_value=self.stream_cls)
+        pymget.PyMGet._batch = PropertyMock(return_value=self.batch_cls)
+        pymget.PyMGet._recursive = PropertyMock(return_value=self.recursive_cls)
+        pymget.PyMGet._daemon = PropertyMock(return_value=self.daemon_cls)
+        pymget.PyMGet._client = PropertyMock(return_value=self.client_cls)
+        pymget.PyMGet._work_for = PropertyMock(return_value=self.work_for)
         pymget.PyMGet._console = PropertyMock()
         self.app = pymget.PyMGet([])
         self.app.manager = Mock()
@@ -20,10 +37,63 @@ class TestPyMGet(unittest.TestCase):
         self.app.run()
         self.cl_cls.assert_called_with(self.app.console, [])
         self.app.cl.parse.assert_called_with()
-        self.outfile_cls.assert_called_with(self.app.console, self.app.cl.filename)
+        self.outfile_cls.assert_called_with(self.app.console, self.app.cl.filename, self.app.cl.large_file, self.app.cl.direct_io, self.app.cl.repair)
         self.app.manager.prepare.assert_called_with(self.app.console, self.app.cl, self.app.outfile)
         self.app.manager.download.assert_called_with()
 
+    @patch('sys.stderr')
+    def test_redirect_console(self, stderr_mock):
+        app = pymget.PyMGet(['pymget', '-o', '-', 'http://example.com/file'])
+        app.console.redirect.assert_called_with(stderr_mock)
+        app = pymget.PyMGet(['pymget', '--out-file=-'])
+        app.console.redirect.assert_called_with(stderr_mock)
+        self.assertFalse(pymget.PyMGet.stdout_output(['pymget', '-o', 'file', '-']))
+
+    @patch('sys.stdout')
+    def test_run_stream(self, stdout_mock):
+        self.cl_cls.return_value.filename = '-'
+        self.app.run()
+        self.stream_cls.assert_called_with(self.app.console, stdout_mock.buffer, self.app.cl.stream_memory)
+        self.assertFalse(self.outfile_cls.called)
+        self.app.manager.prepare.assert_called_with(self.app.console, self.app.cl, self.stream_cls.return_value)
+
+    def test_run_batch(self):
+        self.cl_cls.return_value.jobs = [('', [Mock()])]
+        self.app.run()
+        self.batch_cls.return_value.prepare.assert_called_with(self.app.console, self.app.cl)
+        self.batch_cls.return_value.download.assert_called_with()
+        self.assertFalse(self.app.manager.prepare.called)
+
+    def test_run_recursive(self):
+        self.cl_cls.return_value.recursive = True
+        self.app.run()
+        self.recursive_cls.return_value.prepare.assert_called_with(self.app.console, self.app.cl)
+        self.recursive_cls.return_value.download.assert_called_with()
+        self.assertFalse(self.batch_cls.called)
+        self.assertFalse(self.app.manager.prepare.called)
+
+    def test_run_daemon(self):
+        self.cl_cls.return_value.daemon = True
+        self.app.run()
+        self.daemon_cls.return_value.prepare.assert_called_with(self.app.console, self.app.cl)
+        self.daemon_cls.return_value.download.assert_called_with()
+        self.assertFalse(self.app.manager.prepare.called)
+
+    def test_run_submit(self):
+        url = Mock()
+        self.cl_cls.return_value.submit = True
+        self.cl_cls.return_value.urls = iter([url])
+        self.app.run()
+        self.client_cls.assert_called_with(self.app.console, self.app.cl.socket)
+        self.client_cls.return_value.submit.assert_called_with([('', [url])], self.app.cl.filename)
+        self.assertFalse(self.app.manager.prepare.called)
+
+    def test_run_worker(self):
+        self.cl_cls.return_value.worker = ('coordinator', 8000)
+        self.app.run()
+        self.work_for.assert_called_with(self.app.console, ('coordinator', 8000), self.app.cl.secret)
+        self.assertFalse(self.app.manager.prepare.called)
+
     def test_run_cancel(self):
         self.app.manager.download = Mock(side_effect=CancelError('Canceled by user'))
         self.app.run()
@@ -0,0 +1,263 @@
+import unittest
+from unittest.mock import Mock, patch
+import os
+import ftplib
+import tempfile
+
+from pymget import recursive
+from pymget.networking import URL
+from pymget.errors import FatalError
+
+class FakeFTP:
+
+    """
+    FTP server with a tree in memory, directories are dicts,
+    files are tuples (size, modify).
+
+    """
+    tree = {
+        'pub': {
+            'a.txt': (10, '20200101120000'),
+            'sub': {
+                'b.bin': (5000, '20210203040506.123'),
+                'deep': {},
+            },
+        },
+    }
+    mlsd_supported = True
+
+    def __init__(self, host, user, password, timeout):
+        self.commands = []
+
+    def voidcmd(self, command):
+        self.commands.append(command)
+
+    def node(self, path):
+        node = self.tree
+        for name in filter(None, path.split('/')):
+            node = node[name]
+        return node
+
+    def mlsd(self, path, facts):
+        if not self.mlsd_supported:
+            raise ftplib.error_perm('500 Unknown command')
+        yield '.', {'type': 'cdir'}
+        for name, child in self.node(path).items():
+            if isinstance(child, dict):
+                yield name, {'type': 'dir', 'modify': '20200101000000'}
+            else:
+                yield name, {'type': 'file', 'size': str(child[0]), 'modify': child[1]}
+
+    def retrlines(self, command, callback):
+        for name, child in self.node(command[5:]).items():
+            if isinstance(child, dict):
+                callback('drwxr-xr-x 2 ftp ftp 4096 Jan  1 12:00 {}'.format(name))
+            else:
+                callback('-rw-r--r-- 1 ftp ftp {} Jan  1 12:00 {}'.format(child[0], name))
+        callback('lrwxrwxrwx 1 ftp ftp 5 Jan  1 12:00 link -> a.txt')
+
+    def sendcmd(self, command):
+        size, modify = self.node(command[5:])
+        return '213 ' + modify
+
+    def quit(self):
+        pass
+
+
+
+class HostileFTP(FakeFTP):
+
+    """
+    FTP server which lists names pointing outside the directory.
+
+    """
+    names = ['..', '../../../tmp/evil', '/etc/cron.d/x', 'a\\b', 'sub/../../x']
+
+    def mlsd(self, path, facts):
+        yield from super().mlsd(path, facts)
+        for name in self.names:
+            yield name, {'type': 'file', 'size': '1', 'modify': '20200101000000'}
+        yield '..', {'type': 'dir'}
+
+    def retrlines(self, command, callback):
+        super().retrlines(command, callback)
+        for name in self.names:
+            callback('-rw-r--r-- 1 ftp ftp 1 Jan  1 12:00 {}'.format(name))
+
+
+
+
+class TestParsers(unittest.TestCase):
+
+    def test_parse_ftp_time(self):
+        self.assertEqual(recursive.parse_ftp_time('19700101000010'), 10)
+        self.assertEqual(recursive.parse_ftp_time('19700101000010.500'), 10)
+        self.assertIsNone(recursive.parse_ftp_time('wrong'))
+
+    def test_parse_list_line(self):
+        self.assertEqual(recursive.parse_list_line('-rw-r--r-- 1 ftp ftp 10 Jan  1 12:00 my file.txt'), ('my file.txt', 'file', 10))
+        self.assertEqual(recursive.parse_list_line('drwxr-xr-x 2 ftp ftp 4096 Jan  1 2020 dir'), ('dir', 'dir', 0))
+        self.assertIsNone(recursive.parse_list_line('drwxr-xr-x 2 ftp ftp 4096 Jan  1 2020 ..'))
+        self.assertIsNone(recursive.parse_list_line('lrwxrwxrwx 1 ftp ftp 5 Jan  1 12:00 link -> a.txt'))
+        self.assertIsNone(recursive.parse_list_line('total 8'))
+
+    def test_safe_name(self):
+        self.assertTrue(recursive.safe_name('file.txt'))
+        self.assertTrue(recursive.safe_name('..file'))
+        for name in ['', '.', '..', '../evil', '/etc/x', 'a/b', 'a\\b', 'c:\\x']:
+            self.assertFalse(recursive.safe_name(name), name)
+
+
+
+
+class TestFTPTree(unittest.TestCase):
+
+    def setUp(self):
+        FakeFTP.mlsd_supported = True
+        patcher = patch.object(recursive.FTPTree, 'protocol', FakeFTP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def expected(self):
+        return [
+            ('a.txt', 10, recursive.parse_ftp_time('20200101120000')),
+            ('sub/b.bin', 5000, recursive.parse_ftp_time('20210203040506')),
+        ]
+
+    def test_list_mlsd(self):
+        tree = recursive.FTPTree(URL('ftp://server.com/pub/'), 1, 3)
+        self.assertEqual(tree.list(), self.expected())
+
+    def test_list_without_mlsd(self):
+        FakeFTP.mlsd_supported = False
+        tree = recursive.FTPTree(URL('ftp://server.com/pub'), 1, 2)
+        self.assertEqual(tree.list(), self.expected())
+
+    def test_list_rejects_wrong_names(self):
+        for mlsd in True, False:
+            FakeFTP.mlsd_supported = mlsd
+            with patch.object(recursive.FTPTree, 'protocol', HostileFTP):
+                tree = recursive.FTPTree(URL('ftp://server.com/pub/'), 1, 2)
+                self.assertEqual(tree.list(), self.expected())
+            self.assertIn('../../../tmp/evil', tree.rejected)
+            self.assertIn('sub//etc/cron.d/x', tree.rejected)
+
+    def test_list_error(self):
+        tree = recursive.FTPTree(URL('ftp://server.com/missing/'), 1, 2)
+        with self.assertRaises(KeyError):
+            tree.list()
+
+
+
+
+class TestRecursive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.console = Mock()
+        self.command_line = Mock()
+        self.command_line.filename = self.tmp.name + os.sep
+        self.command_line.jobs = []
+        self.command_line.connections = 8
+        self.command_line.block_size = 100
+        self.command_line.urls = [URL('ftp://one.com/pub/'), URL('http://web.com/pub/'), URL('ftp://two.com/mirror/pub')]
+        self.files = [('a', 10, 1000), ('b', 20, 2000), ('c/d', 1000, 3000)]
+        self.tree = Mock()
+        self.tree.return_value.list.return_value = self.files
+        self.tree.return_value.rejected = []
+        patchers = [patch.object(recursive.Recursive, '_tree', self.tree), patch.object(recursive.Recursive, '_pool', Mock())]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.recursive = recursive.Recursive()
+
+    def local_file(self, path, size, mtime):
+        fullpath = os.path.join(self.tmp.name, path)
+        with open(fullpath, 'wb') as f:
+            f.write(b'\x00' * size)
+        os.utime(fullpath, (mtime, mtime))
+        return fullpath
+
+    def test_prepare(self):
+        self.recursive.prepare(self.console, self.command_line)
+        self.tree.assert_called_with(self.command_line.urls[0], self.command_line.timeout, 4)
+        jobs = [(path, [url.url for url in urls]) for path, urls in self.recursive.jobs]
+        self.assertEqual(jobs, [
+            ('a', ['ftp://one.com/pub/a']), # single blocks are downloaded from mirrors in turn
+            ('b', ['ftp://two.com/mirror/pub/b']),
+            ('c/d', ['ftp://one.com/pub/c/d', 'ftp://two.com/mirror/pub/c/d']),
+        ])
+        self.assertEqual(self.recursive.total, 3)
+
+    def test_prepare_skips_up_to_date(self):
+        self.local_file('a', 10, 1000)
+        self.local_file('b', 20, 1999) # the time differs
+        self.recursive.prepare(self.console, self.command_line)
+        self.assertEqual([path for path, urls in self.recursive.jobs], ['b', 'c/d'])
+        self.assertEqual(self.recursive.skipped, 1)
+
+    def test_up_to_date_partially_downloaded(self):
+        fullpath = self.local_file('a', 10, 1000)
+        open(fullpath + '.pymget', 'wb').close()
+        self.recursive.command_line = self.command_line
+        self.assertFalse(self.recursive.up_to_date('a', 10, 1000))
+
+    def test_up_to_date_unknown_time(self):
+        self.local_file('a', 10, 1000)
+        self.recursive.command_line = self.command_line
+        self.assertFalse(self.recursive.up_to_date('a', 10, None))
+
+    def test_prepare_no_ftp(self):
+        self.command_line.urls = [URL('http://web.com/pub/')]
+        with self.assertRaises(FatalError):
+            self.recursive.prepare(self.console, self.command_line)
+
+    def test_prepare_list_next_mirror(self):
+        self.tree.return_value.list.side_effect = [ftplib.error_perm('550'), self.files]
+        self.recursive.prepare(self.console, self.command_line)
+        self.tree.assert_called_with(self.command_line.urls[2], self.command_line.timeout, 4)
+        self.assertTrue(self.console.error.called)
+
+    def test_prepare_list_failed(self):
+        self.tree.return_value.list.side_effect = OSError
+        with self.assertRaises(FatalError):
+            self.recursive.prepare(self.console, self.command_line)
+
+    def test_prepare_skips_outside(self):
+        self.tree.return_value.list.return_value = [('../evil', 1, 1000), ('/etc/x', 1, 1000), ('c/../../y', 1, 1000), ('a', 10, 1000)]
+        self.tree.return_value.rejected = ['sub/..']
+        self.recursive.prepare(self.console, self.command_line)
+        self.assertEqual([path for path, urls in self.recursive.jobs], ['a'])
+        self.assertEqual(self.console.warning.call_count, 4)
+
+    @patch('pymget.batch.Batch.start_job')
+    def test_start_job_outside(self, start_job_mock):
+        self.recursive.console = self.console
+        self.recursive.command_line = self.command_line
+        outside = tempfile.NamedTemporaryFile(delete=False)
+        outside.close()
+        self.addCleanup(os.remove, outside.name)
+        self.recursive.start_job(os.path.relpath(outside.name, self.tmp.name), [])
+        self.recursive.start_job(outside.name, [])
+        self.assertTrue(os.path.exists(outside.name))
+        self.assertFalse(start_job_mock.called)
+        self.assertEqual(self.recursive.failed, 2)
+
+    @patch('pymget.batch.Batch.start_job')
+    def test_start_job_replaces_changed_file(self, start_job_mock):
+        self.recursive.command_line = self.command_line
+        fullpath = self.local_file('a', 10, 1000)
+        self.recursive.start_job('a', [])
+        self.assertFalse(os.path.exists(fullpath))
+        self.recursive.start_job('c/d', [])
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp.name, 'c')))
+        start_job_mock.assert_called_with(self.recursive, 'c/d', [])
+
+    def test_job_done_sets_time(self):
+        self.recursive.console = self.console
+        fullpath = self.local_file('a', 10, 1000)
+        self.recursive.times['a'] = 5000
+        self.recursive.job_done('a', Mock(outfile=Mock(fullpath=fullpath)))
+        self.assertEqual(int(os.stat(fullpath).st_mtime), 5000)
+        self.assertEqual(self.recursive.done, 1)
@@ -0,0 +1,46 @@
+import unittest
+import os
+import hashlib
+import tempfile
+
+from pymget import seed
+from pymget.checksum import PieceHashes
+from pymget.errors import FileError
+
+def hashes(data, length):
+    digests = [hashlib.sha256(data[i:i + length]).hexdigest() for i in range(0, len(data), length)]
+    piece_hashes = PieceHashes('sha256', length, digests)
+    piece_hashes.set_file_size(len(data))
+    return piece_hashes
+
+class TestSeed(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'old')
+
+    def create(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        s = seed.Seed(self.path)
+        self.addCleanup(s.close)
+        return s
+
+    def test_match(self):
+        s = self.create(b'aaaabbbbccccdd')
+        new = b'bbbbxxxxccccdd' # moved, changed and the same pieces
+        self.assertEqual(s.match(hashes(new, 4)), {0: 4, 2: 8, 3: 12})
+        self.assertEqual(s.read(4, 4), b'bbbb')
+
+    def test_match_repeated_pieces(self):
+        s = self.create(b'aaaa')
+        self.assertEqual(s.match(hashes(b'aaaaaaaa', 4)), {0: 0, 1: 0})
+
+    def test_short_last_piece(self):
+        self.assertEqual(self.create(b'dd').match(hashes(b'aaaadd', 4)), {1: 0}) # at the end of the seed
+        self.assertEqual(self.create(b'xxxxddxx').match(hashes(b'aaaadd', 4)), {1: 4}) # at the same offset
+
+    def test_not_found(self):
+        with self.assertRaises(FileError):
+            seed.Seed(os.path.join(self.tmp.name, 'nonexistent'))
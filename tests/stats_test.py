@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+
+from pymget import stats
+
+class TestMirrorRecord(unittest.TestCase):
+
+    def test_part(self):
+        record = stats.MirrorRecord()
+        record.part(100, 1)
+        record.part(300, 3)
+        self.assertEqual((record.speed, record.ttfb, record.parts), (200, 2, 2))
+
+    def test_merge(self):
+        record = stats.MirrorRecord(100, 1, 3, 1, True)
+        record.merge(stats.MirrorRecord(500, 5, 1, 2, None))
+        self.assertEqual((record.speed, record.ttfb, record.parts, record.errors, record.ranges), (200, 2, 4, 3, True))
+
+    def test_flaky(self):
+        self.assertFalse(stats.MirrorRecord(errors=2).flaky)
+        self.assertTrue(stats.MirrorRecord(errors=2.9).flaky) # 3 errors decayed a bit
+        self.assertTrue(stats.MirrorRecord(errors=3).flaky)
+        self.assertFalse(stats.MirrorRecord(parts=10, errors=3).flaky)
+
+
+
+class TestMirrorStats(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'cache', 'mirrors.db')
+        self.stats = stats.MirrorStats(self.path)
+        self.addCleanup(self.stats.close)
+
+    def test_save_and_load(self):
+        self.assertEqual(self.stats.load(['one.com']), {})
+        self.stats.save({'one.com': stats.MirrorRecord(100, 1, 2, 0, True)})
+        self.stats.save({'one.com': stats.MirrorRecord(400, 4, 1, 1, None), 'two.com': stats.MirrorRecord(errors=1, ranges=False)})
+        other = stats.MirrorStats(self.path) # another process
+        self.addCleanup(other.close)
+        records = other.load(['one.com', 'two.com', 'three.com'])
+        self.assertEqual(set(records), {'one.com', 'two.com'})
+        one = records['one.com']
+        self.assertAlmostEqual(one.speed, 200, 3)
+        self.assertAlmostEqual(one.parts, 3, 3)
+        self.assertAlmostEqual(one.errors, 1, 3)
+        self.assertTrue(one.ranges)
+        self.assertFalse(records['two.com'].ranges)
+
+    def test_decay(self):
+        self.stats.save({'one.com': stats.MirrorRecord(errors=4)})
+        with patch('time.time', return_value=os.path.getmtime(self.path) + 2 * stats.MirrorStats.HALF_LIFE + 60):
+            record = self.stats.load(['one.com'])['one.com']
+        self.assertAlmostEqual(record.errors, 1, 2) # the mirror is tried again
+        self.assertFalse(record.flaky)
+
+    def test_unusable_database(self):
+        path = os.path.join(self.tmp.name, 'file')
+        with open(path, 'w') as f:
+            f.write('not a database')
+        broken = stats.MirrorStats(os.path.join(path, 'mirrors.db'))
+        self.assertIsNone(broken.db)
+        self.assertEqual(broken.load(['one.com']), {})
+        broken.save({'one.com': stats.MirrorRecord(errors=1)})
@@ -7,14 +7,15 @@ class TestTaskInfo(unittest.TestCase):
 
     def setUp(self):
         self.manager = Mock()
+        self.manager.stale_part.return_value = False
 
     def test_task_head_data(self):
-        info = ti.TaskHeadData('test', 200, 1024)
+        info = ti.TaskHeadData('test', 200, 1024, '"abc"')
         self.assertEqual(info.name, 'test')
         self.assertEqual(info.status, 200)
         self.assertEqual(info.file_size, 1024)
         info.process(self.manager)
-        self.manager.set_file_size.assert_called_with('test', 1024)
+        self.manager.set_file_size.assert_called_with('test', 1024, ('"abc"', ''))
 
     def test_task_redirect(self):
         url = Mock(url='http://server.com')
@@ -38,7 +39,12 @@ class TestTaskInfo(unittest.TestCase):
         self.assertEqual(info.name, 'test')
         self.assertEqual(info.status, 404)
         info.process(self.manager)
-        self.manager.do_error.assert_called_with('test', 404)
+        self.manager.do_error.assert_called_with('test', 404, 0)
+
+    def test_task_head_error_retry_after(self):
+        info = ti.TaskHeadError('test', 503, 30)
+        info.process(self.manager)
+        self.manager.do_error.assert_called_with('test', 503, 30)
 
     def test_task_error(self):
         info = ti.TaskError('test', 404, 1024)
@@ -46,8 +52,11 @@ class TestTaskInfo(unittest.TestCase):
         self.assertEqual(info.status, 404)
         self.assertEqual(info.offset, 1024)
         info.process(self.manager)
-        self.manager.add_failed_part.assert_called_with(1024)
-        self.manager.do_error.assert_called_with('test', 404)
+        self.manager.add_failed_part.assert_called_with(1024, b'')
+        self.manager.do_error.assert_called_with('test', 404, 0)
+        info = ti.TaskError('test', 0, 1024, 0, b'\x00'*10)
+        info.process(self.manager)
+        self.manager.add_failed_part.assert_called_with(1024, b'\x00'*10)
 
     def test_task_data(self):
         info = ti.TaskData('test', 206, 1024, b'\x00'*100)
@@ -57,3 +66,16 @@ class TestTaskInfo(unittest.TestCase):
         self.assertEqual(info.data, b'\x00'*100)
         info.process(self.manager)
         self.manager.write_data.assert_called_with('test', 1024, b'\x00'*100)
+
+    def test_task_data_stale(self):
+        self.manager.stale_part.return_value = True
+        info = ti.TaskData('test', 206, 1024, b'\x00'*100)
+        info.process(self.manager)
+        self.manager.stale_part.assert_called_with('test', 1024)
+        self.assertFalse(self.manager.write_data.called)
+
+    def test_task_changed(self):
+        info = ti.TaskChanged('test', 200, 1024, 2000, '"new"', 'Mon, 19 Oct 2026 10:00:00 GMT')
+        self.assertEqual(info.offset, 1024)
+        info.process(self.manager)
+        self.manager.file_changed.assert_called_with('test', 1024, 2000, ('"new"', 'Mon, 19 Oct 2026 10:00:00 GMT'))
@@ -0,0 +1,36 @@
+import unittest
+
+from pymget import tuner
+
+class TestTuner(unittest.TestCase):
+
+    def setUp(self):
+        self.tuner = tuner.Tuner()
+
+    def test_plateau(self):
+        self.assertFalse(self.tuner.update(0, 0, 4)) # the first window starts
+        self.assertFalse(self.tuner.update(1, 100, 4)) # the window is not over
+        self.assertTrue(self.tuner.update(3, 300, 4))
+        self.assertEqual(self.tuner.streams, 2)
+        self.assertTrue(self.tuner.update(6, 900, 4)) # 200 B/s with 2 streams
+        self.assertEqual(self.tuner.streams, 3)
+        self.assertTrue(self.tuner.update(9, 1500, 4)) # 200 B/s with 3 streams, the third one is useless
+        self.assertEqual(self.tuner.streams, 2)
+        self.assertTrue(self.tuner.settled)
+        self.assertEqual(self.tuner.speed, 200)
+        self.assertFalse(self.tuner.update(100, 10**6, 4))
+
+    def test_errors(self):
+        self.tuner.update(0, 0, 4)
+        self.tuner.update(3, 300, 4)
+        self.tuner.error()
+        self.tuner.update(6, 1200, 4) # faster, but errors have appeared
+        self.assertEqual(self.tuner.streams, 1)
+        self.assertTrue(self.tuner.settled)
+
+    def test_all_streams(self):
+        self.tuner.update(0, 0, 2)
+        self.tuner.update(3, 300, 2)
+        self.tuner.update(6, 1200, 2)
+        self.assertEqual(self.tuner.streams, 2) # there are no more mirrors
+        self.assertTrue(self.tuner.settled)
@@ -0,0 +1,238 @@
+import unittest
+from unittest.mock import Mock, patch
+import os
+import queue
+import tempfile
+from multiprocessing.connection import Client
+
+from pymget import workers
+from pymget.errors import FatalError
+from pymget.networking import URL
+from pymget.task_info import TaskProgress, TaskData, TaskHeadData, TaskError, TaskHeadError, TaskWritten, TaskWriteError
+
+class TestWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = Mock()
+        self.mirror_cls = Mock()
+        patcher = patch.object(workers.Worker, '_mirror', self.mirror_cls)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.worker = workers.Worker(self.conn, 100, 10)
+        self.mirror = self.mirror_cls.create.return_value
+        self.mirror.url = URL('http://server.com/file')
+
+    def sent(self):
+        return [call[0][0] for call in self.conn.send.call_args_list]
+
+    def test_connect(self):
+        self.worker.connect('server.com', URL('http://server.com/file'))
+        url, block_size, timeout = self.mirror_cls.create.call_args[0]
+        self.assertEqual((url.url, block_size, timeout), ('http://server.com/file', 100, 10))
+        self.assertIs(self.mirror.data_queue, self.worker.data_queue)
+        self.mirror.connect.assert_called_with()
+        self.assertEqual(self.worker.busy, {'server.com'})
+        self.worker.connect('server.com', URL('http://server.com/file')) # the same mirror reconnects
+        self.assertEqual(self.mirror_cls.create.call_count, 1)
+        self.worker.connect('server.com', URL('http://server.com/other')) # redirected
+        self.assertEqual(self.mirror_cls.create.call_count, 2)
+
+    def test_download(self):
+        self.worker.mirrors['server.com'] = self.mirror
+        self.worker.download('server.com', 200, 1000, ('"abc"', ''))
+        self.assertEqual(self.mirror.file_size, 1000)
+        self.assertEqual(self.mirror.validator, ('"abc"', ''))
+        self.mirror.download.assert_called_with(200)
+        self.assertEqual(self.worker.busy, {'server.com'})
+
+    def test_download_without_connection(self):
+        self.worker.download('server.com', 200, 1000, None, URL('http://server.com/file'))
+        self.assertEqual(self.mirror_cls.create.call_count, 1)
+        self.assertIs(self.worker.mirrors['server.com'], self.mirror)
+        self.mirror.download.assert_called_with(200)
+
+    def test_forward(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'file')
+            with open(path, 'wb') as f:
+                f.write(b'\x00' * 20)
+            self.worker.open(path)
+            self.worker.mirrors['server.com'] = self.mirror
+            self.worker.busy.add('server.com')
+            self.mirror.wait_connection.return_value = True
+            self.worker.data_queue.put(TaskProgress('server.com', 206, 5))
+            self.worker.data_queue.put(TaskData('server.com', 206, 10, bytearray(b'\x01' * 10)))
+            self.worker.data_queue.put(TaskProgress('other.com', 206, 5))
+            self.worker.data_queue.put(TaskProgress('other.com', 206, 8))
+            self.worker.forward()
+            self.worker.stop()
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'\x00' * 10 + b'\x01' * 10)
+        sent = self.sent()
+        self.assertEqual(len(sent), 3)
+        self.assertIsInstance(sent[0][1], TaskWritten) # progress of the finished task is dropped
+        self.assertEqual((sent[0][1].offset, sent[0][1].length), (10, 10))
+        self.assertEqual(sent[1][1].task_progress, 8) # only the last progress is sent
+        self.assertEqual(sent[2], ('idle', 'server.com'))
+        self.assertEqual(self.worker.busy, set())
+
+    def test_forward_data_to_manager(self):
+        self.mirror.name = 'server.com'
+        self.mirror_cls.create.return_value = self.mirror
+        self.worker.connect('server.com@node', URL('http://server.com/file'))
+        self.mirror.wait_connection.return_value = False
+        self.worker.data_queue.put(TaskData('server.com', 206, 10, b'\x01' * 10))
+        self.worker.forward()
+        task_info = self.sent()[0][1]
+        self.assertIsInstance(task_info, TaskData) # there is no shared file, data are sent
+        self.assertEqual(task_info.name, 'server.com@node')
+
+    def test_write_error(self):
+        self.worker.open('/nonexistent/file')
+        task_info = self.worker.write(TaskData('server.com', 206, 10, b'\x01'))
+        self.assertIsInstance(task_info, TaskWriteError)
+        self.assertEqual(task_info.offset, 10)
+
+    def test_run(self):
+        self.conn.poll.return_value = True
+        self.conn.recv.side_effect = [('open', '/tmp/file'), ('cancel', 'server.com'), ('stop',)]
+        self.worker.mirrors['server.com'] = self.mirror
+        self.worker.run()
+        self.assertEqual(self.worker.path, '/tmp/file')
+        self.mirror.cancel.assert_called_with()
+        self.mirror.close.assert_called_with()
+
+    def test_run_manager_gone(self):
+        self.conn.poll.side_effect = EOFError
+        self.worker.mirrors['server.com'] = self.mirror
+        self.worker.run()
+        self.mirror.close.assert_called_with()
+
+
+
+
+class TestWorkerProcess(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = workers.WorkerProcess(100, 10)
+        self.addCleanup(self.worker.conn.close)
+        self.addCleanup(self.worker.child_conn.close)
+        self.worker.conn = Mock()
+        self.mirror = workers.ProcessMirror(URL('http://server.com/file'), 100, 10, self.worker)
+        self.mirror.data_queue = queue.Queue()
+
+    def test_read(self):
+        task_info = TaskHeadData('server.com', 206, 1000)
+        self.mirror.connect()
+        self.worker.conn.recv.side_effect = [('task', task_info), ('task', TaskHeadData('gone.com', 206, 1)), ('idle', 'server.com'), EOFError]
+        self.worker.read()
+        self.assertIs(self.mirror.data_queue.get_nowait(), task_info)
+        self.assertTrue(self.mirror.data_queue.empty())
+        self.assertTrue(self.mirror.wait_connection())
+
+    def test_read_process_died(self):
+        self.mirror.download(200)
+        self.worker.conn.recv.side_effect = EOFError
+        self.worker.read()
+        task_info = self.mirror.data_queue.get_nowait()
+        self.assertIsInstance(task_info, TaskError)
+        self.assertEqual(task_info.offset, 200)
+        self.assertTrue(self.mirror.wait_connection())
+
+    def test_send_process_died(self):
+        self.worker.conn.send.side_effect = BrokenPipeError
+        self.worker.send('stop')
+
+
+
+
+class TestProcessMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = Mock()
+        self.worker.mirrors = {}
+        self.mirror = workers.ProcessMirror(URL('http://server.com/file'), 100, 10, self.worker)
+        self.mirror.data_queue = queue.Queue()
+
+    def test_commands(self):
+        self.assertIs(self.worker.mirrors['server.com'], self.mirror)
+        self.mirror.connect()
+        self.worker.send.assert_called_with('connect', 'server.com', self.mirror.url)
+        self.assertFalse(self.mirror.wait_connection())
+        self.assertFalse(self.mirror.need_connect)
+        self.mirror.idle.set()
+        self.mirror.file_size = 1000
+        self.mirror.validator = ('"abc"', '')
+        self.mirror.download(200)
+        self.worker.send.assert_called_with('download', 'server.com', 200, 1000, ('"abc"', ''), self.mirror.url)
+        self.mirror.cancel()
+        self.worker.send.assert_called_with('cancel', 'server.com')
+        self.mirror.close()
+        self.worker.send.assert_called_with('close', 'server.com')
+
+    def test_worker_died(self):
+        self.worker.alive = False
+        self.mirror.download(200)
+        self.assertEqual(self.mirror.data_queue.get_nowait().offset, 200)
+        self.assertTrue(self.mirror.wait_connection())
+
+    def test_done(self):
+        self.mirror.done()
+        self.assertTrue(self.mirror.ready)
+        self.assertFalse(self.mirror.need_connect)
+        ftp = workers.ProcessMirror(URL('ftp://server.com/file'), 100, 10, self.worker)
+        ftp.done()
+        self.assertFalse(ftp.ready)
+        self.assertTrue(ftp.need_connect)
+
+    def test_fail_while_connecting(self):
+        self.mirror.connect()
+        self.mirror.fail()
+        self.assertIsInstance(self.mirror.data_queue.get_nowait(), TaskHeadError)
+        self.mirror.fail() # the mirror is idle now
+        self.assertTrue(self.mirror.data_queue.empty())
+
+    def test_connect_message_once(self):
+        console = Mock()
+        self.mirror.connect_message(console)
+        self.mirror.connect_message(console)
+        self.assertEqual(console.message.call_count, 1)
+
+
+
+
+class TestRemote(unittest.TestCase):
+
+    def setUp(self):
+        self.coordinator = workers.Coordinator(('127.0.0.1', 0), 'secret', 100, 10)
+        self.addCleanup(self.coordinator.close)
+
+    def accepted(self):
+        for i in range(100):
+            workers = self.coordinator.accepted()
+            if workers:
+                return workers
+            self.coordinator.thread.join(0.01)
+        return []
+
+    def test_accept(self):
+        conn = Client(self.coordinator.address, authkey=b'secret')
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.recv(), (100, 10))
+        worker, = self.accepted()
+        self.addCleanup(worker.conn.close)
+        self.assertIsInstance(worker, workers.RemoteWorker)
+        mirror = workers.RemoteMirror(URL('http://server.com/file'), 100, 10, worker)
+        self.assertEqual(mirror.name, 'server.com@' + worker.name)
+        self.assertIs(worker.mirrors[mirror.name], mirror)
+
+    def test_wrong_secret(self):
+        with self.assertRaises(FatalError):
+            workers.work_for(Mock(), self.coordinator.address, 'wrong')
+        self.assertEqual(self.accepted(), [])
+
+    def test_close(self):
+        self.coordinator.close()
+        self.assertFalse(self.coordinator.thread.is_alive())
+        with self.assertRaises(FatalError):
+            workers.work_for(Mock(), self.coordinator.address, 'secret')
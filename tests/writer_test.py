@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import Mock
+
+from pymget.writer import Writer, coalesce
+from pymget.errors import FileError
+
+class TestCoalesce(unittest.TestCase):
+
+    def test_adjacent_blocks(self):
+        runs = coalesce({10: b'b'*10, 0: b'a'*10, 30: b'c'*5})
+        self.assertEqual(runs, [[0, 20, [b'a'*10, b'b'*10]], [30, 5, [b'c'*5]]])
+
+    def test_empty(self):
+        self.assertEqual(coalesce({}), [])
+
+
+class TestWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.outfile = Mock()
+        self.writer = Writer(self.outfile, 100)
+
+    def test_write_runs(self):
+        self.writer.put(10, b'b'*10) # the thread is not started, blocks are queued
+        self.writer.put(0, b'a'*10)
+        self.writer.put(50, b'c'*10)
+        self.writer.start()
+        self.writer.close()
+        self.outfile.write_at.assert_any_call(0, [b'a'*10, b'b'*10])
+        self.outfile.write_at.assert_any_call(50, [b'c'*10])
+        self.assertEqual(self.writer.take_written(), [(0, 10), (10, 10), (50, 10)])
+        self.assertEqual(self.writer.take_written(), [])
+        self.assertEqual(self.writer.queued_bytes, 0)
+
+    def test_large_block_with_empty_queue(self):
+        self.writer.put(0, b'a'*200)
+        self.assertEqual(self.writer.queued_bytes, 200)
+
+    def test_backpressure(self):
+        self.writer.put(0, b'a'*60)
+        self.writer.condition.wait = Mock(side_effect=KeyboardInterrupt)
+        with self.assertRaises(KeyboardInterrupt): # put waits for the writer
+            self.writer.put(60, b'b'*60)
+        self.assertNotIn(60, self.writer.blocks)
+
+    def test_error(self):
+        self.outfile.write_at.side_effect = FileError('error')
+        self.writer.put(0, b'a'*10)
+        self.writer.start()
+        self.writer.close()
+        self.assertIsInstance(self.writer.error, FileError)
+        self.assertEqual(self.writer.take_written(), [])
+        with self.assertRaises(FileError):
+            self.writer.put(10, b'b'*10)